@@ -0,0 +1,202 @@
+"""
+Cliente asyncio de WSAA (LoginCms) para ARCA/AFIP.
+
+Los endpoints de tickets son async: llamar a get_arca_access_ticket
+(firma + SOAP bloqueantes) congela el event loop del worker mientras WSAA
+responde. Este cliente:
+- Firma el TRA en un pool de threads acotado (trabajo de CPU)
+- Envía el sobre SOAP de LoginCms con un httpx.AsyncClient con pool de
+  conexiones y timeouts, sin bloquear el loop
+
+Devuelve exactamente el mismo dict que get_arca_access_ticket.
+
+Variables de entorno:
+    ARCA_SIGN_WORKERS: Threads para firmar TRA (default: 4)
+    ARCA_HTTP_POOL_SIZE: Conexiones máximas al WSAA (default: 10)
+    ARCA_SOAP_TIMEOUT: Timeout total de la llamada en segundos (default: 30)
+    ARCA_CONNECT_TIMEOUT: Timeout de conexión en segundos (default: 10)
+"""
+
+import asyncio
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from lxml import etree
+
+from Arca.wsaa import (
+    TIMEZONE_OFFSET, create_tra, sign_tra_with_credentials, parse_login_ticket_response, credentials_registry
+)
+from utils.logger import setup_logger
+
+logger = setup_logger('arca')
+
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+LOGIN_CMS_ENVELOPE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:wsaa="http://wsaa.view.sua.dvadac.desein.afip.gov">'
+    '<soapenv:Header/>'
+    '<soapenv:Body><wsaa:loginCms><wsaa:in0>{cms}</wsaa:in0></wsaa:loginCms></soapenv:Body>'
+    '</soapenv:Envelope>'
+)
+
+# Pool acotado para la firma CMS (CPU), separado del executor por defecto del loop
+_sign_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ARCA_SIGN_WORKERS', '4')),
+    thread_name_prefix='arca-firma'
+)
+
+
+def wsaa_endpoint(wsdl_url: str) -> str:
+    """URL del endpoint SOAP a partir de la URL del WSDL (sin '?WSDL')."""
+    base, _, query = wsdl_url.partition('?')
+    return base if query.lower() == 'wsdl' else wsdl_url
+
+
+def parse_login_cms_response(soap_xml: bytes) -> dict:
+    """Extrae el loginCmsReturn (o el faultstring) del sobre SOAP de respuesta."""
+    try:
+        root = etree.fromstring(soap_xml)
+    except etree.XMLSyntaxError as e:
+        logger.error(f"Respuesta SOAP de WSAA no es XML válida: {e}")
+        return {'error': f"Respuesta no es XML válida: {soap_xml[:500]!r}"}
+
+    login_return = root.find('.//{*}loginCmsReturn')
+    if login_return is not None and login_return.text:
+        return parse_login_ticket_response(login_return.text)
+
+    fault_string = root.find(f'.//{{{SOAP_ENV_NS}}}Fault/faultstring')
+    error_msg = fault_string.text if fault_string is not None else "Respuesta del WSAA no contiene credenciales ni error específico."
+    logger.error(f"Error en respuesta WSAA: {error_msg}")
+    return {'error': error_msg}
+
+
+class AsyncWsaaClient:
+    """Cliente HTTP asíncrono de LoginCms con pool de conexiones compartido."""
+
+    def __init__(self):
+        self._http = None
+        self._loop = None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        # El AsyncClient queda atado al loop donde se creó
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            pool_size = int(os.getenv('ARCA_HTTP_POOL_SIZE', '10'))
+            timeout = float(os.getenv('ARCA_SOAP_TIMEOUT', '30'))
+            connect_timeout = float(os.getenv('ARCA_CONNECT_TIMEOUT', '10'))
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+            self._loop = loop
+            logger.info(f"Cliente HTTP async WSAA creado - Pool: {pool_size}, Timeout: {timeout}s")
+        return self._http
+
+    async def login_cms(self, cms_base64: str, wsdl_url: str) -> dict:
+        """Invoca LoginCms. Devuelve {'token', 'sign'} o {'error'} como call_wsaa."""
+        endpoint = wsaa_endpoint(wsdl_url)
+        logger.info(f"Llamando WSAA (async): {endpoint}")
+
+        try:
+            response = await self._get_http_client().post(
+                endpoint,
+                content=LOGIN_CMS_ENVELOPE.format(cms=cms_base64).encode('utf-8'),
+                headers={"Content-Type": "text/xml; charset=utf-8", "SOAPAction": '""'}
+            )
+        except httpx.TimeoutException as e:
+            logger.error(f"Timeout en la llamada SOAP a WSAA: {e!r}")
+            return {'error': f"Timeout en la llamada SOAP a WSAA: {e!r}"}
+        except httpx.HTTPError as e:
+            logger.error(f"Error en la llamada SOAP a WSAA: {e!r}")
+            return {'error': f"Error en la llamada SOAP: {e!r}"}
+
+        logger.info(f"Respuesta WSAA recibida - HTTP {response.status_code}")
+        return parse_login_cms_response(response.content)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._loop = None
+
+
+wsaa_async_client = AsyncWsaaClient()
+
+
+async def get_arca_access_ticket_async(service_type="", environment="", custom_config=None):
+    """
+    Versión asyncio de get_arca_access_ticket (mismos parámetros y respuesta).
+
+    La firma corre en el pool acotado de threads y la llamada SOAP sobre
+    el cliente HTTP asíncrono, sin bloquear el event loop.
+    """
+
+    logger.info(f"Iniciando autenticación ARCA async - Tipo: '{service_type}', Entorno: '{environment}'")
+
+    try:
+        credenciales = None if custom_config else credentials_registry.get(service_type, environment)
+        settings = custom_config or credenciales.settings()
+        logger.info(f"Configuración obtenida: servicio={settings.service_name}, cert={settings.cert_file}")
+
+        tra_xml = create_tra(settings.service_name)
+
+        # Firma CMS (CPU) fuera del event loop
+        loop = asyncio.get_running_loop()
+        cms_base64 = await loop.run_in_executor(
+            _sign_executor, _validate_and_sign, settings, tra_xml, credenciales
+        )
+
+        wsaa_response = await wsaa_async_client.login_cms(cms_base64, settings.wsaa_url)
+
+        if 'error' in wsaa_response:
+            logger.error(f"Error en WSAA: {wsaa_response['error']}")
+            return {
+                'success': False,
+                'error': wsaa_response['error'],
+                'details': 'Error en la comunicación con WSAA'
+            }
+
+        logger.info("Autenticación ARCA completada exitosamente")
+        return {
+            'success': True,
+            'token': wsaa_response['token'],
+            'sign': wsaa_response['sign'],
+            'expiration_time': wsaa_response.get('expiration_time'),
+            'service': settings.service_name,
+            'service_type': service_type or 'CPE',
+            'environment': environment or 'PROD',
+            'timestamp': datetime.datetime.now(
+                datetime.timezone(datetime.timedelta(hours=TIMEZONE_OFFSET))
+            ).isoformat()
+        }
+
+    except FileNotFoundError as e:
+        logger.error(f"Certificados no encontrados: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'details': 'Certificados SSL no encontrados'
+        }
+    except Exception as e:
+        logger.error(f"Error inesperado en autenticación ARCA: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'details': 'Error inesperado en la autenticación ARCA'
+        }
+
+
+def _validate_and_sign(settings, tra_xml, credenciales=None):
+    """Valida certificados y firma el TRA (se ejecuta en el pool de firma)."""
+    if credenciales is None:
+        settings.validate_certificates()
+    return sign_tra_with_credentials(tra_xml, settings, credenciales)
+
+
+async def close_async_clients() -> None:
+    """Cierra las conexiones HTTP abiertas (apagado de la aplicación)."""
+    await wsaa_async_client.aclose()
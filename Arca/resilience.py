@@ -0,0 +1,241 @@
+"""
+Control de admisión de llamadas a WSAA.
+
+Cuando AFIP/ARCA está lento o caído, cada cache miss termina en una
+llamada SOAP que espera el timeout completo, y los reintentos seguidos
+hacen que WSAA nos limite. Este módulo agrega, alrededor del fetcher del
+broker (get_arca_access_ticket / get_arca_access_ticket_async):
+
+- Circuit breaker por (servicio, entorno) con sondeo semi-abierto
+- Token bucket global para las llamadas salientes a WSAA
+- Reintentos con backoff exponencial y jitter, solo para errores transitorios
+
+Cuando el circuito está abierto o no hay cupo, la llamada se rechaza al
+instante con 'circuit_open' / 'rate_limited' y 'retry_after' en el resultado.
+
+Variables de entorno:
+    ARCA_CB_FAILURE_THRESHOLD: Fallos transitorios seguidos que abren el circuito (default: 5)
+    ARCA_CB_OPEN_SECONDS: Segundos con el circuito abierto antes de sondear (default: 30)
+    ARCA_WSAA_RATE_PER_MINUTE: Llamadas WSAA permitidas por minuto (default: 30)
+    ARCA_WSAA_BURST: Ráfaga máxima de llamadas WSAA (default: 5)
+    ARCA_WSAA_MAX_RETRIES: Reintentos ante errores transitorios (default: 2)
+    ARCA_WSAA_BACKOFF_BASE: Base del backoff en segundos (default: 0.5)
+    ARCA_WSAA_BACKOFF_MAX: Tope del backoff en segundos (default: 8)
+"""
+
+import asyncio
+import inspect
+import os
+import random
+import time
+from typing import Callable, Dict, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger('arca')
+
+# Errores de transporte/disponibilidad de WSAA (los faults de negocio no se reintentan)
+ERRORES_TRANSITORIOS = (
+    "timeout", "error en la llamada soap", "no es xml válida", "connecterror",
+    "connection", "service unavailable", "503", "502", "504",
+)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMI_ABIERTO = "semi_abierto"
+
+
+def es_error_transitorio(error: str) -> bool:
+    """True si el error indica que WSAA no respondió o no está disponible."""
+    error = (error or "").lower()
+    return any(marca in error for marca in ERRORES_TRANSITORIOS)
+
+
+def backoff_con_jitter(intento: int, base: float, maximo: float) -> float:
+    """Espera antes del reintento N (full jitter: uniforme entre 0 y base * 2^N, acotado)."""
+    return random.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker con sondeo semi-abierto.
+
+    Cerrado: deja pasar todo. Tras `umbral_fallos` fallos transitorios
+    seguidos se abre y rechaza durante `tiempo_apertura` segundos; después
+    deja pasar una única llamada de sondeo (semi-abierto). Si el sondeo
+    funciona se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral_fallos: int = 5, tiempo_apertura: float = 30.0):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = CERRADO
+        self.fallos = 0
+        self._abierto_desde = 0.0
+        self._sondeo_en_curso = False
+
+    def permitir(self) -> bool:
+        """True si la llamada puede salir hacia WSAA."""
+        if self.estado == CERRADO:
+            return True
+        if self.estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.tiempo_apertura:
+            self.estado = SEMI_ABIERTO
+            self._sondeo_en_curso = False
+        if self.estado == SEMI_ABIERTO and not self._sondeo_en_curso:
+            self._sondeo_en_curso = True
+            return True
+        return False
+
+    def registrar_exito(self) -> None:
+        if self.estado != CERRADO:
+            logger.info("Circuito WSAA cerrado - WSAA responde nuevamente")
+        self.estado = CERRADO
+        self.fallos = 0
+        self._sondeo_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        self.fallos += 1
+        if self.estado == SEMI_ABIERTO or self.fallos >= self.umbral_fallos:
+            if self.estado != ABIERTO:
+                logger.warning(f"Circuito WSAA abierto tras {self.fallos} fallos - Se rechaza por {self.tiempo_apertura:.0f}s")
+            self.estado = ABIERTO
+            self._abierto_desde = time.monotonic()
+            self._sondeo_en_curso = False
+
+    def liberar_sondeo(self) -> None:
+        """Libera el sondeo semi-abierto que finalmente no se ejecutó."""
+        self._sondeo_en_curso = False
+
+    def segundos_para_sondeo(self) -> float:
+        if self.estado != ABIERTO:
+            return 0.0
+        return max(0.0, self.tiempo_apertura - (time.monotonic() - self._abierto_desde))
+
+
+class TokenBucket:
+    """Token bucket: `tasa` tokens por segundo con capacidad `capacidad`."""
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._tokens = capacidad
+        self._ultimo = time.monotonic()
+
+    def _recargar(self) -> None:
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def consumir(self) -> bool:
+        """Toma un token si hay disponible."""
+        self._recargar()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def segundos_para_token(self) -> float:
+        self._recargar()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.tasa
+
+
+class WsaaGuard:
+    """
+    Admisión de llamadas a WSAA: breaker por (servicio, entorno), cupo global y reintentos.
+
+    Los parámetros no informados se leen del entorno.
+    """
+
+    def __init__(self, umbral_fallos: int = None, tiempo_apertura: float = None,
+                 llamadas_por_minuto: float = None, rafaga: float = None,
+                 max_reintentos: int = None, backoff_base: float = None, backoff_max: float = None):
+        self.umbral_fallos = umbral_fallos if umbral_fallos is not None else int(os.getenv('ARCA_CB_FAILURE_THRESHOLD', '5'))
+        self.tiempo_apertura = tiempo_apertura if tiempo_apertura is not None else float(os.getenv('ARCA_CB_OPEN_SECONDS', '30'))
+        llamadas_por_minuto = llamadas_por_minuto if llamadas_por_minuto is not None else float(os.getenv('ARCA_WSAA_RATE_PER_MINUTE', '30'))
+        rafaga = rafaga if rafaga is not None else float(os.getenv('ARCA_WSAA_BURST', '5'))
+        self.max_reintentos = max_reintentos if max_reintentos is not None else int(os.getenv('ARCA_WSAA_MAX_RETRIES', '2'))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv('ARCA_WSAA_BACKOFF_BASE', '0.5'))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv('ARCA_WSAA_BACKOFF_MAX', '8'))
+        self.bucket = TokenBucket(llamadas_por_minuto / 60.0, rafaga)
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self.rechazos = 0
+        self.llamadas = 0  # Intentos que llegaron a salir hacia WSAA (incluye reintentos)
+
+    def breaker(self, service_type: str, environment: str) -> CircuitBreaker:
+        clave = (service_type, environment)
+        if clave not in self._breakers:
+            self._breakers[clave] = CircuitBreaker(self.umbral_fallos, self.tiempo_apertura)
+        return self._breakers[clave]
+
+    def _rechazo(self, motivo: str, error: str, retry_after: float) -> dict:
+        self.rechazos += 1
+        logger.warning(f"Llamada WSAA rechazada ({motivo}) - Reintentar en {retry_after:.1f}s")
+        return {
+            'success': False,
+            'error': error,
+            'details': 'WSAA no disponible temporalmente',
+            motivo: True,
+            'retry_after': max(1, int(retry_after + 0.999)),
+        }
+
+    async def llamar(self, fetcher: Callable[[str, str], dict], service_type: str, environment: str) -> dict:
+        """
+        Ejecuta el fetcher respetando breaker, cupo y reintentos.
+
+        Devuelve el dict del fetcher, o un rechazo con 'circuit_open' o
+        'rate_limited' y 'retry_after' sin llamar a WSAA.
+        """
+        breaker = self.breaker(service_type, environment)
+
+        for intento in range(self.max_reintentos + 1):
+            if not breaker.permitir():
+                return self._rechazo('circuit_open', f"Circuito WSAA abierto para {service_type}/{environment}",
+                                     breaker.segundos_para_sondeo())
+            if not self.bucket.consumir():
+                # El sondeo no llegó a salir: se libera para el próximo intento
+                breaker.liberar_sondeo()
+                return self._rechazo('rate_limited', "Límite de llamadas a WSAA alcanzado",
+                                     self.bucket.segundos_para_token())
+
+            self.llamadas += 1
+            try:
+                if inspect.iscoroutinefunction(fetcher):
+                    resultado = await fetcher(service_type, environment)
+                else:
+                    loop = asyncio.get_running_loop()
+                    resultado = await loop.run_in_executor(None, fetcher, service_type, environment)
+            except asyncio.CancelledError:
+                # Cancelada (ej: apagado): no es un fallo de WSAA, pero el sondeo no puede quedar tomado
+                breaker.liberar_sondeo()
+                raise
+            except Exception:
+                breaker.registrar_fallo()
+                raise
+
+            error = resultado.get('error', '')
+            if resultado.get('success') or not es_error_transitorio(error):
+                # WSAA respondió (ticket o fault de negocio como "ya posee un TA válido")
+                breaker.registrar_exito()
+                return resultado
+
+            breaker.registrar_fallo()
+            if intento == self.max_reintentos:
+                return resultado
+
+            espera = backoff_con_jitter(intento, self.backoff_base, self.backoff_max)
+            logger.warning(f"Error transitorio de WSAA ({error}) - Reintento {intento + 1} en {espera:.2f}s")
+            await asyncio.sleep(espera)
+
+        return resultado
+
+    def stats(self) -> dict:
+        """Estado de los circuitos y del cupo para monitoreo."""
+        return {
+            "circuitos": {
+                f"{servicio}/{entorno}": {"estado": b.estado, "fallos": b.fallos}
+                for (servicio, entorno), b in self._breakers.items()
+            },
+            "tokens_disponibles": round(self.bucket._tokens, 2),
+            "rechazos": self.rechazos,
+            "llamadas": self.llamadas,
+        }
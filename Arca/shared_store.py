@@ -0,0 +1,143 @@
+"""
+Store de tickets WSAA compartido entre workers del mismo host.
+
+Con varios workers de uvicorn cada proceso tiene su propio broker en
+memoria: sin coordinación cada uno pide su ticket a WSAA (y el segundo
+recibe "ya posee un TA válido"). Este store es un archivo SQLite en modo
+WAL, separado de logigrain.db, con dos tablas:
+
+- tickets: último ticket publicado por clave (cert, servicio, entorno)
+- leases: lock consultivo con vencimiento; solo el worker que lo tiene
+  llama a WSAA, el resto espera a que el ticket aparezca en el store
+
+En WAL las lecturas no bloquean ni son bloqueadas por la escritura del
+ticket, y el lease se toma con BEGIN IMMEDIATE (un único escritor a la vez).
+Si el worker que tiene el lease muere, el lease vence y otro lo toma.
+
+Variables de entorno:
+    ARCA_SHARED_STORE: 'false' desactiva el store compartido (default: true)
+    ARCA_SHARED_STORE_PATH: Archivo SQLite (default: cache/arca_tickets.db)
+    ARCA_SHARED_LEASE_SECONDS: Vigencia del lease de renovación (default: 60)
+"""
+
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger('arca')
+
+BASE_DIR = Path(__file__).parent.parent.absolute()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    clave TEXT PRIMARY KEY,
+    resultado TEXT NOT NULL,
+    fecha_vencimiento TEXT NOT NULL,
+    publicado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    clave TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    vence REAL NOT NULL
+);
+"""
+
+
+def _serializar_clave(clave: Tuple[str, str, str]) -> str:
+    return "|".join(clave)
+
+
+class SharedTicketStore:
+    """
+    Tickets y leases de renovación en un archivo SQLite WAL compartido.
+
+    Args:
+        path: Archivo SQLite del store
+        lease_segundos: Vigencia del lease (debe superar el timeout de WSAA)
+        espera_sondeo: Segundos entre lecturas mientras otro worker renueva
+    """
+
+    def __init__(self, path: str, lease_segundos: Optional[float] = None, espera_sondeo: float = 0.05):
+        self.path = str(path)
+        self.lease_segundos = lease_segundos if lease_segundos is not None else \
+            float(os.getenv('ARCA_SHARED_LEASE_SECONDS', '60'))
+        self.espera_sondeo = espera_sondeo
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión por thread (sqlite3 no comparte conexiones entre threads)."""
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(_ESQUEMA)
+            self._local.con = con
+        return con
+
+    def leer(self, clave: Tuple[str, str, str]) -> Optional[Tuple[dict, datetime.datetime]]:
+        """Devuelve (resultado, fecha_vencimiento UTC) del ticket publicado, si existe."""
+        fila = self._conexion().execute(
+            "SELECT resultado, fecha_vencimiento FROM tickets WHERE clave = ?",
+            (_serializar_clave(clave),)
+        ).fetchone()
+        if fila is None:
+            return None
+        return json.loads(fila[0]), datetime.datetime.fromisoformat(fila[1])
+
+    def publicar(self, clave: Tuple[str, str, str], resultado: dict, vencimiento: datetime.datetime) -> None:
+        """Publica el ticket para el resto de los workers."""
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO tickets (clave, resultado, fecha_vencimiento, publicado) VALUES (?, ?, ?, ?)",
+            (_serializar_clave(clave), json.dumps(resultado), vencimiento.isoformat(), time.time())
+        )
+
+    def adquirir_lease(self, clave: Tuple[str, str, str]) -> bool:
+        """Intenta tomar el lease de renovación de la clave. True si este worker lo tiene."""
+        con = self._conexion()
+        ahora = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            fila = con.execute(
+                "SELECT owner, vence FROM leases WHERE clave = ?", (_serializar_clave(clave),)
+            ).fetchone()
+            if fila is not None and fila[0] != self.owner and fila[1] > ahora:
+                con.execute("ROLLBACK")
+                return False
+            con.execute(
+                "INSERT OR REPLACE INTO leases (clave, owner, vence) VALUES (?, ?, ?)",
+                (_serializar_clave(clave), self.owner, ahora + self.lease_segundos)
+            )
+            con.execute("COMMIT")
+            return True
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def liberar_lease(self, clave: Tuple[str, str, str]) -> None:
+        """Libera el lease si lo tiene este worker."""
+        self._conexion().execute(
+            "DELETE FROM leases WHERE clave = ? AND owner = ?", (_serializar_clave(clave), self.owner)
+        )
+
+
+def shared_store_from_env() -> Optional[SharedTicketStore]:
+    """Store compartido según el entorno, o None si está deshabilitado."""
+    if os.getenv('ARCA_SHARED_STORE', 'true').lower() == 'false':
+        return None
+    path = os.getenv('ARCA_SHARED_STORE_PATH', str(BASE_DIR / "cache" / "arca_tickets.db"))
+    try:
+        return SharedTicketStore(path)
+    except OSError as e:
+        logger.warning(f"No se pudo crear el store compartido de tickets en {path}: {e}")
+        return None
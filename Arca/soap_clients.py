@@ -0,0 +1,109 @@
+"""
+Registro de clientes SOAP (zeep) reutilizables para los webservices ARCA/AFIP.
+
+Crear un zeep.Client descarga y parsea el WSDL y abre una conexión TLS
+nueva. Este módulo mantiene un único cliente por URL de WSDL, todos sobre
+un Transport con:
+- requests.Session con pool de conexiones HTTP (keep-alive)
+- Cache en disco de WSDL/XSD (zeep SqliteCache), que sobrevive reinicios
+
+Sirve para LoginCms (WSAA) y para los futuros clientes wscpe/wsfe.
+
+Variables de entorno:
+    ARCA_WSDL_CACHE_PATH: Archivo SQLite de cache de WSDL (default: cache/wsdl_cache.db)
+    ARCA_WSDL_CACHE_TTL: Segundos de validez del WSDL cacheado (default: 86400)
+    ARCA_HTTP_POOL_SIZE: Conexiones máximas por host (default: 10)
+    ARCA_SOAP_TIMEOUT: Timeout en segundos de las operaciones SOAP (default: 30)
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable
+
+import requests
+from requests.adapters import HTTPAdapter
+from zeep import Client, Settings
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
+
+from utils.logger import setup_logger
+
+logger = setup_logger('arca')
+
+BASE_DIR = Path(__file__).parent.parent  # LogiGrain root
+
+_clients: Dict[str, Client] = {}
+_transport = None
+_lock = threading.Lock()
+
+
+def _build_transport() -> Transport:
+    """Crea el Transport compartido: sesión HTTP con pool y cache de WSDL en disco."""
+    pool_size = int(os.getenv('ARCA_HTTP_POOL_SIZE', '10'))
+    timeout = int(os.getenv('ARCA_SOAP_TIMEOUT', '30'))
+    cache_path = Path(os.getenv('ARCA_WSDL_CACHE_PATH', str(BASE_DIR / "cache" / "wsdl_cache.db")))
+    cache_ttl = int(os.getenv('ARCA_WSDL_CACHE_TTL', '86400'))
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    logger.info(f"Transport SOAP creado - Pool: {pool_size}, Timeout: {timeout}s, Cache WSDL: {cache_path}")
+
+    return Transport(
+        session=session,
+        cache=SqliteCache(path=str(cache_path), timeout=cache_ttl),
+        timeout=timeout,
+        operation_timeout=timeout
+    )
+
+
+def get_soap_client(wsdl_url: str) -> Client:
+    """
+    Devuelve el cliente zeep para la URL de WSDL, creándolo una sola vez.
+
+    Args:
+        wsdl_url: URL del WSDL (ej: LoginCms?WSDL de WSAA)
+    """
+    client = _clients.get(wsdl_url)
+    if client is not None:
+        return client
+
+    global _transport
+    with _lock:
+        client = _clients.get(wsdl_url)
+        if client is None:
+            if _transport is None:
+                _transport = _build_transport()
+            logger.info(f"Creando cliente SOAP para: {wsdl_url}")
+            settings = Settings(strict=False, xml_huge_tree=True)
+            client = Client(wsdl_url, settings=settings, transport=_transport)
+            _clients[wsdl_url] = client
+    return client
+
+
+def warm_soap_clients(wsdl_urls: Iterable[str]) -> None:
+    """
+    Precarga los clientes SOAP (WSDL + conexión) al iniciar la aplicación.
+    Un error no es fatal: el cliente se creará en la primera llamada.
+    """
+    for wsdl_url in dict.fromkeys(wsdl_urls):
+        try:
+            get_soap_client(wsdl_url)
+            logger.info(f"Cliente SOAP precargado: {wsdl_url}")
+        except Exception as e:
+            logger.warning(f"No se pudo precargar cliente SOAP {wsdl_url}: {e}")
+
+
+def reset_soap_clients() -> None:
+    """Descarta los clientes y el Transport (ej: tras cambiar la configuración)."""
+    global _transport
+    with _lock:
+        _clients.clear()
+        if _transport is not None:
+            _transport.session.close()
+        _transport = None
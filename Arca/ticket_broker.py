@@ -0,0 +1,263 @@
+"""
+Broker de tickets WSAA compartido entre usuarios.
+
+Un Access Ticket de ARCA pertenece al certificado y al servicio, no al
+usuario ni al puerto. El broker guarda un único ticket por
+(fingerprint del certificado, servicio, entorno) y colapsa los cache miss
+concurrentes en una sola llamada WSAA en vuelo que todos los solicitantes
+esperan. Así un cambio de turno con 50 operadores genera un solo LoginCms
+en vez de 50 (y evita el rechazo "ya posee un TA válido").
+
+Con varios workers, el broker se apoya en un store compartido
+(Arca/shared_store.py) para que solo un proceso del host llame a WSAA.
+
+El vencimiento de cada ticket es el expirationTime real informado por
+WSAA (con 8 horas como respaldo si no viene). La renovación anticipada la
+hace Arca/ticket_refresher.py llamando a refresh().
+
+El control de acceso por usuario/puerto (validate_user_puerto_access)
+se sigue haciendo antes de llegar al broker.
+"""
+
+import asyncio
+import datetime
+import inspect
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Arca.wsaa import credentials_registry, parse_expiration_time, get_arca_access_ticket
+from Arca.async_client import get_arca_access_ticket_async
+from Arca.shared_store import SharedTicketStore
+from Arca.resilience import WsaaGuard
+from utils.logger import setup_logger
+
+logger = setup_logger('arca')
+
+# Vigencia asumida si WSAA no informa expirationTime (misma que ArcaToken)
+TICKET_VIGENCIA = datetime.timedelta(hours=8)
+
+TicketKey = Tuple[str, str, str]  # (fingerprint_cert, servicio, entorno)
+
+
+@dataclass
+class TicketEntry:
+    """Ticket vigente en el broker."""
+    resultado: dict
+    fecha_vencimiento: datetime.datetime  # UTC naive, igual que ArcaToken
+    service_type: str = "CPE"
+    environment: str = "PROD"
+
+    def is_expired(self) -> bool:
+        return datetime.datetime.utcnow() >= self.fecha_vencimiento
+
+
+class TicketBroker:
+    """
+    Cache de tickets WSAA por certificado con single-flight.
+
+    Args:
+        fetcher: Función que obtiene el ticket de WSAA. Recibe
+            (service_type, environment) y devuelve el dict de
+            get_arca_access_ticket. Puede ser una corrutina (cliente
+            async) o una función bloqueante, que se ejecuta fuera del loop.
+        store: Store compartido entre workers (Arca/shared_store.py), opcional
+        guard: Control de admisión de WSAA (Arca/resilience.py), opcional
+    """
+
+    def __init__(self, fetcher: Callable[[str, str], dict] = get_arca_access_ticket_async,
+                 store: Optional[SharedTicketStore] = None, guard: Optional[WsaaGuard] = None):
+        self.fetcher = fetcher
+        self.store = store
+        self.guard = guard
+        self._tickets: Dict[TicketKey, TicketEntry] = {}
+        self._en_vuelo: Dict[TicketKey, asyncio.Task] = {}
+        self._llamadas_directas = 0
+
+    @property
+    def wsaa_calls(self) -> int:
+        """Llamadas que llegaron a WSAA; con guard las cuenta el guard, una por intento."""
+        return self._llamadas_directas + (self.guard.llamadas if self.guard is not None else 0)
+
+    @property
+    def fetcher_sincronico(self) -> bool:
+        """El fetcher es bloqueante (cliente zeep de Arca/soap_clients.py), no el cliente httpx async."""
+        return not inspect.iscoroutinefunction(self.fetcher)
+
+    def ticket_key(self, service_type: str = "", environment: str = "") -> TicketKey:
+        """Clave del ticket: (fingerprint del certificado, servicio, entorno)."""
+        environment = environment or os.getenv('ARCA_ENVIRONMENT', 'PROD')
+        credenciales = credentials_registry.get(service_type, environment)
+        return (credenciales.fingerprint, credenciales.service_name, environment)
+
+    async def get_ticket(self, service_type: str = "", environment: str = "") -> dict:
+        """
+        Obtiene el ticket del servicio, desde memoria o desde WSAA.
+
+        Si ya hay una llamada WSAA en vuelo para la misma clave, espera su
+        resultado en lugar de lanzar otra.
+
+        Returns:
+            dict con el formato de get_arca_access_ticket más 'wsaa_url',
+            'fecha_vencimiento' y 'from_broker' (True si no hubo llamada WSAA).
+        """
+        service_type = service_type or "CPE"
+        environment = environment or os.getenv('ARCA_ENVIRONMENT', 'PROD')
+
+        try:
+            clave = self.ticket_key(service_type, environment)
+        except FileNotFoundError as e:
+            logger.error(f"Certificados no encontrados: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'details': 'Certificados SSL no encontrados'
+            }
+
+        entrada = self._tickets.get(clave)
+        if entrada and not entrada.is_expired():
+            logger.info(f"Ticket WSAA servido por broker - Servicio: {clave[1]}, Entorno: {environment}")
+            return {**entrada.resultado, 'from_broker': True}
+
+        resultado = await self._esperar_llamada(clave, service_type, environment)
+        return {**resultado, 'from_broker': False}
+
+    async def refresh(self, service_type: str = "", environment: str = "") -> dict:
+        """
+        Fuerza la renovación del ticket aunque el actual siga vigente.
+
+        Mientras la llamada está en vuelo get_ticket sigue sirviendo el
+        ticket vigente; si WSAA falla se conserva el anterior.
+        """
+        service_type = service_type or "CPE"
+        environment = environment or os.getenv('ARCA_ENVIRONMENT', 'PROD')
+        clave = self.ticket_key(service_type, environment)
+        logger.info(f"Renovando ticket WSAA - Servicio: {clave[1]}, Entorno: {environment}")
+        return await self._esperar_llamada(clave, service_type, environment)
+
+    async def _esperar_llamada(self, clave: TicketKey, service_type: str, environment: str) -> dict:
+        """Lanza la llamada WSAA de la clave o se suma a la que ya está en vuelo."""
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            entrada = self._tickets.get(clave)
+            token_actual = entrada.resultado.get('token') if entrada else None
+            tarea = asyncio.create_task(self._solicitar(clave, service_type, environment, token_actual))
+            self._en_vuelo[clave] = tarea
+        else:
+            logger.info(f"Esperando llamada WSAA en vuelo - Servicio: {clave[1]}, Entorno: {environment}")
+
+        # shield: si un cliente cancela, la llamada sigue para el resto
+        return await asyncio.shield(tarea)
+
+    async def _solicitar(self, clave: TicketKey, service_type: str, environment: str,
+                         token_actual: Optional[str] = None) -> dict:
+        """
+        Obtiene un ticket nuevo para la clave y lo publica en memoria.
+
+        Con store compartido primero adopta el ticket que otro worker haya
+        publicado (distinto de token_actual); si no hay, solo el worker que
+        toma el lease llama a WSAA y el resto espera su publicación.
+        """
+        try:
+            if self.store is None:
+                resultado = await self._llamar_wsaa(service_type, environment)
+            else:
+                resultado = await self._solicitar_compartido(clave, service_type, environment, token_actual)
+
+            if resultado.get('success'):
+                vencimiento = datetime.datetime.fromisoformat(resultado['fecha_vencimiento'])
+                self._tickets[clave] = TicketEntry(resultado, vencimiento, service_type, environment)
+                logger.info(f"Ticket WSAA publicado en broker - Servicio: {clave[1]}, Entorno: {environment}, Vence: {vencimiento}")
+            return resultado
+        finally:
+            self._en_vuelo.pop(clave, None)
+
+    async def _llamar_wsaa(self, service_type: str, environment: str) -> dict:
+        """Una llamada al fetcher; agrega 'wsaa_url' y 'fecha_vencimiento' al resultado exitoso."""
+        if self.guard is not None:
+            resultado = await self.guard.llamar(self.fetcher, service_type, environment)
+        elif inspect.iscoroutinefunction(self.fetcher):
+            self._llamadas_directas += 1
+            resultado = await self.fetcher(service_type, environment)
+        else:
+            self._llamadas_directas += 1
+            loop = asyncio.get_running_loop()
+            resultado = await loop.run_in_executor(None, self.fetcher, service_type, environment)
+
+        if resultado.get('success'):
+            vencimiento = parse_expiration_time(resultado.get('expiration_time'))
+            if vencimiento is None:
+                vencimiento = datetime.datetime.utcnow() + TICKET_VIGENCIA
+            resultado = {
+                **resultado,
+                'wsaa_url': credentials_registry.get(service_type, environment).wsaa_url,
+                'fecha_vencimiento': vencimiento.isoformat(),
+            }
+        return resultado
+
+    async def _solicitar_compartido(self, clave: TicketKey, service_type: str, environment: str,
+                                    token_actual: Optional[str]) -> dict:
+        """Coordina con los demás workers a través del store compartido."""
+        loop = asyncio.get_running_loop()
+
+        def adoptable(leido) -> bool:
+            if leido is None:
+                return False
+            resultado, vencimiento = leido
+            return datetime.datetime.utcnow() < vencimiento and resultado.get('token') != token_actual
+
+        while True:
+            leido = await loop.run_in_executor(None, self.store.leer, clave)
+            if adoptable(leido):
+                logger.info(f"Ticket WSAA tomado del store compartido - Servicio: {clave[1]}, Entorno: {environment}")
+                return leido[0]
+
+            if await loop.run_in_executor(None, self.store.adquirir_lease, clave):
+                try:
+                    # Otro worker pudo publicar entre la lectura y la toma del lease
+                    leido = await loop.run_in_executor(None, self.store.leer, clave)
+                    if adoptable(leido):
+                        return leido[0]
+
+                    resultado = await self._llamar_wsaa(service_type, environment)
+                    if resultado.get('success'):
+                        vencimiento = datetime.datetime.fromisoformat(resultado['fecha_vencimiento'])
+                        await loop.run_in_executor(None, self.store.publicar, clave, resultado, vencimiento)
+                    return resultado
+                finally:
+                    await loop.run_in_executor(None, self.store.liberar_lease, clave)
+
+            # Otro worker tiene el lease: esperar a que publique
+            await asyncio.sleep(self.store.espera_sondeo)
+
+    def invalidate(self, service_type: str = "", environment: str = "") -> None:
+        """Descarta el ticket en memoria de un servicio/entorno."""
+        self._tickets.pop(self.ticket_key(service_type, environment), None)
+
+    def get_entry(self, clave: TicketKey) -> Optional[TicketEntry]:
+        """Devuelve la entrada vigente de una clave, si existe."""
+        return self._tickets.get(clave)
+
+    def entries(self) -> List[Tuple[TicketKey, TicketEntry]]:
+        """Tickets publicados en el broker (copia, para recorrer sin bloquear)."""
+        return list(self._tickets.items())
+
+
+def fetcher_desde_entorno() -> Callable[[str, str], dict]:
+    """
+    Fetcher de WSAA según ARCA_WSAA_CLIENT.
+
+    'httpx' (default): cliente async de Arca/async_client.py. 'zeep': cliente
+    sincrónico de Arca/wsaa.py con los clientes reutilizables de
+    Arca/soap_clients.py, ejecutado fuera del loop.
+    """
+    cliente = os.getenv('ARCA_WSAA_CLIENT', 'httpx').strip().lower()
+    if cliente == 'zeep':
+        return get_arca_access_ticket
+    if cliente != 'httpx':
+        logger.warning(f"ARCA_WSAA_CLIENT inválido ({cliente}) - Se usa httpx")
+    return get_arca_access_ticket_async
+
+
+# Broker compartido por toda la aplicación (el fetcher se elige en el arranque de la API)
+ticket_broker = TicketBroker()
@@ -0,0 +1,172 @@
+"""
+Renovación anticipada de tickets WSAA.
+
+Sin este proceso el ticket se renueva recién cuando un operador recibe un
+cache miss, y la ida y vuelta a WSAA queda en el camino de su escaneo.
+El refresher corre dentro del lifespan de FastAPI, recorre los tickets
+publicados en el broker (uno por certificado, servicio y entorno) y los
+renueva un tiempo antes de su expirationTime real, con un desfasaje
+aleatorio para que varios tickets o workers no golpeen WSAA a la vez.
+
+Si la renovación falla (WSAA caído o el rechazo "ya posee un TA válido")
+se conserva el ticket vigente y se reintenta más cerca del vencimiento.
+
+Variables de entorno:
+    ARCA_TICKET_REFRESH_ENABLED: 'false' desactiva la renovación (default: true)
+    ARCA_TICKET_REFRESH_LEAD_MINUTES: Minutos antes del vencimiento para renovar (default: 30)
+    ARCA_TICKET_REFRESH_JITTER_SECONDS: Desfasaje aleatorio máximo en segundos (default: 120)
+    ARCA_TICKET_REFRESH_RETRY_SECONDS: Espera máxima entre reintentos fallidos (default: 60)
+"""
+
+import asyncio
+import datetime
+import os
+import random
+from typing import Dict, Optional, Tuple
+
+from Arca.ticket_broker import TicketBroker, TicketEntry, TicketKey, ticket_broker
+from utils.logger import setup_logger
+
+logger = setup_logger('arca')
+
+# Mensajes con que WSAA rechaza un LoginCms mientras el TA anterior sigue vigente
+TA_VIGENTE_MARCAS = ("ya posee un ta valido", "ya posee un ta válido", "alreadyauthenticated")
+
+
+def es_rechazo_ta_vigente(error: str) -> bool:
+    """True si el error de WSAA indica que el certificado ya tiene un TA válido."""
+    error = (error or "").lower()
+    return any(marca in error for marca in TA_VIGENTE_MARCAS)
+
+
+class TicketRefresher:
+    """
+    Scheduler de renovación de los tickets del broker.
+
+    Args:
+        broker: Broker cuyos tickets se renuevan
+        lead: Anticipación respecto del vencimiento (default: env)
+        jitter: Desfasaje aleatorio máximo en segundos (default: env)
+        retry: Espera máxima entre reintentos en segundos (default: env)
+        intervalo_maximo: Segundos máximos entre revisiones de la agenda
+
+    Los valores por defecto se leen del entorno al usarse (después de load_dotenv).
+    """
+
+    def __init__(self, broker: TicketBroker, lead: Optional[datetime.timedelta] = None,
+                 jitter: Optional[float] = None, retry: Optional[float] = None,
+                 intervalo_maximo: float = 60.0):
+        self.broker = broker
+        self._lead = lead
+        self._jitter = jitter
+        self._retry = retry
+        self.intervalo_maximo = intervalo_maximo
+        # clave -> (vencimiento del ticket agendado, momento de renovación)
+        self._agenda: Dict[TicketKey, Tuple[datetime.datetime, datetime.datetime]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.renovaciones = 0
+        self.fallos = 0
+
+    @property
+    def lead(self) -> datetime.timedelta:
+        if self._lead is not None:
+            return self._lead
+        return datetime.timedelta(minutes=float(os.getenv('ARCA_TICKET_REFRESH_LEAD_MINUTES', '30')))
+
+    @property
+    def jitter(self) -> float:
+        if self._jitter is not None:
+            return self._jitter
+        return float(os.getenv('ARCA_TICKET_REFRESH_JITTER_SECONDS', '120'))
+
+    @property
+    def retry(self) -> float:
+        if self._retry is not None:
+            return self._retry
+        return float(os.getenv('ARCA_TICKET_REFRESH_RETRY_SECONDS', '60'))
+
+    def proxima_renovacion(self, clave: TicketKey, entrada: TicketEntry) -> datetime.datetime:
+        """Momento de renovación agendado para el ticket (se sortea el jitter una vez por ticket)."""
+        agendado = self._agenda.get(clave)
+        if agendado is None or agendado[0] != entrada.fecha_vencimiento:
+            desfasaje = datetime.timedelta(seconds=random.uniform(0, self.jitter))
+            agendado = (entrada.fecha_vencimiento, entrada.fecha_vencimiento - self.lead - desfasaje)
+            self._agenda[clave] = agendado
+        return agendado[1]
+
+    async def renovar_pendientes(self) -> float:
+        """
+        Renueva los tickets cuya renovación ya venció.
+
+        Returns:
+            Segundos hasta la próxima renovación agendada (acotado a intervalo_maximo)
+        """
+        ahora = datetime.datetime.utcnow()
+        proxima = ahora + datetime.timedelta(seconds=self.intervalo_maximo)
+
+        for clave, entrada in self.broker.entries():
+            momento = self.proxima_renovacion(clave, entrada)
+            if momento <= ahora:
+                await self._renovar(clave, entrada)
+                momento = self.proxima_renovacion(clave, self.broker.get_entry(clave) or entrada)
+            proxima = min(proxima, momento)
+
+        return max(0.0, (proxima - datetime.datetime.utcnow()).total_seconds())
+
+    async def _renovar(self, clave: TicketKey, entrada: TicketEntry) -> None:
+        """Renueva un ticket; si falla conserva el vigente y agenda el reintento."""
+        try:
+            resultado = await self.broker.refresh(entrada.service_type, entrada.environment)
+        except Exception as e:
+            resultado = {'success': False, 'error': str(e)}
+
+        if resultado.get('success'):
+            self.renovaciones += 1
+            logger.info(f"Ticket WSAA renovado anticipadamente - Servicio: {clave[1]}, Entorno: {clave[2]}")
+            return
+
+        self.fallos += 1
+        restante = (entrada.fecha_vencimiento - datetime.datetime.utcnow()).total_seconds()
+        # Reintentar antes del vencimiento: a mitad del tiempo restante, sin superar retry
+        espera = self.retry if restante <= 0 else min(self.retry, max(restante / 2, 1.0))
+        self._agenda[clave] = (
+            entrada.fecha_vencimiento,
+            datetime.datetime.utcnow() + datetime.timedelta(seconds=espera)
+        )
+
+        if es_rechazo_ta_vigente(resultado.get('error')):
+            logger.warning(f"WSAA informa TA vigente para {clave[1]} - Se conserva el ticket actual, reintento en {espera:.0f}s")
+        else:
+            logger.error(f"Error renovando ticket WSAA {clave[1]}: {resultado.get('error')} - Reintento en {espera:.0f}s")
+
+    async def _run(self) -> None:
+        logger.info(f"Renovación de tickets WSAA iniciada - Anticipación: {self.lead}, Jitter: {self.jitter:.0f}s")
+        while True:
+            try:
+                espera = await self.renovar_pendientes()
+            except Exception as e:
+                logger.error(f"Error en la renovación de tickets WSAA: {e}")
+                espera = self.retry
+            await asyncio.sleep(min(max(espera, 0.05), self.intervalo_maximo))
+
+    def start(self) -> None:
+        """Inicia la tarea de renovación en el event loop actual."""
+        if os.getenv('ARCA_TICKET_REFRESH_ENABLED', 'true').lower() == 'false':
+            logger.info("Renovación anticipada de tickets WSAA deshabilitada")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='arca-ticket-refresher')
+
+    async def stop(self) -> None:
+        """Detiene la tarea de renovación."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Refresher de los tickets del broker compartido
+ticket_refresher = TicketRefresher(ticket_broker)
@@ -1,15 +1,19 @@
 
 import datetime
 import random
+import threading
+import time
 import xml.etree.ElementTree as ET
 import base64
+from dataclasses import dataclass
 
 # Dependencias Criptográficas
 from OpenSSL import crypto
-from cryptography.hazmat.primitives import serialization
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.serialization import pkcs7
 
 # Dependencias SOAP
-from zeep import Client, Settings
 from lxml import etree 
 
 # Logging centralizado
@@ -18,6 +22,7 @@ import os
 # Agregar directorio padre al path para importar utils
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.logger import setup_logger
+from Arca.soap_clients import get_soap_client
 logger = setup_logger('arca') 
 
 # --- CONFIGURACIÓN ---
@@ -28,6 +33,19 @@ TIMEZONE_OFFSET = -3
 def load_keys_and_cert(cert_file, key_file):
     """Carga el certificado y la clave privada de archivos PEM."""
     
+    # 1. Cargar certificado y clave con 'cryptography' (una sola lectura y parseo)
+    cert, private_key = load_signing_credentials(cert_file, key_file)
+    
+    # 2. Convertir al formato de pyOpenSSL
+    return crypto.X509.from_cryptography(cert), crypto.PKey.from_cryptography_key(private_key)
+
+
+def load_signing_credentials(cert_file, key_file):
+    """
+    Carga certificado y clave privada PEM como objetos de 'cryptography',
+    listos para la firma CMS en memoria.
+    """
+    
     logger.info(f"Cargando certificados SSL: {cert_file}, {key_file}")
     
     try:
@@ -36,21 +54,20 @@ def load_keys_and_cert(cert_file, key_file):
         with open(key_file, "rb") as f:
             # Aquí puedes especificar la contraseña si la clave está cifrada (passphrase=b'tu_clave')
             private_key_pem = f.read()
+            # La clave es propia y local: se omite la verificación matemática RSA
+            # (~60ms por carga), igual que hace OpenSSL CLI al firmar
             private_key = serialization.load_pem_private_key(
                 private_key_pem,
-                password=None # Reemplaza None si tu clave tiene passphrase
+                password=None, # Reemplaza None si tu clave tiene passphrase
+                unsafe_skip_rsa_key_validation=True
             )
         
-        # 2. Convertir la clave privada al formato de pyOpenSSL
-        pkey = crypto.load_privatekey(crypto.FILETYPE_PEM, private_key_pem)
-
-        # 3. Cargar el certificado
+        # 2. Cargar el certificado
         with open(cert_file, "rb") as f:
-            cert_pem = f.read()
-            cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert_pem)
+            cert = x509.load_pem_x509_certificate(f.read())
         
         logger.info("Certificados SSL cargados exitosamente")
-        return cert, pkey
+        return cert, private_key
         
     except FileNotFoundError as e:
         logger.error(f"Error cargando certificados: {e}")
@@ -115,31 +132,97 @@ def create_tra(service_id):
 
 
 def sign_tra_cms(tra_xml, cert_file, key_file):
+    """
+    Firma el XML del TRA y devuelve el CMS en Base64 (sin headers PEM).
+
+    Por defecto firma en memoria con 'cryptography' (sin procesos ni archivos
+    temporales). Con ARCA_CMS_SIGNER=openssl se usa el método VFP original
+    con OpenSSL CLI como fallback.
+    """
+    
+    signer = os.getenv('ARCA_CMS_SIGNER', 'cryptography').lower()
+    
+    if signer == 'openssl':
+        return sign_tra_cms_openssl(tra_xml, cert_file, key_file)
+    
+    cert, private_key = load_signing_credentials(cert_file, key_file)
+    return sign_tra_cms_memory(tra_xml, cert, private_key)
+
+
+def sign_tra_with_credentials(tra_xml, settings, credenciales=None):
+    """
+    Firma el TRA con las credenciales ya parseadas del registro, sin leer disco.
+    Sin credenciales (configuración personalizada) o con ARCA_CMS_SIGNER=openssl
+    usa sign_tra_cms sobre los archivos.
+    """
+    if credenciales is None or os.getenv('ARCA_CMS_SIGNER', 'cryptography').lower() == 'openssl':
+        return sign_tra_cms(tra_xml, settings.cert_file, settings.key_file)
+    return sign_tra_cms_memory(tra_xml, credenciales.cert, credenciales.private_key)
+
+
+def sign_tra_cms_memory(tra_xml, cert, private_key):
+    """
+    Firma el XML del TRA en memoria con el builder PKCS7/CMS de 'cryptography'.
+    
+    Genera la misma estructura que 'openssl cms -sign -nodetach -outform PEM':
+    SignedData con el TRA embebido, SHA256, certificado del firmante y atributos
+    firmados (contentType, signingTime, messageDigest, SMIMECapabilities).
+    El resultado es el DER en Base64 en una sola línea, igual que el PEM limpio.
+    
+    Args:
+        tra_xml: XML del TRA como string
+        cert: Certificado x509 de 'cryptography'
+        private_key: Clave privada de 'cryptography'
+    """
+    
+    logger.info("Firmando TRA en memoria (cryptography PKCS7)")
+    
+    try:
+        cms_der = (
+            pkcs7.PKCS7SignatureBuilder()
+            .set_data(tra_xml.encode('utf-8'))
+            .add_signer(cert, private_key, hashes.SHA256())
+            .sign(serialization.Encoding.DER, [])
+        )
+        cms_base64 = base64.b64encode(cms_der).decode('ascii')
+        
+        logger.info(f"CMS generado en memoria, longitud: {len(cms_base64)}")
+        return cms_base64
+        
+    except Exception as e:
+        logger.error(f"Error firmando TRA en memoria: {e}")
+        raise
+
+
+def sign_tra_cms_openssl(tra_xml, cert_file, key_file):
     """
     Firma el XML del TRA usando OpenSSL CLI (igual que en VFP).
     Este método replica exactamente la lógica del código VFP funcionando.
+    Se mantiene como fallback opcional (ARCA_CMS_SIGNER=openssl).
     """
     
     logger.info("Firmando TRA con OpenSSL CLI (método VFP)")
     
     import subprocess
+    import shutil
     import tempfile
-    import os
     from pathlib import Path
     
     try:
         # Obtener directorio base y ruta de OpenSSL
         base_dir = Path(__file__).parent.parent  # LogiGrain root
-        openssl_path = base_dir / "Ssl" / "openssl.exe"
+        openssl_path = Path(os.getenv('ARCA_OPENSSL_PATH', str(base_dir / "Ssl" / "openssl.exe")))
         
         logger.info(f"Usando OpenSSL: {openssl_path}")
         
         if not openssl_path.exists():
             raise FileNotFoundError(f"OpenSSL no encontrado: {openssl_path}")
         
-        # Crear archivos temporales en el directorio del proyecto
-        temp_dir = base_dir / "Ssl" / "TEMP"
-        temp_dir.mkdir(exist_ok=True)
+        # Crear un directorio temporal propio por firma dentro del proyecto,
+        # así las solicitudes concurrentes no se pisan los archivos
+        base_temp_dir = base_dir / "Ssl" / "TEMP"
+        base_temp_dir.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(dir=base_temp_dir))
         
         tra_file = temp_dir / "requestTA.xml"
         cms_file = temp_dir / "MiLoginTicketRequest.xml.cms"
@@ -207,11 +290,7 @@ def sign_tra_cms(tra_xml, cert_file, key_file):
         logger.info(f"CMS limpiado, longitud final: {len(cms_base64)}")
         
         # 6. Limpiar archivos temporales (opcional)
-        try:
-            tra_file.unlink()
-            cms_file.unlink()
-        except:
-            pass  # No es crítico si falla la limpieza
+        shutil.rmtree(temp_dir, ignore_errors=True)  # No es crítico si falla la limpieza
         
         return cms_base64
         
@@ -230,12 +309,11 @@ def call_wsaa(cms_base64, wsdl_url):
     """Invoca el método LoginCms del WSAA para obtener el TA."""
 
     logger.info(f"Llamando WSAA: {wsdl_url}")
-    
-    settings = Settings(strict=False, xml_huge_tree=True)
-    client = Client(wsdl_url, settings=settings)
 
     # 1. Invocar el método LoginCms con el CMS Base64
     try:
+        # Cliente reutilizado: WSDL cacheado y conexión HTTP del pool
+        client = get_soap_client(wsdl_url)
         logger.debug("Enviando CMS a WSAA...")
         response = client.service.loginCms(in0=cms_base64)
         logger.info("Respuesta WSAA recibida exitosamente")
@@ -245,6 +323,16 @@ def call_wsaa(cms_base64, wsdl_url):
         return {'error': f"Error en la llamada SOAP: {e}"}
 
     # 2. Procesar la respuesta XML para extraer Token y Sign
+    return parse_login_ticket_response(response)
+
+
+def parse_login_ticket_response(response):
+    """
+    Procesa el loginTicketResponse devuelto por LoginCms.
+    
+    Returns:
+        dict con 'token' y 'sign', o con 'error' si la respuesta no trae credenciales
+    """
     try:
         root = etree.fromstring(response.encode('utf-8'))
     except etree.XMLSyntaxError as e:
@@ -260,7 +348,10 @@ def call_wsaa(cms_base64, wsdl_url):
         logger.info("Token y Sign extraídos exitosamente de respuesta WSAA")
         return {
             'token': token,
-            'sign': sign
+            'sign': sign,
+            # Vigencia real informada por WSAA en el header del ticket
+            'generation_time': root.findtext('.//header/generationTime'),
+            'expiration_time': root.findtext('.//header/expirationTime')
         }
     else:
         # Si no hay credenciales, buscamos si hay un error reportado
@@ -271,6 +362,24 @@ def call_wsaa(cms_base64, wsdl_url):
         return {'error': error_msg}
 
 
+def parse_expiration_time(expiration_time):
+    """
+    Convierte el expirationTime de WSAA (ISO 8601 con zona, ej:
+    2025-12-11T03:50:00.123-03:00) a datetime UTC naive, igual que los
+    timestamps de la base de datos. Devuelve None si no se puede interpretar.
+    """
+    if not expiration_time:
+        return None
+    try:
+        vencimiento = datetime.datetime.fromisoformat(expiration_time.strip())
+    except ValueError:
+        logger.warning(f"expirationTime de WSAA no interpretable: {expiration_time}")
+        return None
+    if vencimiento.tzinfo is None:
+        vencimiento = vencimiento.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=TIMEZONE_OFFSET)))
+    return vencimiento.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
 class ArcaSettings:
     """Configuración para la integración con ARCA/AFIP WSAA."""
     
@@ -315,16 +424,19 @@ def get_arca_access_ticket(service_type="", environment="", custom_config=None):
     logger.info(f"Iniciando autenticación ARCA - Tipo: '{service_type}', Entorno: '{environment}'")
     
     try:
-        # Obtener configuración
+        # Obtener configuración (del registro de credenciales si no es personalizada)
         if custom_config:
             settings = custom_config
+            credenciales = None
         else:
-            settings = _get_service_config(service_type, environment)
+            credenciales = credentials_registry.get(service_type, environment)
+            settings = credenciales.settings()
         
         logger.info(f"Configuración obtenida: servicio={settings.service_name}, cert={settings.cert_file}")
         
-        # 1. Validar que existan los certificados
-        settings.validate_certificates()
+        # 1. Validar que existan los certificados (el registro ya los validó al cargarlos)
+        if credenciales is None:
+            settings.validate_certificates()
         logger.info("Validación de certificados completada")
         
         # 2. Crear el XML TRA
@@ -333,7 +445,7 @@ def get_arca_access_ticket(service_type="", environment="", custom_config=None):
         
         # 3. Firmar el TRA con CMS
         logger.info("Firmando TRA con certificados SSL...")
-        cms_base64 = sign_tra_cms(tra_xml, settings.cert_file, settings.key_file)
+        cms_base64 = sign_tra_with_credentials(tra_xml, settings, credenciales)
         logger.info("TRA firmado exitosamente con CMS")
         
         # 4. Enviar al WSAA y obtener respuesta
@@ -353,6 +465,7 @@ def get_arca_access_ticket(service_type="", environment="", custom_config=None):
             'success': True,
             'token': wsaa_response['token'],
             'sign': wsaa_response['sign'],
+            'expiration_time': wsaa_response.get('expiration_time'),
             'service': settings.service_name,
             'service_type': service_type or 'CPE',
             'environment': environment or 'PROD',
@@ -438,4 +551,134 @@ def _get_service_config(service_type="", environment=""):
         cert_file=cert_file,
         key_file=key_file,
         wsaa_url=wsaa_url
-    )
\ No newline at end of file
+    )
+
+# --- REGISTRO DE CREDENCIALES ---
+
+@dataclass(frozen=True)
+class ServiceCredentials:
+    """Configuración y credenciales ya parseadas de un servicio/entorno (inmutable)."""
+    service_type: str
+    environment: str
+    service_name: str
+    cert_file: str
+    key_file: str
+    wsaa_url: str
+    cert: x509.Certificate
+    private_key: object
+    fingerprint: str            # SHA256 hex del certificado
+    not_after: datetime.datetime  # Vencimiento del certificado (UTC naive)
+    cert_mtime: float
+    key_mtime: float
+    cert_size: int
+    key_size: int
+
+    def settings(self) -> ArcaSettings:
+        return ArcaSettings(self.service_name, self.cert_file, self.key_file, self.wsaa_url)
+
+    def dias_restantes(self) -> int:
+        return (self.not_after - datetime.datetime.utcnow()).days
+
+
+class CredentialsRegistry:
+    """
+    Registro de credenciales por (servicio, entorno) para CPE, EMBARQUES y FACTURACION.
+
+    Lee la configuración del entorno y parsea certificado y clave una sola
+    vez. Después solo revisa los mtime de los archivos cada
+    ARCA_CERT_RECHECK_SECONDS (default: 30) y recarga la entrada si cambiaron;
+    request_reload() (SIGHUP) fuerza releer configuración y archivos.
+    Cada entrada es inmutable: una recarga publica una entrada nueva.
+    """
+
+    def __init__(self, recheck_seconds: float = None):
+        self._recheck_seconds = recheck_seconds
+        self._entradas = {}
+        self._ultimo_chequeo = {}
+        self._recargar = False
+        self._lock = threading.Lock()
+
+    @property
+    def recheck_seconds(self) -> float:
+        if self._recheck_seconds is not None:
+            return self._recheck_seconds
+        return float(os.getenv('ARCA_CERT_RECHECK_SECONDS', '30'))
+
+    def get(self, service_type="", environment="") -> ServiceCredentials:
+        """
+        Credenciales del servicio/entorno (mismos defaults que _get_service_config).
+
+        Raises:
+            FileNotFoundError: Si el certificado o la clave no existen
+        """
+        service_type = service_type or "CPE"
+        environment = environment or os.getenv('ARCA_ENVIRONMENT', 'PROD')
+        clave = (service_type, environment)
+
+        if self._recargar:
+            self.reload()
+
+        entrada = self._entradas.get(clave)
+        if entrada is not None and time.monotonic() - self._ultimo_chequeo.get(clave, 0) < self.recheck_seconds:
+            return entrada
+
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                entrada = self._cargar(service_type, environment)
+            elif self._archivos_modificados(entrada):
+                try:
+                    entrada = self._cargar(service_type, environment)
+                    logger.info(f"Certificados de {service_type}/{environment} recargados por cambio en disco")
+                except Exception as e:
+                    # Archivo a medio copiar o inválido: se sigue con la versión anterior
+                    logger.error(f"No se pudieron recargar certificados de {service_type}/{environment}: {e}")
+            self._entradas[clave] = entrada
+            self._ultimo_chequeo[clave] = time.monotonic()
+            return entrada
+
+    def _archivos_modificados(self, entrada: ServiceCredentials) -> bool:
+        try:
+            return (os.stat(entrada.cert_file).st_mtime != entrada.cert_mtime or
+                    os.stat(entrada.key_file).st_mtime != entrada.key_mtime)
+        except FileNotFoundError:
+            logger.warning(f"Certificados de {entrada.service_type} no encontrados en disco - se conserva la versión cargada")
+            return False
+
+    def _cargar(self, service_type: str, environment: str) -> ServiceCredentials:
+        settings = _get_service_config(service_type, environment)
+        settings.validate_certificates()
+        cert_stat, key_stat = os.stat(settings.cert_file), os.stat(settings.key_file)
+        cert, private_key = load_signing_credentials(settings.cert_file, settings.key_file)
+        return ServiceCredentials(
+            service_type=service_type,
+            environment=environment,
+            service_name=settings.service_name,
+            cert_file=settings.cert_file,
+            key_file=settings.key_file,
+            wsaa_url=settings.wsaa_url,
+            cert=cert,
+            private_key=private_key,
+            fingerprint=cert.fingerprint(hashes.SHA256()).hex(),
+            not_after=cert.not_valid_after_utc.replace(tzinfo=None),
+            cert_mtime=cert_stat.st_mtime,
+            key_mtime=key_stat.st_mtime,
+            cert_size=cert_stat.st_size,
+            key_size=key_stat.st_size,
+        )
+
+    def request_reload(self) -> None:
+        """Marca el registro para recargarse en el próximo acceso (seguro desde un signal handler)."""
+        self._recargar = True
+
+    def reload(self) -> None:
+        """Descarta todas las entradas: se releen configuración y certificados."""
+        with self._lock:
+            self._recargar = False
+            self._entradas = {}
+            self._ultimo_chequeo = {}
+        logger.info("Registro de credenciales ARCA recargado")
+
+
+# Registro compartido por toda la aplicación
+credentials_registry = CredentialsRegistry()
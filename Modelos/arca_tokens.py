@@ -7,15 +7,18 @@ de tokens y signs de ARCA/AFIP, evitando solicitudes innecesarias.
 
 Características:
 - Cache por usuario y puerto específico
-- Validación automática de expiración (8 horas)
+- Vencimiento real informado por WSAA (expirationTime), 8 horas por defecto
 - Tipos de servicio: CPE, EMBARQUES, FACTURACION
 - Timestamps con zona horaria Argentina (GMT-3)
 """
 
 from sqlmodel import SQLModel, Field, Relationship
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+
+# Máximo de pares puerto/servicio por solicitud a /arca/tickets
+MAX_TICKETS_POR_LOTE = 50
 
 
 class ArcaToken(SQLModel, table=True):
@@ -38,7 +41,7 @@ class ArcaToken(SQLModel, table=True):
     
     # Control de fechas
     fecha_solicitud: datetime = Field(default_factory=datetime.utcnow)
-    fecha_vencimiento: datetime  # Se calcula como fecha_solicitud + 8 horas
+    fecha_vencimiento: datetime  # expirationTime de WSAA, o fecha_solicitud + 8 horas
     
     # Metadatos adicionales
     wsaa_url: Optional[str] = Field(default=None, max_length=200)
@@ -48,7 +51,9 @@ class ArcaToken(SQLModel, table=True):
     usuario: "Usuario" = Relationship(back_populates="arca_tokens")
     
     def __init__(self, **data):
-        """Inicializar token con cálculo automático de fecha de vencimiento."""
+        """Inicializar token con cálculo automático de fecha de vencimiento si no se informa."""
+        if data.get("fecha_vencimiento") is None:
+            data.pop("fecha_vencimiento", None)
         if "fecha_vencimiento" not in data and "fecha_solicitud" in data:
             data["fecha_vencimiento"] = data["fecha_solicitud"] + timedelta(hours=8)
         elif "fecha_vencimiento" not in data:
@@ -73,6 +78,24 @@ class ArcaTokenRequest(BaseModel):
     puerto_codigo: str = Field(..., min_length=3, max_length=10, description="Código del puerto (ej: TRP1, TSL1)")
 
 
+class ArcaTicketItem(BaseModel):
+    """Par puerto/servicio dentro de una solicitud de tickets en lote."""
+    puerto_codigo: str = Field(..., min_length=3, max_length=10, description="Código del puerto (ej: TRP1, TSL1)")
+    servicio_tipo: Literal["CPE", "EMBARQUES", "FACTURACION"] = Field(..., description="Tipo de servicio ARCA")
+
+
+class ArcaTicketsBatchRequest(BaseModel):
+    """Request model para /arca/tickets: varios pares puerto/servicio en una sola llamada."""
+    items: List[ArcaTicketItem] = Field(..., description="Pares puerto/servicio a resolver")
+
+    @field_validator("items")
+    @classmethod
+    def validar_cantidad(cls, items: List[ArcaTicketItem]) -> List[ArcaTicketItem]:
+        if not 1 <= len(items) <= MAX_TICKETS_POR_LOTE:
+            raise ValueError(f"Se aceptan entre 1 y {MAX_TICKETS_POR_LOTE} pares puerto/servicio")
+        return items
+
+
 class ArcaTokenResponse(BaseModel):
     """Response model unificado para tokens ARCA con información de cache."""
     status: str
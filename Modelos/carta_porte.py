@@ -2,9 +2,10 @@
 # Integración con servicios ARCA/AFIP para validación documental
 
 from sqlmodel import SQLModel, Field, Relationship
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
+from pydantic import BaseModel
 
 
 class EstadoCamion(str, Enum):
@@ -20,6 +21,33 @@ class EstadoCamion(str, Enum):
     SALIDO = "Salido"
 
 
+# Circuito del camión, en orden: Playa de Camiones -> viaje -> terminal -> salida
+CIRCUITO: List[EstadoCamion] = [
+    EstadoCamion.EN_PLAYA,
+    EstadoCamion.EN_VIAJE,
+    EstadoCamion.INGRESADO,
+    EstadoCamion.EN_CALADA,
+    EstadoCamion.POST_CALADA,
+    EstadoCamion.EN_BALANZA_BRUTO,
+    EstadoCamion.DESCARGANDO,
+    EstadoCamion.EN_BALANZA_TARA,
+    EstadoCamion.SALIDO,
+]
+
+# Sector en el que queda el camión en cada estado (numeración 3.x de sistema_terminal_portuaria.md)
+SECTOR_POR_ESTADO: Dict[EstadoCamion, int] = {
+    EstadoCamion.EN_PLAYA: 1,           # Playa de Camiones
+    EstadoCamion.EN_VIAJE: 3,           # En tránsito hacia la Portería de Ingreso
+    EstadoCamion.INGRESADO: 4,          # Playa de Precalado
+    EstadoCamion.EN_CALADA: 5,
+    EstadoCamion.POST_CALADA: 6,        # Playa de Espera post-Calada
+    EstadoCamion.EN_BALANZA_BRUTO: 7,
+    EstadoCamion.DESCARGANDO: 8,        # Plataformas de Descarga
+    EstadoCamion.EN_BALANZA_TARA: 9,
+    EstadoCamion.SALIDO: 10,            # Portería de Salida
+}
+
+
 class TipoCereal(str, Enum):
     """Tipos de cereales manejados en el puerto."""
     TRIGO = "Trigo"
@@ -38,6 +66,15 @@ class CalidadCereal(str, Enum):
     RECHAZO = "Rechazo"
 
 
+class EstadoOrdenDespacho(str, Enum):
+    """Estados de una orden de despacho de Operaciones a la Playa de Camiones."""
+    PENDIENTE = "Pendiente"      # Faltan camiones por reservar en la playa
+    ASIGNADA = "Asignada"        # Todos los camiones reservados, esperando salir
+    DESPACHADA = "Despachada"    # Todos en viaje hacia la terminal
+    CUMPLIDA = "Cumplida"        # Todos ingresaron por la Portería
+    CANCELADA = "Cancelada"
+
+
 class CartaPorteElectronica(SQLModel, table=True):
     """
     Modelo principal para Cartas de Porte Electrónicas.
@@ -47,6 +84,7 @@ class CartaPorteElectronica(SQLModel, table=True):
     
     # Datos ARCA/AFIP
     numero_carta: str = Field(index=True, unique=True)
+    puerto_codigo: str = Field(max_length=10)  # Puerto de descarga (ej: TRP1); índices compuestos en utils/migraciones.py
     coe_numero: Optional[str] = Field(default=None)  # Código de Operación Electrónica
     cuit_origen: str = Field(min_length=11, max_length=11)
     cuit_destino: str = Field(min_length=11, max_length=11)
@@ -64,6 +102,7 @@ class CartaPorteElectronica(SQLModel, table=True):
     
     # Control de estado
     estado_actual: EstadoCamion = Field(default=EstadoCamion.EN_VIAJE)
+    orden_despacho_id: Optional[int] = Field(default=None, foreign_key="ordendespacho.id")  # Reserva de una orden (utils/despachos.py)
     fecha_ingreso: Optional[datetime] = Field(default=None)
     fecha_salida: Optional[datetime] = Field(default=None)
     
@@ -134,4 +173,71 @@ class MovimientoSector(SQLModel, table=True):
     
     # Validación del movimiento
     autorizado_por: str
-    motivo_movimiento: str = Field(default="Flujo operativo normal")
\ No newline at end of file
+    motivo_movimiento: str = Field(default="Flujo operativo normal")
+    clave_idempotencia: Optional[str] = Field(default=None, max_length=100)  # Escaneo que lo generó (índice único en utils/migraciones.py)
+
+
+class ContadorCircuito(SQLModel, table=True):
+    """
+    Camiones por (puerto, estado, cereal, calidad) para el tablero de Operaciones.
+    Se mantiene en la misma transacción que cada cambio de estado (utils/contadores_circuito.py).
+    """
+    puerto_codigo: str = Field(primary_key=True, max_length=10)
+    estado: str = Field(primary_key=True, max_length=20)  # Nombre de EstadoCamion (como lo guarda SQLModel)
+    tipo_cereal: str = Field(primary_key=True, max_length=20)  # Nombre de TipoCereal
+    calidad: str = Field(default="", primary_key=True, max_length=20)  # Nombre de CalidadCereal; "" sin calidad asignada
+    cantidad: int = Field(default=0)
+
+
+class OrdenDespacho(SQLModel, table=True):
+    """
+    Pedido de Operaciones a la Playa de Camiones ("10 camiones de Maíz").
+    Los camiones se reservan con CartaPorteElectronica.orden_despacho_id; los
+    avances los suma cada transición en su misma transacción (utils/despachos.py).
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    puerto_codigo: str = Field(max_length=10)  # Índices en utils/migraciones.py
+    tipo_cereal: TipoCereal
+    cuit_destino: Optional[str] = Field(default=None, min_length=11, max_length=11)  # Exportador; None: cualquiera
+    cantidad: int = Field(gt=0)
+
+    # Avance
+    estado: EstadoOrdenDespacho = Field(default=EstadoOrdenDespacho.PENDIENTE)
+    asignados: int = Field(default=0)    # Reservados en la playa (o ya despachados)
+    despachados: int = Field(default=0)  # Salieron de la playa (En Viaje)
+    ingresados: int = Field(default=0)   # Pasaron la Portería de Ingreso
+
+    solicitado_por: str
+    clave_idempotencia: Optional[str] = Field(default=None, max_length=100)  # Índice único en utils/migraciones.py
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default=None)
+    fecha_cumplida: Optional[datetime] = Field(default=None)
+
+
+# Modelos de request para los llamados desde las playas de espera
+class LlamadoCamionRequest(BaseModel):
+    """Request model para llamar al próximo camión de una playa (filtros opcionales)."""
+    tipo_cereal: Optional[TipoCereal] = Field(default=None, description="Cereal solicitado (Precalado: orden de Operaciones)")
+    calidad: Optional[CalidadCereal] = Field(default=None, description="Calidad asignada en Calada (solo post-Calada)")
+    puesto_asignado: Optional[str] = Field(default=None, max_length=50, description="Puesto de Calada o báscula asignada")
+
+
+class TransicionRequest(BaseModel):
+    """Request model para el escaneo de QR de un sector (transición de estado de la carta)."""
+    numero_carta: str = Field(..., min_length=1, max_length=50, description="Número de carta de porte (QR)")
+    puerto_codigo: str = Field(..., min_length=3, max_length=10, description="Puerto del sector que escanea")
+    estado_nuevo: EstadoCamion = Field(..., description="Estado al que pasa el camión")
+    clave_idempotencia: Optional[str] = Field(default=None, max_length=100, description="Identificador del escaneo; por defecto <puerto>:<carta>:<estado>")
+    calidad_asignada: Optional[CalidadCereal] = Field(default=None, description="Resultado de Calada (requerido para Post-Calada)")
+    puesto_asignado: Optional[str] = Field(default=None, max_length=50)
+    inspector_asignado: Optional[str] = Field(default=None, max_length=50)
+    observaciones: Optional[str] = Field(default=None, max_length=500)
+
+
+class OrdenDespachoRequest(BaseModel):
+    """Request model para una orden de despacho de Operaciones a la Playa de Camiones."""
+    puerto_codigo: str = Field(..., min_length=3, max_length=10, description="Puerto que pide los camiones")
+    tipo_cereal: TipoCereal = Field(..., description="Cereal pedido")
+    cantidad: int = Field(..., gt=0, le=500, description="Camiones pedidos")
+    cuit_destino: Optional[str] = Field(default=None, min_length=11, max_length=11, description="Exportador (CUIT destino de la carta); vacío: cualquiera")
+    clave_idempotencia: Optional[str] = Field(default=None, max_length=100, description="Identificador del pedido: repetirlo devuelve la misma orden")
@@ -1,7 +1,31 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import List, Optional
 from datetime import datetime
+import base64
 import hashlib
+import hmac
+import os
+import secrets
+
+
+# Hash de contraseñas: PBKDF2-HMAC-SHA256 con sal por usuario.
+# Formato: pbkdf2_sha256$<iteraciones>$<sal b64>$<hash b64>. Los hashes sha256
+# sin sal anteriores se siguen aceptando y se migran en el próximo login.
+PASSWORD_ALGORITMO = "pbkdf2_sha256"
+PASSWORD_ITERACIONES = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", "260000"))
+
+
+def _pbkdf2(password: str, sal: bytes, iteraciones: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), sal, iteraciones)
+
+
+def hash_password(password: str, iteraciones: int = None) -> str:
+    """Genera el hash PBKDF2 con sal aleatoria (costoso: llamar fuera del event loop)."""
+    iteraciones = iteraciones or PASSWORD_ITERACIONES
+    sal = secrets.token_bytes(16)
+    derivada = _pbkdf2(password, sal, iteraciones)
+    return "$".join([PASSWORD_ALGORITMO, str(iteraciones),
+                     base64.b64encode(sal).decode(), base64.b64encode(derivada).decode()])
 
 
 # === MODELOS DE NEGOCIO === #
@@ -40,11 +64,25 @@ class Usuario(SQLModel, table=True):
     
     def set_password(self, password: str) -> None:
         """Hashea y establece la contraseña"""
-        self.password_hash = hashlib.sha256(password.encode()).hexdigest()
+        self.password_hash = hash_password(password)
     
     def verify_password(self, password: str) -> bool:
-        """Verifica si la contraseña es correcta"""
-        return self.password_hash == hashlib.sha256(password.encode()).hexdigest()
+        """Verifica si la contraseña es correcta (PBKDF2 o sha256 legado)"""
+        partes = (self.password_hash or "").split("$")
+        if len(partes) == 4 and partes[0] == PASSWORD_ALGORITMO:
+            try:
+                iteraciones, sal, esperado = int(partes[1]), base64.b64decode(partes[2]), base64.b64decode(partes[3])
+            except ValueError:
+                return False
+            return hmac.compare_digest(_pbkdf2(password, sal, iteraciones), esperado)
+        legado = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest((self.password_hash or "").encode(), legado.encode())
+    
+    def password_requiere_rehash(self) -> bool:
+        """True si el hash es sha256 legado o usa otra cantidad de iteraciones"""
+        partes = (self.password_hash or "").split("$")
+        return not (len(partes) == 4 and partes[0] == PASSWORD_ALGORITMO
+                    and partes[1] == str(PASSWORD_ITERACIONES))
 
 
 class UsuarioPuerto(SQLModel, table=True):
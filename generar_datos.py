@@ -0,0 +1,339 @@
+"""
+Generador de datos sintéticos para bases de benchmark de LogiGrain.
+
+Produce volúmenes de cosecha (millones de cartas de porte, pesajes y
+movimientos de sector) repartidos entre TRP1, TRP2 y TSL1, con mezcla de
+cereales, exportadores y tiempos de permanencia realistas por sector del
+circuito. Los camiones que llegaron hacia el final de la temporada quedan
+a mitad de circuito (en playa, en viaje, en precalado, ...), así que la
+base sirve también para las colas y el tablero.
+
+Es determinístico a partir de la semilla: misma semilla y parámetros,
+mismas filas. Carga con executemany en transacciones grandes sobre la
+conexión DBAPI; los índices secundarios de las tres tablas se difieren
+(se borran antes y se recrean al final con el mismo SQL de las
+migraciones), y el tiempo reportado los incluye.
+
+Uso:
+    python generar_datos.py --url sqlite:///./benchmark.db [--cartas 1000000] [--semilla 42]
+                            [--desde 2025-03-01] [--dias 120] [--lote 20000] [--sin-diferir-indices]
+"""
+
+import sys
+import time
+import random
+import argparse
+from bisect import bisect
+from itertools import accumulate
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlmodel import SQLModel
+
+from Modelos.usuario import Puerto
+from Modelos.arca_tokens import ArcaToken  # noqa: F401 (create_all y migraciones)
+from Modelos.carta_porte import CIRCUITO, SECTOR_POR_ESTADO, EstadoCamion, TipoCereal, CalidadCereal
+from utils.contadores_circuito import SQL_RECONSTRUCCION
+from utils.database import crear_engine
+from utils.migraciones import aplicar_migraciones
+
+TABLAS = ("cartaporteelectronica", "movimientosector", "pesaje")
+
+PUERTOS = {"TRP1": 0.45, "TRP2": 0.35, "TSL1": 0.20}
+CEREALES = {
+    TipoCereal.SOJA: 0.38, TipoCereal.MAIZ: 0.34, TipoCereal.TRIGO: 0.14,
+    TipoCereal.GIRASOL: 0.06, TipoCereal.CEBADA: 0.05, TipoCereal.SORGO: 0.03,
+}
+# Los rechazados en Calada salen sin descargar: quedan fuera del circuito generado
+CALIDADES = {CalidadCereal.ESTANDAR: 0.56, CalidadCereal.PREMIUM: 0.22, CalidadCereal.COMERCIAL: 0.22}
+
+# Minutos que el camión permanece en cada estado antes de pasar al siguiente: (tipo, a, b)
+#   "exp": exponencial de media a (esperas en playas), "uni": uniforme entre a y b (operaciones)
+PERMANENCIA = {
+    EstadoCamion.EN_PLAYA: ("exp", 600, 0),          # Espera el llamado de Operaciones
+    EstadoCamion.EN_VIAJE: ("uni", 25, 45),          # 20 km hasta la terminal
+    EstadoCamion.INGRESADO: ("exp", 90, 0),          # Playa de Precalado
+    EstadoCamion.EN_CALADA: ("uni", 10, 25),
+    EstadoCamion.POST_CALADA: ("exp", 150, 0),       # Espera de plataforma
+    EstadoCamion.EN_BALANZA_BRUTO: ("uni", 3, 8),
+    EstadoCamion.DESCARGANDO: ("uni", 20, 45),
+    EstadoCamion.EN_BALANZA_TARA: ("uni", 3, 8),
+}
+
+SQL_CARTA = (
+    "INSERT INTO cartaporteelectronica (id, numero_carta, puerto_codigo, coe_numero, cuit_origen, cuit_destino, "
+    "tipo_cereal, peso_declarado, calidad_origen, calidad_asignada, patente, chofer_cuit, empresa_transporte, "
+    "estado_actual, fecha_ingreso, fecha_salida, validado_arca, fecha_validacion_arca, token_arca_usado, "
+    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, NULL, ?, ?)"
+)
+SQL_MOVIMIENTO = (
+    "INSERT INTO movimientosector (id, carta_porte_id, sector_origen, sector_destino, timestamp_movimiento, "
+    "estado_anterior, estado_nuevo, observaciones, puesto_asignado, inspector_asignado, tiempo_estimado, "
+    "autorizado_por, motivo_movimiento) VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, NULL, ?, 'Flujo operativo normal')"
+)
+SQL_PESAJE = (
+    "INSERT INTO pesaje (id, carta_porte_id, tipo_pesaje, peso, timestamp_pesaje, balanza_id, operador, "
+    "peso_neto, diferencia_declarada, ticket_emitido, numero_ticket) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class _Elector:
+    """Elección ponderada con bisect sobre pesos acumulados (más barata que random.choices por elemento)."""
+
+    def __init__(self, azar: random.Random, pesos: Dict):
+        self.valores = list(pesos)
+        self.acumulados = list(accumulate(pesos.values()))
+        self.total = self.acumulados[-1]
+        self.azar = azar
+
+    def __call__(self):
+        return self.valores[bisect(self.acumulados, self.azar.random() * self.total)]
+
+    def nombres(self) -> "_Elector":
+        """Mismo elector devolviendo el nombre de cada enum (lo que guarda SQLModel)."""
+        elector = _Elector(self.azar, {valor.name: 1 for valor in self.valores})
+        elector.acumulados, elector.total = self.acumulados, self.total
+        return elector
+
+
+class _Fechas:
+    """Formatea segundos desde `origen` con el formato DATETIME de SQLAlchemy para SQLite."""
+
+    def __init__(self, origen: datetime, dias: int):
+        # Un día extra: las cartas creadas el último día pueden avanzar hasta el "ahora"
+        self.dias = [(origen + timedelta(days=d)).strftime("%Y-%m-%d ") for d in range(dias + 1)]
+        self.horas = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}.000000" for s in range(86400)]
+
+    def __call__(self, segundos: int) -> str:
+        return self.dias[segundos // 86400] + self.horas[segundos % 86400]
+
+
+def _cuit(azar: random.Random, prefijo: str) -> str:
+    return f"{prefijo}{azar.randrange(10 ** 9):09d}"
+
+
+def _patente(azar: random.Random) -> str:
+    letras = "ABCDEFGHJKLMNPRSTUVWXYZ"
+    return (azar.choice(letras) + azar.choice(letras) + f"{azar.randrange(1000):03d}"
+            + azar.choice(letras) + azar.choice(letras))
+
+
+class GeneradorCosecha:
+    """
+    Genera las filas de una temporada de cosecha.
+
+    Args:
+        semilla: Semilla del generador pseudoaleatorio
+        desde: Inicio de la temporada (UTC)
+        dias: Duración de la temporada; el "ahora" de la base es el final
+        cartas: Cantidad total de cartas de porte
+    """
+
+    def __init__(self, semilla: int, desde: datetime, dias: int, cartas: int):
+        self.azar = azar = random.Random(semilla)
+        self.dias = dias
+        self.cartas = cartas
+        self.ahora = dias * 86400
+        self.fecha = _Fechas(desde, dias)
+        self.puerto = _Elector(azar, PUERTOS)
+        self.cereal = _Elector(azar, CEREALES).nombres()
+        self.calidad = _Elector(azar, CALIDADES).nombres()
+        # Volumen diario con pico a 40% de la temporada (campana sobre un piso del 15%)
+        self.dia = _Elector(azar, {
+            d: 0.15 + 2.718 ** -(((d - 0.4 * dias) / (0.25 * dias)) ** 2) for d in range(dias)
+        })
+
+        # Pools: exportadores concentrados (los primeros reciben la mayor parte), productores y flota
+        self.exportador = _Elector(azar, {_cuit(azar, "30"): 1 / (i + 1) for i in range(12)})
+        self.productores = [_cuit(azar, "20") for _ in range(5000)]
+        self.patentes = [_patente(azar) for _ in range(60000)]
+        self.choferes = [_cuit(azar, "20") for _ in range(40000)]
+        self.empresas = [f"Transportes {i:03d} S.R.L." for i in range(300)]
+        self.grados = ["Grado 1", "Grado 2", "Grado 3", "Conforme"]
+
+        # Transiciones del circuito precalculadas: (estado, siguiente, nombres, sectores, operador, permanencia)
+        self.transiciones = [
+            (estado, siguiente, estado.name, siguiente.name, SECTOR_POR_ESTADO[estado], SECTOR_POR_ESTADO[siguiente],
+             f"operador_s{SECTOR_POR_ESTADO[siguiente]}") + PERMANENCIA[estado]
+            for estado, siguiente in zip(CIRCUITO, CIRCUITO[1:])
+        ]
+
+    def lote(self, primer_id: int, cantidad: int, ids_hijos: List[int]) -> Tuple[list, list, list]:
+        """Filas (cartas, movimientos, pesajes) de `cantidad` cartas; ids_hijos = [próximo id movimiento, próximo id pesaje]."""
+        # Locales: el lazo corre millones de veces y el lookup de atributos pesa
+        aleatorio, gauss, expovariate = self.azar.random, self.azar.gauss, self.azar.expovariate
+        fecha, ahora, transiciones = self.fecha, self.ahora, self.transiciones
+        elegir_puerto, elegir_cereal, elegir_calidad = self.puerto, self.cereal, self.calidad
+        elegir_dia, elegir_exportador = self.dia, self.exportador
+        productores, patentes, choferes, empresas, grados = (
+            self.productores, self.patentes, self.choferes, self.empresas, self.grados
+        )
+        INGRESADO, EN_CALADA, POST_CALADA, DESCARGANDO, SALIDO = (
+            EstadoCamion.INGRESADO, EstadoCamion.EN_CALADA, EstadoCamion.POST_CALADA,
+            EstadoCamion.DESCARGANDO, EstadoCamion.SALIDO
+        )
+        cartas, movimientos, pesajes = [], [], []
+        agregar_movimiento, agregar_pesaje = movimientos.append, pesajes.append
+        id_movimiento, id_pesaje = ids_hijos
+
+        for carta_id in range(primer_id, primer_id + cantidad):
+            puerto = elegir_puerto()
+            llegada = elegir_dia() * 86400 + int(aleatorio() * 86400)
+            declarado = float(round(min(36000, max(24000, gauss(30000, 1500)))))
+
+            # Recorrer el circuito mientras la transición ocurra antes del "ahora"
+            instante, estado_nombre = llegada, transiciones[0][2]
+            calidad = fecha_ingreso = fecha_salida = bruto = tara = None
+            for _, siguiente, nombre, siguiente_nombre, origen, destino, operador, tipo, a, b in transiciones:
+                minutos = expovariate(1 / a) if tipo == "exp" else a + (b - a) * aleatorio()
+                siguiente_instante = instante + int(minutos * 60) + 1
+                if siguiente_instante > ahora:
+                    break
+                instante, texto = siguiente_instante, fecha(siguiente_instante)
+                puesto = inspector = None
+                if siguiente is INGRESADO:
+                    fecha_ingreso = texto
+                elif siguiente is EN_CALADA:
+                    puesto, inspector = f"Calador {int(aleatorio() * 6) + 1}", f"inspector{int(aleatorio() * 12) + 1}"
+                elif siguiente is POST_CALADA:
+                    calidad = elegir_calidad()
+                elif siguiente is DESCARGANDO:
+                    puesto = f"Plataforma {int(aleatorio() * 4) + 1}"
+                    # Se pesó en bruto al salir de la balanza
+                    tara = float(round(gauss(15000, 800)))
+                    bruto = tara + declarado + float(round(gauss(0, 120)))
+                    agregar_pesaje((id_pesaje, carta_id, "bruto", bruto, texto, f"{puerto}-B{int(aleatorio() * 3) + 1}",
+                                    "operador_bruto", None, None, 0, None))
+                    id_pesaje += 1
+                elif siguiente is SALIDO:
+                    fecha_salida = texto
+                    neto = bruto - tara
+                    agregar_pesaje((id_pesaje, carta_id, "tara", tara, texto, f"{puerto}-T{int(aleatorio() * 3) + 1}",
+                                    "operador_tara", neto, neto - declarado, 1, f"TK{carta_id:010d}"))
+                    id_pesaje += 1
+
+                agregar_movimiento((id_movimiento, carta_id, origen, destino, texto, nombre, siguiente_nombre,
+                                    puesto, inspector, operador))
+                id_movimiento += 1
+                estado_nombre = siguiente_nombre
+
+            creada = fecha(llegada)
+            cartas.append((
+                carta_id, f"CPE{carta_id:011d}", puerto, str(330000000000 + carta_id),
+                productores[int(aleatorio() * len(productores))], elegir_exportador(), elegir_cereal(), declarado,
+                grados[int(aleatorio() * len(grados))], calidad, patentes[int(aleatorio() * len(patentes))],
+                choferes[int(aleatorio() * len(choferes))], empresas[int(aleatorio() * len(empresas))],
+                estado_nombre, fecha_ingreso, fecha_salida, creada, creada, fecha(instante)
+            ))
+
+        ids_hijos[0], ids_hijos[1] = id_movimiento, id_pesaje
+        return cartas, movimientos, pesajes
+
+
+def _indices_secundarios(cursor) -> List[Tuple[str, str]]:
+    marcadores = ", ".join("?" for _ in TABLAS)
+    return cursor.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marcadores})",
+        TABLAS
+    ).fetchall()
+
+
+def generar(url: str, cartas: int, semilla: int, desde: datetime, dias: int, lote: int,
+            diferir_indices: bool = True, informar=print) -> Dict[str, int]:
+    """
+    Crea el esquema si hace falta (tablas + migraciones) y carga la temporada.
+
+    Si las tablas ya tienen filas, los ids continúan a partir del máximo existente.
+
+    Returns:
+        Filas insertadas por tabla y segundos totales ("segundos")
+    """
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
+    with engine.begin() as conexion:
+        existentes = {fila[0] for fila in conexion.execute(Puerto.__table__.select().with_only_columns(Puerto.codigo))}
+        nuevos = [{"nombre": f"Terminal {codigo}", "codigo": codigo, "habilitado": True}
+                  for codigo in PUERTOS if codigo not in existentes]
+        if nuevos:
+            conexion.execute(Puerto.__table__.insert(), nuevos)
+
+    generador = GeneradorCosecha(semilla, desde, dias, cartas)
+    conexion = engine.raw_connection()
+    try:
+        cursor = conexion.cursor()
+        # Carga de una base de benchmark: sin fsync por commit y con cache grande
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA cache_size=-262144")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        primer_id, id_movimiento, id_pesaje = (
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}").fetchone()[0] for tabla in TABLAS
+        )
+        ids_hijos = [id_movimiento, id_pesaje]
+
+        inicio = time.perf_counter()
+        indices = _indices_secundarios(cursor) if diferir_indices else []
+        for nombre, _ in indices:
+            cursor.execute(f"DROP INDEX {nombre}")
+        conexion.commit()
+
+        filas = {tabla: 0 for tabla in TABLAS}
+        for desplazamiento in range(0, cartas, lote):
+            cantidad = min(lote, cartas - desplazamiento)
+            filas_cartas, filas_movimientos, filas_pesajes = generador.lote(primer_id + desplazamiento, cantidad, ids_hijos)
+            cursor.executemany(SQL_CARTA, filas_cartas)
+            cursor.executemany(SQL_MOVIMIENTO, filas_movimientos)
+            cursor.executemany(SQL_PESAJE, filas_pesajes)
+            conexion.commit()
+            filas["cartaporteelectronica"] += len(filas_cartas)
+            filas["movimientosector"] += len(filas_movimientos)
+            filas["pesaje"] += len(filas_pesajes)
+            total = sum(filas.values())
+            informar(f"  {desplazamiento + cantidad:>10,} cartas | {total:>12,} filas | "
+                     f"{total / (time.perf_counter() - inicio):>10,.0f} filas/s")
+
+        if indices:
+            informar(f"  Recreando {len(indices)} índices secundarios...")
+            for _, sql in indices:
+                cursor.execute(sql)
+        # La carga no pasa por las transiciones: los contadores del tablero se reconstruyen al final
+        informar("  Reconstruyendo contadores del circuito...")
+        cursor.execute("DELETE FROM contadorcircuito")
+        cursor.execute(
+            "INSERT INTO contadorcircuito (puerto_codigo, estado, tipo_cereal, calidad, cantidad) "
+            f"SELECT puerto_codigo, estado, tipo_cereal, calidad, cantidad FROM ({SQL_RECONSTRUCCION})"
+        )
+        cursor.execute("ANALYZE")
+        conexion.commit()
+        filas["segundos"] = time.perf_counter() - inicio
+    finally:
+        conexion.close()
+        engine.dispose()
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de datos sintéticos de cosecha para benchmarks")
+    parser.add_argument("--url", required=True, help="Base destino (ej: sqlite:///./benchmark.db); no usar la productiva")
+    parser.add_argument("--cartas", type=int, default=1_000_000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--desde", type=lambda texto: datetime.strptime(texto, "%Y-%m-%d"), default=datetime(2025, 3, 1),
+                        help="Inicio de la temporada (AAAA-MM-DD)")
+    parser.add_argument("--dias", type=int, default=120, help="Duración de la temporada; el final es el 'ahora' de la base")
+    parser.add_argument("--lote", type=int, default=20000, help="Cartas por transacción")
+    parser.add_argument("--sin-diferir-indices", action="store_true",
+                        help="Mantener los índices secundarios durante la carga")
+    args = parser.parse_args()
+
+    print("=== GENERADOR DE DATOS DE COSECHA ===")
+    print(f"  {args.cartas:,} cartas | semilla {args.semilla} | {args.desde:%Y-%m-%d} + {args.dias} días | {args.url}")
+    filas = generar(args.url, args.cartas, args.semilla, args.desde, args.dias, args.lote,
+                    diferir_indices=not args.sin_diferir_indices)
+    total = sum(v for k, v in filas.items() if k != "segundos")
+    print(f"  Cartas: {filas['cartaporteelectronica']:,} | movimientos: {filas['movimientosector']:,} | "
+          f"pesajes: {filas['pesaje']:,}")
+    print(f"  Total: {total:,} filas en {filas['segundos']:.1f}s ({total / filas['segundos']:,.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
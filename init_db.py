@@ -3,8 +3,10 @@ Script para inicializar datos de prueba en LogiGrain.
 Crea usuarios, puertos y relaciones para testing del sistema de login.
 """
 
-from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel import SQLModel, Session
 from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.arca_tokens import ArcaToken
+from Modelos.carta_porte import CartaPorteElectronica, Pesaje, MovimientoSector
 from datetime import datetime
 import sys
 import os
@@ -12,15 +14,19 @@ import os
 # Agregar el directorio padre al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Configuración de base de datos
-DATABASE_URL = "sqlite:///./logigrain.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+from utils.database import crear_engine
+from utils.migraciones import aplicar_migraciones
+
+# Configuración de base de datos (misma variable que main.py)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./logigrain.db")
+engine = crear_engine(DATABASE_URL)
 
 def init_database():
     """Inicializar base de datos con datos de prueba"""
     
     # Crear tablas
     SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
     
     with Session(engine) as session:
         print("🏗️ Inicializando base de datos LogiGrain...")
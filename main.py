@@ -1,22 +1,46 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import SQLModel, create_engine, Session, select
+from sqlmodel import SQLModel, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from Arca.wsaa import ArcaSettings, get_arca_access_ticket
+from Arca.wsaa import ArcaSettings, _get_service_config, parse_expiration_time, credentials_registry
+from Arca.ticket_broker import ticket_broker, fetcher_desde_entorno
+from Arca.ticket_refresher import ticket_refresher
+from Arca.shared_store import shared_store_from_env
+from Arca.resilience import WsaaGuard
+from Arca.soap_clients import warm_soap_clients
+from Arca.async_client import close_async_clients
 import os
+import json
+import time
+import hashlib
+import asyncio
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 import uvicorn
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Literal
+from dataclasses import asdict
 
 # Modelos de datos
 from Modelos.usuario import (
     Usuario, Puerto, UsuarioPuerto, 
-    UsuarioLogin, LoginResponse, UsuarioResponse, PuertoResponse
+    UsuarioLogin, LoginResponse, UsuarioResponse, PuertoResponse, hash_password
 )
 from Modelos.arca_tokens import (
-    ArcaToken, ArcaTokenRequest, ArcaTokenResponse
+    ArcaToken, ArcaTokenRequest, ArcaTokenResponse, ArcaTicketsBatchRequest
+)
+from Modelos.carta_porte import (
+    CartaPorteElectronica, Pesaje, MovimientoSector, TipoCereal, CalidadCereal, LlamadoCamionRequest, TransicionRequest,
+    EstadoOrdenDespacho, OrdenDespachoRequest, CIRCUITO, SECTOR_POR_ESTADO
 )
 
 # Cargar variables de entorno
@@ -24,24 +48,46 @@ load_dotenv()
 
 # Logging centralizado
 from utils.logger import setup_logger
+from utils.ttl_cache import TTLCache
+from utils.auth_cache import PrincipalCache
+from utils.acl_index import acl_index
+from utils.write_behind import UsuarioWriteBehind
+from utils.pendientes_commit import PendientesDeCommit
+from utils.purga_tokens import PurgaTokensArca
+from utils.colas_playa import colas_playa, PLAYAS, Playa, CamionEnCola
+from utils.contadores_circuito import contadores_circuito
+from utils.canal_circuito import canal_circuito, frame_sse
+from utils.lecturas_compartidas import lecturas_compartidas
+from utils.transiciones import motor_transiciones, SolicitudTransicion, TransicionInvalida
+from utils.despachos import ordenes_despacho, ResultadoOrden, ESTADOS_ABIERTOS
+from utils.database import crear_engine, crear_engines_async, nueva_sesion_async, sesion_paralela, engine_escritura
+from utils.migraciones import aplicar_migraciones
 logger = setup_logger('main')
 
-# Configuración de base de datos SQLite
-DATABASE_URL = "sqlite:///./logigrain.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Configuración de base de datos SQLite (DB_PROFILE=PROD: WAL, lectores + un escritor; ver utils/database.py)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./logigrain.db")
+engine = crear_engine(DATABASE_URL)  # Sincrónico: arranque y scripts
+async_engine, async_engine_escritor = crear_engines_async(DATABASE_URL)  # Asíncronos (aiosqlite): endpoints
 
 def create_db_and_tables():
-    """Crear base de datos y tablas si no existen"""
+    """Crear base de datos y tablas si no existen, y aplicar las migraciones pendientes"""
     try:
         SQLModel.metadata.create_all(engine, checkfirst=True)
     except Exception as e:
         logger.warning(f"Las tablas ya existen o hay un problema menor: {e}")
+    # Índices compuestos y columnas nuevas (utils/migraciones.py); un fallo acá sí detiene el arranque
+    aplicar_migraciones(engine)
 
 def get_session():
-    """Dependency para obtener sesión de base de datos"""
+    """Sesión sincrónica (scripts y tareas fuera del event loop)"""
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    """Dependency para obtener sesión asíncrona de base de datos"""
+    async with nueva_sesion_async(async_engine, async_engine_escritor) as session:
+        yield session
+
 # Configuración JWT
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "logigrain-secret-key-change-in-production")
 ALGORITHM = "HS256"
@@ -61,8 +107,81 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# === CACHE DE AUTENTICACIÓN === #
+
+# Tokens JWT ya decodificados: sha256(token) -> claims, hasta el exp del token
+jwt_memo = TTLCache(max_size=int(os.getenv("AUTH_JWT_MEMO_SIZE", "4096")), nombre="jwt_decodificados")
+
+# Usuario autenticado por ID, con versión que se incrementa ante cambios (ver eventos abajo)
+principal_cache = PrincipalCache(
+    ttl=float(os.getenv("AUTH_PRINCIPAL_TTL_SECONDS", "30")),
+    max_size=int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "2048")),
+    nombre="usuarios_principal"
+)
+
+# === LOGIN === #
+
+# Verificación de contraseñas (PBKDF2, costosa en CPU) fuera del event loop, con hilos acotados
+password_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LOGIN_HASH_WORKERS", str(os.cpu_count() or 2))),
+    thread_name_prefix="login-hash"
+)
+
+# ultimo_acceso y migración de hashes legados se escriben en lote (ver utils/write_behind.py)
+acceso_write_behind = UsuarioWriteBehind(intervalo=float(os.getenv("LOGIN_WRITE_BEHIND_SECONDS", "5")))
+
+# Campos de Usuario cuyo cambio no afecta la autenticación (no invalidan el principal)
+CAMPOS_USUARIO_SIN_IMPACTO = {"ultimo_acceso"}
+
+def _invalidar_principales(usuarios: set) -> None:
+    """Después del commit: los usuarios afectados (None: todos)."""
+    if None in usuarios:
+        principal_cache.invalidar_todos()
+        return
+    for usuario_id in usuarios:
+        principal_cache.invalidar(usuario_id)
+
+_principales_pendientes = PendientesDeCommit("principales_invalidados", _invalidar_principales, set)
+
+def _invalidar_principal_al_commit(target, usuario_id: Optional[int]) -> None:
+    """Se invalida recién en el commit (utils/pendientes_commit.py); un rollback lo descarta."""
+    usuarios = _principales_pendientes.en(target)
+    if usuarios is not None:
+        usuarios.add(usuario_id)
+
+@event.listens_for(Usuario, "after_update")
+def _invalidar_principal_usuario(mapper, connection, target):
+    """Usuario deshabilitado o modificado: descartar su principal."""
+    if any(
+        atributo.history.has_changes()
+        for atributo in sa_inspect(target).attrs if atributo.key not in CAMPOS_USUARIO_SIN_IMPACTO
+    ):
+        _invalidar_principal_al_commit(target, target.id)
+
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_principal_usuario_eliminado(mapper, connection, target):
+    _invalidar_principal_al_commit(target, target.id)
+
+@event.listens_for(UsuarioPuerto, "after_insert")
+@event.listens_for(UsuarioPuerto, "after_update")
+@event.listens_for(UsuarioPuerto, "after_delete")
+def _invalidar_principal_puertos(mapper, connection, target):
+    """Cambio en los puertos asignados a un usuario."""
+    _invalidar_principal_al_commit(target, target.usuario_id)
+
+@event.listens_for(Puerto, "after_update")
+@event.listens_for(Puerto, "after_delete")
+def _invalidar_principales_puerto(mapper, connection, target):
+    """Un puerto deshabilitado afecta a todos sus usuarios."""
+    _invalidar_principal_al_commit(target, None)
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verificar y decodificar token JWT"""
+    """Verificar y decodificar token JWT (memoizado por hash del token hasta su vencimiento)"""
+    clave = hashlib.sha256(credentials.credentials.encode()).digest()
+    token_data = jwt_memo.get(clave)
+    if token_data is not None:
+        return token_data
+    
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -76,29 +195,46 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
                 detail="Token inválido"
             )
             
-        return {
+        token_data = {
             "username": username,
             "user_id": user_id,
             "is_admin": is_admin,
             "puertos": puertos
         }
+        if payload.get("exp"):
+            jwt_memo.set(clave, token_data, ttl=payload["exp"] - time.time())
+        return token_data
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido o expirado"
         )
 
-def get_current_user(session: Session = Depends(get_session), token_data: dict = Depends(verify_token)):
-    """Obtener usuario actual desde el token JWT"""
-    statement = select(Usuario).where(Usuario.id == token_data["user_id"])
-    usuario = session.exec(statement).first()
+async def get_current_user(session: AsyncSession = Depends(get_async_session), token_data: dict = Depends(verify_token)):
+    """
+    Obtener usuario actual desde el token JWT.
     
-    if not usuario:
-        logger.error(f"Usuario no encontrado en BD: ID {token_data['user_id']}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado"
-        )
+    Devuelve una copia del usuario sin sesión asociada (principal). En
+    régimen estable sale del cache en memoria, sin consultar la base.
+    """
+    user_id = token_data["user_id"]
+    usuario = principal_cache.get(user_id)
+    
+    if usuario is None:
+        # Versión tomada antes de consultar: un cambio concurrente invalida lo que se guarde
+        version = principal_cache.version(user_id)
+        statement = select(Usuario).where(Usuario.id == user_id)
+        usuario_db = (await session.exec(statement)).first()
+        
+        if not usuario_db:
+            logger.error(f"Usuario no encontrado en BD: ID {user_id}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuario no encontrado"
+            )
+        
+        usuario = Usuario(**usuario_db.model_dump())
+        principal_cache.set(user_id, usuario, version)
     
     if not usuario.habilitado:
         logger.warning(f"Usuario deshabilitado: {usuario.username}")
@@ -119,9 +255,28 @@ def log_endpoint_access(action: str, usuario: Usuario, puerto_codigo: str = None
 
 # === FUNCIONES DE CACHE ARCA === #
 
-def get_cached_arca_token(usuario_id: int, puerto_codigo: str, servicio_tipo: str, session: Session) -> Optional[ArcaToken]:
+# L1 en memoria delante de la tabla arca_tokens (L2): (usuario_id, puerto, servicio) -> ArcaToken desacoplado
+arca_token_l1 = TTLCache(max_size=int(os.getenv("ARCA_TOKEN_L1_SIZE", "2048")), nombre="arca_tokens_l1")
+
+# Los vencidos se borran en lote desde el lifespan, nunca dentro de un request
+purga_tokens_arca = PurgaTokensArca(intervalo=float(os.getenv("ARCA_TOKEN_PURGE_SECONDS", "300")))
+
+def _guardar_en_l1(token: ArcaToken) -> None:
+    """Guarda una copia del token (sin sesión asociada) con TTL hasta su vencimiento."""
+    snapshot = ArcaToken(**token.model_dump())
+    arca_token_l1.set(
+        (token.usuario_id, token.puerto_codigo, token.servicio_tipo),
+        snapshot,
+        ttl=token.tiempo_restante().total_seconds()
+    )
+
+def invalidate_arca_token_cache(usuario_id: int, puerto_codigo: str, servicio_tipo: str) -> None:
+    """Descarta el token del L1 (usar ante cualquier escritura en arca_tokens)."""
+    arca_token_l1.invalidate((usuario_id, puerto_codigo, servicio_tipo))
+
+async def get_cached_arca_token(usuario_id: int, puerto_codigo: str, servicio_tipo: str, session: AsyncSession) -> Optional[ArcaToken]:
     """
-    Buscar token ARCA válido en cache.
+    Buscar token ARCA válido en cache (L1 en memoria, luego tabla arca_tokens).
     
     Args:
         usuario_id: ID del usuario
@@ -132,23 +287,25 @@ def get_cached_arca_token(usuario_id: int, puerto_codigo: str, servicio_tipo: st
     Returns:
         ArcaToken si existe y es válido, None en caso contrario
     """
+    token = arca_token_l1.get((usuario_id, puerto_codigo, servicio_tipo))
+    if token is not None:
+        return token
+    
     try:
         statement = select(ArcaToken).where(
             ArcaToken.usuario_id == usuario_id,
             ArcaToken.puerto_codigo == puerto_codigo,
             ArcaToken.servicio_tipo == servicio_tipo,
             ArcaToken.fecha_vencimiento > datetime.utcnow()
-        ).order_by(ArcaToken.fecha_solicitud.desc())
+        )
         
-        token = session.exec(statement).first()
+        # Una fila por (usuario, puerto, servicio); los vencidos los borra purga_tokens_arca
+        token = (await session.exec(statement)).first()
         
         if token and not token.is_expired():
             logger.info(f"Token ARCA encontrado en cache - Usuario: {usuario_id}, Puerto: {puerto_codigo}, Servicio: {servicio_tipo}, Vence: {token.fecha_vencimiento}")
+            _guardar_en_l1(token)
             return token
-        elif token and token.is_expired():
-            logger.info(f"Token ARCA expirado encontrado - Eliminando del cache")
-            session.delete(token)
-            session.commit()
             
         return None
         
@@ -156,9 +313,9 @@ def get_cached_arca_token(usuario_id: int, puerto_codigo: str, servicio_tipo: st
         logger.error(f"Error al buscar token ARCA en cache: {str(e)}")
         return None
 
-def save_arca_token_to_cache(usuario_id: int, puerto_codigo: str, servicio_tipo: str, 
-                           token: str, sign: str, wsaa_url: str, servicio_nombre: str, 
-                           session: Session) -> ArcaToken:
+async def save_arca_token_to_cache(usuario_id: int, puerto_codigo: str, servicio_tipo: str, 
+                                 token: str, sign: str, wsaa_url: str, servicio_nombre: str, 
+                                 session: AsyncSession, fecha_vencimiento: Optional[datetime] = None) -> ArcaToken:
     """
     Guardar nuevo token ARCA en cache.
     
@@ -171,23 +328,16 @@ def save_arca_token_to_cache(usuario_id: int, puerto_codigo: str, servicio_tipo:
         wsaa_url: URL del servicio WSAA
         servicio_nombre: Nombre del servicio
         session: Sesión de base de datos
+        fecha_vencimiento: Vencimiento real del ticket (UTC); si es None se asumen 8 horas
         
     Returns:
         ArcaToken guardado
     """
+    # Invalidar el L1 antes de escribir: si el guardado falla no queda un token viejo en memoria
+    invalidate_arca_token_cache(usuario_id, puerto_codigo, servicio_tipo)
+    
     try:
-        # Eliminar tokens anteriores del mismo usuario/puerto/servicio
-        statement = select(ArcaToken).where(
-            ArcaToken.usuario_id == usuario_id,
-            ArcaToken.puerto_codigo == puerto_codigo,
-            ArcaToken.servicio_tipo == servicio_tipo
-        )
-        tokens_anteriores = session.exec(statement).all()
-        
-        for token_anterior in tokens_anteriores:
-            session.delete(token_anterior)
-        
-        # Crear nuevo token
+        # El constructor completa fecha_solicitud y el vencimiento por defecto; no se agrega a la sesión
         nuevo_token = ArcaToken(
             usuario_id=usuario_id,
             puerto_codigo=puerto_codigo,
@@ -195,12 +345,23 @@ def save_arca_token_to_cache(usuario_id: int, puerto_codigo: str, servicio_tipo:
             token=token,
             sign=sign,
             wsaa_url=wsaa_url,
-            servicio_nombre=servicio_nombre
+            servicio_nombre=servicio_nombre,
+            fecha_vencimiento=fecha_vencimiento
         )
         
-        session.add(nuevo_token)
-        session.commit()
-        session.refresh(nuevo_token)
+        # Un solo upsert sobre la clave única (usuario_id, puerto_codigo, servicio_tipo): reemplaza
+        # el ticket anterior sin cargar ni borrar objetos
+        tabla = ArcaToken.__table__
+        valores = nuevo_token.model_dump(exclude={"id"})
+        statement = sqlite_insert(tabla).values(**valores)
+        statement = statement.on_conflict_do_update(
+            index_elements=[tabla.c.usuario_id, tabla.c.puerto_codigo, tabla.c.servicio_tipo],
+            set_={columna: statement.excluded[columna] for columna in valores
+                  if columna not in ("usuario_id", "puerto_codigo", "servicio_tipo")}
+        ).returning(tabla.c.id)
+        nuevo_token.id = (await session.exec(statement)).scalar_one()
+        await session.commit()
+        _guardar_en_l1(nuevo_token)
         
         logger.info(f"Token ARCA guardado en cache - Usuario: {usuario_id}, Puerto: {puerto_codigo}, Servicio: {servicio_tipo}, Vence: {nuevo_token.fecha_vencimiento}")
         
@@ -208,13 +369,56 @@ def save_arca_token_to_cache(usuario_id: int, puerto_codigo: str, servicio_tipo:
         
     except Exception as e:
         logger.error(f"Error al guardar token ARCA en cache: {str(e)}")
-        session.rollback()
+        await session.rollback()
         raise
 
-def validate_user_puerto_access(usuario: Usuario, puerto_codigo: str, session: Session) -> bool:
+async def get_cached_arca_tokens(usuario_id: int, pares: List[Tuple[str, str]], session: AsyncSession) -> Dict[Tuple[str, str], ArcaToken]:
+    """
+    Buscar en cache los tokens vigentes de varios pares (puerto_codigo, servicio_tipo).
+    
+    Los pares que no están en el L1 se resuelven con una sola consulta a arca_tokens.
+    
+    Returns:
+        Dict (puerto_codigo, servicio_tipo) -> ArcaToken, solo con los pares encontrados
+    """
+    encontrados = {}
+    pendientes = set()
+    for puerto_codigo, servicio_tipo in pares:
+        token = arca_token_l1.get((usuario_id, puerto_codigo, servicio_tipo))
+        if token is not None:
+            encontrados[(puerto_codigo, servicio_tipo)] = token
+        else:
+            pendientes.add((puerto_codigo, servicio_tipo))
+    
+    if not pendientes:
+        return encontrados
+    
+    try:
+        statement = select(ArcaToken).where(
+            ArcaToken.usuario_id == usuario_id,
+            ArcaToken.puerto_codigo.in_({puerto for puerto, _ in pendientes}),
+            ArcaToken.servicio_tipo.in_({servicio for _, servicio in pendientes}),
+            ArcaToken.fecha_vencimiento > datetime.utcnow()
+        )
+        
+        for token in (await session.exec(statement)).all():
+            par = (token.puerto_codigo, token.servicio_tipo)
+            if par in pendientes and par not in encontrados and not token.is_expired():
+                encontrados[par] = token
+                _guardar_en_l1(token)
+                
+    except Exception as e:
+        logger.error(f"Error al buscar tokens ARCA en cache: {str(e)}")
+    
+    return encontrados
+
+async def validate_user_puerto_access(usuario: Usuario, puerto_codigo: str, session: AsyncSession) -> bool:
     """
     Validar que el usuario tenga acceso al puerto especificado.
     
+    Consulta el índice de acceso en memoria (utils/acl_index.py); la sesión
+    solo se usa si el índice todavía no está cargado o debe recargarse.
+    
     Args:
         usuario: Usuario autenticado
         puerto_codigo: Código del puerto a validar
@@ -224,32 +428,78 @@ def validate_user_puerto_access(usuario: Usuario, puerto_codigo: str, session: S
         bool: True si tiene acceso, False en caso contrario
     """
     try:
-        statement = select(UsuarioPuerto, Puerto).join(Puerto).where(
-            UsuarioPuerto.usuario_id == usuario.id,
-            Puerto.codigo == puerto_codigo,
-            UsuarioPuerto.habilitado == True,
-            Puerto.habilitado == True
-        )
-        
-        resultado = session.exec(statement).first()
-        return resultado is not None
+        await acl_index.asegurar_cargado_async(session)
+        return acl_index.tiene_acceso(usuario.id, puerto_codigo)
         
     except Exception as e:
         logger.error(f"Error al validar acceso a puerto: {str(e)}")
         return False
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicio y apagado de la aplicación."""
+    # Crear tablas al iniciar
+    create_db_and_tables()
+    logger.info("Base de datos y tablas creadas")
+    
+    # Índice de acceso usuario/puerto en memoria
+    with Session(engine) as session:
+        acl_index.cargar(session)
+        # Colas de las playas de espera (Precalado y post-Calada)
+        colas_playa.cargar(session)
+        # Contadores del tablero de Operaciones (camiones por estado)
+        contadores_circuito.cargar(session)
+    
+    # Cliente de WSAA del broker (ARCA_WSAA_CLIENT: httpx por defecto, o zeep)
+    ticket_broker.fetcher = fetcher_desde_entorno()
+    # Precargar clientes SOAP de WSAA en segundo plano (no bloquea el arranque si AFIP no responde).
+    # Solo los usa el cliente zeep; httpx arma el sobre de LoginCms sin leer el WSDL
+    if ticket_broker.fetcher_sincronico:
+        wsaa_urls = [_get_service_config(servicio).wsaa_url for servicio in SERVICIOS_ARCA]
+        threading.Thread(target=warm_soap_clients, args=(wsaa_urls,), daemon=True).start()
+    
+    # SIGHUP recarga configuración y certificados ARCA sin reiniciar (solo POSIX)
+    if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: credentials_registry.request_reload())
+    
+    # Tickets compartidos entre workers del host y renovación anticipada
+    ticket_broker.store = shared_store_from_env()
+    ticket_broker.guard = WsaaGuard()
+    ticket_refresher.start()
+    
+    # Volcado periódico de ultimo_acceso de los logins
+    tarea_write_behind = asyncio.create_task(acceso_write_behind.ejecutar())
+    # Purga de tickets ARCA vencidos (por el engine que recibe las escrituras)
+    tarea_purga_tokens = asyncio.create_task(purga_tokens_arca.ejecutar(async_engine_escritor or async_engine))
+    # Reconciliación de los contadores del tablero desde MovimientoSector
+    tarea_contadores = asyncio.create_task(contadores_circuito.ejecutar(async_engine_escritor or async_engine, async_engine))
+    # Recarga de las colas de playa (ve los cambios confirmados por otros workers)
+    tarea_colas = asyncio.create_task(colas_playa.ejecutar(async_engine))
+    
+    yield
+    
+    tarea_write_behind.cancel()
+    tarea_purga_tokens.cancel()
+    tarea_contadores.cancel()
+    tarea_colas.cancel()
+    # Los streams de eventos abiertos terminan con `resync` (si no, el apagado los esperaría)
+    canal_circuito.cerrar()
+    await acceso_write_behind.flush()
+    await ticket_refresher.stop()
+    await close_async_clients()
+    logger.info("Conexiones ARCA cerradas")
+    # Las conexiones de aiosqlite usan hilos no-daemon: cerrarlas para que el proceso termine
+    await async_engine.dispose()
+    if async_engine_escritor is not None:
+        await async_engine_escritor.dispose()
+
 app = FastAPI(
     title="LogiGrain - Terminal Portuaria",
     description="Sistema integral de gestión para terminal portuaria con integración ARCA/AFIP",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Crear tablas al iniciar
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
-    logger.info("Base de datos y tablas creadas")
-
 # Obtener ruta base del proyecto
 BASE_DIR = Path(__file__).parent.absolute()
 
@@ -258,7 +508,7 @@ BASE_DIR = Path(__file__).parent.absolute()
 @app.post("/login", response_model=LoginResponse)
 async def login(
     user_credentials: UsuarioLogin, 
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Endpoint de login con JSON en body.
@@ -267,9 +517,15 @@ async def login(
     logger.info(f"Intento de login para usuario: {user_credentials.username}")
     
     try:
-        # Buscar usuario por username
+        # Una sola consulta (índice por username); los puertos salen del índice de acceso
         statement = select(Usuario).where(Usuario.username == user_credentials.username)
-        usuario = session.exec(statement).first()
+        usuario_db = (await session.exec(statement)).first()
+        usuario = Usuario(**usuario_db.model_dump()) if usuario_db else None
+        await acl_index.asegurar_cargado_async(session)
+        engine_sesion = engine_escritura(session)
+        # Liberar la conexión antes de esperar el hash: en una ráfaga de logins no se retienen
+        # conexiones del pool mientras la verificación espera su turno en password_pool
+        await session.close()
         
         if not usuario:
             logger.warning(f"Usuario no encontrado: {user_credentials.username}")
@@ -278,8 +534,9 @@ async def login(
                 detail="Credenciales inválidas"
             )
         
-        # Verificar contraseña
-        if not usuario.verify_password(user_credentials.password):
+        # Verificar contraseña (PBKDF2 en hilo aparte, sin bloquear el event loop)
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(password_pool, usuario.verify_password, user_credentials.password):
             logger.warning(f"Contraseña incorrecta para usuario: {user_credentials.username}")
             raise HTTPException(
                 status_code=401,
@@ -294,37 +551,23 @@ async def login(
                 detail="Usuario deshabilitado"
             )
         
-        # Obtener puertos del usuario
-        statement_puertos = select(UsuarioPuerto, Puerto).join(Puerto).where(
-            UsuarioPuerto.usuario_id == usuario.id,
-            UsuarioPuerto.habilitado == True,
-            Puerto.habilitado == True
-        )
-        resultados = session.exec(statement_puertos).all()
+        puertos = [PuertoResponse.model_validate(puerto) for puerto in acl_index.puertos_de(usuario.id)]
         
-        if not resultados:
+        if not puertos:
             logger.warning(f"Usuario sin puertos asignados: {user_credentials.username}")
             raise HTTPException(
                 status_code=403,
                 detail="Usuario sin puertos asignados"
             )
         
-        # Construir lista de puertos
-        puertos = [
-            PuertoResponse(
-                id=puerto.id,
-                nombre=puerto.nombre,
-                codigo=puerto.codigo,
-                descripcion=puerto.descripcion,
-                ubicacion=puerto.ubicacion,
-                habilitado=puerto.habilitado
-            ) for _, puerto in resultados
-        ]
+        # Hash sha256 legado o con otras iteraciones: migrarlo con la contraseña ya verificada
+        if usuario.password_requiere_rehash() and not acceso_write_behind.rehash_pendiente(engine_sesion, usuario.id):
+            hash_nuevo = await loop.run_in_executor(password_pool, hash_password, user_credentials.password)
+            acceso_write_behind.registrar_rehash(engine_sesion, usuario.id, usuario.password_hash, hash_nuevo)
         
-        # Actualizar último acceso
+        # Último acceso: escritura diferida, sin commit por login
         usuario.ultimo_acceso = datetime.utcnow()
-        session.add(usuario)
-        session.commit()
+        acceso_write_behind.registrar_acceso(engine_sesion, usuario.id, usuario.ultimo_acceso)
         
         # Crear token JWT
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -342,16 +585,7 @@ async def login(
         logger.info(f"Login exitoso para usuario: {user_credentials.username}")
         
         return LoginResponse(
-            usuario=UsuarioResponse(
-                id=usuario.id,
-                username=usuario.username,
-                nombre_completo=usuario.nombre_completo,
-                email=usuario.email,
-                habilitado=usuario.habilitado,
-                es_admin=usuario.es_admin,
-                fecha_creacion=usuario.fecha_creacion,
-                ultimo_acceso=usuario.ultimo_acceso
-            ),
+            usuario=UsuarioResponse.model_validate(usuario),
             puertos=puertos,
             token=access_token,
             mensaje=f"Login exitoso. Acceso a {len(puertos)} puerto(s)."
@@ -380,7 +614,8 @@ async def root():
         "servicios_arca": [
             "/get-ticket-cpe - Token Cartas de Porte Electrónica", 
             "/get-ticket-embarques - Token Comunicaciones de Embarques",
-            "/get-ticket-facturacion - Token Facturación Electrónica"
+            "/get-ticket-facturacion - Token Facturación Electrónica",
+            "/arca/tickets - Varios tokens puerto/servicio en una llamada (NDJSON)"
         ],
         "diagnosticos": [
             "/health - Verificación de salud",
@@ -390,277 +625,653 @@ async def root():
     }
 
 
-@app.post("/get-ticket-cpe")
-async def get_ticket_cpe(
-    request: ArcaTokenRequest, 
-    current_user: Usuario = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
-    """Obtiene Access Ticket específico para Cartas de Porte Electrónica."""
-    puerto_codigo = request.puerto_codigo
-    log_endpoint_access("Solicitud Token CPE", current_user, puerto_codigo)
+# Configuración de cada servicio ARCA expuesto: etiqueta para logs/mensajes y nombre por defecto
+SERVICIOS_ARCA = {
+    "CPE": {"etiqueta": "CPE", "servicio_default": "wscpe"},
+    "EMBARQUES": {"etiqueta": "EMBARQUES", "servicio_default": "wconscomunicacionembarque"},
+    "FACTURACION": {"etiqueta": "FACTURACIÓN", "servicio_default": "wsfe"},
+}
+
+
+def respuesta_token_cacheado(cached_token: ArcaToken, etiqueta: str, current_user: Usuario,
+                             puerto_codigo: str, degradado: bool = False) -> ArcaTokenResponse:
+    """Respuesta con un token del cache del usuario/puerto (degradado: WSAA no disponible)."""
+    tiempo_restante = cached_token.tiempo_restante()
+    cache_info = {
+        "from_cache": True,
+        "fecha_solicitud": cached_token.fecha_solicitud.isoformat(),
+        "fecha_vencimiento": cached_token.fecha_vencimiento.isoformat(),
+        "tiempo_restante_minutos": int(tiempo_restante.total_seconds() / 60)
+    }
+    if degradado:
+        cache_info["degraded"] = True
+    
+    response_data = {
+        "success": True,
+        "token": cached_token.token,
+        "sign": cached_token.sign,
+        "service": cached_token.servicio_nombre,
+        "wsaa_url": cached_token.wsaa_url
+    }
+    
+    log_endpoint_access(f"Token {etiqueta} - Cache Hit", current_user, puerto_codigo, success=True, 
+                     details=f"Token reutilizado, vence en {int(tiempo_restante.total_seconds() / 60)} minutos" +
+                             (" (WSAA no disponible)" if degradado else ""))
+    
+    return ArcaTokenResponse(
+        status="success",
+        message=f"Token {etiqueta} obtenido desde cache" + (" (WSAA no disponible)" if degradado else ""),
+        data=response_data,
+        cache_info=cache_info
+    )
+
+
+async def solicitar_ticket_broker(servicio_tipo: str, puerto_codigo: str, cached_token: Optional[ArcaToken],
+                                  current_user: Usuario, session: AsyncSession) -> ArcaTokenResponse:
+    """
+    Pide el ticket al broker y lo guarda en el cache del usuario/puerto.
+    
+    Si WSAA no está disponible (circuito abierto o sin cupo) devuelve el
+    token cacheado como degradado, o HTTPException 503 con Retry-After.
+    Cualquier otra falla (ej: "ya posee un TA válido" tras un reinicio, con
+    el broker vacío) también devuelve el token cacheado mientras esté vigente.
+    """
+    etiqueta = SERVICIOS_ARCA[servicio_tipo]["etiqueta"]
+    
+    # Solicitar ticket al broker (una sola llamada WSAA por certificado/servicio)
+    result = await ticket_broker.get_ticket(servicio_tipo)
+    
+    # WSAA no disponible (circuito abierto o sin cupo): último ticket vigente o 503 inmediato
+    if result.get('circuit_open') or result.get('rate_limited'):
+        if cached_token and not cached_token.is_expired():
+            return respuesta_token_cacheado(cached_token, etiqueta, current_user, puerto_codigo, degradado=True)
+        log_endpoint_access(f"Token {etiqueta} - WSAA No Disponible", current_user, puerto_codigo, success=False, details=result['error'])
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=result,
+            headers={"Retry-After": str(result['retry_after'])}
+        )
+    
+    if not result['success']:
+        if cached_token and not cached_token.is_expired():
+            logger.warning(f"Broker sin ticket {etiqueta} ({result.get('error')}); se usa el token cacheado vigente")
+            return respuesta_token_cacheado(cached_token, etiqueta, current_user, puerto_codigo, degradado=True)
+        log_endpoint_access(f"Token {etiqueta} Error", current_user, puerto_codigo, success=False, details=str(result))
+        raise HTTPException(status_code=500, detail=result)
+    
+    # El broker todavía no renovó: mismo ticket que el cacheado, sin volver a escribirlo
+    if cached_token and result['token'] == cached_token.token:
+        return respuesta_token_cacheado(cached_token, etiqueta, current_user, puerto_codigo)
+    
+    # Guardar en cache
+    nuevo_token = await save_arca_token_to_cache(
+        usuario_id=current_user.id,
+        puerto_codigo=puerto_codigo,
+        servicio_tipo=servicio_tipo,
+        token=result['token'],
+        sign=result['sign'],
+        wsaa_url=result.get('wsaa_url', ''),
+        servicio_nombre=result.get('service', SERVICIOS_ARCA[servicio_tipo]["servicio_default"]),
+        session=session,
+        fecha_vencimiento=parse_expiration_time(result.get('expiration_time'))
+    )
+    
+    cache_info = {
+        "from_cache": False,
+        "from_broker": result.get('from_broker', False),
+        "fecha_solicitud": nuevo_token.fecha_solicitud.isoformat(),
+        "fecha_vencimiento": nuevo_token.fecha_vencimiento.isoformat(),
+        "tiempo_restante_minutos": int(nuevo_token.tiempo_restante().total_seconds() / 60)
+    }
+    
+    log_endpoint_access(f"Token {etiqueta} - Nuevo Solicitado", current_user, puerto_codigo, success=True, details="Token generado y guardado en cache")
+    
+    return ArcaTokenResponse(
+        status="success",
+        message=f"Token {etiqueta} obtenido y guardado en cache",
+        data=result,
+        cache_info=cache_info
+    )
+
+
+async def obtener_ticket_arca(servicio_tipo: str, puerto_codigo: str, current_user: Usuario, session: AsyncSession) -> ArcaTokenResponse:
+    """
+    Flujo común de los endpoints de tickets ARCA.
+    
+    1. Valida acceso del usuario al puerto
+    2. Busca token en cache del usuario/puerto/servicio
+    3. En cache miss pide el ticket al broker (compartido por certificado)
+    4. Guarda el ticket en cache del usuario
+    """
+    etiqueta = SERVICIOS_ARCA[servicio_tipo]["etiqueta"]
+    log_endpoint_access(f"Solicitud Token {etiqueta}", current_user, puerto_codigo)
     
     try:
         # Validar acceso del usuario al puerto
-        if not validate_user_puerto_access(current_user, puerto_codigo, session):
-            log_endpoint_access("Token CPE - Acceso Denegado", current_user, puerto_codigo, success=False, details="Usuario sin acceso al puerto")
+        if not await validate_user_puerto_access(current_user, puerto_codigo, session):
+            log_endpoint_access(f"Token {etiqueta} - Acceso Denegado", current_user, puerto_codigo, success=False, details="Usuario sin acceso al puerto")
             raise HTTPException(
                 status_code=403, 
                 detail=f"Usuario no tiene acceso al puerto {puerto_codigo}"
             )
         
         # Buscar token en cache
-        cached_token = get_cached_arca_token(current_user.id, puerto_codigo, "CPE", session)
+        cached_token = await get_cached_arca_token(current_user.id, puerto_codigo, servicio_tipo, session)
         
-        if cached_token:
-            tiempo_restante = cached_token.tiempo_restante()
-            cache_info = {
-                "from_cache": True,
-                "fecha_solicitud": cached_token.fecha_solicitud.isoformat(),
-                "fecha_vencimiento": cached_token.fecha_vencimiento.isoformat(),
-                "tiempo_restante_minutos": int(tiempo_restante.total_seconds() / 60)
-            }
-            
-            response_data = {
-                "success": True,
-                "token": cached_token.token,
-                "sign": cached_token.sign,
-                "service": cached_token.servicio_nombre,
-                "wsaa_url": cached_token.wsaa_url
-            }
-            
-            log_endpoint_access("Token CPE - Cache Hit", current_user, puerto_codigo, success=True, 
-                             details=f"Token reutilizado, vence en {int(tiempo_restante.total_seconds() / 60)} minutos")
-            
-            return ArcaTokenResponse(
-                status="success",
-                message="Token CPE obtenido desde cache",
-                data=response_data,
-                cache_info=cache_info
-            )
-        
-        # Solicitar nuevo token a ARCA
-        result = get_arca_access_ticket("CPE")
+        # Dentro de la ventana de renovación el broker ya tiene (o está obteniendo) el ticket nuevo
+        if cached_token and cached_token.tiempo_restante() > ticket_refresher.lead:
+            return respuesta_token_cacheado(cached_token, etiqueta, current_user, puerto_codigo)
         
-        if result['success']:
-            # Guardar en cache
-            nuevo_token = save_arca_token_to_cache(
-                usuario_id=current_user.id,
-                puerto_codigo=puerto_codigo,
-                servicio_tipo="CPE",
-                token=result['token'],
-                sign=result['sign'],
-                wsaa_url=result.get('wsaa_url', ''),
-                servicio_nombre=result.get('service', 'wscpe'),
-                session=session
-            )
-            
-            cache_info = {
-                "from_cache": False,
-                "fecha_solicitud": nuevo_token.fecha_solicitud.isoformat(),
-                "fecha_vencimiento": nuevo_token.fecha_vencimiento.isoformat(),
-                "tiempo_restante_minutos": 480  # 8 horas
-            }
-            
-            log_endpoint_access("Token CPE - Nuevo Solicitado", current_user, puerto_codigo, success=True, details="Token generado y guardado en cache")
-            
-            return ArcaTokenResponse(
-                status="success",
-                message="Token CPE obtenido y guardado en cache",
-                data=result,
-                cache_info=cache_info
-            )
-        else:
-            log_endpoint_access("Token CPE Error", current_user, puerto_codigo, success=False, details=str(result))
-            raise HTTPException(status_code=500, detail=result)
+        return await solicitar_ticket_broker(servicio_tipo, puerto_codigo, cached_token, current_user, session)
             
     except HTTPException:
         raise
     except Exception as e:
-        log_endpoint_access("Token CPE Excepción", current_user, puerto_codigo, success=False, details=str(e))
+        log_endpoint_access(f"Token {etiqueta} Excepción", current_user, puerto_codigo, success=False, details=str(e))
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
 
+@app.post("/get-ticket-cpe")
+async def get_ticket_cpe(
+    request: ArcaTokenRequest, 
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Obtiene Access Ticket específico para Cartas de Porte Electrónica."""
+    return await obtener_ticket_arca("CPE", request.puerto_codigo, current_user, session)
+
+
 @app.post("/get-ticket-embarques") 
 async def get_ticket_embarques(
     request: ArcaTokenRequest,
     current_user: Usuario = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Obtiene Access Ticket específico para Comunicaciones de Embarques."""
-    puerto_codigo = request.puerto_codigo
-    log_endpoint_access("Solicitud Token EMBARQUES", current_user, puerto_codigo)
-    
-    try:
-        # Validar acceso del usuario al puerto
-        if not validate_user_puerto_access(current_user, puerto_codigo, session):
-            log_endpoint_access("Token EMBARQUES - Acceso Denegado", current_user, puerto_codigo, success=False, details="Usuario sin acceso al puerto")
-            raise HTTPException(
-                status_code=403, 
-                detail=f"Usuario no tiene acceso al puerto {puerto_codigo}"
-            )
-        
-        # Buscar token en cache
-        cached_token = get_cached_arca_token(current_user.id, puerto_codigo, "EMBARQUES", session)
-        
-        if cached_token:
-            tiempo_restante = cached_token.tiempo_restante()
-            cache_info = {
-                "from_cache": True,
-                "fecha_solicitud": cached_token.fecha_solicitud.isoformat(),
-                "fecha_vencimiento": cached_token.fecha_vencimiento.isoformat(),
-                "tiempo_restante_minutos": int(tiempo_restante.total_seconds() / 60)
-            }
-            
-            response_data = {
-                "success": True,
-                "token": cached_token.token,
-                "sign": cached_token.sign,
-                "service": cached_token.servicio_nombre,
-                "wsaa_url": cached_token.wsaa_url
-            }
-            
-            log_endpoint_access("Token EMBARQUES - Cache Hit", current_user, puerto_codigo, success=True, 
-                             details=f"Token reutilizado, vence en {int(tiempo_restante.total_seconds() / 60)} minutos")
-            
-            return ArcaTokenResponse(
-                status="success",
-                message="Token EMBARQUES obtenido desde cache",
-                data=response_data,
-                cache_info=cache_info
-            )
-        
-        # Solicitar nuevo token a ARCA
-        result = get_arca_access_ticket("EMBARQUES")
-        
-        if result['success']:
-            # Guardar en cache
-            nuevo_token = save_arca_token_to_cache(
-                usuario_id=current_user.id,
-                puerto_codigo=puerto_codigo,
-                servicio_tipo="EMBARQUES",
-                token=result['token'],
-                sign=result['sign'],
-                wsaa_url=result.get('wsaa_url', ''),
-                servicio_nombre=result.get('service', 'wconscomunicacionembarque'),
-                session=session
-            )
-            
-            cache_info = {
-                "from_cache": False,
-                "fecha_solicitud": nuevo_token.fecha_solicitud.isoformat(),
-                "fecha_vencimiento": nuevo_token.fecha_vencimiento.isoformat(),
-                "tiempo_restante_minutos": 480  # 8 horas
-            }
-            
-            log_endpoint_access("Token EMBARQUES - Nuevo Solicitado", current_user, puerto_codigo, success=True, details="Token generado y guardado en cache")
-            
-            return ArcaTokenResponse(
-                status="success",
-                message="Token EMBARQUES obtenido y guardado en cache",
-                data=result,
-                cache_info=cache_info
-            )
-        else:
-            log_endpoint_access("Token EMBARQUES Error", current_user, puerto_codigo, success=False, details=str(result))
-            raise HTTPException(status_code=500, detail=result)
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        log_endpoint_access("Token EMBARQUES Excepción", current_user, puerto_codigo, success=False, details=str(e))
-        raise HTTPException(status_code=500, detail={"error": str(e)})
+    return await obtener_ticket_arca("EMBARQUES", request.puerto_codigo, current_user, session)
 
 
 @app.post("/get-ticket-facturacion")
 async def get_ticket_facturacion(
     request: ArcaTokenRequest,
     current_user: Usuario = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Obtiene Access Ticket específico para Facturación Electrónica."""
-    puerto_codigo = request.puerto_codigo
-    log_endpoint_access("Solicitud Token FACTURACIÓN", current_user, puerto_codigo)
+    return await obtener_ticket_arca("FACTURACION", request.puerto_codigo, current_user, session)
+
+
+@app.post("/arca/tickets")
+async def get_tickets_arca(
+    request: ArcaTicketsBatchRequest,
+    current_user: Usuario = Depends(get_current_user),
+    token_data: dict = Depends(verify_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Obtiene varios Access Tickets (pares puerto/servicio) en una sola llamada.
+    
+    El acceso a los puertos se valida con el claim `puertos` del JWT y el
+    índice de acceso en memoria (revocaciones posteriores al login), los
+    tokens cacheados se resuelven con una sola consulta y los faltantes se
+    piden al broker en paralelo. La respuesta es NDJSON: una línea por par,
+    primero los del cache y luego a medida que llegan los de WSAA.
+    """
+    pares = list(dict.fromkeys((item.puerto_codigo, item.servicio_tipo) for item in request.items))
+    puertos_permitidos = set(token_data.get("puertos") or [])
+    log_endpoint_access("Solicitud Tickets Lote", current_user, details=f"{len(pares)} pares puerto/servicio")
+    
+    await acl_index.asegurar_cargado_async(session)
+    permitidos = [par for par in pares if par[0] in puertos_permitidos and acl_index.tiene_acceso(current_user.id, par[0])]
+    denegados = [par for par in pares if par not in permitidos]
+    cacheados = await get_cached_arca_tokens(current_user.id, permitidos, session)
+    
+    # Dentro de la ventana de renovación se pide al broker (el token del cache queda como respaldo)
+    aciertos = [par for par in permitidos if par in cacheados and cacheados[par].tiempo_restante() > ticket_refresher.lead]
+    faltantes = [par for par in permitidos if par not in aciertos]
+    
+    def linea(par: Tuple[str, str], status_code: int, contenido: dict) -> str:
+        puerto_codigo, servicio_tipo = par
+        registro = {"puerto_codigo": puerto_codigo, "servicio_tipo": servicio_tipo, "status_code": status_code, **contenido}
+        return json.dumps(jsonable_encoder(registro), ensure_ascii=False) + "\n"
+    
+    async def resolver(par: Tuple[str, str]) -> Tuple[Tuple[str, str], int, dict]:
+        puerto_codigo, servicio_tipo = par
+        try:
+            # Sesión propia por par: una AsyncSession no admite operaciones concurrentes
+            async with sesion_paralela(session) as sesion_par:
+                respuesta = await solicitar_ticket_broker(servicio_tipo, puerto_codigo, cacheados.get(par), current_user, sesion_par)
+            return par, 200, respuesta.model_dump()
+        except HTTPException as e:
+            return par, e.status_code, {"status": "error", "detail": e.detail}
+        except Exception as e:
+            log_endpoint_access(f"Token {servicio_tipo} Excepción", current_user, puerto_codigo, success=False, details=str(e))
+            return par, 500, {"status": "error", "detail": {"error": str(e)}}
+    
+    async def generar():
+        tareas = [asyncio.create_task(resolver(par)) for par in faltantes]
+        try:
+            for par in denegados:
+                log_endpoint_access(f"Token {par[1]} - Acceso Denegado", current_user, par[0], success=False, details="Puerto fuera del token")
+                yield linea(par, 403, {"status": "error", "detail": f"Usuario no tiene acceso al puerto {par[0]}"})
+            for par in aciertos:
+                respuesta = respuesta_token_cacheado(cacheados[par], SERVICIOS_ARCA[par[1]]["etiqueta"], current_user, par[0])
+                yield linea(par, 200, respuesta.model_dump())
+            for tarea in asyncio.as_completed(tareas):
+                yield linea(*await tarea)
+        finally:
+            # Si el cliente corta la conexión no quedan pedidos huérfanos
+            for tarea in tareas:
+                tarea.cancel()
+    
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+
+# === LECTURAS COMPARTIDAS (COLAS, TABLERO) === #
+
+async def validar_acceso_puerto(accion: str, puerto_codigo: str, current_user: Usuario, session: AsyncSession) -> None:
+    """Valida el acceso al puerto (403)."""
+    if not await validate_user_puerto_access(current_user, puerto_codigo, session):
+        log_endpoint_access(f"{accion} - Acceso Denegado", current_user, puerto_codigo, success=False, details="Usuario sin acceso al puerto")
+        raise HTTPException(status_code=403, detail=f"Usuario no tiene acceso al puerto {puerto_codigo}")
+
+
+async def lectura_compartida(recurso: str, puerto_codigo: str, parametros: Dict[str, Any], calcular) -> Response:
+    """
+    Respuesta JSON de una lectura que no depende del usuario (utils/lecturas_compartidas.py).
+    
+    `calcular` devuelve el contenido; se serializa una vez y el cuerpo se
+    comparte entre las requests idénticas en vuelo y las del mismo tick.
+    """
+    async def cuerpo() -> bytes:
+        return JSONResponse(jsonable_encoder(await calcular())).body
+    
+    return Response(content=await lecturas_compartidas.obtener(recurso, puerto_codigo, parametros, cuerpo),
+                    media_type="application/json")
+
+
+# === COLAS DE PLAYA === #
+
+async def validar_acceso_playa(accion: str, puerto_codigo: str, current_user: Usuario, session: AsyncSession) -> None:
+    """Valida el acceso al puerto (403) y asegura las colas cargadas."""
+    await validar_acceso_puerto(accion, puerto_codigo, current_user, session)
+    await colas_playa.asegurar_cargado_async(session)
+
+
+async def registrar_llamado(camion: CamionEnCola, playa: Playa, puesto_asignado: Optional[str],
+                            current_user: Usuario, session: AsyncSession) -> bool:
+    """
+    Pasa la carta al estado de llamado por el motor de transiciones (UPDATE condicional + MovimientoSector).
+    
+    Returns:
+        False si la carta ya no estaba en la playa (otro cambio se adelantó); no escribe nada
+    """
+    resultado = await motor_transiciones.aplicar(engine_escritura(session), SolicitudTransicion(
+        hacia=playa.llamado,
+        autorizado_por=current_user.username,
+        puerto_codigo=camion.puerto_codigo,
+        carta_id=camion.carta_id,
+        clave_idempotencia=f"llamado:{camion.carta_id}:{playa.llamado.name}:{camion.desde.isoformat()}",
+        puesto_asignado=puesto_asignado
+    ))
+    return resultado.resultado == "aplicada"
+
+
+@app.get("/colas/{puerto_codigo}/{playa}")
+async def listar_cola_playa(
+    puerto_codigo: str,
+    playa: Literal["precalado", "post-calada"],
+    tipo_cereal: Optional[TipoCereal] = None,
+    calidad: Optional[CalidadCereal] = None,
+    limite: int = 100,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Camiones de una playa de espera en orden de llamado.
+    
+    Precalado: Cereal + FIFO. Post-Calada: Calidad, Cereal + FIFO. Se lee
+    de las colas en memoria (utils/colas_playa.py), sin consultar la base;
+    las requests idénticas del mismo tick comparten la respuesta.
+    """
+    await validar_acceso_puerto("Cola de Playa", puerto_codigo, current_user, session)
+    # Liberar la conexión del request mientras espera el cálculo compartido (que abre su propia sesión)
+    await session.close()
+    config = PLAYAS[playa]
+    limite = max(limite, 0)
+    
+    async def calcular():
+        # Cómputo compartido y blindado: sesión propia, no la del primer request (puede cerrarse o cancelarse)
+        async with sesion_paralela(session) as sesion_carga:
+            await colas_playa.asegurar_cargado_async(sesion_carga)
+        total, camiones = colas_playa.listar(puerto_codigo, config, tipo_cereal, calidad, limite=limite)
+        return {
+            "puerto_codigo": puerto_codigo,
+            "playa": config.nombre,
+            "sector": config.sector,
+            "total": total,
+            "camiones": [asdict(camion) for camion in camiones]
+        }
+    
+    return await lectura_compartida("colas", puerto_codigo, {"playa": playa, "tipo_cereal": tipo_cereal,
+                                                             "calidad": calidad, "limite": limite}, calcular)
+
+
+@app.post("/colas/{puerto_codigo}/{playa}/llamar")
+async def llamar_camion(
+    puerto_codigo: str,
+    playa: Literal["precalado", "post-calada"],
+    request: LlamadoCamionRequest,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Llama al próximo camión de la playa: Precalado -> En Calada, post-Calada -> En Báscula Bruto.
+    
+    El camión sale de la cola antes de escribir (dos llamados simultáneos no
+    eligen el mismo); si la escritura falla vuelve a su lugar en la fila.
+    """
+    config = PLAYAS[playa]
+    log_endpoint_access(f"Solicitud Llamado {config.nombre}", current_user, puerto_codigo)
+    await validar_acceso_playa(f"Llamado {config.nombre}", puerto_codigo, current_user, session)
+    
+    while True:
+        camion = colas_playa.sacar(puerto_codigo, config, request.tipo_cereal, request.calidad)
+        if camion is None:
+            raise HTTPException(status_code=404, detail=f"No hay camiones en espera en {config.nombre} para el filtro pedido")
+        try:
+            if await registrar_llamado(camion, config, request.puesto_asignado, current_user, session):
+                break
+        except Exception as e:
+            colas_playa.aplicar_estado(camion.carta_id, camion.patente, camion.puerto_codigo, config.estado,
+                                       camion.tipo_cereal, camion.calidad, desde=camion.desde)
+            log_endpoint_access(f"Llamado {config.nombre} Excepción", current_user, puerto_codigo, success=False, details=str(e))
+            raise HTTPException(status_code=500, detail={"error": str(e)})
+        # La carta ya había salido de la playa por otro camino: seguir con el próximo de la fila
+        logger.warning(f"Carta {camion.carta_id} ({camion.patente}) ya no estaba en {config.nombre}; se descarta de la cola")
+    
+    log_endpoint_access(f"Llamado {config.nombre}", current_user, puerto_codigo, success=True,
+                        details=f"Camión {camion.patente} -> {config.llamado.value}")
+    return {
+        "status": "success",
+        "message": f"Camión {camion.patente} llamado: {config.llamado.value}",
+        "estado_nuevo": config.llamado.name,
+        "camion": asdict(camion)
+    }
+
+
+# === TRANSICIONES DE ESTADO (ESCANEOS DE QR) === #
+
+@app.post("/transiciones")
+async def registrar_transicion(
+    request: TransicionRequest,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Escaneo de QR de un sector: mueve la carta al estado indicado y registra el MovimientoSector.
+    
+    Solo se aceptan las transiciones de utils/transiciones.py (TRANSICIONES).
+    Un escaneo repetido (misma clave de idempotencia) devuelve el resultado
+    original con `duplicada: true`. Los escaneos concurrentes se confirman
+    en lote (group commit).
+    """
+    accion = f"Transición {request.estado_nuevo.name}"
+    if not await validate_user_puerto_access(current_user, request.puerto_codigo, session):
+        log_endpoint_access(f"{accion} - Acceso Denegado", current_user, request.puerto_codigo, success=False, details="Usuario sin acceso al puerto")
+        raise HTTPException(status_code=403, detail=f"Usuario no tiene acceso al puerto {request.puerto_codigo}")
     
     try:
-        # Validar acceso del usuario al puerto
-        if not validate_user_puerto_access(current_user, puerto_codigo, session):
-            log_endpoint_access("Token FACTURACIÓN - Acceso Denegado", current_user, puerto_codigo, success=False, details="Usuario sin acceso al puerto")
-            raise HTTPException(
-                status_code=403, 
-                detail=f"Usuario no tiene acceso al puerto {puerto_codigo}"
-            )
-        
-        # Buscar token en cache
-        cached_token = get_cached_arca_token(current_user.id, puerto_codigo, "FACTURACION", session)
-        
-        if cached_token:
-            tiempo_restante = cached_token.tiempo_restante()
-            cache_info = {
-                "from_cache": True,
-                "fecha_solicitud": cached_token.fecha_solicitud.isoformat(),
-                "fecha_vencimiento": cached_token.fecha_vencimiento.isoformat(),
-                "tiempo_restante_minutos": int(tiempo_restante.total_seconds() / 60)
-            }
-            
-            response_data = {
-                "success": True,
-                "token": cached_token.token,
-                "sign": cached_token.sign,
-                "service": cached_token.servicio_nombre,
-                "wsaa_url": cached_token.wsaa_url
-            }
-            
-            log_endpoint_access("Token FACTURACIÓN - Cache Hit", current_user, puerto_codigo, success=True, 
-                             details=f"Token reutilizado, vence en {int(tiempo_restante.total_seconds() / 60)} minutos")
-            
-            return ArcaTokenResponse(
-                status="success",
-                message="Token FACTURACIÓN obtenido desde cache",
-                data=response_data,
-                cache_info=cache_info
-            )
-        
-        # Solicitar nuevo token a ARCA
-        result = get_arca_access_ticket("FACTURACION")
-        
-        if result['success']:
-            # Guardar en cache
-            nuevo_token = save_arca_token_to_cache(
-                usuario_id=current_user.id,
-                puerto_codigo=puerto_codigo,
-                servicio_tipo="FACTURACION",
-                token=result['token'],
-                sign=result['sign'],
-                wsaa_url=result.get('wsaa_url', ''),
-                servicio_nombre=result.get('service', 'wsfe'),
-                session=session
-            )
-            
-            cache_info = {
-                "from_cache": False,
-                "fecha_solicitud": nuevo_token.fecha_solicitud.isoformat(),
-                "fecha_vencimiento": nuevo_token.fecha_vencimiento.isoformat(),
-                "tiempo_restante_minutos": 480  # 8 horas
-            }
-            
-            log_endpoint_access("Token FACTURACIÓN - Nuevo Solicitado", current_user, puerto_codigo, success=True, details="Token generado y guardado en cache")
-            
-            return ArcaTokenResponse(
-                status="success",
-                message="Token FACTURACIÓN obtenido y guardado en cache",
-                data=result,
-                cache_info=cache_info
-            )
-        else:
-            log_endpoint_access("Token FACTURACIÓN Error", current_user, puerto_codigo, success=False, details=str(result))
-            raise HTTPException(status_code=500, detail=result)
-            
-    except HTTPException:
-        raise
+        resultado = await motor_transiciones.aplicar(engine_escritura(session), SolicitudTransicion(
+            hacia=request.estado_nuevo,
+            autorizado_por=current_user.username,
+            puerto_codigo=request.puerto_codigo,
+            numero_carta=request.numero_carta,
+            clave_idempotencia=request.clave_idempotencia,
+            calidad_asignada=request.calidad_asignada,
+            puesto_asignado=request.puesto_asignado,
+            inspector_asignado=request.inspector_asignado,
+            observaciones=request.observaciones
+        ))
+    except TransicionInvalida as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        log_endpoint_access(f"{accion} Excepción", current_user, request.puerto_codigo, success=False, details=str(e))
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+    
+    if resultado.resultado == "no_encontrada":
+        raise HTTPException(status_code=404, detail=f"Carta de porte {request.numero_carta} no encontrada en {request.puerto_codigo}")
+    if resultado.resultado == "rechazada":
+        log_endpoint_access(f"{accion} - Rechazada", current_user, request.puerto_codigo, success=False,
+                            details=f"{request.numero_carta} está en {resultado.estado_actual}")
+        raise HTTPException(status_code=409, detail={
+            "error": f"La carta está en {resultado.estado_actual}; {request.estado_nuevo.name} requiere {resultado.estado_anterior}",
+            "estado_actual": resultado.estado_actual
+        })
+    
+    return {
+        "status": "success",
+        "duplicada": resultado.resultado == "duplicada",
+        "transicion": asdict(resultado)
+    }
+
+
+# === ÓRDENES DE DESPACHO (OPERACIONES -> PLAYA DE CAMIONES) === #
+
+async def orden_con_acceso(accion: str, orden_id: int, current_user: Usuario, session: AsyncSession) -> ResultadoOrden:
+    """Orden con sus camiones (404) si el usuario tiene acceso a su puerto (403)."""
+    resultado = await ordenes_despacho.consultar(session, orden_id)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail=f"Orden de despacho {orden_id} no encontrada")
+    await validar_acceso_puerto(accion, resultado.orden["puerto_codigo"], current_user, session)
+    return resultado
+
+
+@app.post("/despachos")
+async def crear_orden_despacho(
+    request: OrdenDespachoRequest,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Orden de Operaciones a la Playa de Camiones: reserva los N camiones más antiguos del cereal (y exportador).
+    
+    La reserva es una sola sentencia (utils/despachos.py): dos órdenes
+    simultáneas nunca reservan el mismo camión. Si no alcanzan los camiones
+    la orden queda Pendiente con los que haya. Un pedido repetido (misma
+    clave de idempotencia) devuelve la orden original con `duplicada: true`.
+    """
+    accion = "Orden de Despacho"
+    log_endpoint_access(f"Solicitud {accion}", current_user, request.puerto_codigo)
+    await validar_acceso_puerto(accion, request.puerto_codigo, current_user, session)
+    
+    try:
+        resultado = await ordenes_despacho.crear(
+            engine_escritura(session), request.puerto_codigo, request.tipo_cereal, request.cantidad,
+            current_user.username, cuit_destino=request.cuit_destino, clave_idempotencia=request.clave_idempotencia
+        )
+    except Exception as e:
+        log_endpoint_access(f"{accion} Excepción", current_user, request.puerto_codigo, success=False, details=str(e))
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+    
+    log_endpoint_access(accion, current_user, request.puerto_codigo, success=True,
+                        details=f"Orden {resultado.orden['id']}: {resultado.orden['asignados']}/{resultado.orden['cantidad']} "
+                                f"camiones de {request.tipo_cereal.value}")
+    return {"status": "success", **asdict(resultado)}
+
+
+@app.get("/despachos")
+async def listar_ordenes_despacho(
+    puerto_codigo: str,
+    estado: Optional[List[EstadoOrdenDespacho]] = Query(default=None),
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Órdenes del puerto, las más antiguas primero (por defecto las abiertas: Pendiente y Asignada)."""
+    await validar_acceso_puerto("Órdenes de Despacho", puerto_codigo, current_user, session)
+    ordenes = await ordenes_despacho.listar(session, puerto_codigo, estado or ESTADOS_ABIERTOS)
+    return {"puerto_codigo": puerto_codigo, "total": len(ordenes), "ordenes": ordenes}
+
+
+@app.get("/despachos/{orden_id}")
+async def consultar_orden_despacho(
+    orden_id: int,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Orden con su avance (asignados, despachados, ingresados) y el estado actual de cada camión."""
+    return asdict(await orden_con_acceso("Orden de Despacho", orden_id, current_user, session))
+
+
+@app.post("/despachos/{orden_id}/asignar")
+async def asignar_orden_despacho(
+    orden_id: int,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Completa una orden Pendiente con los camiones que llegaron a la playa después del pedido."""
+    orden = (await orden_con_acceso("Asignar Orden de Despacho", orden_id, current_user, session)).orden
+    resultado = await ordenes_despacho.asignar(engine_escritura(session), orden_id)
+    if resultado is None:
+        raise HTTPException(status_code=409, detail={"error": f"La orden {orden_id} no está pendiente",
+                                                     "estado": orden["estado"]})
+    return {"status": "success", **asdict(resultado)}
+
+
+@app.post("/despachos/{orden_id}/despachar")
+async def despachar_orden(
+    orden_id: int,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    La Playa marca En Viaje, en bloque, los camiones reservados de la orden.
+    
+    Una transacción para todos (utils/transiciones.py, despachar_orden); cada
+    camión queda con su MovimientoSector y cuenta como despachado en la orden.
+    """
+    accion = "Despacho de Orden"
+    orden = (await orden_con_acceso(accion, orden_id, current_user, session)).orden
+    if orden["estado"] == EstadoOrdenDespacho.CANCELADA.name:
+        raise HTTPException(status_code=409, detail={"error": f"La orden {orden_id} está cancelada", "estado": orden["estado"]})
+    
+    try:
+        despachados = await motor_transiciones.despachar_orden(engine_escritura(session), orden_id, current_user.username)
     except Exception as e:
-        log_endpoint_access("Token FACTURACIÓN Excepción", current_user, puerto_codigo, success=False, details=str(e))
+        log_endpoint_access(f"{accion} Excepción", current_user, orden["puerto_codigo"], success=False, details=str(e))
         raise HTTPException(status_code=500, detail={"error": str(e)})
+    
+    log_endpoint_access(accion, current_user, orden["puerto_codigo"], success=True,
+                        details=f"Orden {orden_id}: {len(despachados)} camiones En Viaje")
+    resultado = await ordenes_despacho.consultar(session, orden_id)
+    return {"status": "success", "despachados": len(despachados), **asdict(resultado)}
+
+
+@app.post("/despachos/{orden_id}/cancelar")
+async def cancelar_orden_despacho(
+    orden_id: int,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Cancela una orden abierta; sus camiones que siguen en la playa quedan libres para otras órdenes."""
+    orden = (await orden_con_acceso("Cancelar Orden de Despacho", orden_id, current_user, session)).orden
+    resultado = await ordenes_despacho.cancelar(engine_escritura(session), orden_id)
+    if resultado is None:
+        raise HTTPException(status_code=409, detail={"error": f"La orden {orden_id} ya no está abierta",
+                                                     "estado": orden["estado"]})
+    log_endpoint_access("Cancelar Orden de Despacho", current_user, orden["puerto_codigo"], success=True,
+                        details=f"Orden {orden_id} cancelada")
+    return {"status": "success", **asdict(resultado)}
+
+
+# === TABLERO DE OPERACIONES === #
+
+@app.get("/tablero/{puerto_codigo}")
+async def tablero_circuito(
+    puerto_codigo: str,
+    tipo_cereal: Optional[TipoCereal] = None,
+    calidad: Optional[CalidadCereal] = None,
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Camiones del puerto en cada estado del circuito (En Playa ... Salido).
+    
+    Se lee del espejo en memoria de los contadores (utils/contadores_circuito.py),
+    que las transiciones mantienen en la misma transacción: no recorre las
+    cartas de la temporada. Las requests idénticas del mismo tick comparten la respuesta.
+    """
+    await validar_acceso_puerto("Tablero", puerto_codigo, current_user, session)
+    # Liberar la conexión del request mientras espera el cálculo compartido (que abre su propia sesión)
+    await session.close()
+    
+    async def calcular():
+        # Cómputo compartido y blindado: sesión propia, no la del primer request (puede cerrarse o cancelarse)
+        async with sesion_paralela(session) as sesion_carga:
+            await contadores_circuito.asegurar_cargado_async(sesion_carga)
+        cantidades = contadores_circuito.tablero(puerto_codigo, tipo_cereal, calidad)
+        return {
+            "puerto_codigo": puerto_codigo,
+            "total": sum(cantidades.values()),
+            "estados": [
+                {"estado": estado.name, "descripcion": estado.value, "sector": SECTOR_POR_ESTADO[estado],
+                 "cantidad": cantidades[estado.name]}
+                for estado in CIRCUITO
+            ]
+        }
+    
+    return await lectura_compartida("tablero", puerto_codigo, {"tipo_cereal": tipo_cereal, "calidad": calidad}, calcular)
+
+
+# === EVENTOS DEL CIRCUITO (SSE) === #
+
+@app.get("/eventos/{puerto_codigo}")
+async def eventos_circuito(
+    puerto_codigo: str,
+    sectores: Optional[List[int]] = Query(default=None, description="Sectores a seguir (ej: 4 Precalado, 6 post-Calada); todos si se omite"),
+    current_user: Usuario = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Stream SSE de los cambios de estado del puerto (utils/canal_circuito.py).
+    
+    Primero un evento `estado` con los contadores actuales; después un evento
+    `diff` por tick con las cartas que entraron o salieron de los sectores
+    pedidos y el delta de los contadores. Un evento `resync` cierra el
+    stream (consumidor lento o apagado): releer /colas y /tablero y reconectar.
+    """
+    await validar_acceso_puerto("Eventos", puerto_codigo, current_user, session)
+    desconocidos = set(sectores or ()) - set(SECTOR_POR_ESTADO.values())
+    if desconocidos:
+        raise HTTPException(status_code=422, detail=f"Sectores desconocidos: {sorted(desconocidos)}")
+    await contadores_circuito.asegurar_cargado_async(session)
+    # El stream puede durar horas: la conexión de la sesión vuelve al pool ya
+    await session.close()
+    
+    suscripcion = canal_circuito.suscribir(puerto_codigo, sectores)
+    contadores = contadores_circuito.tablero(puerto_codigo)
+    inicial = frame_sse("estado", {
+        "puerto_codigo": puerto_codigo,
+        "sectores": sorted(suscripcion.sectores) if suscripcion.sectores else None,
+        "contadores": {estado.name: contadores[estado.name] for estado in CIRCUITO
+                       if suscripcion.sectores is None or SECTOR_POR_ESTADO[estado] in suscripcion.sectores},
+    })
+    log_endpoint_access("Suscripción Eventos", current_user, puerto_codigo, details=f"sectores: {sectores or 'todos'}")
+    
+    async def generar():
+        try:
+            yield inicial
+            while True:
+                frames = await suscripcion.siguiente()
+                if frames is None:
+                    break
+                yield frames
+        finally:
+            # Cliente desconectado, resync o apagado
+            canal_circuito.cancelar(suscripcion)
+    
+    return StreamingResponse(generar(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.get("/health")
@@ -680,6 +1291,39 @@ async def health_check(current_user: Usuario = Depends(get_current_user)):
     }
 
 
+@app.get("/cache-stats")
+async def cache_stats(current_user: Usuario = Depends(get_current_user)):
+    """Estadísticas de los caches de tickets ARCA (L1, broker, renovación) y de autenticación."""
+    log_endpoint_access("Cache Stats", current_user)
+
+    return {
+        "arca_tokens_l1": arca_token_l1.stats(),
+        "arca_tokens_purga": purga_tokens_arca.stats(),
+        "colas_playa": colas_playa.stats(),
+        "contadores_circuito": contadores_circuito.stats(),
+        "canal_circuito": canal_circuito.stats(),
+        "lecturas_compartidas": lecturas_compartidas.stats(),
+        "transiciones": motor_transiciones.stats(),
+        "despachos": ordenes_despacho.stats(),
+        "ticket_broker": {
+            "tickets": len(ticket_broker.entries()),
+            "wsaa_calls": ticket_broker.wsaa_calls
+        },
+        "ticket_refresher": {
+            "renovaciones": ticket_refresher.renovaciones,
+            "fallos": ticket_refresher.fallos
+        },
+        "wsaa_guard": ticket_broker.guard.stats() if ticket_broker.guard else None,
+        "auth": {
+            "jwt_memo": jwt_memo.stats(),
+            "principales": principal_cache.stats(),
+            "acl_puertos": acl_index.stats(),
+            "login_write_behind": acceso_write_behind.stats()
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
 @app.get("/diagnose-certs")
 async def diagnose_certificates(current_user: Usuario = Depends(get_current_user)):
     """
@@ -704,29 +1348,36 @@ async def diagnose_certificates(current_user: Usuario = Depends(get_current_user
     
     for service in services:
         try:
-            # Obtener configuración del servicio
-            from Arca.wsaa import _get_service_config
-            config = _get_service_config(service, "")
-            
-            service_diag = {
-                "service_name": config.service_name,
-                "cert_file": config.cert_file,
-                "key_file": config.key_file,
-                "wsaa_url": config.wsaa_url,
-                "cert_exists": os.path.exists(config.cert_file),
-                "key_exists": os.path.exists(config.key_file),
-                "cert_size": os.path.getsize(config.cert_file) if os.path.exists(config.cert_file) else 0,
-                "key_size": os.path.getsize(config.key_file) if os.path.exists(config.key_file) else 0
-            }
-            
-            # Probar carga de certificados
+            # Credenciales ya parseadas del registro (solo se lee disco si cambiaron)
             try:
-                config.validate_certificates()
-                service_diag["validation"] = "success"
+                cred = credentials_registry.get(service, "")
             except Exception as e:
-                service_diag["validation"] = f"error: {e}"
+                config = _get_service_config(service, "")
+                diagnostics["services"][service] = {
+                    "service_name": config.service_name,
+                    "cert_file": config.cert_file,
+                    "key_file": config.key_file,
+                    "wsaa_url": config.wsaa_url,
+                    "cert_exists": os.path.exists(config.cert_file),
+                    "key_exists": os.path.exists(config.key_file),
+                    "validation": f"error: {e}"
+                }
+                continue
             
-            diagnostics["services"][service] = service_diag
+            diagnostics["services"][service] = {
+                "service_name": cred.service_name,
+                "cert_file": cred.cert_file,
+                "key_file": cred.key_file,
+                "wsaa_url": cred.wsaa_url,
+                "cert_exists": True,
+                "key_exists": True,
+                "cert_size": cred.cert_size,
+                "key_size": cred.key_size,
+                "fingerprint_sha256": cred.fingerprint,
+                "cert_not_after": cred.not_after.isoformat(),
+                "cert_dias_restantes": cred.dias_restantes(),
+                "validation": "success"
+            }
             
         except Exception as e:
             diagnostics["services"][service] = {"error": str(e)}
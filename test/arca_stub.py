@@ -0,0 +1,402 @@
+"""
+Servidor local que simula WSAA (LoginCms), WSCPE y WSFE de ARCA/AFIP para pruebas y benchmarks.
+
+Expone el WSDL de LoginCms y responde loginCms con un loginTicketResponse
+(token, sign, generationTime y expirationTime) sin salir a los hosts de AFIP.
+Cuenta las llamadas recibidas para que las pruebas puedan verificar cuántas
+veces se llamó a WSAA, y permite inyectar fallas (HTTP 503, SOAP fault,
+"ya posee un TA válido" o respuestas más lentas que el timeout del cliente),
+una tasa de errores aleatoria y el rechazo real de WSAA a un segundo TA
+mientras el anterior sigue vigente (ta_unico).
+
+WSCPE y WSFE responden sus operaciones dummy y validan que el Token
+recibido haya sido emitido por este stub.
+
+Uso desde código:
+    with ArcaStub(latencia=0.05, ta_unico=True) as stub:
+        os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+        stub.inyectar_falla("http503", cantidad=3)
+
+Uso standalone:
+    python test/arca_stub.py --puerto 8099 --latencia 0.2 --tasa-error 0.05 --ta-unico
+"""
+
+import re
+import uuid
+import time
+import base64
+import random
+import argparse
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+WSAA_PATH = "/ws/services/LoginCms"
+WSAA_NAMESPACE = "http://wsaa.view.sua.dvadac.desein.afip.gov"
+WSCPE_PATH = "/wscpe/services/soap"
+WSFE_PATH = "/wsfev1/service.asmx"
+
+LOGIN_CMS_WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions targetNamespace="{ns}"
+    xmlns:impl="{ns}"
+    xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:wsdlsoap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <wsdl:types>
+    <schema elementFormDefault="qualified" targetNamespace="{ns}" xmlns="http://www.w3.org/2001/XMLSchema">
+      <element name="loginCms">
+        <complexType><sequence><element name="in0" type="xsd:string"/></sequence></complexType>
+      </element>
+      <element name="loginCmsResponse">
+        <complexType><sequence><element name="loginCmsReturn" type="xsd:string"/></sequence></complexType>
+      </element>
+    </schema>
+  </wsdl:types>
+  <wsdl:message name="loginCmsRequest"><wsdl:part element="impl:loginCms" name="parameters"/></wsdl:message>
+  <wsdl:message name="loginCmsResponse"><wsdl:part element="impl:loginCmsResponse" name="parameters"/></wsdl:message>
+  <wsdl:portType name="LoginCMS">
+    <wsdl:operation name="loginCms">
+      <wsdl:input message="impl:loginCmsRequest" name="loginCmsRequest"/>
+      <wsdl:output message="impl:loginCmsResponse" name="loginCmsResponse"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="LoginCmsSoapBinding" type="impl:LoginCMS">
+    <wsdlsoap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="loginCms">
+      <wsdlsoap:operation soapAction=""/>
+      <wsdl:input name="loginCmsRequest"><wsdlsoap:body use="literal"/></wsdl:input>
+      <wsdl:output name="loginCmsResponse"><wsdlsoap:body use="literal"/></wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="LoginCMSService">
+    <wsdl:port binding="impl:LoginCmsSoapBinding" name="LoginCms">
+      <wsdlsoap:address location="{location}"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+SOAP_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body>
+    <loginCmsResponse xmlns="{ns}">
+      <loginCmsReturn>{ticket}</loginCmsReturn>
+    </loginCmsResponse>
+  </soapenv:Body>
+</soapenv:Envelope>
+"""
+
+SOAP_FAULT = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body>
+    <soapenv:Fault>
+      <faultcode>{code}</faultcode>
+      <faultstring>{mensaje}</faultstring>
+    </soapenv:Fault>
+  </soapenv:Body>
+</soapenv:Envelope>
+"""
+
+# Respuestas de las operaciones dummy (estado de los servidores de AFIP)
+WSCPE_DUMMY_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+  <soapenv:Body>
+    <dummyResponse xmlns="https://serviciosjava.afip.gob.ar/wscpe/">
+      <respuesta><appserver>OK</appserver><authserver>OK</authserver><dbserver>OK</dbserver></respuesta>
+    </dummyResponse>
+  </soapenv:Body>
+</soapenv:Envelope>
+"""
+
+WSFE_DUMMY_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <FEDummyResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+      <FEDummyResult><AppServer>OK</AppServer><DbServer>OK</DbServer><AuthServer>OK</AuthServer></FEDummyResult>
+    </FEDummyResponse>
+  </soap:Body>
+</soap:Envelope>
+"""
+
+# Tipos de falla inyectables: (status HTTP, faultcode, faultstring)
+FALLAS = {
+    "http503": (503, None, None),
+    "fault": (500, "ns1:cms.bad", "Error interno simulado de WSAA"),
+    "ta_vigente": (500, "ns1:coe.alreadyAuthenticated", "El CEE ya posee un TA valido para el acceso al WSN solicitado"),
+    "lento": None,  # Responde bien, pero después de demora_falla segundos
+}
+
+TICKET_RESPONSE = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<loginTicketResponse version="1.0"><header>'
+    '<source>CN=wsaahomo, O=AFIP, C=AR, SERIALNUMBER=CUIT 33693450239</source>'
+    '<destination>SERIALNUMBER=CUIT 20123456789, CN=logigrain</destination>'
+    '<uniqueId>{unique_id}</uniqueId>'
+    '<generationTime>{generation}</generationTime>'
+    '<expirationTime>{expiration}</expirationTime>'
+    '</header><credentials><token>{token}</token><sign>{sign}</sign></credentials>'
+    '</loginTicketResponse>'
+)
+
+
+class _WsaaHandler(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 (keep-alive) del stub."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Evita la demora de ~40ms de Nagle + delayed ACK
+
+    def log_message(self, format, *args):
+        pass  # Silencioso: las pruebas imprimen sus propios resultados
+
+    def _responder(self, status: int, cuerpo: str, content_type: str = "text/xml; charset=utf-8"):
+        datos = cuerpo.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        stub = self.server.stub
+        if self.path.startswith(WSAA_PATH):
+            stub.wsdl_requests += 1
+            location = f"{stub.base_url}{WSAA_PATH}"
+            self._responder(200, LOGIN_CMS_WSDL.format(ns=WSAA_NAMESPACE, location=location))
+        else:
+            self._responder(404, "not found", "text/plain")
+
+    def do_POST(self):
+        stub = self.server.stub
+        largo = int(self.headers.get("Content-Length", 0))
+        cuerpo = self.rfile.read(largo).decode("utf-8", errors="replace")
+
+        if self.path.startswith((WSCPE_PATH, WSFE_PATH)):
+            self._servicio_negocio(stub, cuerpo)
+            return
+        if not self.path.startswith(WSAA_PATH):
+            self._responder(404, "not found", "text/plain")
+            return
+
+        stub.registrar_llamada()
+        if stub.latencia:
+            time.sleep(stub.latencia)
+
+        falla = stub.tomar_falla()
+        if falla is None and stub.tasa_error and stub.sortear_error():
+            falla = "http503"
+        if falla == "lento":
+            time.sleep(stub.demora_falla)
+        elif falla == "http503":
+            self._responder(503, "Service Unavailable", "text/plain")
+            return
+        elif falla:
+            status, code, mensaje = FALLAS[falla]
+            self._responder(status, SOAP_FAULT.format(code=code, mensaje=mensaje))
+            return
+
+        servicio = stub.servicio_solicitado(cuerpo)
+        if not stub.emitir_ta(servicio):
+            status, code, mensaje = FALLAS["ta_vigente"]
+            self._responder(status, SOAP_FAULT.format(code=code, mensaje=mensaje))
+            return
+
+        self._responder(200, stub.login_cms(cuerpo))
+
+    def _servicio_negocio(self, stub, cuerpo: str):
+        """WSCPE / WSFE: operación dummy; si viene Token debe ser uno emitido por el stub."""
+        servicio = "wscpe" if self.path.startswith(WSCPE_PATH) else "wsfe"
+        stub.registrar_llamada_servicio(servicio)
+        if stub.latencia:
+            time.sleep(stub.latencia)
+
+        token = re.search(r"<(?:\w+:)?[Tt]oken>([^<]+)</(?:\w+:)?[Tt]oken>", cuerpo)
+        if token and not stub.token_valido(token.group(1)):
+            self._responder(500, SOAP_FAULT.format(code="soap:Client", mensaje="Token invalido o vencido"))
+            return
+
+        self._responder(200, WSCPE_DUMMY_RESPONSE if servicio == "wscpe" else WSFE_DUMMY_RESPONSE)
+
+
+class ArcaStub:
+    """
+    Stand-in local de WSAA.
+
+    Args:
+        latencia: Segundos de demora por cada llamada SOAP
+        vigencia_horas: Horas entre generationTime y expirationTime del ticket
+        puerto: Puerto TCP (0 = asignado por el sistema)
+        tasa_error: Probabilidad (0 a 1) de que un loginCms responda HTTP 503
+        ta_unico: Rechazar con "ya posee un TA válido" un loginCms para un servicio
+                  que ya tiene un ticket vigente (comportamiento real de WSAA)
+        semilla: Semilla del sorteo de errores, para corridas reproducibles
+    """
+
+    def __init__(self, latencia: float = 0.0, vigencia_horas: float = 12, puerto: int = 0,
+                 tasa_error: float = 0.0, ta_unico: bool = False, semilla: int = None):
+        self.latencia = latencia
+        self.vigencia_horas = vigencia_horas
+        self.tasa_error = tasa_error
+        self.ta_unico = ta_unico
+        self.login_calls = 0
+        self.wsdl_requests = 0
+        self.service_calls = {"wscpe": 0, "wsfe": 0}
+        self.ta_rechazados = 0
+        self._random = random.Random(semilla)
+        self._vencimientos = {}  # servicio -> vencimiento del último TA emitido
+        self._tokens = {}  # token -> vencimiento
+        self.falla = None
+        self.fallas_restantes = None
+        self.demora_falla = 5.0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", puerto), _WsaaHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, puerto = self._server.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    @property
+    def wsaa_wsdl_url(self) -> str:
+        return f"{self.base_url}{WSAA_PATH}?WSDL"
+
+    @property
+    def wscpe_url(self) -> str:
+        return f"{self.base_url}{WSCPE_PATH}"
+
+    @property
+    def wsfe_url(self) -> str:
+        return f"{self.base_url}{WSFE_PATH}"
+
+    def registrar_llamada(self) -> None:
+        with self._lock:
+            self.login_calls += 1
+
+    def registrar_llamada_servicio(self, servicio: str) -> None:
+        with self._lock:
+            self.service_calls[servicio] += 1
+
+    def sortear_error(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.tasa_error
+
+    def emitir_ta(self, servicio: str) -> bool:
+        """Con ta_unico, False si el servicio ya tiene un TA vigente."""
+        if not self.ta_unico:
+            return True
+        with self._lock:
+            vencimiento = self._vencimientos.get(servicio)
+            if vencimiento and vencimiento > time.time():
+                self.ta_rechazados += 1
+                return False
+            self._vencimientos[servicio] = time.time() + self.vigencia_horas * 3600
+            return True
+
+    def token_valido(self, token: str) -> bool:
+        with self._lock:
+            vencimiento = self._tokens.get(token)
+        return vencimiento is not None and vencimiento > time.time()
+
+    def inyectar_falla(self, tipo: str, cantidad: int = None, demora: float = 5.0) -> None:
+        """
+        Hace fallar los próximos loginCms.
+
+        Args:
+            tipo: Una de FALLAS ('http503', 'fault', 'ta_vigente', 'lento')
+            cantidad: Cantidad de llamadas que fallan (None = hasta limpiar_fallas)
+            demora: Segundos de demora para 'lento'
+        """
+        if tipo not in FALLAS:
+            raise ValueError(f"Falla desconocida: {tipo}. Opciones: {', '.join(FALLAS)}")
+        with self._lock:
+            self.falla = tipo
+            self.fallas_restantes = cantidad
+            self.demora_falla = demora
+
+    def limpiar_fallas(self) -> None:
+        with self._lock:
+            self.falla = None
+            self.fallas_restantes = None
+
+    def tomar_falla(self):
+        """Falla a aplicar en esta llamada (descuenta la cantidad restante)."""
+        with self._lock:
+            if self.falla is None:
+                return None
+            falla = self.falla
+            if self.fallas_restantes is not None:
+                self.fallas_restantes -= 1
+                if self.fallas_restantes <= 0:
+                    self.falla = None
+                    self.fallas_restantes = None
+            return falla
+
+    def servicio_solicitado(self, soap_request: str) -> str:
+        """Servicio del TRA embebido en el CMS del loginCms (wscpe si no se puede leer)."""
+        match = re.search(r"<(?:\w+:)?in0>([^<]+)</(?:\w+:)?in0>", soap_request)
+        if match:
+            # El TRA va embebido sin cifrar dentro del CMS (SignedData -nodetach)
+            cms = base64.b64decode(match.group(1))
+            servicio_match = re.search(rb"<service>([^<]+)</service>", cms)
+            if servicio_match:
+                return servicio_match.group(1).decode()
+        return "wscpe"
+
+    def login_cms(self, soap_request: str) -> str:
+        """Arma la respuesta SOAP de loginCms para el CMS recibido."""
+        servicio = self.servicio_solicitado(soap_request)
+
+        tz = datetime.timezone(datetime.timedelta(hours=-3))
+        ahora = datetime.datetime.now(tz).replace(microsecond=0)
+        token = base64.b64encode(f"stub-token-{servicio}-{uuid.uuid4()}".encode()).decode()
+        with self._lock:
+            self._tokens[token] = time.time() + self.vigencia_horas * 3600
+        ticket = TICKET_RESPONSE.format(
+            unique_id=uuid.uuid4().int % 10**10,
+            generation=ahora.isoformat(),
+            expiration=(ahora + datetime.timedelta(hours=self.vigencia_horas)).isoformat(),
+            token=token,
+            sign=base64.b64encode(uuid.uuid4().bytes).decode(),
+        )
+        return SOAP_RESPONSE.format(ns=WSAA_NAMESPACE, ticket=escape(ticket))
+
+    def start(self) -> "ArcaStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de WSAA/WSCPE/WSFE")
+    parser.add_argument("puerto_posicional", nargs="?", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--puerto", type=int, default=8099, help="Puerto TCP (default: 8099)")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de demora por llamada SOAP")
+    parser.add_argument("--vigencia-horas", type=float, default=12, help="Vigencia de los tickets emitidos")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de HTTP 503 en loginCms (0 a 1)")
+    parser.add_argument("--ta-unico", action="store_true", help='Rechazar un segundo TA vigente ("ya posee un TA válido")')
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla del sorteo de errores")
+    args = parser.parse_args()
+
+    stub = ArcaStub(latencia=args.latencia, vigencia_horas=args.vigencia_horas,
+                    puerto=args.puerto_posicional or args.puerto, tasa_error=args.tasa_error,
+                    ta_unico=args.ta_unico, semilla=args.semilla)
+    print(f"🧪 Stub WSAA escuchando en {stub.wsaa_wsdl_url}")
+    print(f"   Configurar: ARCA_WSAA_URL_HOMO={stub.wsaa_wsdl_url}")
+    print(f"   WSCPE: {stub.wscpe_url} | WSFE: {stub.wsfe_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,112 @@
+"""
+Benchmark de validación de acceso usuario/puerto: join por request vs índice en memoria.
+
+Crea una base SQLite temporal con miles de usuarios y decenas de puertos,
+y compara la consulta UsuarioPuerto/Puerto que se hacía en cada request
+(validate_user_puerto_access y /login) contra utils/acl_index.py.
+
+Uso:
+    python test/bench_acl_puertos.py [--usuarios 5000] [--puertos 48] [--por-usuario 4]
+"""
+
+import sys
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.arca_tokens import ArcaToken  # noqa: F401 - registra la relación Usuario.arca_tokens
+from utils.acl_index import PuertoAclIndex
+
+
+def preparar_base(path: Path, usuarios: int, puertos: int, por_usuario: int, azar: random.Random):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conexion:
+        conexion.execute(Puerto.__table__.insert(), [
+            {"id": i, "nombre": f"Puerto {i}", "codigo": f"P{i:03d}", "habilitado": i % 10 != 0}
+            for i in range(1, puertos + 1)
+        ])
+        conexion.execute(Usuario.__table__.insert(), [
+            {"id": i, "username": f"u{i}", "password_hash": "x", "nombre_completo": f"Usuario {i}",
+             "email": f"u{i}@x", "habilitado": True, "es_admin": False}
+            for i in range(1, usuarios + 1)
+        ])
+        conexion.execute(UsuarioPuerto.__table__.insert(), [
+            {"usuario_id": u, "puerto_id": p, "habilitado": True}
+            for u in range(1, usuarios + 1)
+            for p in azar.sample(range(1, puertos + 1), por_usuario)
+        ])
+    return engine
+
+
+def acceso_por_join(session: Session, usuario_id: int, codigo: str) -> bool:
+    """Consulta que hacía validate_user_puerto_access en cada request."""
+    statement = select(UsuarioPuerto, Puerto).join(Puerto).where(
+        UsuarioPuerto.usuario_id == usuario_id,
+        Puerto.codigo == codigo,
+        UsuarioPuerto.habilitado == True,
+        Puerto.habilitado == True
+    )
+    return session.exec(statement).first() is not None
+
+
+def medir(nombre, funcion, consultas):
+    inicio = time.perf_counter()
+    resultados = [funcion(u, c) for u, c in consultas]
+    transcurrido = time.perf_counter() - inicio
+    print(f"  {nombre:<28} {len(consultas) / transcurrido:>12,.0f} validaciones/s | "
+          f"{transcurrido / len(consultas) * 1e6:8.2f} µs c/u")
+    return transcurrido, resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de acceso a puertos")
+    parser.add_argument("--usuarios", type=int, default=5000)
+    parser.add_argument("--puertos", type=int, default=48)
+    parser.add_argument("--por-usuario", type=int, default=4, help="Puertos asignados a cada usuario")
+    parser.add_argument("--validaciones", type=int, default=20000)
+    args = parser.parse_args()
+    logging.getLogger('main').setLevel(logging.WARNING)
+
+    azar = random.Random(1)
+    directorio = Path(tempfile.mkdtemp(prefix="bench_acl_"))
+    try:
+        engine = preparar_base(directorio / "acl.db", args.usuarios, args.puertos, args.por_usuario, azar)
+        consultas = [(azar.randint(1, args.usuarios), f"P{azar.randint(1, args.puertos):03d}")
+                     for _ in range(args.validaciones)]
+
+        print("=== BENCHMARK ÍNDICE DE ACCESO A PUERTOS ===")
+        print(f"  {args.usuarios} usuarios | {args.puertos} puertos | {args.por_usuario} puertos por usuario")
+        print()
+
+        indice = PuertoAclIndex()
+        with Session(engine) as session:
+            inicio = time.perf_counter()
+            indice.cargar(session)
+            print(f"  Carga del índice: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+            tiempo_join, por_join = medir("join UsuarioPuerto/Puerto",
+                                          lambda u, c: acceso_por_join(session, u, c), consultas)
+        tiempo_indice, por_indice = medir("índice en memoria", indice.tiene_acceso, consultas)
+
+        assert por_join == por_indice, "El índice no coincide con la consulta"
+        print()
+        print(f"  Resultados idénticos en {len(consultas)} validaciones ({sum(por_indice)} con acceso)")
+        print(f"🎯 Mejora: x{tiempo_join / tiempo_indice:,.0f}")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
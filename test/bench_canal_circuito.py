@@ -0,0 +1,248 @@
+"""
+Benchmark del canal de eventos: N pantallas suscriptas por SSE a un solo worker.
+
+Levanta la API en uvicorn (un worker, lifespan completo) sobre una base
+temporal con camiones en la Playa de Camiones, abre N streams
+/eventos/TRP1 (un tercio sigue Precalado, un tercio post-Calada y el resto
+todos los sectores) y, con todos conectados, hace avanzar camiones por
+el circuito con POST /transiciones. Al final el canal se cierra (`resync`)
+y cada pantalla compara los contadores que reconstruyó (estado inicial +
+diffs) con el tablero final.
+
+Reporta tiempo de conexión, transiciones/s, diffs emitidos, frames
+serializados vs entregados, CPU del worker (getrusage del proceso que
+corre uvicorn), demora de entrega (desde que el diff se
+serializa hasta que la pantalla lo lee) y pantallas descartadas por lentas.
+Las pantallas y los escaneos corren en otro proceso (no comparten el GIL
+con el worker); en una máquina de un solo núcleo igual compiten por la CPU
+y la demora incluye su costo de parseo.
+
+Uso:
+    python test/bench_canal_circuito.py [--suscriptores 1000] [--camiones 300] [--concurrencia 50]
+                                        [--perfil DEV|PROD] [--tick-ms 100]
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+import argparse
+import tempfile
+import resource
+import multiprocessing
+import statistics
+from collections import Counter
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+import httpx
+from sqlmodel import SQLModel, Session
+
+from bench_carga_arca import puerto_libre, levantar_api
+from utilidades_prueba import configurar_certificados_entorno
+
+# Sectores que sigue cada tercio de las pantallas (None: todos)
+FILTROS = ([4], [6], None)
+POR_CLIENTE = 50
+RECORRIDO = ("En Viaje", "Ingresado", "En Calada", "Post Calada", "En Balanza Bruto")
+
+
+def percentil(valores, p):
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1]
+
+
+def preparar_base(path: Path, camiones: int):
+    """Base temporal con el puerto TRP1, un usuario con acceso y N camiones en la Playa de Camiones."""
+    from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+    from Modelos.carta_porte import CartaPorteElectronica, EstadoCamion, TipoCereal
+    from utils.database import crear_engine
+    from utils.migraciones import aplicar_migraciones
+
+    engine = crear_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        usuario = Usuario(username="pantallas", nombre_completo="Pantallas de sector", email="pantallas@logigrain.local")
+        usuario.set_password("bench")
+        session.add_all([usuario, Puerto(nombre="Puerto TRP1", codigo="TRP1")])
+        session.flush()
+        session.add(UsuarioPuerto(usuario_id=usuario.id, puerto_id=1))
+        session.commit()
+        usuario_id = usuario.id
+    with engine.begin() as conexion:
+        conexion.execute(CartaPorteElectronica.__table__.insert(), [
+            {"id": i, "numero_carta": f"CPE-{i}", "puerto_codigo": "TRP1", "cuit_origen": "20111111112",
+             "cuit_destino": "30222222223", "tipo_cereal": TipoCereal.SOJA, "peso_declarado": 30000,
+             "patente": f"AB{i:05d}", "chofer_cuit": "20333333334", "empresa_transporte": "Transportes",
+             "estado_actual": EstadoCamion.EN_PLAYA, "validado_arca": False}
+            for i in range(1, camiones + 1)
+        ])
+    # Después de la carga: la migración de los contadores del tablero los arma desde las cartas
+    aplicar_migraciones(engine)
+    return engine, usuario_id
+
+
+async def pantalla(cliente, headers, sectores, conectadas: asyncio.Event, estado: dict):
+    """Un stream SSE: reconstruye los contadores y mide la demora de cada diff."""
+    inicio = time.perf_counter()
+    params = {"sectores": sectores} if sectores else None
+    contadores = Counter()
+    demoras = []
+    evento = None
+    try:
+        async with cliente.stream("GET", "/eventos/TRP1", params=params, headers=headers) as respuesta:
+            respuesta.raise_for_status()
+            async for linea in respuesta.aiter_lines():
+                if linea.startswith("event: "):
+                    evento = linea[7:]
+                elif linea.startswith("data: "):
+                    datos = json.loads(linea[6:])
+                    if evento == "estado":
+                        estado["conexion"].append(time.perf_counter() - inicio)
+                        contadores.update(datos["contadores"])
+                        if len(estado["conexion"]) == estado["total"]:
+                            conectadas.set()
+                    elif evento == "diff":
+                        demoras.append(time.time() - datos["enviado"])
+                        contadores.update(datos["contadores"])
+                    elif evento == "resync":
+                        estado["resync"][datos["motivo"]] += 1
+    except httpx.HTTPError as e:
+        estado["errores"][type(e).__name__] += 1
+    return sectores, +contadores, demoras
+
+
+async def carga(base_url: str, token: str, suscriptores: int, camiones: int, concurrencia: int, fin_carga):
+    headers = {"Authorization": f"Bearer {token}"}
+    estado = {"total": suscriptores, "conexion": [], "resync": Counter(), "errores": Counter()}
+    conectadas = asyncio.Event()
+    # Un pool de httpx recorre sus conexiones en cada request: las pantallas se reparten
+    # en clientes chicos y los escaneos van por otro, así el cliente no es el cuello de botella
+    timeout = httpx.Timeout(60, read=None)
+    clientes = [httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=httpx.Limits(max_connections=POR_CLIENTE))
+                for _ in range(0, suscriptores, POR_CLIENTE)]
+    escaner = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=httpx.Limits(max_connections=concurrencia))
+
+    try:
+        inicio = time.perf_counter()
+        pantallas = [asyncio.create_task(pantalla(clientes[i // POR_CLIENTE], headers, FILTROS[i % len(FILTROS)],
+                                                  conectadas, estado))
+                     for i in range(suscriptores)]
+        await asyncio.wait_for(conectadas.wait(), timeout=120)
+        conexion_total = time.perf_counter() - inicio
+
+        limite = asyncio.Semaphore(concurrencia)
+        errores = Counter()
+
+        async def camion(numero: str):
+            for hacia in RECORRIDO:
+                cuerpo = {"numero_carta": numero, "puerto_codigo": "TRP1", "estado_nuevo": hacia}
+                if hacia == "Post Calada":
+                    cuerpo["calidad_asignada"] = "Estándar"
+                async with limite:
+                    respuesta = await escaner.post("/transiciones", json=cuerpo, headers=headers)
+                if respuesta.status_code != 200:
+                    errores[respuesta.status_code] += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(camion(f"CPE-{i}") for i in range(1, camiones + 1)))
+        transcurrido = time.perf_counter() - inicio
+        # Último tick en vuelo; después el tablero final y las estadísticas del canal
+        await asyncio.sleep(1)
+        final = (await escaner.get("/tablero/TRP1", headers=headers)).json()
+        stats = (await escaner.get("/cache-stats", headers=headers)).json()["canal_circuito"]
+        # El worker cierra el canal (`resync`) y los streams terminan
+        fin_carga.set()
+        resultados = await asyncio.gather(*pantallas)
+    finally:
+        for cliente in clientes + [escaner]:
+            await cliente.aclose()
+
+    return conexion_total, transcurrido, errores, final, stats, estado, resultados
+
+
+def proceso_clientes(base_url: str, token: str, args: argparse.Namespace, fin_carga, cola):
+    """Pantallas y escáneres en otro proceso: el worker medido no comparte el GIL con sus clientes."""
+    cola.put(asyncio.run(carga(base_url, token, args.suscriptores, args.camiones, args.concurrencia, fin_carga)))
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Benchmark del canal SSE de cambios de estado")
+    parser.add_argument("--suscriptores", type=int, default=1000, help="Pantallas conectadas (default: 1000)")
+    parser.add_argument("--camiones", type=int, default=300, help=f"Camiones que avanzan {len(RECORRIDO)} sectores")
+    parser.add_argument("--concurrencia", type=int, default=50, help="Escaneos en vuelo a la vez")
+    parser.add_argument("--perfil", choices=("DEV", "PROD"), default="PROD", help="DB_PROFILE a medir")
+    parser.add_argument("--tick-ms", type=int, default=100, help="CANAL_TICK_MS")
+    args = parser.parse_args()
+
+    directorio = Path(tempfile.mkdtemp(prefix="bench_canal_"))
+    configurar_certificados_entorno(os.environ, directorio, "canal")
+    os.environ["DB_PROFILE"] = args.perfil
+    os.environ["CANAL_TICK_MS"] = str(args.tick_ms)
+    os.environ["ARCA_SHARED_STORE_PATH"] = str(directorio / "arca_tickets.db")
+
+    import main as api
+    from utils.database import crear_engines_async
+    for nombre in ('main', 'arca'):
+        logging.getLogger(nombre).setLevel(logging.WARNING)
+    api.engine, usuario_id = preparar_base(directorio / "canal.db", args.camiones)
+    api.async_engine, api.async_engine_escritor = crear_engines_async(str(api.engine.url))
+    token = api.create_access_token({"sub": "pantallas", "user_id": usuario_id, "puertos": ["TRP1"]})
+
+    puerto = puerto_libre()
+    # Con el cliente saturado una conexión de escaneo puede quedar ociosa más que el keep-alive
+    # de uvicorn (5 s) y reusarse justo cuando el servidor la cierra (ReadError)
+    servidor, hilo = levantar_api(api.app, puerto, timeout_keep_alive=120)
+    contexto = multiprocessing.get_context("spawn")
+    fin_carga, cola = contexto.Event(), contexto.Queue()
+    clientes = contexto.Process(target=proceso_clientes, args=(f"http://127.0.0.1:{puerto}", token, args, fin_carga, cola))
+    cpu_inicio, pared_inicio = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter()
+    clientes.start()
+    try:
+        while not fin_carga.wait(0.5):
+            if not clientes.is_alive():
+                raise SystemExit("El proceso de clientes terminó con error")
+        cpu_fin, pared = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter() - pared_inicio
+        api.canal_circuito.cerrar("fin_bench")
+        conexion_total, transcurrido, errores, final, stats, estado, resultados = cola.get(timeout=300)
+        clientes.join()
+    finally:
+        servidor.should_exit = True
+        hilo.join(timeout=30)
+
+    # Cada pantalla debe terminar con los contadores del tablero final (de sus sectores)
+    esperado = {e["estado"]: (e["sector"], e["cantidad"]) for e in final["estados"]}
+    desfasadas = sum(
+        1 for sectores, contadores, _ in resultados
+        if dict(contadores) != {nombre: cantidad for nombre, (sector, cantidad) in esperado.items()
+                                if cantidad and (sectores is None or sector in sectores)}
+    )
+    demoras = [d * 1000 for _, _, lista in resultados for d in lista]
+    transiciones = args.camiones * len(RECORRIDO)
+
+    print("=== BENCHMARK CANAL DE EVENTOS (SSE, un worker) ===")
+    print(f"  Perfil {args.perfil} | {args.suscriptores} pantallas (filtros {FILTROS}) | tick {args.tick_ms} ms | "
+          f"{args.camiones} camiones x {len(RECORRIDO)} sectores, {args.concurrencia} en vuelo")
+    print(f"  Conexión: {len(estado['conexion'])} pantallas en {conexion_total:.2f}s | "
+          f"p50 {percentil(estado['conexion'], 50) * 1000:.0f} ms | p99 {percentil(estado['conexion'], 99) * 1000:.0f} ms")
+    print(f"  Transiciones/s con las pantallas conectadas: {transiciones / transcurrido:,.0f} "
+          f"({transiciones} en {transcurrido:.2f}s) | errores: {dict(errores) or 0}")
+    print(f"  Diffs: {stats['diffs']} | frames serializados: {stats['frames_serializados']} | "
+          f"entregados: {stats['frames_entregados']} | descartadas por lentas: {stats['descartados_lentos']}")
+    cpu = (cpu_fin.ru_utime + cpu_fin.ru_stime) - (cpu_inicio.ru_utime + cpu_inicio.ru_stime)
+    print(f"  CPU del worker: {cpu:.1f}s en {pared:.1f}s de pared ({cpu / pared:.0%}) | "
+          f"{cpu / max(stats['frames_entregados'] + transiciones, 1) * 1e6:.0f} µs por frame entregado o transición")
+    print(f"  Demora de entrega: p50 {percentil(demoras, 50):.1f} ms | p95 {percentil(demoras, 95):.1f} ms | "
+          f"p99 {percentil(demoras, 99):.1f} ms | max {max(demoras, default=0):.1f} ms ({len(demoras)} diffs leídos)")
+    print(f"  Cierre: {dict(estado['resync'])} | errores de stream: {dict(estado['errores']) or 0} | "
+          f"pantallas con contadores desfasados: {desfasadas}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,205 @@
+"""
+Benchmark de carga end-to-end del camino ARCA: /login y los endpoints de tickets.
+
+Levanta el stub local de WSAA, una base SQLite temporal con usuarios de
+prueba y la API en uvicorn con su lifespan completo (broker, store
+compartido, control de admisión y renovación). Genera carga a tasa
+constante en lazo abierto: cada request se programa en su instante y la
+latencia se mide desde ese instante, así una API saturada no esconde su
+cola (sin omisión coordinada).
+
+Reporta p50/p95/p99 por endpoint, throughput logrado y llamadas WSAA por
+request de ticket.
+
+Uso:
+    python test/bench_carga_arca.py --rps 100 --duracion 20 --usuarios 50
+    python test/bench_carga_arca.py --latencia-wsaa 0.3 --tasa-error 0.05 --ta-unico
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from collections import defaultdict
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+import httpx
+import uvicorn
+from sqlmodel import Session, create_engine
+
+from arca_stub import ArcaStub
+from utilidades_prueba import configurar_certificados_entorno
+from utils.database import crear_engines_async
+
+PUERTOS = ("TRP1", "TRP2", "TSL1")
+PASSWORD = "carga123"
+ENDPOINTS = {
+    "login": "/login",
+    "CPE": "/get-ticket-cpe",
+    "EMBARQUES": "/get-ticket-embarques",
+    "FACTURACION": "/get-ticket-facturacion",
+}
+
+
+def percentil(valores, p):
+    """Percentil p (1-99) de una lista de valores."""
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1]
+
+
+def preparar_base(directorio: Path, usuarios: int):
+    """Base SQLite temporal con los puertos y N usuarios con acceso a todos."""
+    from sqlmodel import SQLModel
+    from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+
+    engine = create_engine(f"sqlite:///{directorio / 'carga.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        puertos = [Puerto(nombre=f"Puerto {codigo}", codigo=codigo) for codigo in PUERTOS]
+        session.add_all(puertos)
+        session.flush()
+        for i in range(usuarios):
+            usuario = Usuario(username=f"carga{i}", nombre_completo=f"Operador {i}", email=f"carga{i}@logigrain.local")
+            usuario.set_password(PASSWORD)
+            session.add(usuario)
+            session.flush()
+            session.add_all([UsuarioPuerto(usuario_id=usuario.id, puerto_id=puerto.id) for puerto in puertos])
+        session.commit()
+    return engine
+
+
+def puerto_libre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def levantar_api(app, puerto: int, **opciones):
+    """Corre la API en uvicorn dentro de un hilo y espera a que termine el arranque (opciones: de uvicorn.Config)."""
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning", **opciones))
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, hilo
+
+
+async def generar_carga(base_url: str, usuarios: int, rps: float, duracion: float, semilla: int):
+    """Lazo abierto: programa rps * duracion requests y mide desde su instante programado."""
+    azar = random.Random(semilla)
+    latencias = defaultdict(list)
+    errores = defaultdict(lambda: defaultdict(int))
+    limites = httpx.Limits(max_connections=500, max_keepalive_connections=500)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limites) as cliente:
+        # JWT inicial de cada usuario (no se mide)
+        jwts = {}
+        for i in range(usuarios):
+            respuesta = await cliente.post("/login", json={"username": f"carga{i}", "password": PASSWORD})
+            respuesta.raise_for_status()
+            jwts[i] = respuesta.json()["token"]
+
+        async def ejecutar(operacion: str, usuario: int, programado: float):
+            if operacion == "login":
+                respuesta = await cliente.post("/login", json={"username": f"carga{usuario}", "password": PASSWORD})
+            else:
+                respuesta = await cliente.post(
+                    ENDPOINTS[operacion],
+                    json={"puerto_codigo": azar.choice(PUERTOS)},
+                    headers={"Authorization": f"Bearer {jwts[usuario]}"},
+                )
+            latencias[operacion].append((time.perf_counter() - programado) * 1000)
+            if respuesta.status_code != 200:
+                errores[operacion][respuesta.status_code] += 1
+
+        total = int(rps * duracion)
+        tareas = []
+        inicio = time.perf_counter()
+        for i in range(total):
+            programado = inicio + i / rps
+            espera = programado - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            operacion = azar.choice(list(ENDPOINTS))
+            tareas.append(asyncio.create_task(ejecutar(operacion, azar.randrange(usuarios), programado)))
+        await asyncio.gather(*tareas)
+        transcurrido = time.perf_counter() - inicio
+
+    return latencias, errores, transcurrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del camino ARCA contra el stub local")
+    parser.add_argument("--rps", type=float, default=50, help="Requests por segundo objetivo (default: 50)")
+    parser.add_argument("--duracion", type=float, default=10, help="Segundos de carga (default: 10)")
+    parser.add_argument("--usuarios", type=int, default=20, help="Usuarios distintos (default: 20)")
+    parser.add_argument("--latencia-wsaa", type=float, default=0.2, help="Demora del stub por loginCms (default: 0.2)")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de HTTP 503 en loginCms")
+    parser.add_argument("--ta-unico", action="store_true", help='El stub rechaza un segundo TA vigente ("ya posee un TA válido")')
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla de la mezcla de requests")
+    args = parser.parse_args()
+
+    directorio = Path(tempfile.mkdtemp(prefix="bench_carga_"))
+    configurar_certificados_entorno(os.environ, directorio, "carga")
+
+    with ArcaStub(latencia=args.latencia_wsaa, tasa_error=args.tasa_error,
+                  ta_unico=args.ta_unico, semilla=args.semilla) as stub:
+        os.environ['ARCA_ENVIRONMENT'] = 'HOMO'
+        os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+        os.environ['ARCA_SHARED_STORE_PATH'] = str(directorio / "arca_tickets.db")
+
+        import main as api
+        import Modelos.usuario as modelo_usuario
+        for nombre in ('main', 'arca'):
+            logging.getLogger(nombre).setLevel(logging.WARNING)
+        # El costo del KDF de contraseñas se mide aparte (bench_login.py); acá no debe dominar el login
+        modelo_usuario.PASSWORD_ITERACIONES = 1000
+        api.engine = preparar_base(directorio, args.usuarios)
+        api.async_engine, api.async_engine_escritor = crear_engines_async(str(api.engine.url))
+
+        puerto = puerto_libre()
+        servidor, hilo = levantar_api(api.app, puerto)
+        try:
+            latencias, errores, transcurrido = asyncio.run(
+                generar_carga(f"http://127.0.0.1:{puerto}", args.usuarios, args.rps, args.duracion, args.semilla)
+            )
+        finally:
+            servidor.should_exit = True
+            hilo.join(timeout=10)
+
+    print("=== BENCHMARK DE CARGA ARCA (stub local) ===")
+    print(f"  Objetivo: {args.rps:.0f} req/s durante {args.duracion:.0f}s | {args.usuarios} usuarios | "
+          f"latencia WSAA {args.latencia_wsaa * 1000:.0f} ms | tasa de error {args.tasa_error:.0%}")
+    print()
+    print(f"  {'endpoint':<26} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for operacion, ruta in ENDPOINTS.items():
+        valores = latencias.get(operacion, [])
+        cantidad_errores = sum(errores[operacion].values())
+        print(f"  {ruta:<26} {len(valores):>6} {cantidad_errores:>5} {percentil(valores, 50):>9.2f} "
+              f"{percentil(valores, 95):>9.2f} {percentil(valores, 99):>9.2f}")
+        if cantidad_errores:
+            detalle = ", ".join(f"HTTP {codigo}: {n}" for codigo, n in sorted(errores[operacion].items()))
+            print(f"  {'':<26} {detalle}")
+
+    total = sum(len(v) for v in latencias.values())
+    tickets = sum(len(latencias.get(servicio, [])) for servicio in ("CPE", "EMBARQUES", "FACTURACION"))
+    print()
+    print(f"  Throughput logrado: {total / transcurrido:.1f} req/s ({total} requests en {transcurrido:.1f}s)")
+    print(f"  Llamadas WSAA: {stub.login_calls} | por request de ticket: {stub.login_calls / max(tickets, 1):.4f} | "
+          f"TA rechazados por duplicado: {stub.ta_rechazados}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de latencia de call_wsaa contra el stub local de WSAA.
+
+Compara el comportamiento anterior (un zeep.Client nuevo por llamada, que
+descarga y parsea el WSDL y abre otra conexión) contra el registro de
+clientes de Arca/soap_clients.py (WSDL cacheado + pool HTTP).
+
+Uso:
+    python test/bench_cliente_soap.py [iteraciones]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import statistics
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+_TEMP_DIR = Path(tempfile.mkdtemp(prefix="bench_soap_"))
+os.environ['ARCA_WSDL_CACHE_PATH'] = str(_TEMP_DIR / "wsdl_cache.db")
+
+from zeep import Client, Settings
+
+from Arca.wsaa import create_tra, sign_tra_cms, call_wsaa
+from Arca.soap_clients import reset_soap_clients
+from arca_stub import ArcaStub
+from utilidades_prueba import generar_certificado_prueba
+
+
+def cliente_nuevo_por_llamada(cms_base64, wsdl_url):
+    """Replica el call_wsaa original: construye el cliente en cada llamada."""
+    client = Client(wsdl_url, settings=Settings(strict=False, xml_huge_tree=True))
+    return client.service.loginCms(in0=cms_base64)
+
+
+def medir(nombre, funcion, iteraciones):
+    """Ejecuta N llamadas y reporta latencias en milisegundos."""
+    latencias = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1]
+    print(f"  {nombre:<30} media {statistics.mean(latencias):7.2f} ms | "
+          f"p50 {statistics.median(latencias):7.2f} ms | p95 {p95:7.2f} ms")
+    return statistics.mean(latencias)
+
+
+def main():
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    logging.getLogger('arca').setLevel(logging.WARNING)
+
+    print("=== BENCHMARK CLIENTE SOAP WSAA (stub local) ===")
+
+    try:
+        cert_file, key_file = generar_certificado_prueba(_TEMP_DIR)
+        cms = sign_tra_cms(create_tra("wscpe"), cert_file, key_file)
+
+        with ArcaStub() as stub:
+            url = stub.wsaa_wsdl_url
+
+            wsdl_antes = stub.wsdl_requests
+            media_anterior = medir("zeep.Client por llamada",
+                                   lambda: cliente_nuevo_por_llamada(cms, url), iteraciones)
+            wsdl_anterior = stub.wsdl_requests - wsdl_antes
+
+            reset_soap_clients()
+            wsdl_antes = stub.wsdl_requests
+            resultado = call_wsaa(cms, url)
+            assert 'token' in resultado, resultado
+            media_registro = medir("registro (WSDL cache + pool)",
+                                   lambda: call_wsaa(cms, url), iteraciones)
+            wsdl_registro = stub.wsdl_requests - wsdl_antes
+
+        print()
+        print(f"  Descargas de WSDL: {wsdl_anterior} (por llamada) vs {wsdl_registro} (registro)")
+        print(f"🎯 Mejora de latencia media: x{media_anterior / media_registro:.1f}")
+    finally:
+        reset_soap_clients()
+        shutil.rmtree(_TEMP_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark de contención de SQLite: lecturas y escrituras mezcladas desde muchos requests concurrentes.
+
+Crea una base temporal en archivo y dispara operaciones concurrentes sobre
+los engines de los endpoints (utils/database.py) con el perfil elegido:
+las lecturas emulan get_current_user + búsqueda de ticket en arca_tokens y
+las escrituras guardan un ticket con save_arca_token_to_cache (upsert +
+commit). Reporta operaciones/s, latencias p50/p95/p99 por tipo y
+los errores "database is locked".
+
+Uso:
+    python test/bench_contencion_sqlite.py [--perfil DEV|PROD] [--operaciones 4000]
+                                          [--concurrencia 200] [--escrituras 0.3]
+                                          [--usuarios 50] [--semilla 7]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlmodel import SQLModel, select
+
+import main
+from Modelos.usuario import Usuario, Puerto
+from Modelos.arca_tokens import ArcaToken
+from utils.database import crear_engine, crear_engines_async, nueva_sesion_async
+from utils.migraciones import aplicar_migraciones
+
+SERVICIOS = ("CPE", "EMBARQUES", "FACTURACION")
+PUERTOS = ("TRP1", "TRP2", "TRP3", "TRP4")
+
+
+def preparar_base(path: Path, usuarios: int) -> str:
+    url = f"sqlite:///{path}"
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
+    with engine.begin() as conexion:
+        conexion.execute(Puerto.__table__.insert(), [
+            {"id": i, "nombre": f"Puerto {codigo}", "codigo": codigo, "habilitado": True}
+            for i, codigo in enumerate(PUERTOS, start=1)
+        ])
+        conexion.execute(Usuario.__table__.insert(), [
+            {"id": i, "username": f"operador{i}", "password_hash": "x", "nombre_completo": f"Usuario {i}",
+             "email": f"u{i}@x", "habilitado": True, "es_admin": False}
+            for i in range(1, usuarios + 1)
+        ])
+    engine.dispose()
+    return url
+
+
+async def carga(url: str, operaciones: int, concurrencia: int, escrituras: float, usuarios: int, semilla: int):
+    lectores, escritor = crear_engines_async(url)
+    azar = random.Random(semilla)
+    plan = [(azar.random() < escrituras, 1 + azar.randrange(usuarios), azar.choice(PUERTOS), azar.choice(SERVICIOS))
+            for _ in range(operaciones)]
+    limite = asyncio.Semaphore(concurrencia)
+    latencias = {"lectura": [], "escritura": []}
+    errores = Counter()
+
+    async def operacion(es_escritura, usuario_id, puerto, servicio):
+        async with limite:
+            inicio = time.perf_counter()
+            try:
+                async with nueva_sesion_async(lectores, escritor) as session:
+                    if es_escritura:
+                        await main.save_arca_token_to_cache(usuario_id, puerto, servicio, "token", "sign",
+                                                            "wsaa", servicio.lower(), session)
+                    else:
+                        await session.get(Usuario, usuario_id)
+                        (await session.exec(select(ArcaToken).where(
+                            ArcaToken.usuario_id == usuario_id,
+                            ArcaToken.puerto_codigo == puerto,
+                            ArcaToken.servicio_tipo == servicio
+                        ))).first()
+            except Exception as e:
+                errores["database is locked" if "database is locked" in str(e) else type(e).__name__] += 1
+                return
+            latencias["escritura" if es_escritura else "lectura"].append(time.perf_counter() - inicio)
+
+    try:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(operacion(*op) for op in plan))
+        transcurrido = time.perf_counter() - inicio
+    finally:
+        await lectores.dispose()
+        if escritor is not None:
+            await escritor.dispose()
+    return transcurrido, latencias, errores
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Benchmark de contención lectura/escritura en SQLite")
+    parser.add_argument("--perfil", choices=("DEV", "PROD"), default="PROD", help="DB_PROFILE a medir")
+    parser.add_argument("--operaciones", type=int, default=4000)
+    parser.add_argument("--concurrencia", type=int, default=200, help="Requests en vuelo a la vez")
+    parser.add_argument("--escrituras", type=float, default=0.3, help="Fracción de operaciones que escriben")
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+    os.environ["DB_PROFILE"] = args.perfil
+    logging.getLogger('main').setLevel(logging.CRITICAL)
+
+    directorio = Path(tempfile.mkdtemp(prefix="bench_contencion_"))
+    try:
+        url = preparar_base(directorio / "contencion.db", args.usuarios)
+        transcurrido, latencias, errores = asyncio.run(
+            carga(url, args.operaciones, args.concurrencia, args.escrituras, args.usuarios, args.semilla)
+        )
+    finally:
+        main.arca_token_l1.clear()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print("=== BENCHMARK CONTENCIÓN SQLITE ===")
+    print(f"  Perfil {args.perfil} | {args.operaciones} operaciones ({args.escrituras:.0%} escrituras) | "
+          f"{args.concurrencia} en vuelo")
+    completadas = sum(len(v) for v in latencias.values())
+    print(f"  Operaciones/s: {completadas / transcurrido:,.0f} | 'database is locked': {errores['database is locked']}")
+    otros = {tipo: n for tipo, n in errores.items() if tipo != "database is locked"}
+    if otros:
+        print(f"  Otros errores: {', '.join(f'{tipo}: {n}' for tipo, n in sorted(otros.items()))}")
+    for tipo, valores in latencias.items():
+        if len(valores) < 2:
+            continue
+        cuantiles = statistics.quantiles(valores, n=100)
+        print(f"  {tipo:<10} n={len(valores):<6} p50 {cuantiles[49] * 1000:7.1f} ms | "
+              f"p95 {cuantiles[94] * 1000:7.1f} ms | p99 {cuantiles[98] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,147 @@
+"""
+Benchmark de las órdenes de despacho: reserva y despacho en bloque de camiones de la Playa.
+
+Crea una base temporal con la temporada cargada (cartas ya salidas) y una
+Playa de Camiones con camiones de varios cereales y exportadores. Mide,
+por ronda, una orden de N camiones de Maíz: la reserva (alta de la orden
++ sentencia de asignación, un commit) y el despacho en bloque a En Viaje
+(UPDATE, movimientos, contadores y avance, un commit). Después lanza
+órdenes simultáneas sobre un mismo pool y verifica que ningún camión
+quede en dos órdenes.
+
+Uso:
+    python test/bench_despachos.py [--perfil DEV|PROD] [--camiones 200] [--rondas 10]
+                                   [--historial 100000] [--simultaneas 20]
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlmodel import SQLModel
+
+import Modelos.usuario  # noqa: F401 (create_all y migraciones)
+import Modelos.arca_tokens  # noqa: F401
+from Modelos.carta_porte import CartaPorteElectronica, EstadoCamion, TipoCereal
+from utils.database import crear_engine, crear_engines_async
+from utils.despachos import OrdenesDespacho
+from utils.migraciones import aplicar_migraciones
+from utils.transiciones import MotorTransiciones
+
+EXPORTADORES = ["30222222223", "30555555553", "30777777773"]
+OTROS_CEREALES = [TipoCereal.SOJA, TipoCereal.TRIGO, TipoCereal.GIRASOL]
+
+
+def preparar_base(path: Path, historial: int, en_playa: int, simultaneas: int) -> str:
+    """Temporada (SALIDO), Maíz en playa para las rondas y el pool de las simultáneas, y otros cereales."""
+    url = f"sqlite:///{path}"
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
+    inicio = datetime(2025, 4, 1)
+    filas = []
+    cartas = [(EstadoCamion.SALIDO, TipoCereal.MAIZ)] * historial + [(EstadoCamion.EN_PLAYA, TipoCereal.MAIZ)] * en_playa \
+        + [(EstadoCamion.EN_PLAYA, TipoCereal.SORGO)] * simultaneas + [(EstadoCamion.EN_PLAYA, c) for c in OTROS_CEREALES] * 500
+    for i, (estado, cereal) in enumerate(cartas, start=1):
+        filas.append({
+            "id": i, "numero_carta": f"CPE-{i}", "puerto_codigo": "TRP1", "cuit_origen": "20111111112",
+            "cuit_destino": EXPORTADORES[i % len(EXPORTADORES)], "tipo_cereal": cereal, "peso_declarado": 30000,
+            "patente": f"AB{i:06d}", "chofer_cuit": "20333333334", "empresa_transporte": "Transportes",
+            "estado_actual": estado, "validado_arca": False, "created_at": inicio + timedelta(seconds=i),
+        })
+    with engine.begin() as conexion:
+        conexion.execute(CartaPorteElectronica.__table__.insert(), filas)
+    with engine.connect() as conexion:
+        conexion.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    return url
+
+
+async def carga(url: str, camiones: int, rondas: int, simultaneas: int):
+    lectores, escritor = crear_engines_async(url)
+    engine = escritor or lectores
+    ordenes, motor = OrdenesDespacho(), MotorTransiciones()
+    reservas, despachos, errores = [], [], []
+    try:
+        # Calentar el pool y el cache de sentencias
+        orden = await ordenes.crear(engine, "TRP1", TipoCereal.SOJA, 1, "bench")
+        await motor.despachar_orden(engine, orden.orden["id"], "bench")
+
+        for _ in range(rondas):
+            inicio = time.perf_counter()
+            orden = await ordenes.crear(engine, "TRP1", TipoCereal.MAIZ, camiones, "bench")
+            reservas.append(time.perf_counter() - inicio)
+            if orden.reservados != camiones:
+                errores.append(f"orden {orden.orden['id']}: {orden.reservados}/{camiones} reservados")
+            inicio = time.perf_counter()
+            despachados = await motor.despachar_orden(engine, orden.orden["id"], "bench")
+            despachos.append(time.perf_counter() - inicio)
+            if len(despachados) != camiones:
+                errores.append(f"orden {orden.orden['id']}: {len(despachados)}/{camiones} despachados")
+
+        # Órdenes simultáneas que piden más de lo que hay: ningún camión en dos órdenes
+        por_orden = max(simultaneas // 4, 1)
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*[ordenes.crear(engine, "TRP1", TipoCereal.SORGO, por_orden, f"bench{i}")
+                                            for i in range(8)])
+        concurrente = time.perf_counter() - inicio
+        reservados = [c["carta_id"] for r in resultados for c in r.camiones]
+        if len(reservados) != len(set(reservados)):
+            errores.append(f"{len(reservados) - len(set(reservados))} camiones en dos órdenes")
+        if len(reservados) != min(simultaneas, 8 * por_orden):
+            errores.append(f"simultáneas: {len(reservados)} reservados de {simultaneas} en playa")
+    finally:
+        await lectores.dispose()
+        if escritor is not None:
+            await escritor.dispose()
+    return reservas, despachos, concurrente, len(reservados), errores
+
+
+def _resumen(tiempos):
+    return (f"p50 {statistics.median(tiempos) * 1000:.1f} ms | max {max(tiempos) * 1000:.1f} ms")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Benchmark de las órdenes de despacho")
+    parser.add_argument("--perfil", choices=("DEV", "PROD"), default="PROD", help="DB_PROFILE a medir")
+    parser.add_argument("--camiones", type=int, default=200, help="Camiones por orden")
+    parser.add_argument("--rondas", type=int, default=10, help="Órdenes medidas (reserva + despacho)")
+    parser.add_argument("--historial", type=int, default=100000, help="Cartas de la temporada ya salidas")
+    parser.add_argument("--simultaneas", type=int, default=200, help="Camiones en playa para las 8 órdenes simultáneas")
+    args = parser.parse_args()
+    os.environ["DB_PROFILE"] = args.perfil
+    logging.getLogger('main').setLevel(logging.CRITICAL)
+
+    directorio = Path(tempfile.mkdtemp(prefix="bench_despachos_"))
+    try:
+        url = preparar_base(directorio / "despachos.db", args.historial, args.camiones * args.rondas, args.simultaneas)
+        reservas, despachos, concurrente, reservados, errores = asyncio.run(
+            carga(url, args.camiones, args.rondas, args.simultaneas)
+        )
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print("=== BENCHMARK ÓRDENES DE DESPACHO ===")
+    print(f"  Perfil {args.perfil} | {args.rondas} órdenes x {args.camiones} camiones | "
+          f"temporada {args.historial:,} cartas")
+    print(f"  Reserva (alta + asignación): {_resumen(reservas)}")
+    print(f"  Despacho en bloque a En Viaje: {_resumen(despachos)}")
+    print(f"  Orden completa (reserva + despacho): {_resumen([r + d for r, d in zip(reservas, despachos)])}")
+    print(f"  8 órdenes simultáneas: {reservados} camiones reservados en {concurrente * 1000:.1f} ms")
+    print(f"  Errores: {errores or 0}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,93 @@
+"""
+Benchmark de firma CMS del TRA: firma en memoria (cryptography) vs OpenSSL CLI.
+
+Genera un certificado autofirmado temporal, firma el mismo TRA con ambos
+métodos y reporta firmas/segundo. El método CLI se mide solo si hay un
+binario OpenSSL disponible (ARCA_OPENSSL_PATH, Ssl/openssl.exe o el PATH).
+
+Uso:
+    python test/bench_firma_cms.py [iteraciones]
+"""
+
+import os
+import sys
+import time
+import base64
+import shutil
+import tempfile
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from Arca.wsaa import create_tra, sign_tra_cms, sign_tra_cms_openssl
+from utilidades_prueba import generar_certificado_prueba
+
+
+def buscar_openssl():
+    """Devuelve la ruta del binario OpenSSL a usar para el método CLI, o None."""
+    candidatos = [
+        os.getenv('ARCA_OPENSSL_PATH'),
+        str(BASE_DIR / "Ssl" / "openssl.exe"),
+        shutil.which("openssl"),
+    ]
+    for candidato in candidatos:
+        if candidato and os.path.exists(candidato):
+            return candidato
+    return None
+
+
+def medir(nombre, funcion, iteraciones):
+    """Ejecuta la firma N veces y devuelve firmas/segundo."""
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        funcion()
+    duracion = time.perf_counter() - inicio
+    fps = iteraciones / duracion
+    print(f"  {nombre:<28} {iteraciones:>5} firmas en {duracion:7.3f}s -> {fps:9.1f} firmas/s")
+    return fps
+
+
+def main():
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    # Los logs INFO por firma distorsionan la medición
+    import logging
+    logging.getLogger('arca').setLevel(logging.WARNING)
+
+    print("=== BENCHMARK FIRMA CMS DEL TRA ===")
+    directorio = Path(tempfile.mkdtemp(prefix="bench_cms_"))
+
+    try:
+        cert_file, key_file = generar_certificado_prueba(directorio)
+        tra_xml = create_tra("wscpe")
+
+        # Verificar formato: Base64 de un DER SignedData en una sola línea
+        cms_memoria = sign_tra_cms(tra_xml, cert_file, key_file)
+        der = base64.b64decode(cms_memoria, validate=True)
+        assert "\n" not in cms_memoria and der[:1] == b"\x30"
+        print(f"✅ Firma en memoria válida ({len(cms_memoria)} caracteres Base64)")
+
+        print()
+        fps_memoria = medir("cryptography (memoria)",
+                            lambda: sign_tra_cms(tra_xml, cert_file, key_file),
+                            iteraciones)
+
+        openssl_path = buscar_openssl()
+        if openssl_path:
+            os.environ['ARCA_OPENSSL_PATH'] = openssl_path
+            iteraciones_cli = max(1, iteraciones // 4)
+            fps_cli = medir("OpenSSL CLI (subprocess)",
+                            lambda: sign_tra_cms_openssl(tra_xml, cert_file, key_file),
+                            iteraciones_cli)
+            print()
+            print(f"🎯 Aceleración firma en memoria: x{fps_memoria / fps_cli:.1f}")
+        else:
+            print("⚠️  OpenSSL CLI no disponible - se omite la comparación")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark de throughput de /login ante una ráfaga de logins simultáneos (cambio de turno).
+
+Crea una base SQLite temporal en archivo con N usuarios y dispara logins
+concurrentes contra la app ASGI (mismo event loop, como un worker de uvicorn).
+Reporta logins/s y latencias p50/p95/p99.
+
+Con el KDF por defecto (PBKDF2, PASSWORD_PBKDF2_ITERATIONS) el throughput
+queda acotado por CPU: ~núcleos / costo de un hash. `--iteraciones 1`
+aísla el costo del resto del camino de login.
+
+Uso:
+    python test/bench_login.py [--usuarios 200] [--logins 1000] [--concurrencia 200]
+                               [--iteraciones N] [--hash-legado]
+"""
+
+import sys
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+import hashlib
+
+import httpx
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import main
+import Modelos.usuario as modelo_usuario
+from utils.database import crear_engine_async
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+
+PASSWORD = "turno123"
+
+
+def preparar_base(path: Path, usuarios: int, hash_legado: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    plantilla = Usuario(username="x", nombre_completo="x", email="x")
+    if hash_legado:
+        password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    else:
+        plantilla.set_password(PASSWORD)
+        password_hash = plantilla.password_hash
+    with engine.begin() as conexion:
+        conexion.execute(Puerto.__table__.insert(), [
+            {"id": i, "nombre": f"Puerto {i}", "codigo": f"P{i:03d}", "habilitado": True} for i in range(1, 5)
+        ])
+        conexion.execute(Usuario.__table__.insert(), [
+            {"id": i, "username": f"chofer{i}", "password_hash": password_hash, "nombre_completo": f"Usuario {i}",
+             "email": f"u{i}@x", "habilitado": True, "es_admin": False}
+            for i in range(1, usuarios + 1)
+        ])
+        conexion.execute(UsuarioPuerto.__table__.insert(), [
+            {"usuario_id": u, "puerto_id": p, "habilitado": True}
+            for u in range(1, usuarios + 1) for p in (1 + u % 4, 1 + (u + 1) % 4)
+        ])
+    return engine, crear_engine_async(f"sqlite:///{path}")
+
+
+async def rafaga(usuarios: int, logins: int, concurrencia: int, async_engine):
+    transporte = httpx.ASGITransport(app=main.app)
+    limite = asyncio.Semaphore(concurrencia)
+    latencias, errores = [], []
+
+    async def un_login(cliente, i):
+        async with limite:
+            inicio = time.perf_counter()
+            respuesta = await cliente.post("/login", json={"username": f"chofer{1 + i % usuarios}", "password": PASSWORD})
+            latencias.append(time.perf_counter() - inicio)
+            if respuesta.status_code != 200:
+                errores.append(respuesta.status_code)
+
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(un_login(cliente, i) for i in range(logins)))
+        transcurrido = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    escritos = await main.acceso_write_behind.flush()
+    flush_ms = (time.perf_counter() - inicio) * 1000
+    await async_engine.dispose()
+    return transcurrido, latencias, errores, escritos, flush_ms
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput de /login")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=1000)
+    parser.add_argument("--concurrencia", type=int, default=200, help="Logins en vuelo a la vez")
+    parser.add_argument("--iteraciones", type=int, help="Iteraciones PBKDF2 (default: PASSWORD_PBKDF2_ITERATIONS)")
+    parser.add_argument("--hash-legado", action="store_true", help="Sembrar hashes sha256 sin sal (se migran en el primer login)")
+    args = parser.parse_args()
+    if args.iteraciones:
+        modelo_usuario.PASSWORD_ITERACIONES = args.iteraciones
+    logging.getLogger('main').setLevel(logging.WARNING)
+
+    directorio = Path(tempfile.mkdtemp(prefix="bench_login_"))
+    try:
+        engine, async_engine = preparar_base(directorio / "login.db", args.usuarios, args.hash_legado)
+
+        async def sesion_bench():
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                yield session
+
+        main.app.dependency_overrides[main.get_async_session] = sesion_bench
+        with Session(engine) as session:
+            main.acl_index.cargar(session)
+
+        print("=== BENCHMARK LOGIN ===")
+        print(f"  {args.usuarios} usuarios | {args.logins} logins | {args.concurrencia} en vuelo | "
+              f"hash {'sha256 legado' if args.hash_legado else f'PBKDF2 x{modelo_usuario.PASSWORD_ITERACIONES}'}")
+        transcurrido, latencias, errores, escritos, flush_ms = asyncio.run(
+            rafaga(args.usuarios, args.logins, args.concurrencia, async_engine)
+        )
+
+        cuantiles = statistics.quantiles(latencias, n=100)
+        print(f"  Logins/s: {args.logins / transcurrido:,.0f} | errores: {len(errores)}")
+        print(f"  Latencia p50 {cuantiles[49] * 1000:.1f} ms | p95 {cuantiles[94] * 1000:.1f} ms | p99 {cuantiles[98] * 1000:.1f} ms")
+        print(f"  Flush de ultimo_acceso: {escritos} usuarios en {flush_ms:.1f} ms")
+    finally:
+        main.app.dependency_overrides.clear()
+        main.acl_index.invalidar()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_bench()
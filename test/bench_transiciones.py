@@ -0,0 +1,139 @@
+"""
+Benchmark del motor de transiciones: escaneos de QR concurrentes de todos los sectores.
+
+Crea una base temporal con N camiones en la Playa de Camiones y los hace
+recorrer el circuito completo (8 transiciones cada uno) con muchos
+escaneos en vuelo a la vez, como en un pico de portería. Una fracción de
+los escaneos se repite (QR leído dos veces). Reporta transiciones/s,
+latencias p50/p95/p99 por escaneo, transiciones por commit y errores.
+
+`--max-lote 1` desactiva el group commit (un commit por escaneo) para comparar.
+
+Uso:
+    python test/bench_transiciones.py [--perfil DEV|PROD] [--camiones 1000] [--concurrencia 200]
+                                      [--repetidos 0.05] [--max-lote 256] [--semilla 7]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlmodel import SQLModel
+
+import Modelos.usuario  # noqa: F401 (create_all y migraciones)
+import Modelos.arca_tokens  # noqa: F401
+from Modelos.carta_porte import CartaPorteElectronica, EstadoCamion, TipoCereal, CalidadCereal, CIRCUITO
+from utils.database import crear_engine, crear_engines_async
+from utils.migraciones import aplicar_migraciones
+from utils.transiciones import MotorTransiciones, SolicitudTransicion
+
+
+def preparar_base(path: Path, camiones: int) -> str:
+    url = f"sqlite:///{path}"
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
+    with engine.begin() as conexion:
+        conexion.execute(CartaPorteElectronica.__table__.insert(), [
+            {"id": i, "numero_carta": f"CPE-{i}", "puerto_codigo": "TRP1", "cuit_origen": "20111111112",
+             "cuit_destino": "30222222223", "tipo_cereal": TipoCereal.SOJA, "peso_declarado": 30000,
+             "patente": f"AB{i:05d}", "chofer_cuit": "20333333334", "empresa_transporte": "Transportes",
+             "estado_actual": EstadoCamion.EN_PLAYA, "validado_arca": False}
+            for i in range(1, camiones + 1)
+        ])
+    engine.dispose()
+    return url
+
+
+async def carga(url: str, camiones: int, concurrencia: int, repetidos: float, max_lote: int, semilla: int):
+    lectores, escritor = crear_engines_async(url)
+    engine = escritor or lectores
+    motor = MotorTransiciones(max_lote=max_lote)
+    azar = random.Random(semilla)
+    limite = asyncio.Semaphore(concurrencia)
+    latencias = []
+    resultados = Counter()
+    errores = Counter()
+
+    async def escanear(numero: str, hacia: EstadoCamion):
+        extra = {"calidad_asignada": CalidadCereal.ESTANDAR} if hacia is EstadoCamion.POST_CALADA else {}
+        solicitud = SolicitudTransicion(hacia=hacia, autorizado_por="bench", puerto_codigo="TRP1",
+                                        numero_carta=numero, **extra)
+        async with limite:
+            inicio = time.perf_counter()
+            try:
+                resultado = await motor.aplicar(engine, solicitud)
+            except Exception as e:
+                errores["database is locked" if "database is locked" in str(e) else type(e).__name__] += 1
+                return
+            latencias.append(time.perf_counter() - inicio)
+            resultados[resultado.resultado] += 1
+
+    async def camion(numero: str):
+        # Cada camión avanza sector por sector; entre escaneos cede el loop a los demás
+        for hacia in CIRCUITO[1:]:
+            await escanear(numero, hacia)
+            if azar.random() < repetidos:
+                await escanear(numero, hacia)
+            await asyncio.sleep(0)
+
+    try:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(camion(f"CPE-{i}") for i in range(1, camiones + 1)))
+        transcurrido = time.perf_counter() - inicio
+    finally:
+        await lectores.dispose()
+        if escritor is not None:
+            await escritor.dispose()
+    return transcurrido, latencias, resultados, errores, motor.stats()
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de transiciones de estado")
+    parser.add_argument("--perfil", choices=("DEV", "PROD"), default="PROD", help="DB_PROFILE a medir")
+    parser.add_argument("--camiones", type=int, default=1000, help="Camiones que recorren el circuito (8 escaneos cada uno)")
+    parser.add_argument("--concurrencia", type=int, default=200, help="Escaneos en vuelo a la vez")
+    parser.add_argument("--repetidos", type=float, default=0.05, help="Fracción de escaneos leídos dos veces")
+    parser.add_argument("--max-lote", type=int, default=256, help="Escaneos por commit (1: sin group commit)")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+    os.environ["DB_PROFILE"] = args.perfil
+    logging.getLogger('main').setLevel(logging.CRITICAL)
+
+    directorio = Path(tempfile.mkdtemp(prefix="bench_transiciones_"))
+    try:
+        url = preparar_base(directorio / "transiciones.db", args.camiones)
+        transcurrido, latencias, resultados, errores, stats = asyncio.run(
+            carga(url, args.camiones, args.concurrencia, args.repetidos, args.max_lote, args.semilla)
+        )
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print("=== BENCHMARK TRANSICIONES ===")
+    print(f"  Perfil {args.perfil} | {args.camiones} camiones x {len(CIRCUITO) - 1} sectores | "
+          f"{args.concurrencia} en vuelo | max_lote {args.max_lote}")
+    print(f"  Transiciones aplicadas/s: {resultados['aplicada'] / transcurrido:,.0f} "
+          f"({resultados['aplicada']} en {transcurrido:.2f}s)")
+    print(f"  Resultados: {dict(resultados)} | por commit: {stats['transiciones_por_lote']} | "
+          f"errores: {dict(errores) or 0}")
+    if len(latencias) >= 2:
+        cuantiles = statistics.quantiles(latencias, n=100)
+        print(f"  Escaneo p50 {cuantiles[49] * 1000:.1f} ms | p95 {cuantiles[94] * 1000:.1f} ms | "
+              f"p99 {cuantiles[98] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,28 @@
+"""
+Fixtures compartidas por las pruebas con base de datos.
+
+Las pruebas que además necesitan limpiar estado global (espejos en
+memoria, canal de eventos) redefinen `bases` en su módulo pidiendo esta.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import crear_base_prueba, cerrar_engine_async
+
+
+@pytest.fixture
+def bases(tmp_path):
+    """Base temporal: (engine sincrónico, engine async) sobre el mismo archivo."""
+    engine, async_engine = crear_base_prueba(tmp_path)
+    try:
+        yield engine, async_engine
+    finally:
+        engine.dispose()
+        cerrar_engine_async(async_engine)
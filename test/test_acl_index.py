@@ -0,0 +1,146 @@
+"""
+Pruebas del índice de acceso usuario/puerto (utils/acl_index.py).
+
+Verifica que las validaciones de acceso no consultan la base, que el
+índice se actualiza en el commit ante cambios de UsuarioPuerto y Puerto,
+que un rollback no lo modifica y que login usa el mismo índice.
+
+Uso:
+    python -m pytest -q test/test_acl_index.py
+    python test/test_acl_index.py
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import main
+from utilidades_prueba import crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from utils.acl_index import acl_index
+
+
+@pytest.fixture
+def bases():
+    """Base temporal con 2 usuarios y 3 puertos; el índice queda cargado desde ella. Devuelve (engine, async_engine)."""
+    engine, async_engine = crear_base_prueba()
+    with Session(engine) as session:
+        operador = Usuario(id=1, username="operador", nombre_completo="Operador", email="o@x")
+        operador.set_password("op123")
+        session.add_all([
+            operador,
+            Usuario(id=2, username="otro", nombre_completo="Otro", email="t@x", password_hash="x"),
+            Puerto(id=1, nombre="Puerto 1", codigo="TRP1"),
+            Puerto(id=2, nombre="Puerto 2", codigo="TRP2"),
+            Puerto(id=3, nombre="San Lorenzo", codigo="TSL1"),
+            UsuarioPuerto(usuario_id=1, puerto_id=1),
+            UsuarioPuerto(usuario_id=1, puerto_id=2),
+            UsuarioPuerto(usuario_id=2, puerto_id=3),
+        ])
+        session.commit()
+        acl_index.cargar(session)
+    yield engine, async_engine
+    cerrar_engine_async(async_engine)
+    acl_index.invalidar()
+
+
+@pytest.fixture
+def engine(bases):
+    return bases[0]
+
+
+def test_acceso_sin_consultas(bases):
+    _, async_engine = bases
+    consultas = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: consultas.append(args[2]))
+    operador = Usuario(id=1, username="operador")
+
+    async def validar():
+        async with AsyncSession(async_engine) as session:
+            return [await main.validate_user_puerto_access(operador, codigo, session)
+                    for codigo in ("TRP1", "TRP2", "TSL1", "XXX9")]
+
+    assert asyncio.run(validar()) == [True, True, False, False]
+    assert consultas == []
+
+
+def test_cambios_se_aplican_en_el_commit(engine):
+    with Session(engine) as session:
+        session.add(UsuarioPuerto(usuario_id=1, puerto_id=3))
+        session.flush()
+        assert not acl_index.tiene_acceso(1, "TSL1")  # todavía sin commit
+        session.commit()
+    assert acl_index.tiene_acceso(1, "TSL1")
+
+    with Session(engine) as session:
+        asignacion = session.get(UsuarioPuerto, (1, 1))
+        asignacion.habilitado = False
+        session.commit()
+    assert not acl_index.tiene_acceso(1, "TRP1")
+
+    with Session(engine) as session:
+        session.delete(session.get(UsuarioPuerto, (1, 2)))
+        session.commit()
+    assert not acl_index.tiene_acceso(1, "TRP2")
+
+    # Puerto deshabilitado: nadie accede aunque tenga la asignación
+    with Session(engine) as session:
+        session.get(Puerto, 3).habilitado = False
+        session.commit()
+    assert not acl_index.tiene_acceso(1, "TSL1")
+    assert not acl_index.tiene_acceso(2, "TSL1")
+
+
+def test_rollback_no_modifica_el_indice(engine):
+    with Session(engine) as session:
+        session.add(UsuarioPuerto(usuario_id=2, puerto_id=1))
+        session.flush()
+        session.rollback()
+    assert not acl_index.tiene_acceso(2, "TRP1")
+
+
+def test_puerto_nuevo_y_cambio_de_codigo(engine):
+    with Session(engine) as session:
+        session.add(Puerto(id=4, nombre="Puerto 4", codigo="TRP4"))
+        session.add(UsuarioPuerto(usuario_id=2, puerto_id=4))
+        session.commit()
+    assert acl_index.tiene_acceso(2, "TRP4")
+
+    with Session(engine) as session:
+        session.get(Puerto, 4).codigo = "TRP5"
+        session.commit()
+    assert not acl_index.tiene_acceso(2, "TRP4")
+    assert acl_index.tiene_acceso(2, "TRP5")
+
+
+def test_login_usa_el_indice(bases):
+    engine, async_engine = bases
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    try:
+        cliente = TestClient(main.app)
+        respuesta = cliente.post("/login", json={"username": "operador", "password": "op123"})
+        assert [p["codigo"] for p in respuesta.json()["puertos"]] == ["TRP1", "TRP2"]
+
+        with Session(engine) as session:
+            session.get(Puerto, 2).habilitado = False
+            session.commit()
+        respuesta = cliente.post("/login", json={"username": "operador", "password": "op123"})
+        assert [p["codigo"] for p in respuesta.json()["puertos"]] == ["TRP1"]
+    finally:
+        main.app.dependency_overrides.clear()
+        asyncio.run(main.acceso_write_behind.flush())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,99 @@
+"""
+Pruebas del stub local de WSAA/WSCPE/WSFE (test/arca_stub.py).
+
+Verifica el rechazo de un segundo TA vigente (ta_unico), la tasa de errores
+y que WSCPE/WSFE solo aceptan tokens emitidos por el stub.
+
+Uso:
+    python -m pytest -q test/test_arca_stub.py
+    python test/test_arca_stub.py
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+import httpx
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno
+from arca_stub import ArcaStub
+
+configurar_certificados_entorno(os.environ, Path(tempfile.mkdtemp(prefix="stub_certs_")), "stub")
+
+from Arca.wsaa import credentials_registry
+from Arca.async_client import get_arca_access_ticket_async, wsaa_async_client
+from Arca.ticket_broker import TicketBroker
+
+WSFE_DUMMY = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FEDummy xmlns="http://ar.gov.afip.dif.FEV1/"><Auth><Token>{token}</Token><Sign>S</Sign></Auth></FEDummy>
+</soap:Body></soap:Envelope>"""
+
+
+def _usar_stub(stub):
+    os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+    credentials_registry.reload()
+
+
+def _ejecutar(corrutina_factory):
+    async def escenario():
+        try:
+            return await corrutina_factory()
+        finally:
+            await wsaa_async_client.aclose()
+    return asyncio.run(escenario())
+
+
+def test_ta_unico_rechaza_segundo_ticket():
+    """Con ta_unico el stub se comporta como WSAA: el broker evita el rechazo, una llamada directa no."""
+    with ArcaStub(latencia=0.1, ta_unico=True) as stub:
+        _usar_stub(stub)
+        broker = TicketBroker()
+
+        async def escenario():
+            concurrentes = await asyncio.gather(*[broker.get_ticket("CPE", "HOMO") for _ in range(20)])
+            directa = await get_arca_access_ticket_async("CPE", "HOMO")
+            return concurrentes, directa
+
+        concurrentes, directa = _ejecutar(escenario)
+
+    assert all(r['success'] for r in concurrentes)
+    assert not directa['success'] and "ya posee un TA" in directa['error']
+    assert stub.login_calls == 2 and stub.ta_rechazados == 1
+
+
+def test_tasa_error_reproducible():
+    with ArcaStub(tasa_error=0.5, semilla=7) as stub:
+        primera = [stub.sortear_error() for _ in range(50)]
+    with ArcaStub(tasa_error=0.5, semilla=7) as stub:
+        segunda = [stub.sortear_error() for _ in range(50)]
+
+    assert primera == segunda
+    assert 0 < sum(primera) < 50
+
+
+def test_servicios_validan_token_emitido():
+    with ArcaStub() as stub:
+        _usar_stub(stub)
+        ticket = _ejecutar(lambda: get_arca_access_ticket_async("FACTURACION", "HOMO"))
+
+        valido = httpx.post(stub.wsfe_url, content=WSFE_DUMMY.format(token=ticket['token']))
+        invalido = httpx.post(stub.wsfe_url, content=WSFE_DUMMY.format(token="inventado"))
+        dummy_cpe = httpx.post(stub.wscpe_url, content="<soapenv:Envelope/>")
+
+    assert valido.status_code == 200 and "<AppServer>OK</AppServer>" in valido.text
+    assert invalido.status_code == 500 and "Token invalido" in invalido.text
+    assert dummy_cpe.status_code == 200 and "<appserver>OK</appserver>" in dummy_cpe.text
+    assert stub.service_calls == {"wscpe": 1, "wsfe": 2}
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
@@ -0,0 +1,163 @@
+"""
+Pruebas del endpoint de tickets en lote /arca/tickets.
+
+Verifica que el acceso se valida con el claim `puertos` del JWT, que los
+tokens cacheados salen primero y que los faltantes se piden en paralelo
+(una llamada WSAA por servicio aunque se pidan varios puertos). También
+que un token vigente dentro de la ventana de renovación se sirve si el
+broker falla, y que no se reescribe si el broker devuelve el mismo.
+
+Uso:
+    python -m pytest -q test/test_arca_tickets_batch.py
+    python test/test_arca_tickets_batch.py
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno, crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+from arca_stub import ArcaStub
+
+configurar_certificados_entorno(os.environ, Path(tempfile.mkdtemp(prefix="lote_certs_")), "lote")
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+import main
+from Arca.wsaa import credentials_registry
+from Arca.ticket_broker import TicketBroker
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.arca_tokens import ArcaToken
+
+LATENCIA_WSAA = 0.5
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    """App con base temporal, broker nuevo y stub WSAA lento; devuelve (cliente, stub, engine)."""
+    engine, async_engine = crear_base_prueba()
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="lote", password_hash="x", nombre_completo="Lote", email="l@x")
+        session.add_all([
+            usuario,
+            Puerto(id=1, nombre="Puerto 1", codigo="TRP1"),
+            Puerto(id=2, nombre="Puerto 2", codigo="TRP2"),
+            UsuarioPuerto(usuario_id=1, puerto_id=1),
+            UsuarioPuerto(usuario_id=1, puerto_id=2),
+            ArcaToken(usuario_id=1, puerto_codigo="TRP1", servicio_tipo="CPE", token="CACHEADO", sign="S",
+                      fecha_vencimiento=datetime.utcnow() + timedelta(hours=10)),
+        ])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    monkeypatch.setattr(main, "ticket_broker", TicketBroker())
+    monkeypatch.setenv("ARCA_ENVIRONMENT", "HOMO")
+    main.arca_token_l1.clear()
+    main.acl_index.invalidar()
+
+    jwt = main.create_access_token({"sub": "lote", "user_id": 1, "is_admin": False, "puertos": ["TRP1", "TRP2"]})
+    try:
+        with ArcaStub(latencia=LATENCIA_WSAA) as stub:
+            monkeypatch.setenv("ARCA_WSAA_URL_HOMO", stub.wsaa_wsdl_url)
+            credentials_registry.reload()
+            cliente = TestClient(main.app, headers={"Authorization": f"Bearer {jwt}"})
+            yield cliente, stub, engine
+    finally:
+        main.app.dependency_overrides.clear()
+        cerrar_engine_async(async_engine)
+        main.arca_token_l1.clear()
+        credentials_registry.reload()
+
+
+def _pedir(cliente, pares):
+    items = [{"puerto_codigo": puerto, "servicio_tipo": servicio} for puerto, servicio in pares]
+    respuesta = cliente.post("/arca/tickets", json={"items": items})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(linea) for linea in respuesta.text.splitlines()]
+
+
+def test_lote_cache_primero_y_faltantes_en_paralelo(entorno):
+    cliente, stub, engine = entorno
+    pares = [(puerto, servicio) for puerto in ("TRP1", "TRP2") for servicio in ("CPE", "EMBARQUES", "FACTURACION")]
+
+    inicio = time.perf_counter()
+    lineas = _pedir(cliente, pares)
+    demora = time.perf_counter() - inicio
+
+    assert len(lineas) == 6
+    assert all(l["status_code"] == 200 for l in lineas), lineas
+    # El token cacheado sale primero, sin esperar a WSAA
+    assert (lineas[0]["puerto_codigo"], lineas[0]["servicio_tipo"]) == ("TRP1", "CPE")
+    assert lineas[0]["data"]["token"] == "CACHEADO"
+    assert lineas[0]["cache_info"]["from_cache"]
+    # Una llamada WSAA por servicio faltante y en paralelo (secuencial serían 3 x latencia)
+    assert stub.login_calls == 3
+    assert demora < 2 * LATENCIA_WSAA
+
+    with Session(engine) as session:
+        assert len(session.exec(select(ArcaToken)).all()) == 6
+
+
+def test_lote_valida_puertos_del_token(entorno):
+    cliente, stub, _ = entorno
+
+    lineas = _pedir(cliente, [("TSL1", "CPE"), ("TRP1", "CPE"), ("TRP1", "CPE")])
+
+    assert [(l["puerto_codigo"], l["status_code"]) for l in lineas] == [("TSL1", 403), ("TRP1", 200)]
+    assert stub.login_calls == 0
+
+
+def test_lote_rechaza_servicio_desconocido(entorno):
+    cliente, _, _ = entorno
+
+    respuesta = cliente.post("/arca/tickets", json={"items": [{"puerto_codigo": "TRP1", "servicio_tipo": "OTRO"}]})
+    assert respuesta.status_code == 422
+    assert cliente.post("/arca/tickets", json={"items": []}).status_code == 422
+
+
+def test_token_en_ventana_de_renovacion_con_falla_del_broker(entorno, monkeypatch):
+    cliente, stub, engine = entorno
+    with Session(engine) as session:
+        token = session.exec(select(ArcaToken)).one()
+        token.fecha_vencimiento = datetime.utcnow() + timedelta(minutes=10)
+        session.add(token)
+        session.commit()
+        solicitado = token.fecha_solicitud
+    respuestas = []
+
+    async def fetcher(service_type, environment):
+        return respuestas.pop(0)
+
+    monkeypatch.setattr(main, "ticket_broker", TicketBroker(fetcher))
+    # Reinicio con el broker vacío: WSAA responde que ya hay un TA válido
+    respuestas.append({"success": False, "error": "El CEE ya posee un TA valido para el acceso al WSN solicitado"})
+    degradada = cliente.post("/get-ticket-cpe", json={"puerto_codigo": "TRP1"})
+    # El broker devuelve el mismo ticket (todavía no renovó): no se vuelve a guardar
+    respuestas.append({"success": True, "token": "CACHEADO", "sign": "S", "service": "wscpe"})
+    main.arca_token_l1.clear()
+    igual = cliente.post("/get-ticket-cpe", json={"puerto_codigo": "TRP1"})
+
+    assert degradada.status_code == 200 and degradada.json()["cache_info"]["degraded"]
+    assert degradada.json()["data"]["token"] == "CACHEADO"
+    assert igual.status_code == 200 and igual.json()["cache_info"]["from_cache"]
+    with Session(engine) as session:
+        assert session.exec(select(ArcaToken)).one().fecha_solicitud == solicitado
+    assert stub.login_calls == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
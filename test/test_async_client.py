@@ -0,0 +1,116 @@
+"""
+Pruebas del cliente asyncio de WSAA (Arca/async_client.py) contra el stub local.
+
+Verifica que el ticket se obtiene con el mismo formato que
+get_arca_access_ticket y que el event loop sigue atendiendo otras tareas
+mientras WSAA tarda en responder.
+
+Uso:
+    python -m pytest -q test/test_async_client.py
+    python test/test_async_client.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno
+from arca_stub import ArcaStub
+
+configurar_certificados_entorno(os.environ, Path(tempfile.mkdtemp(prefix="async_certs_")), "async")
+
+from Arca.async_client import get_arca_access_ticket_async, wsaa_endpoint, wsaa_async_client
+from Arca.ticket_broker import TicketBroker
+from Arca.wsaa import credentials_registry
+
+
+def test_wsaa_endpoint_sin_wsdl():
+    assert wsaa_endpoint("https://wsaahomo.afip.gov.ar/ws/services/LoginCms?WSDL") == \
+        "https://wsaahomo.afip.gov.ar/ws/services/LoginCms"
+    assert wsaa_endpoint("http://127.0.0.1:1/ws/services/LoginCms") == "http://127.0.0.1:1/ws/services/LoginCms"
+
+
+def test_ticket_async_contra_stub():
+    with ArcaStub() as stub:
+        os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+        credentials_registry.reload()
+
+        async def escenario():
+            try:
+                return await get_arca_access_ticket_async("FACTURACION", "HOMO")
+            finally:
+                await wsaa_async_client.aclose()
+
+        resultado = asyncio.run(escenario())
+
+    assert resultado['success'], resultado
+    assert resultado['token'] and resultado['sign']
+    assert resultado['service'] == 'wsfe'
+    assert resultado['environment'] == 'HOMO'
+    assert stub.login_calls == 1
+    # El cliente async no descarga el WSDL
+    assert stub.wsdl_requests == 0
+
+
+def test_wsaa_caido_devuelve_error():
+    os.environ['ARCA_WSAA_URL_HOMO'] = "http://127.0.0.1:9/ws/services/LoginCms?WSDL"
+    credentials_registry.reload()
+
+    async def escenario():
+        try:
+            return await get_arca_access_ticket_async("CPE", "HOMO")
+        finally:
+            await wsaa_async_client.aclose()
+
+    resultado = asyncio.run(escenario())
+
+    assert resultado['success'] is False
+    assert resultado['details'] == 'Error en la comunicación con WSAA'
+
+
+def test_event_loop_no_se_bloquea_con_wsaa_lento():
+    """Con WSAA tardando 0.5s, el loop sigue atendiendo otras corrutinas."""
+    with ArcaStub(latencia=0.5) as stub:
+        os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+        credentials_registry.reload()
+        broker = TicketBroker()
+
+        async def latidos(fin):
+            mayor_pausa = 0.0
+            anterior = time.perf_counter()
+            while not fin.is_set():
+                await asyncio.sleep(0.01)
+                ahora = time.perf_counter()
+                mayor_pausa = max(mayor_pausa, ahora - anterior)
+                anterior = ahora
+            return mayor_pausa
+
+        async def escenario():
+            fin = asyncio.Event()
+            tarea_latidos = asyncio.create_task(latidos(fin))
+            try:
+                resultados = await asyncio.gather(*[broker.get_ticket("CPE", "HOMO") for _ in range(20)])
+            finally:
+                fin.set()
+                await wsaa_async_client.aclose()
+            return resultados, await tarea_latidos
+
+        resultados, mayor_pausa = asyncio.run(escenario())
+
+    assert all(r['success'] for r in resultados)
+    assert stub.login_calls == 1
+    assert mayor_pausa < 0.15, f"El event loop estuvo bloqueado {mayor_pausa:.3f}s"
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
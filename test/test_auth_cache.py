@@ -0,0 +1,158 @@
+"""
+Pruebas del camino rápido de autenticación (jwt_memo y principal_cache en main.py).
+
+Verifica que los requests autenticados no consultan la base en régimen
+estable, que deshabilitar un usuario o cambiar sus puertos invalida el
+principal al instante (en el commit, no en el flush) y que el JWT se decodifica una sola vez hasta su exp.
+
+Uso:
+    python -m pytest -q test/test_auth_cache.py
+    python test/test_auth_cache.py
+"""
+
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import main
+from utilidades_prueba import crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from utils.auth_cache import PrincipalCache
+
+
+@pytest.fixture
+def entorno():
+    """App con base temporal que cuenta las consultas de la app; devuelve (cliente, engine, consultas)."""
+    engine, async_engine = crear_base_prueba()
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="auth", nombre_completo="Auth", email="a@x", password_hash="x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"),
+                         UsuarioPuerto(usuario_id=1, puerto_id=1)])
+        session.commit()
+
+    consultas = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: consultas.append(args[2]))
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.principal_cache.invalidar_todos()
+    main.jwt_memo.clear()
+    jwt = main.create_access_token({"sub": "auth", "user_id": 1, "is_admin": False, "puertos": ["TRP1"]})
+    try:
+        yield TestClient(main.app, headers={"Authorization": f"Bearer {jwt}"}), engine, consultas
+    finally:
+        main.app.dependency_overrides.clear()
+        cerrar_engine_async(async_engine)
+        main.principal_cache.invalidar_todos()
+
+
+def test_requests_sin_consultas_a_la_base(entorno):
+    cliente, _, consultas = entorno
+
+    assert cliente.get("/health").status_code == 200
+    cargas = len(consultas)
+    for _ in range(50):
+        assert cliente.get("/health").status_code == 200
+
+    assert cargas == 1
+    assert len(consultas) == cargas
+
+
+def test_usuario_deshabilitado_invalida_al_instante(entorno):
+    cliente, engine, _ = entorno
+    assert cliente.get("/health").status_code == 200
+
+    with Session(engine) as session:
+        usuario = session.get(Usuario, 1)
+        usuario.habilitado = False
+        session.commit()
+
+    assert cliente.get("/health").status_code == 403
+
+
+def test_cambios_de_puertos_y_ultimo_acceso(entorno):
+    cliente, engine, consultas = entorno
+    cliente.get("/health")
+    version = main.principal_cache.version(1)
+
+    # ultimo_acceso (se actualiza en cada login) no invalida el principal
+    with Session(engine) as session:
+        session.get(Usuario, 1).ultimo_acceso = main.datetime.utcnow()
+        session.commit()
+    assert main.principal_cache.version(1) == version
+
+    with Session(engine) as session:
+        session.exec(select(UsuarioPuerto)).first().habilitado = False
+        session.commit()
+    assert main.principal_cache.version(1) != version
+
+    cargas = len(consultas)
+    assert cliente.get("/health").status_code == 200
+    assert len(consultas) == cargas + 1
+
+
+def test_invalidacion_recien_en_el_commit(entorno):
+    cliente, engine, _ = entorno
+    cliente.get("/health")
+    version = main.principal_cache.version(1)
+
+    # El flush no invalida; un rollback descarta la invalidación pendiente
+    with Session(engine) as session:
+        session.get(Usuario, 1).habilitado = False
+        session.flush()
+        assert main.principal_cache.version(1) == version
+        session.rollback()
+    assert main.principal_cache.version(1) == version
+    assert cliente.get("/health").status_code == 200
+
+    with Session(engine) as session:
+        session.get(Puerto, 1).nombre = "Puerto Uno"
+        session.flush()
+        assert main.principal_cache.version(1) == version
+        session.commit()
+    assert main.principal_cache.version(1) != version
+
+
+def test_cambio_durante_la_carga_no_publica_principal_viejo():
+    cache = PrincipalCache(ttl=60)
+    version = cache.version(7)      # request A toma la versión y consulta la base...
+    cache.invalidar(7)              # ...mientras se deshabilita el usuario
+    cache.set(7, "principal viejo", version)
+
+    assert cache.get(7) is None
+
+
+def test_jwt_decodificado_una_vez_hasta_exp(entorno, monkeypatch):
+    cliente, _, _ = entorno
+    decodificaciones = []
+    decode_original = main.jwt.decode
+
+    def contar(*args, **kwargs):
+        decodificaciones.append(1)
+        return decode_original(*args, **kwargs)
+
+    monkeypatch.setattr(main.jwt, "decode", contar)
+    for _ in range(20):
+        assert cliente.get("/health").status_code == 200
+    assert len(decodificaciones) == 1
+
+    corto = main.create_access_token({"sub": "auth", "user_id": 1, "puertos": []}, expires_delta=timedelta(seconds=1))
+    encabezado = {"Authorization": f"Bearer {corto}"}
+    assert cliente.get("/health", headers=encabezado).status_code == 200
+    time.sleep(2.1)
+    # Vencido: ya no sale del memo y la decodificación lo rechaza
+    assert cliente.get("/health", headers=encabezado).status_code == 401
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
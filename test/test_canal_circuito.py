@@ -0,0 +1,231 @@
+"""
+Pruebas del canal de eventos del circuito (utils/canal_circuito.py) y del endpoint SSE /eventos.
+
+Verifica que los cambios de un tick se coalescen en un diff por puerto
+(serializado una vez por filtro), el filtro por sector, el descarte de
+consumidores lentos sin frenar a los demás, el keepalive solo a los
+streams sin tráfico, que un suscriptor nuevo no
+recibe cambios que ya están en su estado inicial y que el motor de
+transiciones y los commits del ORM (no los rollbacks) publican.
+
+Uso:
+    python -m pytest -q test/test_canal_circuito.py
+    python test/test_canal_circuito.py
+"""
+
+import sys
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+import main
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.carta_porte import CartaPorteElectronica, EstadoCamion
+from utils.canal_circuito import CanalCircuito, CambioEstado, canal_circuito, KEEPALIVE
+from utils.transiciones import MotorTransiciones, SolicitudTransicion
+from utilidades_prueba import carta_prueba as _carta, sesion_async_prueba
+
+AHORA = datetime(2025, 4, 1, 8, 0)
+
+
+def _cambio(carta_id, anterior, nuevo, puerto="TRP1"):
+    return CambioEstado(carta_id, f"AB{carta_id:03d}CD", puerto, "SOJA", None, anterior, nuevo, AHORA)
+
+
+def _eventos(texto):
+    """Frames SSE -> [(evento, datos)] (sin los comentarios de keepalive)."""
+    eventos = []
+    for bloque in texto.split("\n\n"):
+        campos = dict(linea.split(": ", 1) for linea in bloque.splitlines() if linea and not linea.startswith(":"))
+        if "event" in campos:
+            eventos.append((campos["event"], json.loads(campos["data"])))
+    return eventos
+
+
+async def _leer(suscripcion):
+    return _eventos(await asyncio.wait_for(suscripcion.siguiente(), timeout=1))
+
+
+def test_diff_coalescido_y_filtrado_por_sector():
+    canal = CanalCircuito(tick=0.01)
+
+    async def escenario():
+        precalado = [canal.suscribir("TRP1", [4]), canal.suscribir("TRP1", [4])]
+        todos = canal.suscribir("TRP1")
+        otro_puerto = canal.suscribir("TRP2")
+        canal.publicar([
+            # Entró y salió de Precalado en el mismo tick: para esa cola no hubo cambio
+            _cambio(1, "EN_VIAJE", "INGRESADO"), _cambio(1, "INGRESADO", "EN_CALADA"),
+            _cambio(2, "EN_VIAJE", "INGRESADO"),
+            # Ida y vuelta: sin cambio neto
+            _cambio(3, "EN_PLAYA", "EN_VIAJE"), _cambio(3, "EN_VIAJE", "EN_PLAYA"),
+        ])
+        await asyncio.sleep(0.05)
+        return [await _leer(s) for s in precalado], await _leer(todos), otro_puerto
+
+    precalado, todos, otro_puerto = asyncio.run(escenario())
+    assert precalado[0] == precalado[1]
+    [(evento, diff)] = precalado[0]
+    assert evento == "diff"
+    assert [(c["carta_id"], c["estado_anterior"], c["estado_nuevo"], c["sector_nuevo"]) for c in diff["cartas"]] == \
+        [(2, "EN_VIAJE", "INGRESADO", 4)]
+    assert diff["contadores"] == {"INGRESADO": 1}
+    [(_, diff)] = todos
+    assert sorted((c["carta_id"], c["estado_anterior"], c["estado_nuevo"]) for c in diff["cartas"]) == \
+        [(1, "EN_VIAJE", "EN_CALADA"), (2, "EN_VIAJE", "INGRESADO")]
+    assert diff["contadores"] == {"EN_VIAJE": -2, "EN_CALADA": 1, "INGRESADO": 1}
+    assert not otro_puerto._buffer
+    # Un diff, serializado una vez por filtro (no por suscriptor)
+    assert (canal.stats()["diffs"], canal.stats()["frames_serializados"], canal.stats()["frames_entregados"]) == (1, 2, 3)
+
+
+def test_consumidor_lento_descartado():
+    canal = CanalCircuito(tick=0.005, limite_buffer=3)
+
+    async def escenario():
+        lento, rapido = canal.suscribir("TRP1"), canal.suscribir("TRP1")
+        recibidos = []
+        for i in range(6):
+            canal.publicar([_cambio(i, "EN_PLAYA", "EN_VIAJE")])
+            await asyncio.sleep(0.02)
+            recibidos += await _leer(rapido)
+        return lento, recibidos
+
+    lento, recibidos = asyncio.run(escenario())
+    assert [diff["cartas"][0]["carta_id"] for _, diff in recibidos] == list(range(6))
+    # El lento pierde lo pendiente y recibe solo el aviso de resincronización
+    assert _eventos(asyncio.run(lento.siguiente())) == [("resync", {"motivo": "consumidor_lento"})]
+    assert asyncio.run(lento.siguiente()) is None
+    assert (canal.stats()["descartados_lentos"], canal.stats()["suscriptores"]) == (1, 1)
+
+
+def test_suscriptor_nuevo_no_recibe_cambios_anteriores():
+    canal = CanalCircuito(tick=0.02)
+
+    async def escenario():
+        antes = canal.suscribir("TRP1")
+        canal.publicar([_cambio(1, "EN_PLAYA", "EN_VIAJE")])
+        # Se suscribe con el cambio 1 pendiente: ya está en sus contadores iniciales
+        despues = canal.suscribir("TRP1")
+        canal.publicar([_cambio(2, "EN_PLAYA", "EN_VIAJE")])
+        await asyncio.sleep(0.06)
+        return await _leer(antes), await _leer(despues)
+
+    antes, despues = asyncio.run(escenario())
+    assert sorted(c["carta_id"] for c in antes[0][1]["cartas"]) == [1, 2]
+    assert [c["carta_id"] for c in despues[0][1]["cartas"]] == [2]
+    assert antes[0][1]["seq"] == despues[0][1]["seq"]
+
+
+def test_latido_solo_a_streams_sin_trafico():
+    canal = CanalCircuito(tick=0.001, keepalive=0.05)
+
+    async def escenario():
+        quieta, activa = canal.suscribir("TRP1"), canal.suscribir("TRP2")
+        await asyncio.sleep(0.03)
+        canal.publicar([_cambio(1, "EN_PLAYA", "EN_VIAJE", puerto="TRP2")])
+        await asyncio.sleep(0.04)
+        return await asyncio.wait_for(quieta.siguiente(), 1), await _leer(activa)
+
+    quieta, activa = asyncio.run(escenario())
+    assert quieta == KEEPALIVE
+    assert [evento for evento, _ in activa] == ["diff"]
+
+
+@pytest.fixture
+def bases(bases):
+    yield bases
+    canal_circuito.cerrar()
+
+
+def test_motor_y_orm_publican_al_confirmar(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        session.add_all([_carta(1), _carta(2)])
+        session.commit()
+
+    async def escenario():
+        suscripcion = canal_circuito.suscribir("TRP1")
+        try:
+            await MotorTransiciones().aplicar(async_engine, SolicitudTransicion(
+                hacia=EstadoCamion.EN_VIAJE, autorizado_por="playa", puerto_codigo="TRP1", numero_carta="CPE-1",
+                puesto_asignado="Playa 3"))
+            with Session(engine) as session:
+                carta = session.get(CartaPorteElectronica, 2)
+                carta.estado_actual = EstadoCamion.EN_VIAJE
+                session.add(carta)
+                session.flush()
+                session.rollback()
+                carta = session.get(CartaPorteElectronica, 2)
+                session.delete(carta)
+                session.commit()
+            await asyncio.sleep(canal_circuito.tick + 0.1)
+            return await _leer(suscripcion)
+        finally:
+            canal_circuito.cancelar(suscripcion)
+
+    [(_, diff)] = asyncio.run(escenario())
+    cartas = {c["carta_id"]: c for c in diff["cartas"]}
+    assert (cartas[1]["estado_anterior"], cartas[1]["estado_nuevo"], cartas[1]["puesto_asignado"]) == \
+        ("EN_PLAYA", "EN_VIAJE", "Playa 3")
+    # El rollback no se publicó; la baja sí
+    assert (cartas[2]["estado_anterior"], cartas[2]["estado_nuevo"]) == ("EN_PLAYA", None)
+    assert diff["contadores"] == {"EN_PLAYA": -2, "EN_VIAJE": 1}
+
+
+def test_endpoint_eventos(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="pantalla", password_hash="x", nombre_completo="Pantalla", email="p@x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"), UsuarioPuerto(usuario_id=1, puerto_id=1),
+                         _carta(1, EstadoCamion.INGRESADO), _carta(2, EstadoCamion.EN_VIAJE)])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    main.acl_index.invalidar()
+    main.contadores_circuito.invalidar()
+    try:
+        cliente = TestClient(main.app)
+        assert cliente.get("/eventos/TRP2").status_code == 403
+        assert cliente.get("/eventos/TRP1", params={"sectores": [99]}).status_code == 422
+
+        # El TestClient devuelve la respuesta cuando el stream termina: se lo cierra desde acá
+        with ThreadPoolExecutor(max_workers=1) as hilo:
+            pedido = hilo.submit(cliente.get, "/eventos/TRP1", params={"sectores": [4]})
+            limite = time.monotonic() + 5
+            while canal_circuito.stats()["suscriptores"] == 0 and time.monotonic() < limite:
+                time.sleep(0.01)
+            canal_circuito.publicar([_cambio(2, "EN_VIAJE", "INGRESADO"), _cambio(7, "EN_PLAYA", "EN_VIAJE")])
+            time.sleep(canal_circuito.tick + 0.2)
+            canal_circuito.cerrar()
+            respuesta = pedido.result(timeout=5)
+    finally:
+        main.app.dependency_overrides.clear()
+        main.contadores_circuito.invalidar()
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/event-stream")
+    eventos = _eventos(respuesta.text)
+    assert [evento for evento, _ in eventos] == ["estado", "diff", "resync"]
+    assert eventos[0][1]["contadores"] == {"INGRESADO": 1}
+    assert [c["carta_id"] for c in eventos[1][1]["cartas"]] == [2]
+    assert eventos[2][1] == {"motivo": "apagado"}
+    assert canal_circuito.stats()["suscriptores"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
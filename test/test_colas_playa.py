@@ -0,0 +1,232 @@
+"""
+Pruebas de las colas de playa (utils/colas_playa.py) y de los endpoints de llamado.
+
+Verifica el orden de cada playa (Precalado: Cereal + FIFO; post-Calada:
+Calidad, Cereal + FIFO), la reconstrucción desde MovimientoSector, que los
+cambios de estado del ORM se reflejan recién en el commit, que la recarga
+periódica incorpora lo escrito por otros workers sin perder los cambios
+locales hechos mientras corre y que el llamado pasa la carta al estado
+siguiente con su movimiento.
+
+Uso:
+    python -m pytest -q test/test_colas_playa.py
+    python test/test_colas_playa.py
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, update
+from sqlmodel import Session, select
+
+import main
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.carta_porte import CartaPorteElectronica, MovimientoSector, EstadoCamion, TipoCereal, CalidadCereal
+from utils.colas_playa import ColasPlaya, PLAYAS, colas_playa
+from utilidades_prueba import carta_prueba, crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+
+PRECALADO, POST_CALADA = PLAYAS["precalado"], PLAYAS["post-calada"]
+INICIO = datetime(2025, 4, 1, 8, 0)
+
+
+def _carta(numero, patente, estado, cereal, calidad=None, puerto="TRP1"):
+    return carta_prueba(numero, estado, cereal, puerto, calidad_asignada=calidad, patente=patente,
+                        fecha_ingreso=INICIO, created_at=INICIO)
+
+
+def _llegada(carta, estado, minutos):
+    return MovimientoSector(carta_porte_id=carta.id, sector_destino=4, estado_anterior=EstadoCamion.EN_VIAJE,
+                            estado_nuevo=estado, timestamp_movimiento=INICIO + timedelta(minutes=minutos),
+                            autorizado_por="porteria")
+
+
+def test_orden_de_cada_playa():
+    colas = ColasPlaya()
+    llegadas = [
+        (1, "AAA111", "INGRESADO", "SOJA", None, 1), (2, "AAA222", "INGRESADO", "TRIGO", None, 5),
+        (3, "AAA333", "INGRESADO", "TRIGO", None, 2), (4, "AAA444", "INGRESADO", "SOJA", None, 0),
+        (5, "BBB111", "POST_CALADA", "SOJA", "ESTANDAR", 0), (6, "BBB222", "POST_CALADA", "MAIZ", "PREMIUM", 9),
+        (7, "BBB333", "POST_CALADA", "TRIGO", "ESTANDAR", 3), (8, "BBB444", "POST_CALADA", "MAIZ", "PREMIUM", 4),
+    ]
+    for carta_id, patente, estado, cereal, calidad, minutos in llegadas:
+        colas.aplicar_estado(carta_id, patente, "TRP1", estado, cereal, calidad, desde=INICIO + timedelta(minutes=minutos))
+
+    # Precalado: cereal (orden de TipoCereal) y FIFO dentro de cada cereal
+    _, camiones = colas.listar("TRP1", PRECALADO)
+    assert [c.patente for c in camiones] == ["AAA333", "AAA222", "AAA444", "AAA111"]
+    assert colas.primero("TRP1", PRECALADO, TipoCereal.SOJA).patente == "AAA444"
+    # Post-Calada: calidad, cereal y FIFO
+    total, camiones = colas.listar("TRP1", POST_CALADA, limite=3)
+    assert total == 4
+    assert [c.patente for c in camiones] == ["BBB444", "BBB222", "BBB333"]
+
+    # Quitar por patente y sacar el primero
+    assert colas.quitar_patente("BBB444").carta_id == 8
+    assert colas.sacar("TRP1", POST_CALADA).patente == "BBB222"
+    assert colas.sacar("TRP1", POST_CALADA, calidad=CalidadCereal.PREMIUM) is None
+    assert colas.sacar("TRP2", PRECALADO) is None
+    # Otra playa de la misma carta: sale de la anterior
+    colas.aplicar_estado(1, "AAA111", "TRP1", EstadoCamion.EN_CALADA, "SOJA", None)
+    assert colas.stats()["camiones"] == 5
+
+
+def test_reconstruccion_y_commits(bases):
+    engine, _ = bases
+    try:
+        with Session(engine) as session:
+            cartas = [
+                _carta(1, "AAA111", EstadoCamion.INGRESADO, TipoCereal.MAIZ),
+                _carta(2, "AAA222", EstadoCamion.INGRESADO, TipoCereal.MAIZ),
+                _carta(3, "AAA333", EstadoCamion.EN_VIAJE, TipoCereal.MAIZ),
+            ]
+            session.add_all(cartas)
+            session.commit()
+            # La llegada a Precalado sale del último movimiento de entrada, no del alta
+            session.add_all([_llegada(cartas[0], EstadoCamion.INGRESADO, 30), _llegada(cartas[1], EstadoCamion.INGRESADO, 10)])
+            session.commit()
+
+            colas = ColasPlaya()
+            colas.cargar(session)
+            assert [c.patente for c in colas.listar("TRP1", PRECALADO)[1]] == ["AAA222", "AAA111"]
+
+            # Las colas globales siguen los commits del ORM (y no los rollbacks)
+            colas_playa.cargar(session)
+            cartas[2].estado_actual = EstadoCamion.INGRESADO
+            session.add(cartas[2])
+            session.flush()
+            session.rollback()
+            assert colas_playa.primero("TRP1", PRECALADO).patente == "AAA222"
+            assert colas_playa.listar("TRP1", PRECALADO)[0] == 2
+
+            carta = session.get(CartaPorteElectronica, cartas[2].id)
+            carta.estado_actual = EstadoCamion.INGRESADO
+            session.add(carta)
+            session.commit()
+            assert [c.patente for c in colas_playa.listar("TRP1", PRECALADO)[1]] == ["AAA222", "AAA111", "AAA333"]
+
+            carta = session.get(CartaPorteElectronica, cartas[1].id)
+            carta.estado_actual = EstadoCamion.EN_CALADA
+            session.add(carta)
+            session.commit()
+            assert colas_playa.primero("TRP1", PRECALADO).patente == "AAA111"
+    finally:
+        colas_playa.invalidar()
+
+
+def test_recarga_con_cambios_de_otro_worker(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        session.add_all([
+            _carta(1, "AAA111", EstadoCamion.INGRESADO, TipoCereal.MAIZ),
+            _carta(2, "AAA222", EstadoCamion.INGRESADO, TipoCereal.MAIZ),
+            _carta(3, "AAA333", EstadoCamion.EN_VIAJE, TipoCereal.MAIZ),
+        ])
+        session.commit()
+        colas = ColasPlaya(intervalo=60)
+        colas.cargar(session)
+
+    # Otro worker (sin eventos del ORM en este proceso): llama a AAA222 e ingresa AAA333
+    tabla = CartaPorteElectronica.__table__
+    with engine.begin() as conexion:
+        conexion.execute(update(tabla).where(tabla.c.id == 2).values(estado_actual=EstadoCamion.EN_CALADA))
+        conexion.execute(update(tabla).where(tabla.c.id == 3).values(estado_actual=EstadoCamion.INGRESADO))
+    assert [c.patente for c in colas.listar("TRP1", PRECALADO)[1]] == ["AAA111", "AAA222"]
+
+    # Un llamado local mientras corre la consulta de la recarga (que todavía ve la carta en la playa)
+    llamados = []
+
+    def llamar_durante_la_consulta(*args):
+        if not llamados:
+            llamados.append(colas.sacar("TRP1", PRECALADO).patente)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", llamar_durante_la_consulta)
+    asyncio.run(colas.recargar(async_engine))
+
+    assert llamados == ["AAA111"]
+    assert [c.patente for c in colas.listar("TRP1", PRECALADO)[1]] == ["AAA333"]
+    assert colas.stats()["recargas"] == 2
+
+
+@pytest.fixture
+def cliente(tmp_path):
+    """App con base temporal: un usuario con acceso a TRP1 y camiones en las dos playas."""
+    engine, async_engine = crear_base_prueba(tmp_path)
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="operaciones", password_hash="x", nombre_completo="Operaciones", email="o@x")
+        session.add_all([
+            usuario,
+            Puerto(id=1, nombre="Puerto 1", codigo="TRP1"),
+            Puerto(id=2, nombre="Puerto 2", codigo="TRP2"),
+            UsuarioPuerto(usuario_id=1, puerto_id=1),
+            _carta(1, "AAA111", EstadoCamion.INGRESADO, TipoCereal.MAIZ),
+            _carta(2, "AAA222", EstadoCamion.INGRESADO, TipoCereal.TRIGO),
+            _carta(3, "BBB111", EstadoCamion.POST_CALADA, TipoCereal.SOJA, CalidadCereal.COMERCIAL),
+        ])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    main.acl_index.invalidar()
+    colas_playa.invalidar()
+    main.lecturas_compartidas.invalidar()
+    try:
+        yield TestClient(main.app), engine
+    finally:
+        main.app.dependency_overrides.clear()
+        colas_playa.invalidar()
+        main.lecturas_compartidas.invalidar()
+        engine.dispose()
+        cerrar_engine_async(async_engine)
+
+
+def test_llamar_camion(cliente):
+    cliente, engine = cliente
+    respuesta = cliente.get("/colas/TRP1/precalado")
+    assert respuesta.status_code == 200
+    assert [c["patente"] for c in respuesta.json()["camiones"]] == ["AAA222", "AAA111"]
+
+    respuesta = cliente.post("/colas/TRP1/precalado/llamar", json={"tipo_cereal": "Maíz", "puesto_asignado": "Calador 2"})
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["camion"]["patente"] == "AAA111"
+    assert respuesta.json()["estado_nuevo"] == "EN_CALADA"
+
+    with Session(engine) as session:
+        carta = session.exec(select(CartaPorteElectronica).where(CartaPorteElectronica.patente == "AAA111")).one()
+        movimiento = session.exec(select(MovimientoSector)).one()
+    assert carta.estado_actual == EstadoCamion.EN_CALADA
+    assert (movimiento.estado_anterior, movimiento.estado_nuevo, movimiento.sector_origen, movimiento.sector_destino) == \
+        (EstadoCamion.INGRESADO, EstadoCamion.EN_CALADA, 4, 5)
+    assert (movimiento.puesto_asignado, movimiento.autorizado_por) == ("Calador 2", "operaciones")
+
+    assert cliente.post("/colas/TRP1/precalado/llamar", json={"tipo_cereal": "Maíz"}).status_code == 404
+    assert cliente.post("/colas/TRP1/post-calada/llamar", json={}).json()["camion"]["patente"] == "BBB111"
+    assert cliente.get("/colas/TRP1/post-calada").json()["total"] == 0
+    assert cliente.get("/colas/TRP2/precalado").status_code == 403
+    assert cliente.get("/colas/TRP1/calada").status_code == 422
+
+
+def test_llamado_descarta_cartas_que_ya_salieron(cliente):
+    cliente, engine = cliente
+    assert cliente.get("/colas/TRP1/precalado").json()["total"] == 2
+    # Cambio fuera del ORM (no llega a las colas): el llamado lo detecta y sigue con el próximo
+    with engine.begin() as conexion:
+        conexion.exec_driver_sql("UPDATE cartaporteelectronica SET estado_actual = 'EN_CALADA' WHERE patente = 'AAA222'")
+
+    respuesta = cliente.post("/colas/TRP1/precalado/llamar", json={})
+    assert respuesta.json()["camion"]["patente"] == "AAA111"
+    with Session(engine) as session:
+        assert len(session.exec(select(MovimientoSector)).all()) == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
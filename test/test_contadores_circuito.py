@@ -0,0 +1,171 @@
+"""
+Pruebas de los contadores del tablero de Operaciones (utils/contadores_circuito.py) y del endpoint /tablero.
+
+Verifica que las escrituras del ORM y del motor de transiciones mantienen
+la tabla contadorcircuito en la misma transacción (un rollback no deja
+rastro), que el espejo en memoria recibe los deltas recién en el commit
+y que la reconciliación desde MovimientoSector corrige los desvíos.
+
+Uso:
+    python -m pytest -q test/test_contadores_circuito.py
+    python test/test_contadores_circuito.py
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+import main
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.carta_porte import CartaPorteElectronica, EstadoCamion, TipoCereal, CalidadCereal, CIRCUITO
+from utils.contadores_circuito import ContadoresCircuito, contadores_circuito
+from utils.transiciones import MotorTransiciones, SolicitudTransicion
+from utilidades_prueba import carta_prueba as _carta, sesion_async_prueba
+
+
+def _tabla(engine):
+    with engine.connect() as conexion:
+        return sorted(tuple(fila) for fila in conexion.exec_driver_sql(
+            "SELECT puerto_codigo, estado, tipo_cereal, calidad, cantidad FROM contadorcircuito WHERE cantidad != 0"
+        ))
+
+
+def _contados(engine):
+    """Lo que el tablero evita: el COUNT(*) sobre las cartas."""
+    with engine.connect() as conexion:
+        return sorted(tuple(fila) for fila in conexion.exec_driver_sql(
+            "SELECT puerto_codigo, estado_actual, tipo_cereal, COALESCE(calidad_asignada, ''), COUNT(*) "
+            "FROM cartaporteelectronica GROUP BY 1, 2, 3, 4"
+        ))
+
+
+@pytest.fixture
+def bases(bases):
+    contadores_circuito.invalidar()
+    yield bases
+    contadores_circuito.invalidar()
+
+
+def test_escrituras_del_orm(bases):
+    engine, _ = bases
+    with Session(engine) as session:
+        session.add_all([_carta(1), _carta(2), _carta(3, cereal=TipoCereal.MAIZ), _carta(4, puerto="TRP2")])
+        session.commit()
+        contadores_circuito.cargar(session)
+
+        carta = session.get(CartaPorteElectronica, 1)
+        carta.estado_actual = EstadoCamion.EN_VIAJE
+        session.add(carta)
+        session.flush()
+        # Escrito en la transacción pero sin commit: el espejo no cambia; el rollback lo deshace
+        assert contadores_circuito.tablero("TRP1")["EN_VIAJE"] == 0
+        session.rollback()
+        assert _tabla(engine) == _contados(engine)
+        assert contadores_circuito.tablero("TRP1")["EN_PLAYA"] == 3
+
+        carta = session.get(CartaPorteElectronica, 2)
+        carta.estado_actual = EstadoCamion.POST_CALADA
+        carta.calidad_asignada = CalidadCereal.PREMIUM
+        session.add(carta)
+        session.delete(session.get(CartaPorteElectronica, 3))
+        session.commit()
+
+    assert _tabla(engine) == _contados(engine) == [
+        ("TRP1", "EN_PLAYA", "SOJA", "", 1), ("TRP1", "POST_CALADA", "SOJA", "PREMIUM", 1), ("TRP2", "EN_PLAYA", "SOJA", "", 1)
+    ]
+    tablero = contadores_circuito.tablero("TRP1")
+    assert list(tablero) == [estado.name for estado in CIRCUITO]
+    assert (tablero["EN_PLAYA"], tablero["POST_CALADA"], sum(tablero.values())) == (1, 1, 2)
+    assert contadores_circuito.tablero("TRP1", calidad=CalidadCereal.PREMIUM)["POST_CALADA"] == 1
+    assert sum(contadores_circuito.tablero("TRP1", tipo_cereal=TipoCereal.MAIZ).values()) == 0
+
+
+def test_transiciones_en_la_misma_transaccion(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        session.add_all([_carta(i, EstadoCamion.EN_CALADA) for i in range(20)])
+        session.commit()
+        contadores_circuito.cargar(session)
+    motor = MotorTransiciones()
+
+    async def escanear():
+        calidades = [CalidadCereal.PREMIUM, CalidadCereal.RECHAZO]
+        await asyncio.gather(*[motor.aplicar(async_engine, SolicitudTransicion(
+            hacia=EstadoCamion.POST_CALADA, autorizado_por="calador", puerto_codigo="TRP1",
+            numero_carta=f"CPE-{i}", calidad_asignada=calidades[i % 2])) for i in range(12)])
+        await asyncio.gather(*[motor.aplicar(async_engine, SolicitudTransicion(
+            hacia=EstadoCamion.EN_BALANZA_BRUTO, autorizado_por="playero", puerto_codigo="TRP1",
+            numero_carta=f"CPE-{i}")) for i in range(4)])
+
+    asyncio.run(escanear())
+    assert _tabla(engine) == _contados(engine)
+    tablero = contadores_circuito.tablero("TRP1")
+    assert (tablero["EN_CALADA"], tablero["POST_CALADA"], tablero["EN_BALANZA_BRUTO"]) == (8, 8, 4)
+    assert contadores_circuito.tablero("TRP1", calidad=CalidadCereal.RECHAZO)["POST_CALADA"] == 4
+
+
+def test_reconciliacion_desde_movimientos(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        session.add_all([_carta(i) for i in range(5)])
+        session.commit()
+    motor = MotorTransiciones()
+
+    async def escanear():
+        for i in range(3):
+            await motor.aplicar(async_engine, SolicitudTransicion(
+                hacia=EstadoCamion.EN_VIAJE, autorizado_por="playa", puerto_codigo="TRP1", numero_carta=f"CPE-{i}"))
+
+    asyncio.run(escanear())
+    esperado = _tabla(engine)
+    # Desvíos: un contador pisado y una carta que cambia de estado sin su movimiento
+    with engine.begin() as conexion:
+        conexion.exec_driver_sql("UPDATE contadorcircuito SET cantidad = 40 WHERE estado = 'EN_VIAJE'")
+        conexion.exec_driver_sql("INSERT INTO contadorcircuito VALUES ('TRP9', 'SALIDO', 'SOJA', '', 2)")
+        conexion.exec_driver_sql("UPDATE cartaporteelectronica SET estado_actual = 'INGRESADO' WHERE numero_carta = 'CPE-0'")
+
+    contadores = ContadoresCircuito(intervalo=60)
+    resultado = asyncio.run(contadores.reconciliar(async_engine))
+    assert resultado == {"corregidas": 2, "desfasadas": 1}
+    assert _tabla(engine) == esperado
+    assert (contadores.tablero("TRP1")["EN_VIAJE"], contadores.tablero("TRP9")["SALIDO"]) == (3, 0)
+    assert asyncio.run(contadores.reconciliar(async_engine))["corregidas"] == 0
+
+
+def test_endpoint_tablero(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="operaciones", password_hash="x", nombre_completo="Operaciones", email="o@x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"), UsuarioPuerto(usuario_id=1, puerto_id=1),
+                         _carta(1), _carta(2, EstadoCamion.SALIDO), _carta(3, EstadoCamion.SALIDO, TipoCereal.TRIGO)])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    main.acl_index.invalidar()
+    main.lecturas_compartidas.invalidar()
+    try:
+        cliente = TestClient(main.app)
+        respuesta = cliente.get("/tablero/TRP1")
+        assert respuesta.status_code == 200, respuesta.text
+        estados = {e["estado"]: e for e in respuesta.json()["estados"]}
+        assert respuesta.json()["total"] == 3
+        assert (estados["EN_PLAYA"]["cantidad"], estados["SALIDO"]["cantidad"], estados["SALIDO"]["sector"]) == (1, 2, 10)
+        assert cliente.get("/tablero/TRP1", params={"tipo_cereal": "Trigo"}).json()["total"] == 1
+        assert cliente.get("/tablero/TRP2").status_code == 403
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
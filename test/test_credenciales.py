@@ -0,0 +1,150 @@
+"""
+Pruebas del registro de credenciales ARCA (CredentialsRegistry en Arca/wsaa.py).
+
+Verifica que certificado y clave se parsean una sola vez, que la entrada se
+recarga solo si cambia el mtime de los archivos o ante un reload explícito,
+y que la firma no lee disco en régimen estable.
+
+Uso:
+    python -m pytest -q test/test_credenciales.py
+    python test/test_credenciales.py
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno, generar_certificado_prueba
+from arca_stub import ArcaStub
+
+_CERT_DIR = Path(tempfile.mkdtemp(prefix="cred_certs_"))
+configurar_certificados_entorno(os.environ, _CERT_DIR, "cred")
+
+import Arca.wsaa as wsaa
+from Arca.wsaa import CredentialsRegistry
+from Arca.async_client import get_arca_access_ticket_async, wsaa_async_client
+
+
+def _configurar(monkeypatch, directorio, nombre):
+    """Genera certificados en el directorio y los configura en el entorno (se restaura al final)."""
+    entorno = {}
+    configurar_certificados_entorno(entorno, directorio, nombre)
+    for clave, valor in entorno.items():
+        monkeypatch.setenv(clave, valor)
+
+
+class ContadorCargas:
+    """Cuenta las lecturas de PEM hechas por load_signing_credentials."""
+
+    def __init__(self, monkeypatch):
+        self.cargas = 0
+        original = wsaa.load_signing_credentials
+
+        def contar(cert_file, key_file):
+            self.cargas += 1
+            return original(cert_file, key_file)
+
+        monkeypatch.setattr(wsaa, "load_signing_credentials", contar)
+
+
+def test_parsea_una_sola_vez(monkeypatch):
+    contador = ContadorCargas(monkeypatch)
+    registro = CredentialsRegistry(recheck_seconds=0)
+
+    primera = registro.get("CPE", "HOMO")
+    for _ in range(100):
+        assert registro.get("CPE", "HOMO") is primera
+
+    assert contador.cargas == 1
+    assert primera.service_name == "wscpe"
+    assert len(primera.fingerprint) == 64
+    assert primera.dias_restantes() > 0
+
+
+def test_recarga_por_cambio_de_mtime(monkeypatch):
+    contador = ContadorCargas(monkeypatch)
+    registro = CredentialsRegistry(recheck_seconds=0)
+    directorio = Path(tempfile.mkdtemp(prefix="cred_mtime_"))
+    _configurar(monkeypatch, directorio, "rotado")
+
+    anterior = registro.get("FACTURACION", "HOMO")
+
+    # Rotación del certificado: se reemplazan los archivos en disco
+    generar_certificado_prueba(directorio, "rotado")
+    futuro = time.time() + 10
+    for archivo in (anterior.cert_file, anterior.key_file):
+        os.utime(archivo, (futuro, futuro))
+
+    nueva = registro.get("FACTURACION", "HOMO")
+    assert nueva is not anterior
+    assert nueva.fingerprint != anterior.fingerprint
+    assert contador.cargas == 2
+
+
+def test_chequeo_de_mtime_acotado():
+    """Dentro de la ventana de chequeo no se consulta el disco aunque cambien los archivos."""
+    registro = CredentialsRegistry(recheck_seconds=3600)
+    anterior = registro.get("EMBARQUES", "HOMO")
+    futuro = time.time() + 20
+    os.utime(anterior.cert_file, (futuro, futuro))
+
+    assert registro.get("EMBARQUES", "HOMO") is anterior
+
+
+def test_reload_relee_configuracion(monkeypatch):
+    registro = CredentialsRegistry(recheck_seconds=3600)
+    assert registro.get("CPE", "HOMO").wsaa_url != "http://nuevo/ws/services/LoginCms?WSDL"
+
+    monkeypatch.setenv("ARCA_WSAA_URL_HOMO", "http://nuevo/ws/services/LoginCms?WSDL")
+    assert registro.get("CPE", "HOMO").wsaa_url != "http://nuevo/ws/services/LoginCms?WSDL"
+
+    registro.request_reload()
+    assert registro.get("CPE", "HOMO").wsaa_url == "http://nuevo/ws/services/LoginCms?WSDL"
+
+
+def test_archivo_invalido_conserva_version_anterior(monkeypatch):
+    _configurar(monkeypatch, Path(tempfile.mkdtemp(prefix="cred_invalido_")), "invalido")
+    registro = CredentialsRegistry(recheck_seconds=0)
+    anterior = registro.get("CPE", "HOMO")
+
+    Path(anterior.cert_file).write_text("certificado a medio copiar")
+    assert registro.get("CPE", "HOMO") is anterior
+
+
+def test_firma_sin_leer_disco(monkeypatch):
+    """Con el registro cargado, el ticket se obtiene aunque los PEM ya no estén en disco."""
+    directorio = Path(tempfile.mkdtemp(prefix="cred_disco_"))
+    try:
+        with ArcaStub() as stub:
+            _configurar(monkeypatch, directorio, "disco")
+            monkeypatch.setenv('ARCA_WSAA_URL_HOMO', stub.wsaa_wsdl_url)
+            monkeypatch.setenv('ARCA_CERT_RECHECK_SECONDS', '3600')
+            wsaa.credentials_registry.reload()
+            wsaa.credentials_registry.get("CPE", "HOMO")
+            shutil.rmtree(directorio)
+
+            async def escenario():
+                try:
+                    return await get_arca_access_ticket_async("CPE", "HOMO")
+                finally:
+                    await wsaa_async_client.aclose()
+
+            resultado = asyncio.run(escenario())
+
+        assert resultado['success'], resultado
+        assert stub.login_calls == 1
+    finally:
+        wsaa.credentials_registry.reload()
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,175 @@
+"""
+Pruebas de la capa de base de datos asíncrona (utils/database.py y get_async_session en main.py).
+
+Verifica que el pool se configura por entorno, que el event loop sigue
+atendiendo /health mientras corren consultas lentas en otras conexiones y
+que el perfil DB_PROFILE=PROD aplica WAL y envía toda escritura al escritor.
+
+Uso:
+    python -m pytest -q test/test_database_async.py
+    python test/test_database_async.py
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+import httpx
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, Session, select
+
+import main
+from Modelos.usuario import Usuario
+from Modelos.arca_tokens import ArcaToken
+from utils.database import (
+    crear_engine, crear_engine_async, crear_engines_async, url_async, nueva_sesion_async, engine_escritura
+)
+from utils.migraciones import aplicar_migraciones
+from utilidades_prueba import crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+
+DEMORA_CONSULTA = 0.8
+
+
+def _dormir(segundos):
+    time.sleep(segundos)
+    return 1
+
+
+@pytest.fixture
+def base():
+    """Base temporal con un usuario; las conexiones de la app conocen la función SQL dormir(s)."""
+    engine, async_engine = crear_base_prueba()
+    with Session(engine) as session:
+        session.add(Usuario(id=1, username="salud", nombre_completo="Salud", email="s@x", password_hash="x"))
+        session.commit()
+    event.listen(async_engine.sync_engine, "connect",
+                 lambda conexion, _: conexion.create_function("dormir", 1, _dormir))
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    try:
+        yield async_engine
+    finally:
+        main.app.dependency_overrides.clear()
+        main.principal_cache.invalidar_todos()
+        cerrar_engine_async(async_engine)
+
+
+def test_pool_configurable(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "2.5")
+    async_engine = crear_engine_async("sqlite:///./no_se_abre.db")
+
+    assert async_engine.url.drivername == "sqlite+aiosqlite"
+    assert async_engine.pool.size() == 3
+    assert async_engine.pool._max_overflow == 1
+    assert async_engine.pool._timeout == 2.5
+    assert url_async("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+
+def test_health_responde_mientras_corren_consultas_lentas(base):
+    async_engine = base
+    jwt = main.create_access_token({"sub": "salud", "user_id": 1, "puertos": []})
+    dependencia = main.app.dependency_overrides[main.get_async_session]
+
+    async def consulta_lenta():
+        async for session in dependencia():
+            await session.exec(text(f"SELECT dormir({DEMORA_CONSULTA})"))
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://prueba",
+                                     headers={"Authorization": f"Bearer {jwt}"}) as cliente:
+            inicio = time.perf_counter()
+            lentas = [asyncio.create_task(consulta_lenta()) for _ in range(4)]
+            await asyncio.sleep(0.05)
+
+            latencias = []
+            while not all(tarea.done() for tarea in lentas):
+                # Sin principal en cache: cada /health también consulta la base
+                main.principal_cache.invalidar_todos()
+                inicio_health = time.perf_counter()
+                respuesta = await cliente.get("/health")
+                latencias.append(time.perf_counter() - inicio_health)
+                assert respuesta.status_code == 200
+                await asyncio.sleep(0.02)
+
+            await asyncio.gather(*lentas)
+            return latencias, time.perf_counter() - inicio
+
+    latencias, total = asyncio.run(escenario())
+
+    assert len(latencias) >= 5, latencias
+    assert max(latencias) < DEMORA_CONSULTA / 2, latencias
+    # Las 4 consultas lentas corrieron en paralelo en conexiones distintas
+    assert total < 2 * DEMORA_CONSULTA
+
+
+@pytest.fixture
+def perfil_produccion(monkeypatch, tmp_path):
+    """Base temporal con DB_PROFILE=PROD. Devuelve (lectores, escritor)."""
+    monkeypatch.setenv("DB_PROFILE", "PROD")
+    url = f"sqlite:///{tmp_path / 'prod.db'}"
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
+    with Session(engine) as session:
+        session.add(Usuario(id=1, username="prod", nombre_completo="Prod", email="p@x", password_hash="x"))
+        session.commit()
+    engine.dispose()
+    lectores, escritor = crear_engines_async(url)
+    try:
+        yield lectores, escritor
+    finally:
+        main.arca_token_l1.clear()
+        cerrar_engine_async(lectores)
+        cerrar_engine_async(escritor)
+
+
+def test_perfil_produccion_pragmas(perfil_produccion):
+    lectores, escritor = perfil_produccion
+
+    async def pragmas(async_engine):
+        async with async_engine.connect() as conexion:
+            return {nombre: (await conexion.exec_driver_sql(f"PRAGMA {nombre}")).scalar()
+                    for nombre in ("journal_mode", "synchronous", "busy_timeout", "query_only")}
+
+    assert asyncio.run(pragmas(lectores)) == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "query_only": 1}
+    assert asyncio.run(pragmas(escritor))["query_only"] == 0
+    assert escritor.pool.size() == 1 and escritor.pool._max_overflow == 0
+
+
+def test_perfil_produccion_escrituras_por_el_escritor(perfil_produccion):
+    lectores, escritor = perfil_produccion
+    sentencias = {"lectores": [], "escritor": []}
+    for nombre, async_engine in (("lectores", lectores), ("escritor", escritor)):
+        event.listen(async_engine.sync_engine, "before_cursor_execute",
+                     lambda *args, destino=sentencias[nombre]: destino.append(args[2].split()[0]))
+
+    async def guardar(i):
+        async with nueva_sesion_async(lectores, escritor) as session:
+            await main.save_arca_token_to_cache(1, f"P{i % 4}", f"S{i}", "token", "sign", "url", "servicio", session)
+
+    async def leer(i):
+        async with nueva_sesion_async(lectores, escritor) as session:
+            return (await session.exec(select(ArcaToken).where(ArcaToken.servicio_tipo == f"S{i}"))).all()
+
+    async def escenario():
+        await asyncio.gather(*(tarea(i) for i in range(20) for tarea in (guardar, leer)))
+        async with nueva_sesion_async(lectores, escritor) as session:
+            assert engine_escritura(session) is escritor
+            return len((await session.exec(select(ArcaToken))).all())
+
+    assert asyncio.run(escenario()) == 20
+    assert set(sentencias["lectores"]) == {"SELECT"}
+    assert sentencias["escritor"].count("INSERT") == 20
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
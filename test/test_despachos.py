@@ -0,0 +1,209 @@
+"""
+Pruebas de las órdenes de despacho (utils/despachos.py) y de su despacho en bloque por el motor de transiciones.
+
+Verifica que una orden reserva los camiones libres más antiguos del
+cereal (y exportador), que órdenes simultáneas no comparten camiones, que
+el despacho en bloque escribe movimientos y contadores, que el avance de
+la orden sigue a los escaneos individuales hasta cumplirla, la
+idempotencia del pedido, la cancelación y los endpoints /despachos.
+
+Uso:
+    python -m pytest -q test/test_despachos.py
+    python test/test_despachos.py
+"""
+
+import sys
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+import main
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.carta_porte import (
+    CartaPorteElectronica, MovimientoSector, ContadorCircuito, OrdenDespacho, EstadoCamion, TipoCereal
+)
+from utils.database import nueva_sesion_async
+from utils.despachos import OrdenesDespacho
+from utils.transiciones import MotorTransiciones, SolicitudTransicion
+from utilidades_prueba import carta_prueba, sembrar_cartas as _sembrar, sesion_async_prueba
+
+INICIO = datetime(2025, 4, 1, 6, 0)
+EXPORTADOR = "30222222223"
+OTRO_EXPORTADOR = "30999999993"
+
+
+def _carta(i, cereal=TipoCereal.MAIZ, **campos):
+    # Las de número más alto llegaron antes a la playa
+    return carta_prueba(i, cereal=cereal, created_at=INICIO - timedelta(minutes=i), **campos)
+
+
+@pytest.fixture
+def bases(bases):
+    main.contadores_circuito.invalidar()
+    yield bases
+    main.contadores_circuito.invalidar()
+
+
+def test_reserva_los_mas_antiguos_del_cereal_y_exportador(bases):
+    engine, async_engine = bases
+    _sembrar(engine, [_carta(i) for i in range(1, 6)] + [
+        _carta(10, cereal=TipoCereal.SOJA), _carta(11, exportador=OTRO_EXPORTADOR),
+        _carta(12, estado=EstadoCamion.INGRESADO), _carta(13, puerto="TRP2"),
+    ])
+    ordenes = OrdenesDespacho()
+
+    async def escenario():
+        primera = await ordenes.crear(async_engine, "TRP1", TipoCereal.MAIZ, 3, "operaciones", cuit_destino=EXPORTADOR)
+        # Quedan dos del exportador: la orden queda pendiente
+        segunda = await ordenes.crear(async_engine, "TRP1", TipoCereal.MAIZ, 4, "operaciones", cuit_destino=EXPORTADOR)
+        cualquiera = await ordenes.crear(async_engine, "TRP1", TipoCereal.MAIZ, 4, "operaciones")
+        return primera, segunda, cualquiera
+
+    primera, segunda, cualquiera = asyncio.run(escenario())
+    assert [c["numero_carta"] for c in primera.camiones] == ["CPE-5", "CPE-4", "CPE-3"]
+    assert (primera.orden["estado"], primera.orden["asignados"], primera.reservados) == ("ASIGNADA", 3, 3)
+    assert [c["numero_carta"] for c in segunda.camiones] == ["CPE-2", "CPE-1"]
+    assert (segunda.orden["estado"], segunda.orden["asignados"]) == ("PENDIENTE", 2)
+    assert [c["numero_carta"] for c in cualquiera.camiones] == ["CPE-11"]
+    assert ordenes.stats()["camiones_faltantes"] == 2 + 3
+    with Session(engine) as session:
+        libres = session.exec(select(CartaPorteElectronica.numero_carta)
+                              .where(CartaPorteElectronica.orden_despacho_id.is_(None))).all()
+    assert sorted(libres) == ["CPE-10", "CPE-12", "CPE-13"]
+
+
+def test_ordenes_simultaneas_no_comparten_camiones(bases):
+    engine, async_engine = bases
+    _sembrar(engine, [_carta(i) for i in range(1, 31)])
+    ordenes = OrdenesDespacho()
+
+    async def escenario():
+        return await asyncio.gather(*[ordenes.crear(async_engine, "TRP1", TipoCereal.MAIZ, 4, f"op{i}") for i in range(10)])
+
+    resultados = asyncio.run(escenario())
+    reservados = [c["carta_id"] for r in resultados for c in r.camiones]
+    assert len(reservados) == len(set(reservados)) == 30
+    assert sorted(r.orden["asignados"] for r in resultados) == [0, 0, 2] + [4] * 7
+    with Session(engine) as session:
+        asignados = {o.id: o.asignados for o in session.exec(select(OrdenDespacho)).all() if o.asignados}
+        por_orden = Counter(c.orden_despacho_id for c in session.exec(select(CartaPorteElectronica)).all())
+    assert por_orden == asignados
+
+
+def test_despacho_en_bloque_y_avance_hasta_cumplida(bases):
+    engine, async_engine = bases
+    _sembrar(engine, [_carta(i) for i in range(1, 5)])
+    ordenes, motor = OrdenesDespacho(), MotorTransiciones()
+
+    async def escenario():
+        orden_id = (await ordenes.crear(async_engine, "TRP1", TipoCereal.MAIZ, 3, "operaciones")).orden["id"]
+        despachados = await motor.despachar_orden(async_engine, orden_id, "playa")
+        otra_vez = await motor.despachar_orden(async_engine, orden_id, "playa")
+        # El QR leído después en la Playa (otro motor: sin la clave en memoria) es un escaneo repetido
+        qr = await MotorTransiciones().aplicar(async_engine, SolicitudTransicion(
+            hacia=EstadoCamion.EN_VIAJE, autorizado_por="playa", puerto_codigo="TRP1", numero_carta="CPE-4"))
+        async with nueva_sesion_async(async_engine) as session:
+            en_viaje = await ordenes.consultar(session, orden_id)
+        for numero in ("CPE-4", "CPE-3", "CPE-2"):
+            await motor.aplicar(async_engine, SolicitudTransicion(
+                hacia=EstadoCamion.INGRESADO, autorizado_por="porteria", puerto_codigo="TRP1", numero_carta=numero))
+        return orden_id, despachados, otra_vez, qr, en_viaje
+
+    orden_id, despachados, otra_vez, qr, en_viaje = asyncio.run(escenario())
+    assert sorted(r.numero_carta for r in despachados) == ["CPE-2", "CPE-3", "CPE-4"]
+    assert {r.resultado for r in despachados} == {"aplicada"} and otra_vez == []
+    assert (qr.resultado, qr.movimiento_id) == ("duplicada", next(r.movimiento_id for r in despachados
+                                                                   if r.numero_carta == "CPE-4"))
+    assert (en_viaje.orden["estado"], en_viaje.orden["despachados"], en_viaje.orden["ingresados"]) == ("DESPACHADA", 3, 0)
+    assert {c["estado_actual"] for c in en_viaje.camiones} == {"EN_VIAJE"}
+
+    with Session(engine) as session:
+        orden = session.get(OrdenDespacho, orden_id)
+        assert (orden.estado.name, orden.despachados, orden.ingresados) == ("CUMPLIDA", 3, 3)
+        assert orden.fecha_cumplida is not None
+        claves = session.exec(select(MovimientoSector.clave_idempotencia)
+                              .where(MovimientoSector.estado_nuevo == EstadoCamion.EN_VIAJE)).all()
+        contadores = {c.estado: c.cantidad for c in session.exec(select(ContadorCircuito)).all()}
+    assert sorted(claves) == ["TRP1:CPE-2:EN_VIAJE", "TRP1:CPE-3:EN_VIAJE", "TRP1:CPE-4:EN_VIAJE"]
+    assert (contadores["EN_PLAYA"], contadores["EN_VIAJE"], contadores["INGRESADO"]) == (1, 0, 3)
+
+
+def test_pedido_repetido_cancelacion_y_completar_pendiente(bases):
+    engine, async_engine = bases
+    _sembrar(engine, [_carta(i) for i in range(1, 4)])
+    ordenes = OrdenesDespacho()
+
+    async def escenario():
+        pedido = dict(puerto_codigo="TRP1", tipo_cereal=TipoCereal.MAIZ, cantidad=2, solicitado_por="operaciones",
+                      clave_idempotencia="pedido-1")
+        original = await ordenes.crear(async_engine, **pedido)
+        repetido = await ordenes.crear(async_engine, **pedido)
+        cancelada = await ordenes.cancelar(async_engine, original.orden["id"])
+        de_nuevo = await ordenes.cancelar(async_engine, original.orden["id"])
+        pendiente = await ordenes.crear(async_engine, "TRP1", TipoCereal.MAIZ, 5, "operaciones")
+        _sembrar(engine, [_carta(i) for i in range(4, 7)])
+        completa = await ordenes.asignar(async_engine, pendiente.orden["id"])
+        return original, repetido, cancelada, de_nuevo, pendiente, completa
+
+    original, repetido, cancelada, de_nuevo, pendiente, completa = asyncio.run(escenario())
+    assert repetido.duplicada and repetido.orden["id"] == original.orden["id"]
+    assert [c["carta_id"] for c in repetido.camiones] == [c["carta_id"] for c in original.camiones]
+    assert (cancelada.orden["estado"], cancelada.orden["asignados"], cancelada.camiones) == ("CANCELADA", 0, [])
+    assert de_nuevo is None
+    # Los liberados vuelven a estar disponibles
+    assert (pendiente.orden["estado"], pendiente.orden["asignados"]) == ("PENDIENTE", 3)
+    assert (completa.orden["estado"], completa.orden["asignados"], completa.reservados) == ("ASIGNADA", 5, 2)
+    # Los dos libres más antiguos (CPE-4 llegó después que CPE-5)
+    assert [c["numero_carta"] for c in completa.camiones] == ["CPE-6", "CPE-5", "CPE-3", "CPE-2", "CPE-1"]
+
+
+def test_endpoints_despachos(bases):
+    engine, async_engine = bases
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="operaciones", password_hash="x", nombre_completo="Operaciones", email="o@x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"), Puerto(id=2, nombre="Puerto 2", codigo="TRP2"),
+                         UsuarioPuerto(usuario_id=1, puerto_id=1), _carta(1, puerto="TRP2")]
+                        + [_carta(i) for i in range(2, 6)])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    main.acl_index.invalidar()
+    try:
+        cliente = TestClient(main.app)
+        pedido = {"puerto_codigo": "TRP1", "tipo_cereal": "Maíz", "cantidad": 3}
+        assert cliente.post("/despachos", json={**pedido, "puerto_codigo": "TRP2"}).status_code == 403
+        assert cliente.post("/despachos", json={**pedido, "cantidad": 0}).status_code == 422
+        creada = cliente.post("/despachos", json=pedido)
+        orden_id = creada.json()["orden"]["id"]
+        abiertas = cliente.get("/despachos", params={"puerto_codigo": "TRP1"})
+        despacho = cliente.post(f"/despachos/{orden_id}/despachar")
+        consulta = cliente.get(f"/despachos/{orden_id}")
+        cancelar = cliente.post(f"/despachos/{orden_id}/cancelar")
+        asignar = cliente.post(f"/despachos/{orden_id}/asignar")
+        inexistente = cliente.get("/despachos/999")
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert creada.status_code == 200
+    assert (creada.json()["orden"]["estado"], creada.json()["reservados"]) == ("ASIGNADA", 3)
+    assert [c["numero_carta"] for c in creada.json()["camiones"]] == ["CPE-5", "CPE-4", "CPE-3"]
+    assert [o["id"] for o in abiertas.json()["ordenes"]] == [orden_id]
+    assert (despacho.status_code, despacho.json()["despachados"], despacho.json()["orden"]["estado"]) == (200, 3, "DESPACHADA")
+    assert {c["estado_actual"] for c in consulta.json()["camiones"]} == {"EN_VIAJE"}
+    assert (cancelar.status_code, asignar.status_code, inexistente.status_code) == (409, 409, 404)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,54 @@
+"""
+Pruebas de la firma CMS en memoria del TRA (sign_tra_cms_memory en Arca/wsaa.py).
+
+Verifica con el CLI de OpenSSL que el CMS generado es un SignedData válido
+(la misma verificación que hace WSAA sobre la firma) y que el contenido
+embebido es exactamente el TRA. Se saltea si openssl no está instalado.
+
+Uso:
+    python -m pytest -q test/test_firma_cms.py
+    python test/test_firma_cms.py
+"""
+
+import sys
+import base64
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from Arca.wsaa import create_tra, load_signing_credentials, sign_tra_cms_memory
+from utilidades_prueba import generar_certificado_prueba
+
+OPENSSL = shutil.which("openssl")
+
+
+@pytest.mark.skipif(OPENSSL is None, reason="openssl no está instalado")
+def test_cms_en_memoria_verifica_con_openssl(tmp_path):
+    cert_file, key_file = generar_certificado_prueba(tmp_path, "firma")
+    cert, private_key = load_signing_credentials(cert_file, key_file)
+    tra_xml = create_tra("wscpe")
+
+    cms_base64 = sign_tra_cms_memory(tra_xml, cert, private_key)
+    # Una sola línea, como el PEM limpio del signer por CLI
+    assert "\n" not in cms_base64
+    cms_file = tmp_path / "tra.cms"
+    cms_file.write_bytes(base64.b64decode(cms_base64))
+
+    # -noverify: el certificado es autofirmado; se verifica la firma y el digest del contenido
+    verificacion = subprocess.run(
+        [OPENSSL, "cms", "-verify", "-inform", "DER", "-noverify", "-in", str(cms_file)],
+        capture_output=True
+    )
+
+    assert verificacion.returncode == 0, verificacion.stderr.decode(errors="replace")
+    assert verificacion.stdout == tra_xml.encode("utf-8")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,97 @@
+"""
+Pruebas del generador de datos sintéticos de cosecha (generar_datos.py).
+
+Verifica que la carga es determinística para una semilla, que las filas
+respetan el circuito (un movimiento por transición, pesajes solo para los
+camiones que descargaron), que los contadores del tablero quedan
+reconstruidos y que los índices diferidos quedan recreados.
+
+Uso:
+    python -m pytest -q test/test_generar_datos.py
+    python test/test_generar_datos.py
+"""
+
+import sys
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from Modelos.carta_porte import CIRCUITO
+from generar_datos import generar
+from utils.migraciones import escaneos_completos
+from utils.database import crear_engine
+
+
+def _generar(ruta, semilla=7):
+    return generar(f"sqlite:///{ruta}", cartas=3000, semilla=semilla, desde=datetime(2025, 3, 1),
+                   dias=10, lote=1000, informar=lambda mensaje: None)
+
+
+def _contenido(ruta):
+    with sqlite3.connect(ruta) as conexion:
+        return [conexion.execute(f"SELECT * FROM {tabla} ORDER BY id").fetchall()
+                for tabla in ("cartaporteelectronica", "movimientosector", "pesaje")]
+
+
+def test_misma_semilla_mismas_filas(tmp_path):
+    _generar(tmp_path / "a.db")
+    _generar(tmp_path / "b.db")
+    _generar(tmp_path / "c.db", semilla=8)
+    assert _contenido(tmp_path / "a.db") == _contenido(tmp_path / "b.db")
+    assert _contenido(tmp_path / "a.db") != _contenido(tmp_path / "c.db")
+
+
+def test_filas_respetan_el_circuito(tmp_path):
+    ruta = tmp_path / "cosecha.db"
+    filas = _generar(ruta)
+    assert filas["cartaporteelectronica"] == 3000
+
+    with sqlite3.connect(ruta) as conexion:
+        movimientos = conexion.execute(
+            "SELECT c.estado_actual, COUNT(m.id) FROM cartaporteelectronica c "
+            "LEFT JOIN movimientosector m ON m.carta_porte_id = c.id GROUP BY c.id"
+        ).fetchall()
+        pesajes_sin_descarga = conexion.execute(
+            "SELECT COUNT(*) FROM pesaje p JOIN cartaporteelectronica c ON c.id = p.carta_porte_id "
+            "WHERE c.estado_actual NOT IN ('DESCARGANDO', 'EN_BALANZA_TARA', 'SALIDO')"
+        ).fetchone()[0]
+        contadores = conexion.execute(
+            "SELECT puerto_codigo, estado, SUM(cantidad) FROM contadorcircuito GROUP BY 1, 2 HAVING SUM(cantidad) > 0"
+        ).fetchall()
+        por_estado = conexion.execute(
+            "SELECT puerto_codigo, estado_actual, COUNT(*) FROM cartaporteelectronica GROUP BY 1, 2"
+        ).fetchall()
+        taras, salidos = conexion.execute(
+            "SELECT (SELECT COUNT(*) FROM pesaje WHERE tipo_pesaje = 'tara'), "
+            "(SELECT COUNT(*) FROM cartaporteelectronica WHERE estado_actual = 'SALIDO')"
+        ).fetchone()
+
+    # Los últimos camiones de la temporada quedan a mitad de circuito
+    assert len({estado for estado, _ in movimientos}) > 1
+    # Cada carta tiene tantos movimientos como posiciones avanzó en el circuito
+    nombres = [estado.name for estado in CIRCUITO]
+    assert all(cantidad == nombres.index(estado) for estado, cantidad in movimientos)
+    assert pesajes_sin_descarga == 0
+    assert taras == salidos
+    assert sorted(contadores) == sorted(por_estado)
+
+
+def test_indices_recreados(tmp_path):
+    ruta = tmp_path / "cosecha.db"
+    _generar(ruta)
+    engine = crear_engine(f"sqlite:///{ruta}")
+    try:
+        with engine.connect() as conexion:
+            assert escaneos_completos(conexion) == {}
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,195 @@
+"""
+Pruebas de las lecturas compartidas (utils/lecturas_compartidas.py) y de su uso en /colas y /tablero.
+
+Verifica la normalización de la clave, que las requests idénticas en vuelo
+comparten un solo cálculo, que el resultado vale hasta el fin del tick en
+que empezó, que un error no queda guardado, que el cálculo compartido no
+usa la sesión del primer request y que el control de acceso sigue siendo
+por request.
+
+Uso:
+    python -m pytest -q test/test_lecturas_compartidas.py
+    python test/test_lecturas_compartidas.py
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlmodel import Session
+
+import main
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.carta_porte import EstadoCamion, CalidadCereal
+from utils.colas_playa import colas_playa
+from utils.lecturas_compartidas import LecturasCompartidas, clave_lectura
+from utilidades_prueba import carta_prueba, crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+
+
+def test_clave_normalizada():
+    assert clave_lectura("colas", "TRP1", {"calidad": CalidadCereal.PREMIUM, "tipo_cereal": None, "limite": 100}) == \
+        clave_lectura("colas", "TRP1", {"limite": 100, "calidad": "PREMIUM"})
+    assert clave_lectura("eventos", "TRP1", {"sectores": [6, 4]}) == clave_lectura("eventos", "TRP1", {"sectores": (4, 6)})
+    assert clave_lectura("colas", "TRP1", {}) != clave_lectura("colas", "TRP2", {})
+    assert clave_lectura("colas", "TRP1", {}) != clave_lectura("tablero", "TRP1", {})
+
+
+def test_calculo_en_vuelo_compartido_y_ventana_del_tick():
+    lecturas = LecturasCompartidas(tick=3600)
+    calculos = []
+
+    async def calcular():
+        calculos.append(1)
+        await asyncio.sleep(0.02)
+        return {"total": len(calculos)}
+
+    async def escenario():
+        concurrentes = await asyncio.gather(*[lecturas.obtener("colas", "TRP1", {"limite": 100}, calcular)
+                                              for _ in range(20)])
+        # Mismo tick: del cache, sin calcular
+        siguiente = await lecturas.obtener("colas", "TRP1", {"limite": 100}, calcular)
+        otra = await lecturas.obtener("colas", "TRP2", {"limite": 100}, calcular)
+        return concurrentes, siguiente, otra
+
+    concurrentes, siguiente, otra = asyncio.run(escenario())
+    assert concurrentes == [{"total": 1}] * 20 and siguiente == {"total": 1} and otra == {"total": 2}
+    stats = lecturas.stats()
+    assert stats["recursos"]["colas"] == {"solicitudes": 22, "calculos": 2, "en_vuelo": 19, "cache": 1,
+                                          "ratio_coalescencia": round(20 / 22, 4)}
+    assert (stats["solicitudes"], stats["calculos"], stats["en_vuelo"]) == (22, 2, 0)
+
+
+def test_resultado_vale_hasta_el_fin_del_tick():
+    # El cálculo dura más que el tick: cuando termina su ventana ya pasó y no se guarda
+    lecturas = LecturasCompartidas(tick=0.01)
+    calculos = []
+
+    async def calcular():
+        calculos.append(1)
+        await asyncio.sleep(0.02)
+        return len(calculos)
+
+    async def escenario():
+        return [await lecturas.obtener("tablero", "TRP1", None, calcular) for _ in range(3)]
+
+    assert asyncio.run(escenario()) == [1, 2, 3]
+    assert lecturas.stats()["entradas"] == 0
+
+
+def test_error_compartido_y_no_guardado():
+    lecturas = LecturasCompartidas(tick=60)
+    intentos = []
+
+    async def calcular():
+        intentos.append(1)
+        await asyncio.sleep(0.01)
+        if len(intentos) == 1:
+            raise RuntimeError("base no disponible")
+        return "ok"
+
+    async def escenario():
+        errores = await asyncio.gather(*[lecturas.obtener("tablero", "TRP1", None, calcular) for _ in range(5)],
+                                       return_exceptions=True)
+        return errores, await lecturas.obtener("tablero", "TRP1", None, calcular)
+
+    errores, reintento = asyncio.run(escenario())
+    assert all(isinstance(e, RuntimeError) for e in errores)
+    assert (reintento, len(intentos)) == ("ok", 2)
+
+
+@pytest.fixture
+def app_con_base(tmp_path):
+    engine, async_engine = crear_base_prueba(tmp_path)
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="operaciones", password_hash="x", nombre_completo="Operaciones", email="o@x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"), UsuarioPuerto(usuario_id=1, puerto_id=1)])
+        session.add_all([carta_prueba(i, EstadoCamion.POST_CALADA, calidad_asignada=CalidadCereal.PREMIUM)
+                         for i in range(30)])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    main.acl_index.invalidar()
+    colas_playa.invalidar()
+    main.contadores_circuito.invalidar()
+    main.lecturas_compartidas.invalidar()
+    # Un tick largo: que la prueba no cruce el borde de la ventana (alineada al reloj)
+    tick, main.lecturas_compartidas.tick = main.lecturas_compartidas.tick, 3600
+    try:
+        yield main.app
+    finally:
+        main.lecturas_compartidas.tick = tick
+        main.app.dependency_overrides.clear()
+        colas_playa.invalidar()
+        main.contadores_circuito.invalidar()
+        main.lecturas_compartidas.invalidar()
+        engine.dispose()
+        cerrar_engine_async(async_engine)
+
+
+def test_pantallas_al_conectarse_comparten_carga_y_respuesta(app_con_base):
+    recargas = colas_playa.recargas
+    antes = main.lecturas_compartidas.stats()["recursos"].get("colas", {}).get("calculos", 0)
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=app_con_base)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+            # Veinte pantallas con las colas sin cargar: una sola carga y un solo cálculo
+            respuestas = await asyncio.gather(*[cliente.get("/colas/TRP1/post-calada", params={"calidad": "Premium"})
+                                                for _ in range(20)])
+            tablero = await cliente.get("/tablero/TRP1")
+            denegada = await cliente.get("/colas/TRP2/post-calada", params={"calidad": "Premium"})
+            return respuestas, tablero, denegada
+
+    respuestas, tablero, denegada = asyncio.run(escenario())
+    assert {r.status_code for r in respuestas} == {200}
+    assert len({r.content for r in respuestas}) == 1
+    assert respuestas[0].json()["total"] == 30 and len(respuestas[0].json()["camiones"]) == 30
+    assert colas_playa.recargas == recargas + 1
+    assert main.lecturas_compartidas.stats()["recursos"]["colas"]["calculos"] == antes + 1
+    assert tablero.json()["total"] == 30
+    assert denegada.status_code == 403
+
+
+
+def test_calculo_compartido_con_sesion_propia(app_con_base, monkeypatch):
+    sesiones_request, sesiones_carga = [], []
+    override = main.app.dependency_overrides[main.get_async_session]
+
+    async def sesion_registrada():
+        async for session in override():
+            sesiones_request.append(session)
+            yield session
+
+    cargar = colas_playa.asegurar_cargado_async
+
+    async def cargar_registrando(session):
+        sesiones_carga.append(session)
+        await asyncio.sleep(0.02)
+        return await cargar(session)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_registrada
+    monkeypatch.setattr(colas_playa, "asegurar_cargado_async", cargar_registrando)
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=app_con_base)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+            return await asyncio.gather(*[cliente.get("/colas/TRP1/post-calada") for _ in range(5)])
+
+    respuestas = asyncio.run(escenario())
+    assert {r.status_code for r in respuestas} == {200}
+    # La carga no usa la sesión de ninguno de los requests que la comparten
+    assert len(sesiones_carga) == 1 and len(sesiones_request) == 5
+    assert all(sesiones_carga[0] is not s for s in sesiones_request)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,143 @@
+"""
+Pruebas del camino de login (POST /login en main.py).
+
+Verifica el hash PBKDF2 con sal y la migración de hashes sha256 legados,
+que login hace una sola consulta y ningún commit (ultimo_acceso se vuelca
+en lote con el write-behind) y que la verificación corre fuera del event loop.
+
+Uso:
+    python -m pytest -q test/test_login.py
+    python test/test_login.py
+"""
+
+import sys
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+import main
+from utilidades_prueba import crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+import Modelos.usuario as modelo_usuario
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto, hash_password
+
+
+@pytest.fixture(autouse=True)
+def iteraciones_rapidas(monkeypatch):
+    monkeypatch.setattr(modelo_usuario, "PASSWORD_ITERACIONES", 1000)
+
+
+def _volcar() -> int:
+    """Vuelca el write-behind de login (en pruebas no corre la tarea del lifespan)."""
+    return asyncio.run(main.acceso_write_behind.flush())
+
+
+@pytest.fixture
+def entorno():
+    """App con base temporal: usuario 'nuevo' con PBKDF2 y 'legado' con sha256 sin sal. Devuelve (cliente, engine, async_engine)."""
+    engine, async_engine = crear_base_prueba()
+    with Session(engine) as session:
+        nuevo = Usuario(id=1, username="nuevo", nombre_completo="Nuevo", email="n@x")
+        nuevo.set_password("clave1")
+        legado = Usuario(id=2, username="legado", nombre_completo="Legado", email="l@x",
+                         password_hash=hashlib.sha256(b"clave2").hexdigest())
+        session.add_all([nuevo, legado, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"),
+                         UsuarioPuerto(usuario_id=1, puerto_id=1), UsuarioPuerto(usuario_id=2, puerto_id=1)])
+        session.commit()
+        main.acl_index.cargar(session)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    _volcar()
+    try:
+        yield TestClient(main.app), engine, async_engine
+    finally:
+        main.app.dependency_overrides.clear()
+        _volcar()
+        cerrar_engine_async(async_engine)
+        main.acl_index.invalidar()
+
+
+
+def test_hash_con_sal_y_legado():
+    primero, segundo = hash_password("secreto"), hash_password("secreto")
+    assert primero != segundo and primero.startswith("pbkdf2_sha256$1000$")
+
+    usuario = Usuario(username="u", nombre_completo="u", email="u", password_hash=primero)
+    assert usuario.verify_password("secreto") and not usuario.verify_password("otro")
+    assert not usuario.password_requiere_rehash()
+
+    usuario.password_hash = hashlib.sha256(b"secreto").hexdigest()
+    assert usuario.verify_password("secreto") and not usuario.verify_password("otro")
+    assert usuario.password_requiere_rehash()
+
+
+def test_login_sin_commit_y_una_consulta(entorno):
+    cliente, engine, async_engine = entorno
+    sentencias = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: sentencias.append(args[2].split()[0]))
+
+    for _ in range(5):
+        respuesta = cliente.post("/login", json={"username": "nuevo", "password": "clave1"})
+        assert respuesta.status_code == 200
+        assert respuesta.json()["usuario"]["ultimo_acceso"] is not None
+    assert sentencias == ["SELECT"] * 5
+
+    # Los 5 logins del mismo usuario se vuelcan como una sola fila
+    assert _volcar() == 1
+    with Session(engine) as session:
+        assert session.get(Usuario, 1).ultimo_acceso is not None
+
+
+def test_migracion_de_hash_legado(entorno):
+    cliente, engine, async_engine = entorno
+    assert cliente.post("/login", json={"username": "legado", "password": "clave2"}).status_code == 200
+    assert main.acceso_write_behind.rehash_pendiente(async_engine, 2)
+    _volcar()
+
+    with Session(engine) as session:
+        assert session.get(Usuario, 2).password_hash.startswith("pbkdf2_sha256$")
+    assert cliente.post("/login", json={"username": "legado", "password": "clave2"}).status_code == 200
+    assert cliente.post("/login", json={"username": "legado", "password": "otra"}).status_code == 401
+
+
+def test_rehash_no_pisa_cambio_de_contrasena(entorno):
+    cliente, engine, _ = entorno
+    assert cliente.post("/login", json={"username": "legado", "password": "clave2"}).status_code == 200
+
+    # El administrador cambia la contraseña antes del volcado
+    with Session(engine) as session:
+        usuario = session.get(Usuario, 2)
+        usuario.set_password("nueva")
+        session.commit()
+    _volcar()
+
+    assert cliente.post("/login", json={"username": "legado", "password": "nueva"}).status_code == 200
+    assert cliente.post("/login", json={"username": "legado", "password": "clave2"}).status_code == 401
+
+
+def test_verificacion_fuera_del_event_loop(entorno, monkeypatch):
+    cliente, _, _ = entorno
+    hilos = []
+    verify_original = Usuario.verify_password
+
+    def registrar_hilo(self, password):
+        hilos.append(threading.current_thread().name)
+        return verify_original(self, password)
+
+    monkeypatch.setattr(Usuario, "verify_password", registrar_hilo)
+    assert cliente.post("/login", json={"username": "nuevo", "password": "clave1"}).status_code == 200
+    assert len(hilos) == 1 and hilos[0].startswith("login-hash")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,104 @@
+"""
+Pruebas del guardado por upsert de tickets ARCA y de la purga de vencidos (utils/purga_tokens.py).
+
+Verifica que guardar un ticket es una sola sentencia sobre la clave única
+(usuario_id, puerto_codigo, servicio_tipo), que buscar un ticket vencido no
+escribe en el request y que la purga elimina los vencidos con un DELETE.
+
+Uso:
+    python -m pytest -q test/test_purga_tokens.py
+    python test/test_purga_tokens.py
+"""
+
+import sys
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import main
+from Modelos.arca_tokens import ArcaToken
+from utils.purga_tokens import PurgaTokensArca
+from utilidades_prueba import crear_base_prueba, cerrar_engine_async
+
+
+@pytest.fixture
+def bases():
+    """Base temporal. Devuelve (engine, async_engine, sentencias ejecutadas por async_engine)."""
+    engine, async_engine = crear_base_prueba()
+    sentencias = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: sentencias.append(args[2].split()[0]))
+    main.arca_token_l1.clear()
+    try:
+        yield engine, async_engine, sentencias
+    finally:
+        main.arca_token_l1.clear()
+        cerrar_engine_async(async_engine)
+
+
+def _guardar(async_engine, token, vence_en):
+    async def guardar():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return await main.save_arca_token_to_cache(
+                1, "TRP1", "CPE", token, "SIGN", "http://wsaa", "wscpe", session,
+                fecha_vencimiento=datetime.utcnow() + vence_en
+            )
+    return asyncio.run(guardar())
+
+
+def test_guardar_es_un_upsert(bases):
+    engine, async_engine, sentencias = bases
+    primero = _guardar(async_engine, "TOKEN-1", timedelta(hours=8))
+    segundo = _guardar(async_engine, "TOKEN-2", timedelta(hours=12))
+
+    # Sin SELECT ni DELETE previos: un INSERT ... ON CONFLICT por guardado
+    assert sentencias == ["INSERT", "INSERT"]
+    assert segundo.id == primero.id
+    with Session(engine) as session:
+        tokens = session.exec(select(ArcaToken)).all()
+    assert [t.token for t in tokens] == ["TOKEN-2"]
+
+
+def test_buscar_vencido_no_escribe(bases):
+    _, async_engine, sentencias = bases
+    _guardar(async_engine, "VIEJO", timedelta(seconds=-1))
+    main.arca_token_l1.clear()
+    sentencias.clear()
+
+    async def buscar():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return await main.get_cached_arca_token(1, "TRP1", "CPE", session)
+
+    assert asyncio.run(buscar()) is None
+    assert sentencias == ["SELECT"]
+
+
+def test_purga_borra_vencidos_con_un_delete(bases):
+    engine, async_engine, sentencias = bases
+    with Session(engine) as session:
+        session.add_all([
+            ArcaToken(usuario_id=1, puerto_codigo=f"P{i}", servicio_tipo="CPE", token="t", sign="s",
+                      fecha_vencimiento=datetime.utcnow() + timedelta(hours=-1 if i < 30 else 1))
+            for i in range(40)
+        ])
+        session.commit()
+
+    purga = PurgaTokensArca()
+    assert asyncio.run(purga.purgar(async_engine)) == 30
+    assert sentencias == ["DELETE"]
+    assert purga.stats()["filas_eliminadas"] == 30
+    with Session(engine) as session:
+        assert len(session.exec(select(ArcaToken)).all()) == 10
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,280 @@
+"""
+Pruebas del control de admisión de WSAA (Arca/resilience.py) contra el stub con fallas inyectadas.
+
+Verifica circuit breaker con sondeo semi-abierto, token bucket, reintentos
+con backoff y la respuesta de los endpoints con WSAA caído (503 inmediato o
+último ticket vigente).
+
+Uso:
+    python -m pytest -q test/test_resilience.py
+    python test/test_resilience.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno
+from arca_stub import ArcaStub
+
+configurar_certificados_entorno(os.environ, Path(tempfile.mkdtemp(prefix="resil_certs_")), "resil")
+
+from Arca.wsaa import credentials_registry
+from Arca.async_client import wsaa_async_client
+from Arca.ticket_broker import TicketBroker
+from Arca.resilience import (
+    CircuitBreaker, TokenBucket, WsaaGuard, backoff_con_jitter, es_error_transitorio,
+    CERRADO, ABIERTO, SEMI_ABIERTO
+)
+
+
+def _usar_stub(stub):
+    os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+    credentials_registry.reload()
+
+
+def _ejecutar(corrutina_factory):
+    async def escenario():
+        try:
+            return await corrutina_factory()
+        finally:
+            await wsaa_async_client.aclose()
+    return asyncio.run(escenario())
+
+
+def test_breaker_abre_sondea_y_cierra():
+    breaker = CircuitBreaker(umbral_fallos=2, tiempo_apertura=0.1)
+    breaker.registrar_fallo()
+    assert breaker.permitir()
+    breaker.registrar_fallo()
+    assert breaker.estado == ABIERTO and not breaker.permitir()
+
+    time.sleep(0.12)
+    assert breaker.permitir()           # único sondeo
+    assert breaker.estado == SEMI_ABIERTO
+    assert not breaker.permitir()       # el resto espera al sondeo
+    breaker.registrar_fallo()
+    assert breaker.estado == ABIERTO    # sondeo fallido: vuelve a abrir
+
+    time.sleep(0.12)
+    assert breaker.permitir()
+    breaker.registrar_exito()
+    assert breaker.estado == CERRADO and breaker.permitir()
+
+
+def test_token_bucket_rafaga_y_recarga():
+    bucket = TokenBucket(tasa=20, capacidad=2)
+    assert bucket.consumir() and bucket.consumir()
+    assert not bucket.consumir()
+    assert 0 < bucket.segundos_para_token() <= 0.05
+    time.sleep(0.06)
+    assert bucket.consumir()
+
+
+def test_backoff_acotado_y_clasificacion():
+    for intento in range(10):
+        assert 0 <= backoff_con_jitter(intento, 0.5, 8) <= min(8, 0.5 * 2 ** intento)
+    assert es_error_transitorio("Timeout en la llamada SOAP a WSAA: ReadTimeout()")
+    assert es_error_transitorio("Respuesta no es XML válida: b'Service Unavailable'")
+    assert not es_error_transitorio("El CEE ya posee un TA valido para el acceso al WSN solicitado")
+
+
+def test_reintentos_recuperan_falla_transitoria():
+    with ArcaStub() as stub:
+        _usar_stub(stub)
+        stub.inyectar_falla("http503", cantidad=2)
+        broker = TicketBroker(guard=WsaaGuard(max_reintentos=2, backoff_base=0.01, rafaga=10))
+
+        resultado = _ejecutar(lambda: broker.get_ticket("CPE", "HOMO"))
+
+    assert resultado['success'], resultado
+    # Cada reintento es una llamada a WSAA
+    assert stub.login_calls == broker.wsaa_calls == 3
+
+
+def test_reintento_sin_cupo_cuenta_el_intento_que_salio():
+    with ArcaStub() as stub:
+        _usar_stub(stub)
+        stub.inyectar_falla("http503", cantidad=1)
+        guard = WsaaGuard(max_reintentos=2, backoff_base=0.01, llamadas_por_minuto=1, rafaga=1)
+        broker = TicketBroker(guard=guard)
+
+        resultado = _ejecutar(lambda: broker.get_ticket("CPE", "HOMO"))
+
+    # El primer intento llegó a WSAA; el reintento quedó sin cupo
+    assert resultado['rate_limited']
+    assert stub.login_calls == broker.wsaa_calls == guard.stats()["llamadas"] == 1
+
+
+def test_circuito_abierto_rechaza_sin_llamar_a_wsaa():
+    with ArcaStub() as stub:
+        _usar_stub(stub)
+        stub.inyectar_falla("http503")
+        guard = WsaaGuard(umbral_fallos=3, tiempo_apertura=0.3, max_reintentos=0, rafaga=100)
+        broker = TicketBroker(guard=guard)
+
+        async def escenario():
+            for _ in range(3):
+                await broker.get_ticket("CPE", "HOMO")
+            inicio = time.perf_counter()
+            rechazado = await broker.get_ticket("CPE", "HOMO")
+            demora = time.perf_counter() - inicio
+
+            stub.limpiar_fallas()
+            await asyncio.sleep(0.35)
+            recuperado = await broker.get_ticket("CPE", "HOMO")
+            return rechazado, demora, recuperado
+
+        rechazado, demora, recuperado = _ejecutar(escenario)
+
+    assert rechazado['circuit_open'] and rechazado['retry_after'] >= 1
+    assert demora < 0.05
+    assert recuperado['success']
+    # 3 fallos + 1 sondeo; el rechazo no llegó al stub ni cuenta como llamada
+    assert stub.login_calls == broker.wsaa_calls == 4
+    assert guard.breaker("CPE", "HOMO").estado == CERRADO
+
+
+def test_sondeo_con_excepcion_o_cancelado_no_traba_el_circuito():
+    guard = WsaaGuard(umbral_fallos=1, tiempo_apertura=0.05, max_reintentos=0, rafaga=100)
+    breaker = guard.breaker("CPE", "HOMO")
+    breaker.registrar_fallo()
+    llamadas = []
+
+    def fetcher_que_falla(service_type, environment):
+        llamadas.append("sync")
+        raise OSError("conexión reseteada")
+
+    async def fetcher_lento(service_type, environment):
+        llamadas.append("async")
+        await asyncio.sleep(10)
+
+    async def escenario():
+        await asyncio.sleep(0.06)
+        try:
+            await guard.llamar(fetcher_que_falla, "CPE", "HOMO")
+        except OSError:
+            pass
+        # El sondeo fallido vuelve a abrir el circuito (no queda semi-abierto tomado)
+        abierto = breaker.estado
+        await asyncio.sleep(0.06)
+        tarea = asyncio.create_task(guard.llamar(fetcher_lento, "CPE", "HOMO"))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            pass
+        return abierto, breaker.permitir()
+
+    abierto, permitido = _ejecutar(escenario)
+    assert abierto == ABIERTO
+    # Cancelado: el sondeo se libera y la próxima llamada puede salir
+    assert permitido and llamadas == ["sync", "async"]
+
+
+def test_ta_vigente_no_se_reintenta_ni_abre_circuito():
+    with ArcaStub() as stub:
+        _usar_stub(stub)
+        stub.inyectar_falla("ta_vigente", cantidad=1)
+        guard = WsaaGuard(umbral_fallos=1, max_reintentos=3, backoff_base=0.01)
+        broker = TicketBroker(guard=guard)
+
+        resultado = _ejecutar(lambda: broker.get_ticket("CPE", "HOMO"))
+
+    assert not resultado['success']
+    assert "ya posee un TA" in resultado['error']
+    assert stub.login_calls == 1
+    assert guard.breaker("CPE", "HOMO").estado == CERRADO
+
+
+def test_cupo_de_llamadas_wsaa():
+    with ArcaStub() as stub:
+        _usar_stub(stub)
+        broker = TicketBroker(guard=WsaaGuard(llamadas_por_minuto=1, rafaga=2))
+
+        async def escenario():
+            return [await broker.get_ticket(servicio, "HOMO") for servicio in ("CPE", "EMBARQUES", "FACTURACION")]
+
+        resultados = _ejecutar(escenario)
+
+    assert [r['success'] for r in resultados] == [True, True, False]
+    assert resultados[2]['rate_limited']
+    assert stub.login_calls == broker.wsaa_calls == 2
+
+
+def test_endpoint_503_o_ticket_degradado():
+    """Con el circuito abierto: 503 inmediato sin token previo, o el último token vigente."""
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+    from utilidades_prueba import crear_base_prueba, sesion_async_prueba, cerrar_engine_async
+    from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+    from Modelos.arca_tokens import ArcaToken
+    import main
+
+    engine, async_engine = crear_base_prueba()
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="gate", password_hash="x", nombre_completo="Gate", email="g@x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"),
+                         Puerto(id=2, nombre="Puerto 2", codigo="TRP2"),
+                         UsuarioPuerto(usuario_id=1, puerto_id=1), UsuarioPuerto(usuario_id=1, puerto_id=2)])
+        # Token CPE en TRP2 a 10 minutos de vencer (dentro de la ventana de renovación)
+        session.add(ArcaToken(usuario_id=1, puerto_codigo="TRP2", servicio_tipo="CPE", token="VIEJO",
+                              sign="S", fecha_vencimiento=datetime.utcnow() + timedelta(minutes=10)))
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    guard_anterior = main.ticket_broker.guard
+    main.ticket_broker.guard = WsaaGuard(umbral_fallos=1, tiempo_apertura=60, max_reintentos=0)
+    main.arca_token_l1.clear()
+    main.acl_index.invalidar()
+    entorno_anterior = os.environ.get('ARCA_ENVIRONMENT')
+    os.environ['ARCA_ENVIRONMENT'] = 'HOMO'
+
+    try:
+        with ArcaStub() as stub:
+            _usar_stub(stub)
+            stub.inyectar_falla("http503")
+            cliente = TestClient(main.app)
+
+            primero = cliente.post("/get-ticket-cpe", json={"puerto_codigo": "TRP1"})
+            inicio = time.perf_counter()
+            segundo = cliente.post("/get-ticket-cpe", json={"puerto_codigo": "TRP1"})
+            demora = time.perf_counter() - inicio
+            degradado = cliente.post("/get-ticket-cpe", json={"puerto_codigo": "TRP2"})
+            llamadas = stub.login_calls
+    finally:
+        main.app.dependency_overrides.clear()
+        cerrar_engine_async(async_engine)
+        main.ticket_broker.guard = guard_anterior
+        main.arca_token_l1.clear()
+        if entorno_anterior is None:
+            os.environ.pop('ARCA_ENVIRONMENT', None)
+        else:
+            os.environ['ARCA_ENVIRONMENT'] = entorno_anterior
+
+    assert primero.status_code == 500          # WSAA respondió 503: error y circuito abierto
+    assert segundo.status_code == 503
+    assert int(segundo.headers["Retry-After"]) >= 1
+    assert demora < 0.5
+    assert degradado.status_code == 200
+    assert degradado.json()["data"]["token"] == "VIEJO"
+    assert degradado.json()["cache_info"]["degraded"] is True
+    assert llamadas == 1
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
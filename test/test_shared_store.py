@@ -0,0 +1,124 @@
+"""
+Pruebas del store de tickets compartido entre workers (Arca/shared_store.py).
+
+Levanta N procesos (como los workers de uvicorn), cada uno con su propio
+broker, apuntando al mismo stub de WSAA y al mismo store: entre todos
+deben generar una única llamada LoginCms.
+
+Uso:
+    python -m pytest -q test/test_shared_store.py
+    python test/test_shared_store.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import datetime
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno
+from arca_stub import ArcaStub
+
+# Los workers (spawn) reciben el entorno de certificados del proceso padre
+if multiprocessing.parent_process() is None:
+    configurar_certificados_entorno(os.environ, Path(tempfile.mkdtemp(prefix="store_certs_")), "store")
+
+from Arca.shared_store import SharedTicketStore
+from Arca.ticket_broker import TicketBroker
+
+WORKERS = 6
+
+
+def _worker(entorno, store_path, barrera, resultados):
+    """Proceso worker: un broker propio que pide el ticket CPE en simultáneo con los demás."""
+    os.environ.update(entorno)
+    broker = TicketBroker(store=SharedTicketStore(store_path))
+
+    async def pedir():
+        barrera.wait()
+        return await broker.get_ticket("CPE", "HOMO")
+
+    resultado = asyncio.run(pedir())
+    resultados.put((resultado['success'], resultado.get('token'), broker.wsaa_calls))
+
+
+def test_n_workers_una_sola_llamada_wsaa():
+    store_path = str(Path(tempfile.mkdtemp(prefix="store_")) / "arca_tickets.db")
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(WORKERS)
+    resultados = contexto.Queue()
+
+    with ArcaStub(latencia=0.3) as stub:
+        entorno = {k: v for k, v in os.environ.items() if k.startswith('ARCA_')}
+        entorno['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+        procesos = [
+            contexto.Process(target=_worker, args=(entorno, store_path, barrera, resultados))
+            for _ in range(WORKERS)
+        ]
+        for proceso in procesos:
+            proceso.start()
+        salidas = [resultados.get(timeout=60) for _ in procesos]
+        for proceso in procesos:
+            proceso.join(timeout=30)
+
+    assert all(exito for exito, _, _ in salidas), salidas
+    assert len({token for _, token, _ in salidas}) == 1
+    assert sum(llamadas for _, _, llamadas in salidas) == 1
+    assert stub.login_calls == 1
+
+
+def test_lease_exclusivo_y_vencido():
+    path = str(Path(tempfile.mkdtemp(prefix="store_")) / "arca_tickets.db")
+    clave = ("fp", "wscpe", "HOMO")
+    worker_a = SharedTicketStore(path, lease_segundos=0.2)
+    worker_b = SharedTicketStore(path, lease_segundos=0.2)
+
+    assert worker_a.adquirir_lease(clave)
+    assert not worker_b.adquirir_lease(clave)
+    worker_a.liberar_lease(clave)
+    assert worker_b.adquirir_lease(clave)
+
+    # Un lease abandonado (worker caído) vence y otro lo toma
+    time.sleep(0.25)
+    assert worker_a.adquirir_lease(clave)
+
+
+def test_refresh_adopta_ticket_de_otro_worker():
+    """Si otro worker ya renovó, refresh toma ese ticket sin llamar a WSAA."""
+    path = str(Path(tempfile.mkdtemp(prefix="store_")) / "arca_tickets.db")
+    vencimiento = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=12)
+    llamadas = []
+
+    def fetcher(service_type, environment):
+        llamadas.append(service_type)
+        return {'success': True, 'token': f'T{len(llamadas)}', 'sign': 'S',
+                'expiration_time': vencimiento.isoformat()}
+
+    worker_a = TicketBroker(fetcher, store=SharedTicketStore(path))
+    worker_b = TicketBroker(fetcher, store=SharedTicketStore(path))
+
+    async def escenario():
+        await worker_a.get_ticket("CPE", "HOMO")
+        await worker_b.get_ticket("CPE", "HOMO")    # adopta T1
+        await worker_a.refresh("CPE", "HOMO")       # renueva a T2
+        return await worker_b.refresh("CPE", "HOMO")  # adopta T2
+
+    resultado = asyncio.run(escenario())
+
+    assert llamadas == ['CPE', 'CPE']
+    assert resultado['token'] == 'T2'
+    assert worker_b.wsaa_calls == 0
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
@@ -0,0 +1,159 @@
+"""
+Pruebas del broker de tickets WSAA (Arca/ticket_broker.py).
+
+Usa un fetcher simulado (sin AFIP) para verificar que los cache miss
+concurrentes se colapsan en una sola llamada WSAA por certificado/servicio,
+y el stub de WSAA para el cliente elegido con ARCA_WSAA_CLIENT.
+
+Uso:
+    python -m pytest -q test/test_ticket_broker.py
+    python test/test_ticket_broker.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno
+
+_CERT_DIR = tempfile.mkdtemp(prefix="broker_certs_")
+configurar_certificados_entorno(os.environ, Path(_CERT_DIR), "broker")
+
+from Arca.wsaa import credentials_registry, get_arca_access_ticket
+from Arca.async_client import get_arca_access_ticket_async
+from Arca.ticket_broker import TicketBroker, fetcher_desde_entorno
+from arca_stub import ArcaStub
+
+
+class FetcherSimulado:
+    """Simula get_arca_access_ticket con latencia y contador de llamadas."""
+
+    def __init__(self, latencia: float = 0.2, success: bool = True):
+        self.latencia = latencia
+        self.success = success
+        self.llamadas = []
+
+    def __call__(self, service_type, environment):
+        self.llamadas.append((service_type, environment))
+        time.sleep(self.latencia)
+        if not self.success:
+            return {'success': False, 'error': 'WSAA caído', 'details': 'simulado'}
+        return {
+            'success': True,
+            'token': f'TOKEN-{service_type}-{len(self.llamadas)}',
+            'sign': 'SIGN',
+            'service': service_type.lower(),
+            'service_type': service_type,
+            'environment': environment,
+        }
+
+
+def test_misses_concurrentes_una_sola_llamada():
+    """50 operadores pidiendo CPE a la vez generan una sola llamada WSAA."""
+    fetcher = FetcherSimulado()
+    broker = TicketBroker(fetcher)
+
+    async def escenario():
+        return await asyncio.gather(*[broker.get_ticket("CPE", "HOMO") for _ in range(50)])
+
+    resultados = asyncio.run(escenario())
+
+    assert len(fetcher.llamadas) == 1
+    assert all(r['success'] for r in resultados)
+    assert len({r['token'] for r in resultados}) == 1
+
+
+def test_ticket_reutilizado_despues_de_la_llamada():
+    """Una vez publicado, el ticket se sirve desde memoria sin llamar a WSAA."""
+    fetcher = FetcherSimulado(latencia=0)
+    broker = TicketBroker(fetcher)
+
+    async def escenario():
+        primero = await broker.get_ticket("CPE", "HOMO")
+        segundo = await broker.get_ticket("CPE", "HOMO")
+        return primero, segundo
+
+    primero, segundo = asyncio.run(escenario())
+
+    assert len(fetcher.llamadas) == 1
+    assert primero['from_broker'] is False
+    assert segundo['from_broker'] is True
+    assert segundo['token'] == primero['token']
+
+
+def test_claves_independientes_por_servicio_y_entorno():
+    """Servicio y entorno forman parte de la clave del ticket."""
+    fetcher = FetcherSimulado(latencia=0.05)
+    broker = TicketBroker(fetcher)
+
+    async def escenario():
+        await asyncio.gather(
+            broker.get_ticket("CPE", "HOMO"),
+            broker.get_ticket("CPE", "HOMO"),
+            broker.get_ticket("FACTURACION", "HOMO"),
+            broker.get_ticket("CPE", "PROD"),
+        )
+
+    asyncio.run(escenario())
+
+    assert sorted(fetcher.llamadas) == [("CPE", "HOMO"), ("CPE", "PROD"), ("FACTURACION", "HOMO")]
+
+
+def test_error_no_se_guarda_en_broker():
+    """Un error de WSAA se propaga a los que esperan y no queda cacheado."""
+    fetcher = FetcherSimulado(latencia=0.05, success=False)
+    broker = TicketBroker(fetcher)
+
+    async def escenario():
+        errores = await asyncio.gather(*[broker.get_ticket("CPE", "HOMO") for _ in range(10)])
+        fetcher.success = True
+        recuperado = await broker.get_ticket("CPE", "HOMO")
+        return errores, recuperado
+
+    errores, recuperado = asyncio.run(escenario())
+
+    assert all(not r['success'] for r in errores)
+    assert recuperado['success']
+    assert len(fetcher.llamadas) == 2
+
+
+
+def test_cliente_wsaa_desde_entorno():
+    """ARCA_WSAA_CLIENT=zeep usa el cliente sincrónico (clientes SOAP reutilizables) contra el stub."""
+    anterior = {clave: os.environ.get(clave) for clave in ('ARCA_WSAA_CLIENT', 'ARCA_WSAA_URL_HOMO')}
+    try:
+        os.environ.pop('ARCA_WSAA_CLIENT', None)
+        assert fetcher_desde_entorno() is get_arca_access_ticket_async
+        os.environ['ARCA_WSAA_CLIENT'] = 'zeep'
+        assert fetcher_desde_entorno() is get_arca_access_ticket
+
+        with ArcaStub() as stub:
+            os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+            credentials_registry.reload()
+            broker = TicketBroker(fetcher_desde_entorno())
+            resultado = asyncio.run(broker.get_ticket("CPE", "HOMO"))
+
+        assert broker.fetcher_sincronico
+        assert resultado['success'], resultado
+        assert stub.login_calls == broker.wsaa_calls == 1
+    finally:
+        for clave, valor in anterior.items():
+            if valor is None:
+                os.environ.pop(clave, None)
+            else:
+                os.environ[clave] = valor
+        credentials_registry.reload()
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
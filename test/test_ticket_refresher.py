@@ -0,0 +1,138 @@
+"""
+Pruebas de la renovación anticipada de tickets WSAA (Arca/ticket_refresher.py).
+
+Verifica que se usa el expirationTime real del ticket y que el refresher
+renueva antes del vencimiento, de modo que los lectores nunca esperan a WSAA.
+
+Uso:
+    python -m pytest -q test/test_ticket_refresher.py
+    python test/test_ticket_refresher.py
+"""
+
+import os
+import sys
+import asyncio
+import datetime
+import tempfile
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from utilidades_prueba import configurar_certificados_entorno
+from arca_stub import ArcaStub, TICKET_RESPONSE
+
+configurar_certificados_entorno(os.environ, Path(tempfile.mkdtemp(prefix="refresher_certs_")), "refresher")
+
+from Arca.wsaa import parse_expiration_time, parse_login_ticket_response, credentials_registry
+from Arca.async_client import wsaa_async_client
+from Arca.ticket_broker import TicketBroker
+from Arca.ticket_refresher import TicketRefresher, es_rechazo_ta_vigente
+
+
+def test_parse_expiration_time_a_utc():
+    assert parse_expiration_time("2025-12-11T03:50:00.123-03:00") == \
+        datetime.datetime(2025, 12, 11, 6, 50, 0, 123000)
+    # Sin zona se asume hora argentina
+    assert parse_expiration_time("2025-12-11T03:50:00") == datetime.datetime(2025, 12, 11, 6, 50)
+    assert parse_expiration_time(None) is None
+    assert parse_expiration_time("mañana") is None
+
+
+def test_login_ticket_response_incluye_vencimiento():
+    ticket = TICKET_RESPONSE.format(
+        unique_id=1, generation="2025-12-10T15:50:00-03:00", expiration="2025-12-11T03:50:00-03:00",
+        token="TOKEN", sign="SIGN"
+    )
+    resultado = parse_login_ticket_response(ticket)
+    assert resultado['token'] == "TOKEN"
+    assert resultado['expiration_time'] == "2025-12-11T03:50:00-03:00"
+
+
+def test_broker_usa_vencimiento_real():
+    vencimiento = "2030-01-01T00:00:00-03:00"
+
+    def fetcher(service_type, environment):
+        return {'success': True, 'token': 'T', 'sign': 'S', 'expiration_time': vencimiento}
+
+    broker = TicketBroker(fetcher)
+    asyncio.run(broker.get_ticket("CPE", "HOMO"))
+
+    (_, entrada), = broker.entries()
+    assert entrada.fecha_vencimiento == datetime.datetime(2030, 1, 1, 3, 0)
+    assert (entrada.service_type, entrada.environment) == ("CPE", "HOMO")
+
+
+def test_refresher_renueva_antes_de_vencer():
+    """Con tickets de 4s y anticipación de 2.5s los lectores nunca esperan a WSAA."""
+    with ArcaStub(vigencia_horas=4 / 3600) as stub:
+        os.environ['ARCA_WSAA_URL_HOMO'] = stub.wsaa_wsdl_url
+        credentials_registry.reload()
+        broker = TicketBroker()
+        refresher = TicketRefresher(broker, lead=datetime.timedelta(seconds=2.5), jitter=0.2,
+                                    retry=0.5, intervalo_maximo=0.1)
+
+        async def escenario():
+            primero = await broker.get_ticket("CPE", "HOMO")
+            refresher.start()
+            lecturas = []
+            try:
+                for _ in range(100):
+                    await asyncio.sleep(0.05)
+                    lecturas.append(await broker.get_ticket("CPE", "HOMO"))
+            finally:
+                await refresher.stop()
+                await wsaa_async_client.aclose()
+            return primero, lecturas
+
+        primero, lecturas = asyncio.run(escenario())
+
+    assert primero['from_broker'] is False
+    assert all(r['success'] and r['from_broker'] for r in lecturas)
+    assert refresher.renovaciones >= 2
+    assert stub.login_calls == 1 + refresher.renovaciones
+    assert len({r['token'] for r in lecturas}) > 1
+
+
+def test_rechazo_ta_vigente_conserva_ticket():
+    """Si WSAA rechaza la renovación se sigue sirviendo el ticket vigente."""
+    llamadas = []
+
+    def fetcher(service_type, environment):
+        llamadas.append(service_type)
+        if len(llamadas) > 1:
+            return {'success': False, 'error': 'El CEE ya posee un TA valido para el acceso al WSN solicitado'}
+        vencimiento = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=10)
+        return {'success': True, 'token': 'T1', 'sign': 'S', 'expiration_time': vencimiento.isoformat()}
+
+    broker = TicketBroker(fetcher)
+    refresher = TicketRefresher(broker, lead=datetime.timedelta(minutes=30), jitter=0, retry=60)
+
+    async def escenario():
+        await broker.get_ticket("CPE", "HOMO")
+        await refresher.renovar_pendientes()
+        return await broker.get_ticket("CPE", "HOMO")
+
+    resultado = asyncio.run(escenario())
+
+    assert len(llamadas) == 2
+    assert refresher.fallos == 1
+    assert resultado['token'] == 'T1' and resultado['from_broker']
+    # El reintento queda agendado antes del vencimiento
+    (clave, entrada), = broker.entries()
+    assert refresher.proxima_renovacion(clave, entrada) < entrada.fecha_vencimiento
+
+
+def test_detecta_rechazo_ta_vigente():
+    assert es_rechazo_ta_vigente("El CEE ya posee un TA valido para el acceso al WSN solicitado")
+    assert es_rechazo_ta_vigente("coe.alreadyAuthenticated")
+    assert not es_rechazo_ta_vigente("Timeout en la llamada SOAP a WSAA")
+    assert not es_rechazo_ta_vigente(None)
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
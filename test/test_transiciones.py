@@ -0,0 +1,182 @@
+"""
+Pruebas del motor de transiciones de estado (utils/transiciones.py) y del endpoint /transiciones.
+
+Verifica que solo se aplican las transiciones de la tabla, que cada una es
+un UPDATE condicional más su MovimientoSector, que un escaneo repetido se
+resuelve como duplicado sin escribir (en memoria y desde la base), que el
+repetido de un escaneo rechazado no se informa como duplicado y que
+los escaneos concurrentes se confirman en lotes.
+
+Uso:
+    python -m pytest -q test/test_transiciones.py
+    python test/test_transiciones.py
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import main
+from Modelos.usuario import Usuario, Puerto, UsuarioPuerto
+from Modelos.carta_porte import CartaPorteElectronica, MovimientoSector, EstadoCamion, CalidadCereal, CIRCUITO
+from utils.transiciones import MotorTransiciones, SolicitudTransicion, TransicionInvalida
+from utilidades_prueba import carta_prueba, sembrar_cartas, sesion_async_prueba
+
+
+def _sembrar(engine, cantidad, estado=EstadoCamion.EN_PLAYA):
+    sembrar_cartas(engine, [carta_prueba(i, estado) for i in range(cantidad)])
+
+
+def _escaneo(numero, hacia, **extra):
+    return SolicitudTransicion(hacia=hacia, autorizado_por="operador", puerto_codigo="TRP1", numero_carta=numero, **extra)
+
+
+def test_circuito_completo_y_transiciones_no_permitidas(bases):
+    engine, async_engine = bases
+    _sembrar(engine, 1)
+    motor = MotorTransiciones()
+
+    async def recorrer():
+        # Saltear un sector se rechaza sin escribir
+        salto = await motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.INGRESADO))
+        aplicadas = []
+        for hacia in CIRCUITO[1:]:
+            extra = {"calidad_asignada": CalidadCereal.PREMIUM} if hacia is EstadoCamion.POST_CALADA else {}
+            aplicadas.append(await motor.aplicar(async_engine, _escaneo("CPE-0", hacia, **extra)))
+        otro_puerto = await motor.aplicar(async_engine, SolicitudTransicion(
+            hacia=EstadoCamion.EN_VIAJE, autorizado_por="operador", puerto_codigo="TRP2", numero_carta="CPE-0"))
+        return salto, aplicadas, otro_puerto
+
+    salto, aplicadas, otro_puerto = asyncio.run(recorrer())
+    assert (salto.resultado, salto.estado_actual) == ("rechazada", "EN_PLAYA")
+    assert [r.resultado for r in aplicadas] == ["aplicada"] * 8
+    assert otro_puerto.resultado == "no_encontrada"
+
+    with Session(engine) as session:
+        carta = session.exec(select(CartaPorteElectronica)).one()
+        movimientos = session.exec(select(MovimientoSector).order_by(MovimientoSector.id)).all()
+    assert carta.estado_actual == EstadoCamion.SALIDO
+    assert carta.calidad_asignada == CalidadCereal.PREMIUM
+    assert carta.fecha_ingreso is not None and carta.fecha_salida is not None
+    assert [m.estado_nuevo for m in movimientos] == CIRCUITO[1:]
+    assert [m.id for m in movimientos] == [r.movimiento_id for r in aplicadas]
+
+    with pytest.raises(TransicionInvalida):
+        asyncio.run(motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.EN_PLAYA)))
+    with pytest.raises(TransicionInvalida):
+        asyncio.run(motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.POST_CALADA)))
+
+
+def test_escaneo_repetido_es_idempotente(bases):
+    engine, async_engine = bases
+    _sembrar(engine, 2, EstadoCamion.EN_VIAJE)
+    motor = MotorTransiciones()
+
+    async def escanear():
+        # Mismo QR tres veces a la vez (mismo lote) y otra vez después
+        juntos = await asyncio.gather(*[motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.INGRESADO))
+                                        for _ in range(3)])
+        despues = await motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.INGRESADO))
+        # Sin la memoria de claves recientes (otro worker, reinicio) la clave se encuentra en la base
+        motor.recientes.clear()
+        desde_base = await motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.INGRESADO))
+        # Otra clave, mismo destino: ya está en ese estado
+        otra_clave = await motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.INGRESADO, clave_idempotencia="qr-2"))
+        return juntos, despues, desde_base, otra_clave
+
+    juntos, despues, desde_base, otra_clave = asyncio.run(escanear())
+    assert sorted(r.resultado for r in juntos) == ["aplicada", "duplicada", "duplicada"]
+    assert despues.resultado == desde_base.resultado == otra_clave.resultado == "duplicada"
+    assert desde_base.movimiento_id == juntos[0].movimiento_id
+
+    with Session(engine) as session:
+        assert len(session.exec(select(MovimientoSector)).all()) == 1
+
+
+def test_escaneo_repetido_rechazado_o_inexistente_no_es_duplicado(bases):
+    engine, async_engine = bases
+    _sembrar(engine, 1)
+    motor = MotorTransiciones()
+
+    async def escanear():
+        # Mismo lote: el repetido de un rechazo o de una carta inexistente no se informa como duplicado
+        salto = await asyncio.gather(*[motor.aplicar(async_engine, _escaneo("CPE-0", EstadoCamion.INGRESADO))
+                                       for _ in range(2)])
+        inexistente = await asyncio.gather(*[motor.aplicar(async_engine, _escaneo("NOPE", EstadoCamion.EN_VIAJE))
+                                             for _ in range(2)])
+        return salto, inexistente
+
+    salto, inexistente = asyncio.run(escanear())
+    assert [r.resultado for r in salto] == ["rechazada", "rechazada"]
+    assert [r.resultado for r in inexistente] == ["no_encontrada", "no_encontrada"]
+    with Session(engine) as session:
+        assert session.exec(select(MovimientoSector)).all() == []
+
+
+def test_escaneos_concurrentes_en_lote(bases):
+    engine, async_engine = bases
+    _sembrar(engine, 300)
+    commits = []
+    event.listen(async_engine.sync_engine, "commit", lambda conexion: commits.append(1))
+    motor = MotorTransiciones(max_lote=128)
+
+    async def escanear():
+        return await asyncio.gather(*[motor.aplicar(async_engine, _escaneo(f"CPE-{i}", EstadoCamion.EN_VIAJE))
+                                      for i in range(300)])
+
+    resultados = asyncio.run(escanear())
+    assert all(r.resultado == "aplicada" for r in resultados)
+    assert len({r.movimiento_id for r in resultados}) == 300
+    # 300 escaneos simultáneos: un commit por lote, no por escaneo
+    assert len(commits) == motor.stats()["lotes"] <= 4
+    with Session(engine) as session:
+        assert len(session.exec(select(MovimientoSector)).all()) == 300
+
+
+def test_endpoint_transiciones(bases):
+    engine, async_engine = bases
+    _sembrar(engine, 1, EstadoCamion.EN_CALADA)
+    with Session(engine) as session:
+        usuario = Usuario(id=1, username="calador", password_hash="x", nombre_completo="Calador", email="c@x")
+        session.add_all([usuario, Puerto(id=1, nombre="Puerto 1", codigo="TRP1"), UsuarioPuerto(usuario_id=1, puerto_id=1)])
+        session.commit()
+        session.refresh(usuario)
+
+    main.app.dependency_overrides[main.get_async_session] = sesion_async_prueba(async_engine)
+    main.app.dependency_overrides[main.get_current_user] = lambda: usuario
+    main.acl_index.invalidar()
+    try:
+        cliente = TestClient(main.app)
+        escaneo = {"numero_carta": "CPE-0", "puerto_codigo": "TRP1", "estado_nuevo": "Post Calada", "clave_idempotencia": "qr-1"}
+        assert cliente.post("/transiciones", json=escaneo).status_code == 422  # Falta la calidad
+        escaneo["calidad_asignada"] = "Comercial"
+        primera = cliente.post("/transiciones", json=escaneo)
+        repetida = cliente.post("/transiciones", json=escaneo)
+        assert primera.status_code == repetida.status_code == 200, primera.text
+        assert (primera.json()["duplicada"], repetida.json()["duplicada"]) == (False, True)
+        assert primera.json()["transicion"]["movimiento_id"] == repetida.json()["transicion"]["movimiento_id"]
+
+        salto = cliente.post("/transiciones", json={"numero_carta": "CPE-0", "puerto_codigo": "TRP1", "estado_nuevo": "Salido"})
+        assert salto.status_code == 409
+        assert salto.json()["detail"]["estado_actual"] == "POST_CALADA"
+        assert cliente.post("/transiciones", json={"numero_carta": "X", "puerto_codigo": "TRP1",
+                                                   "estado_nuevo": "En Viaje"}).status_code == 404
+        assert cliente.post("/transiciones", json={"numero_carta": "CPE-0", "puerto_codigo": "TRP2",
+                                                   "estado_nuevo": "En Viaje"}).status_code == 403
+    finally:
+        main.app.dependency_overrides.clear()
+        main.motor_transiciones.recientes.clear()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-q", __file__]))
@@ -0,0 +1,118 @@
+"""
+Pruebas del cache TTL/LRU (utils/ttl_cache.py) y del L1 de tokens ARCA en main.py.
+
+Uso:
+    python -m pytest -q test/test_ttl_cache.py
+    python test/test_ttl_cache.py
+"""
+
+import sys
+import time
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Agregar directorio padre al path para importar módulos
+BASE_DIR = Path(__file__).parent.parent.absolute()
+sys.path.append(str(BASE_DIR))
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from utils.ttl_cache import TTLCache
+from utilidades_prueba import crear_base_prueba
+import main
+
+
+def test_hit_miss_y_vencimiento():
+    cache = TTLCache(max_size=10)
+    assert cache.get("a") is None
+    cache.set("a", 1, ttl=0.05)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+
+
+def test_desalojo_lru():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")            # "b" pasa a ser el menos usado
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_no_positivo_invalida():
+    cache = TTLCache()
+    cache.set("a", 1, ttl=60)
+    cache.set("a", 2, ttl=0)
+    assert cache.get("a") is None
+
+
+async def _con_sesion_temporal(escenario):
+    """Ejecuta escenario(session) sobre una base temporal (tablas + migraciones) con sesión asíncrona."""
+    engine, async_engine = crear_base_prueba()
+    engine.dispose()
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return await escenario(session)
+    finally:
+        await async_engine.dispose()
+
+
+def test_l1_delante_de_arca_tokens():
+    """El segundo lookup se resuelve en memoria y guardar invalida el L1."""
+    main.arca_token_l1.clear()
+
+    async def escenario(session):
+        await main.save_arca_token_to_cache(
+            1, "TRP1", "CPE", "TOKEN-1", "SIGN", "http://wsaa", "wscpe", session,
+            fecha_vencimiento=datetime.utcnow() + timedelta(hours=12)
+        )
+        main.arca_token_l1.clear()
+
+        antes = main.arca_token_l1.stats()
+        primero = await main.get_cached_arca_token(1, "TRP1", "CPE", session)
+        segundo = await main.get_cached_arca_token(1, "TRP1", "CPE", session)
+        despues = main.arca_token_l1.stats()
+
+        assert primero.token == segundo.token == "TOKEN-1"
+        assert despues["misses"] - antes["misses"] == 1
+        assert despues["hits"] - antes["hits"] == 1
+        # El snapshot no queda asociado a la sesión
+        assert segundo not in session
+
+        await main.save_arca_token_to_cache(
+            1, "TRP1", "CPE", "TOKEN-2", "SIGN", "http://wsaa", "wscpe", session
+        )
+        assert (await main.get_cached_arca_token(1, "TRP1", "CPE", session)).token == "TOKEN-2"
+
+    asyncio.run(_con_sesion_temporal(escenario))
+
+
+def test_hit_l1_submilisegundo():
+    main.arca_token_l1.clear()
+
+    async def escenario(session):
+        await main.save_arca_token_to_cache(2, "TRP2", "EMBARQUES", "T", "S", "http://wsaa", "wconscomunicacionembarque", session)
+
+        iteraciones = 10000
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            await main.get_cached_arca_token(2, "TRP2", "EMBARQUES", session)
+        return (time.perf_counter() - inicio) * 1000 / iteraciones
+
+    promedio_ms = asyncio.run(_con_sesion_temporal(escenario))
+    assert promedio_ms < 1.0, f"Hit L1 promedio {promedio_ms:.4f} ms"
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_") and callable(prueba):
+            prueba()
+            print(f"✅ {nombre}")
@@ -0,0 +1,131 @@
+"""
+Utilidades compartidas por los scripts de prueba y benchmarks de LogiGrain.
+"""
+
+import asyncio
+import datetime
+import tempfile
+from pathlib import Path
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+def generar_certificado_prueba(directorio: Path, nombre: str = "bench"):
+    """
+    Genera un par clave/certificado autofirmado (RSA 2048) en PEM.
+
+    Returns:
+        (ruta_certificado, ruta_clave) como strings
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    subject = x509.Name([
+        x509.NameAttribute(NameOID.COMMON_NAME, f"logigrain-{nombre}"),
+        x509.NameAttribute(NameOID.SERIAL_NUMBER, "CUIT 20123456789"),
+    ])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .sign(key, hashes.SHA256())
+    )
+
+    directorio = Path(directorio)
+    cert_file = directorio / f"{nombre}.crt"
+    key_file = directorio / f"{nombre}.key"
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption()
+    ))
+    return str(cert_file), str(key_file)
+
+
+def configurar_certificados_entorno(entorno: dict, directorio: Path, nombre: str = "bench"):
+    """
+    Genera un certificado de prueba y completa las variables ARCA_* para que
+    los tres servicios (CPE, EMBARQUES, FACTURACION) lo usen.
+
+    Args:
+        entorno: Diccionario de entorno a completar (ej: os.environ)
+        directorio: Directorio donde generar los archivos
+    """
+    cert_file, key_file = generar_certificado_prueba(directorio, nombre)
+    entorno['ARCA_CERT_BASE_DIR'] = str(directorio)
+    for servicio in ("CPE", "EMBARQUES", "FACTURACION"):
+        entorno[f'ARCA_{servicio}_CERT_NAME'] = Path(cert_file).name
+        entorno[f'ARCA_{servicio}_KEY_NAME'] = Path(key_file).name
+    return cert_file, key_file
+
+
+def crear_base_prueba(directorio: Path = None):
+    """
+    Base SQLite temporal en archivo (tablas + migraciones) con dos engines sobre el mismo archivo:
+    sincrónico (para sembrar y verificar desde la prueba) y asíncrono (el
+    que usan los endpoints a través de get_async_session).
+
+    Returns:
+        (engine, async_engine); al terminar llamar a cerrar_engine_async(async_engine)
+    """
+    from sqlmodel import SQLModel
+    from utils.database import crear_engine, crear_engine_async
+    from utils.migraciones import aplicar_migraciones
+    import Modelos.carta_porte  # noqa: F401 (las migraciones indexan sus tablas)
+
+    directorio = Path(directorio or tempfile.mkdtemp(prefix="logigrain_db_"))
+    url = f"sqlite:///{directorio / 'prueba.db'}"
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    aplicar_migraciones(engine)
+    return engine, crear_engine_async(url)
+
+
+def carta_prueba(i: int, estado=None, cereal=None, puerto: str = "TRP1", exportador: str = "30222222223", **campos):
+    """
+    CartaPorteElectronica de prueba: número CPE-{i}, patente AB{i:03d}CD y los mismos CUITs y transportista.
+
+    Args:
+        estado: EstadoCamion (default EN_PLAYA)
+        cereal: TipoCereal (default SOJA)
+        campos: Otros campos de la carta o reemplazos de los anteriores (ej: created_at, patente)
+    """
+    from Modelos.carta_porte import CartaPorteElectronica, EstadoCamion, TipoCereal
+
+    valores = {
+        "numero_carta": f"CPE-{i}", "puerto_codigo": puerto, "cuit_origen": "20111111112", "cuit_destino": exportador,
+        "tipo_cereal": cereal or TipoCereal.SOJA, "peso_declarado": 30000, "patente": f"AB{i:03d}CD",
+        "chofer_cuit": "20333333334", "empresa_transporte": "Transportes", "estado_actual": estado or EstadoCamion.EN_PLAYA,
+    }
+    return CartaPorteElectronica(**{**valores, **campos})
+
+
+def sembrar_cartas(engine, cartas) -> None:
+    """Guarda las cartas con el engine sincrónico de crear_base_prueba."""
+    from sqlmodel import Session
+
+    with Session(engine) as session:
+        session.add_all(cartas)
+        session.commit()
+
+
+def sesion_async_prueba(async_engine, escritor=None):
+    """Dependency equivalente a main.get_async_session sobre otros engines (escritor: perfil PROD)."""
+    from utils.database import nueva_sesion_async
+
+    async def sesion():
+        async with nueva_sesion_async(async_engine, escritor) as session:
+            yield session
+    return sesion
+
+
+def cerrar_engine_async(async_engine):
+    """Cierra las conexiones de aiosqlite (usan hilos no-daemon que impedirían terminar el proceso)."""
+    asyncio.run(async_engine.dispose())
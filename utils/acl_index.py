@@ -0,0 +1,178 @@
+"""
+Índice en memoria de acceso usuario -> puerto.
+
+Reemplaza el join UsuarioPuerto/Puerto que se hacía en cada request de
+ticket y en cada login. Se carga completo al iniciar (dos consultas) y se
+mantiene incrementalmente con eventos de SQLAlchemy, recién en el commit
+(utils/pendientes_commit.py).
+
+Las escrituras que no pasan por el ORM (UPDATE masivos, otro proceso) no
+generan eventos: el índice se recarga completo cada ACL_RELOAD_SECONDS
+(default 300), o a demanda con `acl_index.invalidar()`.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from Modelos.usuario import Puerto, UsuarioPuerto
+from utils.logger import setup_logger
+from utils.pendientes_commit import PendientesDeCommit
+
+logger = setup_logger('main')
+
+class PuertoAclIndex:
+    """
+    Índice usuario_id -> códigos de puerto asignados, más el estado de cada puerto.
+
+    Args:
+        recarga_segundos: Antigüedad máxima del índice antes de recargarlo completo
+    """
+
+    def __init__(self, recarga_segundos: float = None):
+        self.recarga_segundos = recarga_segundos if recarga_segundos is not None else float(os.getenv("ACL_RELOAD_SECONDS", "300"))
+        self._asignaciones: Dict[int, Set[str]] = {}  # usuario_id -> códigos con UsuarioPuerto.habilitado
+        self._puertos: Dict[str, Puerto] = {}  # código -> copia del Puerto (incluye habilitado)
+        self._codigos: Dict[int, str] = {}  # puerto_id -> código
+        self._cargado_en: Optional[float] = None
+        self._lock = threading.Lock()
+        self.recargas = 0
+        self.cambios_aplicados = 0
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.recarga_segundos
+
+    def cargar(self, session: Session) -> None:
+        """Carga completa desde la base (dos consultas) y reemplazo atómico."""
+        puertos = {p.codigo: Puerto(**p.model_dump()) for p in session.exec(select(Puerto)).all()}
+        codigos = {p.id: p.codigo for p in puertos.values()}
+        asignaciones: Dict[int, Set[str]] = {}
+        statement = select(UsuarioPuerto.usuario_id, UsuarioPuerto.puerto_id).where(UsuarioPuerto.habilitado == True)
+        for usuario_id, puerto_id in session.exec(statement).all():
+            codigo = codigos.get(puerto_id)
+            if codigo:
+                asignaciones.setdefault(usuario_id, set()).add(codigo)
+
+        with self._lock:
+            self._puertos, self._codigos, self._asignaciones = puertos, codigos, asignaciones
+            self._cargado_en = time.monotonic()
+            self.recargas += 1
+        logger.info(f"Índice de acceso a puertos cargado - {len(asignaciones)} usuarios, {len(puertos)} puertos")
+
+    def asegurar_cargado(self, session: Session) -> None:
+        """Carga el índice si nunca se cargó o si superó su antigüedad máxima."""
+        if not self.cargado:
+            self.cargar(session)
+
+    async def asegurar_cargado_async(self, session: AsyncSession) -> None:
+        """Igual que asegurar_cargado, para sesiones asíncronas (la carga corre con run_sync)."""
+        if not self.cargado:
+            await session.run_sync(self.cargar)
+
+    def invalidar(self) -> None:
+        """Fuerza la recarga completa en el próximo uso."""
+        with self._lock:
+            self._cargado_en = None
+
+    def tiene_acceso(self, usuario_id: int, puerto_codigo: str) -> bool:
+        """True si el usuario tiene el puerto asignado y habilitado (O(1))."""
+        puerto = self._puertos.get(puerto_codigo)
+        return (puerto is not None and puerto.habilitado
+                and puerto_codigo in self._asignaciones.get(usuario_id, ()))
+
+    def puertos_de(self, usuario_id: int) -> List[Puerto]:
+        """Puertos habilitados del usuario, ordenados por código."""
+        puertos = (self._puertos.get(codigo) for codigo in self._asignaciones.get(usuario_id, ()))
+        return sorted((p for p in puertos if p is not None and p.habilitado), key=lambda p: p.codigo)
+
+    # === Cambios incrementales (aplicados en el commit) === #
+
+    def aplicar_asignacion(self, usuario_id: int, puerto_id: int, habilitado: bool) -> None:
+        with self._lock:
+            codigo = self._codigos.get(puerto_id)
+            if codigo is None:
+                # Puerto desconocido para el índice: recargar en el próximo uso
+                self._cargado_en = None
+                return
+            codigos = self._asignaciones.setdefault(usuario_id, set())
+            if habilitado:
+                codigos.add(codigo)
+            else:
+                codigos.discard(codigo)
+            self.cambios_aplicados += 1
+
+    def aplicar_puerto(self, puerto: Puerto, eliminado: bool = False) -> None:
+        with self._lock:
+            codigo_anterior = self._codigos.get(puerto.id)
+            if codigo_anterior and (eliminado or codigo_anterior != puerto.codigo):
+                self._puertos.pop(codigo_anterior, None)
+                for codigos in self._asignaciones.values():
+                    if codigo_anterior in codigos:
+                        codigos.discard(codigo_anterior)
+                        if not eliminado:
+                            codigos.add(puerto.codigo)
+            if eliminado:
+                self._codigos.pop(puerto.id, None)
+            else:
+                self._codigos[puerto.id] = puerto.codigo
+                self._puertos[puerto.codigo] = puerto
+            self.cambios_aplicados += 1
+
+    def stats(self) -> dict:
+        return {
+            "usuarios": len(self._asignaciones),
+            "puertos": len(self._puertos),
+            "recargas": self.recargas,
+            "cambios_aplicados": self.cambios_aplicados,
+        }
+
+
+acl_index = PuertoAclIndex()
+
+
+# === Eventos de SQLAlchemy: acumular en el flush, aplicar en el commit === #
+
+def _aplicar_cambios(cambios) -> None:
+    for cambio in cambios:
+        cambio()
+
+
+_pendientes = PendientesDeCommit("acl_cambios", _aplicar_cambios)
+
+
+def _registrar_cambio(target, cambio) -> None:
+    cambios = _pendientes.en(target)
+    if cambios is not None:
+        cambios.append(cambio)
+
+
+@event.listens_for(UsuarioPuerto, "after_insert")
+@event.listens_for(UsuarioPuerto, "after_update")
+def _asignacion_guardada(mapper, connection, target):
+    _registrar_cambio(target, lambda u=target.usuario_id, p=target.puerto_id, h=target.habilitado:
+                      acl_index.aplicar_asignacion(u, p, h))
+
+
+@event.listens_for(UsuarioPuerto, "after_delete")
+def _asignacion_eliminada(mapper, connection, target):
+    _registrar_cambio(target, lambda u=target.usuario_id, p=target.puerto_id:
+                      acl_index.aplicar_asignacion(u, p, False))
+
+
+@event.listens_for(Puerto, "after_insert")
+@event.listens_for(Puerto, "after_update")
+def _puerto_guardado(mapper, connection, target):
+    copia = Puerto(**target.model_dump())
+    _registrar_cambio(target, lambda: acl_index.aplicar_puerto(copia))
+
+
+@event.listens_for(Puerto, "after_delete")
+def _puerto_eliminado(mapper, connection, target):
+    copia = Puerto(**target.model_dump())
+    _registrar_cambio(target, lambda: acl_index.aplicar_puerto(copia, eliminado=True))
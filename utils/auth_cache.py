@@ -0,0 +1,79 @@
+"""
+Cache de principales (usuario autenticado) en memoria del proceso.
+
+Evita consultar la tabla de usuarios en cada request autenticado: guarda
+una copia del usuario por un TTL corto junto con la versión vigente al
+momento de cargarlo. Cualquier cambio relevante (usuario deshabilitado,
+puertos modificados) incrementa la versión del usuario, y una entrada con
+versión vieja se trata como fallo aunque su TTL no haya vencido.
+
+La versión se toma ANTES de consultar la base: si el usuario cambia
+mientras se carga, la entrada queda guardada con la versión anterior y el
+siguiente request la descarta (no se publica un principal desactualizado).
+
+Los cambios hechos por otro proceso no generan eventos acá: el TTL acota
+cuánto tiempo puede verse un estado viejo en ese caso.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from utils.ttl_cache import TTLCache
+
+
+class PrincipalCache:
+    """
+    Cache de principales con TTL y contador de versión por usuario.
+
+    Args:
+        ttl: Segundos de vida de cada entrada
+        max_size: Cantidad máxima de usuarios en memoria (LRU)
+        nombre: Nombre del cache (para estadísticas)
+    """
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 2048, nombre: str = "principales"):
+        self.ttl = ttl
+        self._cache = TTLCache(max_size=max_size, nombre=nombre)
+        self._versiones: Dict[Hashable, int] = defaultdict(int)
+        self._generacion = 0  # Cambios que afectan a todos los usuarios (ej: un puerto deshabilitado)
+        self._lock = threading.Lock()
+        self.invalidaciones = 0
+
+    def version(self, usuario_id: Hashable) -> Tuple[int, int]:
+        """Versión vigente del usuario; tomarla antes de cargarlo de la base."""
+        with self._lock:
+            return (self._generacion, self._versiones[usuario_id])
+
+    def get(self, usuario_id: Hashable) -> Optional[Any]:
+        """Principal vigente del usuario o None (vencido, invalidado o ausente)."""
+        entrada = self._cache.get(usuario_id)
+        if entrada is None:
+            return None
+        version, principal = entrada
+        if version != self.version(usuario_id):
+            self._cache.invalidate(usuario_id)
+            return None
+        return principal
+
+    def set(self, usuario_id: Hashable, principal: Any, version: Tuple[int, int]) -> None:
+        """Guarda el principal con la versión tomada antes de cargarlo."""
+        self._cache.set(usuario_id, (version, principal), ttl=self.ttl)
+
+    def invalidar(self, usuario_id: Hashable) -> None:
+        """Incrementa la versión del usuario (su entrada deja de ser válida)."""
+        with self._lock:
+            self._versiones[usuario_id] += 1
+            self.invalidaciones += 1
+        self._cache.invalidate(usuario_id)
+
+    def invalidar_todos(self) -> None:
+        """Invalida todas las entradas (cambios que no son de un usuario puntual)."""
+        with self._lock:
+            self._generacion += 1
+            self.invalidaciones += 1
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del cache para monitoreo."""
+        return {**self._cache.stats(), "ttl": self.ttl, "invalidaciones": self.invalidaciones}
@@ -0,0 +1,410 @@
+"""
+Canal de eventos del circuito (Server-Sent Events) para las pantallas de los sectores.
+
+Las pantallas (lista de Precalado, lista de post-Calada, ocupación de
+plataformas, tablero) se suscriben a un puerto y, opcionalmente, a
+algunos sectores, en lugar de consultar la API cada pocos segundos. El
+canal difunde los cambios de EstadoCamion ya confirmados: los que aplica
+el motor de transiciones (utils/transiciones.py) y los que hace el ORM
+(eventos de SQLAlchemy, recién en el commit: utils/pendientes_commit.py).
+
+- Coalescencia: los cambios se acumulan durante un tick (CANAL_TICK_MS,
+  default 100) y se envían como un diff por puerto: una entrada por carta
+  (estado al inicio y al final del tick; si volvió al mismo estado no se
+  envía) más el delta de los contadores por estado.
+- Filtro: una suscripción con sectores recibe las cartas que entran o
+  salen de esos sectores (altas y bajas de sus colas) y los contadores de
+  sus estados.
+- Difusión: el diff se serializa una sola vez por (puerto, filtro) y el
+  mismo frame se encola en cada suscriptor del grupo.
+- Consumidor lento: cada suscriptor tiene un buffer acotado (CANAL_BUFFER
+  frames, default 64). Si se llena se descarta su buffer y se cierra su
+  stream con un evento `resync`: el cliente vuelve a leer /colas y
+  /tablero y se reconecta. Un cliente lento nunca frena a los demás ni
+  hace crecer la memoria del worker.
+
+Sin suscriptores para un puerto, publicar no hace nada. El canal es por
+worker: cada worker difunde lo que confirma él mismo.
+"""
+
+import os
+import json
+import time
+import asyncio
+import itertools
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, asdict, replace
+from datetime import datetime
+from enum import Enum
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect as sa_inspect
+
+from Modelos.carta_porte import CartaPorteElectronica, SECTOR_POR_ESTADO
+from utils.logger import setup_logger
+from utils.pendientes_commit import PendientesDeCommit
+
+logger = setup_logger('main')
+
+_SECTOR_POR_NOMBRE: Dict[str, int] = {estado.name: sector for estado, sector in SECTOR_POR_ESTADO.items()}
+
+KEEPALIVE = ": keepalive\n\n"
+
+
+def _nombre(valor) -> Optional[str]:
+    return valor.name if isinstance(valor, Enum) else valor
+
+
+@dataclass(frozen=True)
+class CambioEstado:
+    """
+    Cambio de estado confirmado de una carta.
+
+    Args:
+        estado_anterior: None si la carta es nueva
+        estado_nuevo: None si la carta se eliminó
+        timestamp: Momento del cambio (llegada al sector, para el orden FIFO de las colas)
+    """
+    carta_id: int
+    patente: str
+    puerto_codigo: str
+    tipo_cereal: Optional[str]
+    calidad: Optional[str]
+    estado_anterior: Optional[str]
+    estado_nuevo: Optional[str]
+    timestamp: datetime
+    puesto_asignado: Optional[str] = None
+
+    @property
+    def sector_anterior(self) -> Optional[int]:
+        return _SECTOR_POR_NOMBRE.get(self.estado_anterior)
+
+    @property
+    def sector_nuevo(self) -> Optional[int]:
+        return _SECTOR_POR_NOMBRE.get(self.estado_nuevo)
+
+    def visible(self, sectores: Optional[FrozenSet[int]]) -> bool:
+        return sectores is None or self.sector_anterior in sectores or self.sector_nuevo in sectores
+
+    def como_dict(self) -> dict:
+        datos = asdict(self)
+        datos["timestamp"] = self.timestamp.isoformat()
+        datos["sector_anterior"], datos["sector_nuevo"] = self.sector_anterior, self.sector_nuevo
+        return datos
+
+
+def frame_sse(evento: str, datos: dict, id_evento: Optional[int] = None) -> str:
+    """Un evento SSE (una línea de datos JSON)."""
+    cabecera = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{cabecera}event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class Suscripcion:
+    """Stream de un cliente: buffer de frames acotado, consumido por el generador de la respuesta."""
+
+    def __init__(self, puerto_codigo: str, sectores: Optional[FrozenSet[int]], limite: int):
+        self.puerto_codigo = puerto_codigo
+        self.sectores = sectores
+        self.limite = limite
+        self._buffer: Deque[str] = deque()
+        self._hay_datos = asyncio.Event()
+        self.cerrada = False
+        self.motivo: Optional[str] = None
+        # Recibió algo desde el último latido (si no, el latido le manda KEEPALIVE)
+        self.con_trafico = False
+        # Número de publicación al suscribirse: los cambios anteriores ya están en su estado inicial
+        self.desde = 0
+
+    @property
+    def grupo(self) -> Tuple[str, Optional[FrozenSet[int]]]:
+        return self.puerto_codigo, self.sectores
+
+    def entregar(self, frame: str) -> bool:
+        """Encola un frame. False si la suscripción está cerrada o se cerró por consumidor lento."""
+        if self.cerrada:
+            return False
+        if len(self._buffer) >= self.limite:
+            self.cerrar("consumidor_lento")
+            return False
+        self._buffer.append(frame)
+        self.con_trafico = True
+        self._hay_datos.set()
+        return True
+
+    def cerrar(self, motivo: str) -> None:
+        """Descarta lo pendiente y deja solo el aviso de resincronización; el stream termina después."""
+        if self.cerrada:
+            return
+        self.cerrada, self.motivo = True, motivo
+        self._buffer.clear()
+        self._buffer.append(frame_sse("resync", {"motivo": motivo}))
+        self._hay_datos.set()
+
+    async def siguiente(self) -> Optional[str]:
+        """Frames pendientes concatenados (un solo write), o None cuando la suscripción terminó."""
+        # Sin timeout por llamada (wait_for crea una tarea y un timer por frame): los
+        # KEEPALIVE los encola el latido del canal
+        while not self._buffer:
+            if self.cerrada:
+                return None
+            self._hay_datos.clear()
+            await self._hay_datos.wait()
+        frames = "".join(self._buffer)
+        self._buffer.clear()
+        return frames
+
+
+class CanalCircuito:
+    """
+    Difusión de cambios de estado a las suscripciones del worker.
+
+    Args:
+        tick: Segundos durante los que se acumulan cambios antes de enviar un diff
+        limite_buffer: Frames pendientes por suscriptor antes de descartarlo
+        keepalive: Segundos entre latidos; los streams que no recibieron nada desde
+            el latido anterior reciben un comentario SSE (KEEPALIVE)
+    """
+
+    def __init__(self, tick: float = None, limite_buffer: int = None, keepalive: float = None):
+        self.tick = tick if tick is not None else float(os.getenv("CANAL_TICK_MS", "100")) / 1000
+        self.limite_buffer = limite_buffer or int(os.getenv("CANAL_BUFFER", "64"))
+        self.keepalive = keepalive or float(os.getenv("CANAL_KEEPALIVE_SECONDS", "15"))
+        self._grupos: Dict[Tuple[str, Optional[FrozenSet[int]]], Set[Suscripcion]] = {}
+        self._suscriptores_por_puerto: Counter = Counter()
+        self._pendientes: List[Tuple[int, CambioEstado]] = []
+        self._programado = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._latido: Optional[asyncio.TimerHandle] = None
+        self._lock = threading.Lock()
+        self._secuencia = itertools.count(1)
+        self.cambios_publicados = 0
+        self.diffs = 0
+        self.frames_serializados = 0
+        self.frames_entregados = 0
+        self.descartados_lentos = 0
+
+    @property
+    def activo(self) -> bool:
+        """Hay al menos un suscriptor en el worker."""
+        return bool(self._suscriptores_por_puerto)
+
+    # === Suscripciones (en el event loop) === #
+
+    def suscribir(self, puerto_codigo: str, sectores: Optional[Iterable[int]] = None) -> Suscripcion:
+        """Registra un stream; se llama desde el event loop del worker."""
+        sectores = frozenset(sectores) if sectores else None
+        suscripcion = Suscripcion(puerto_codigo, sectores, self.limite_buffer)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            suscripcion.desde = self.cambios_publicados
+            # Un solo timer de keepalive para todas las suscripciones del loop
+            if self._latido is None or self._loop is not loop:
+                self._latido = loop.call_later(self.keepalive, self._latir)
+            self._loop = loop
+            self._grupos.setdefault(suscripcion.grupo, set()).add(suscripcion)
+            self._suscriptores_por_puerto[puerto_codigo] += 1
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        """Quita el stream (el cliente se desconectó o terminó)."""
+        with self._lock:
+            grupo = self._grupos.get(suscripcion.grupo)
+            if grupo is None or suscripcion not in grupo:
+                return
+            grupo.discard(suscripcion)
+            if not grupo:
+                del self._grupos[suscripcion.grupo]
+            self._suscriptores_por_puerto[suscripcion.puerto_codigo] -= 1
+            if not self._suscriptores_por_puerto[suscripcion.puerto_codigo]:
+                del self._suscriptores_por_puerto[suscripcion.puerto_codigo]
+        suscripcion.cerrar("cancelada")
+
+    def cerrar(self, motivo: str = "apagado") -> None:
+        """Cierra todos los streams (apagado del worker); se puede llamar desde cualquier hilo."""
+        loop = self._loop
+        try:
+            en_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            en_loop = False
+        if loop is not None and not en_loop and not loop.is_closed():
+            loop.call_soon_threadsafe(self._cerrar_todas, motivo)
+        else:
+            self._cerrar_todas(motivo)
+
+    def _latir(self) -> None:
+        """Latido (en el loop): KEEPALIVE a los streams sin tráfico; se reprograma mientras haya suscriptores."""
+        with self._lock:
+            suscripciones = [s for grupo in self._grupos.values() for s in grupo]
+            self._latido = self._loop.call_later(self.keepalive, self._latir) if suscripciones else None
+        lentos = []
+        for suscripcion in suscripciones:
+            if not suscripcion.con_trafico and not suscripcion.entregar(KEEPALIVE) \
+                    and suscripcion.motivo == "consumidor_lento":
+                lentos.append(suscripcion)
+            suscripcion.con_trafico = False
+        self._descartar_lentos(lentos)
+
+    def _descartar_lentos(self, lentos: List[Suscripcion]) -> None:
+        for suscripcion in lentos:
+            self.descartados_lentos += 1
+            logger.warning(f"Suscriptor de eventos de {suscripcion.puerto_codigo} descartado por consumidor lento")
+            self.cancelar(suscripcion)
+
+    def _cerrar_todas(self, motivo: str) -> None:
+        with self._lock:
+            suscripciones = [s for grupo in self._grupos.values() for s in grupo]
+        for suscripcion in suscripciones:
+            suscripcion.cerrar(motivo)
+
+    # === Publicación (desde cualquier hilo) === #
+
+    def publicar(self, cambios: Iterable[CambioEstado]) -> None:
+        """Encola cambios confirmados para el próximo tick. Sin suscriptores del puerto se descartan."""
+        with self._lock:
+            if not self._suscriptores_por_puerto:
+                return
+            cambios = [c for c in cambios if c.puerto_codigo in self._suscriptores_por_puerto]
+            if not cambios:
+                return
+            # Cada cambio lleva su número de publicación (ver Suscripcion.desde)
+            primero = self.cambios_publicados
+            self._pendientes.extend(zip(itertools.count(primero), cambios))
+            self.cambios_publicados += len(cambios)
+            if self._programado:
+                return
+            self._programado = True
+            loop = self._loop
+        try:
+            loop.call_soon_threadsafe(loop.call_later, self.tick, self._despachar)
+        except RuntimeError:
+            # El loop de las suscripciones ya no existe (apagado): nada que difundir
+            with self._lock:
+                self._pendientes, self._programado = [], False
+
+    @staticmethod
+    def _coalescer(cambios: Iterable[CambioEstado]) -> Dict[str, List[CambioEstado]]:
+        """Un cambio neto por carta: estado al inicio del tick -> estado al final."""
+        por_carta: Dict[int, CambioEstado] = {}
+        for cambio in cambios:
+            previo = por_carta.get(cambio.carta_id)
+            if previo is not None:
+                cambio = replace(cambio, estado_anterior=previo.estado_anterior)
+            por_carta[cambio.carta_id] = cambio
+        por_puerto: Dict[str, List[CambioEstado]] = {}
+        for cambio in por_carta.values():
+            if cambio.estado_anterior != cambio.estado_nuevo:
+                por_puerto.setdefault(cambio.puerto_codigo, []).append(cambio)
+        return por_puerto
+
+    def _frame(self, secuencia: int, enviado: float, puerto_codigo: str, sectores: Optional[FrozenSet[int]],
+               cambios: List[CambioEstado]) -> Optional[str]:
+        visibles = [c for c in cambios if c.visible(sectores)]
+        if not visibles:
+            return None
+        contadores: Counter = Counter()
+        for cambio in visibles:
+            if cambio.estado_anterior is not None:
+                contadores[cambio.estado_anterior] -= 1
+            if cambio.estado_nuevo is not None:
+                contadores[cambio.estado_nuevo] += 1
+        self.frames_serializados += 1
+        return frame_sse("diff", {
+            "seq": secuencia, "puerto_codigo": puerto_codigo, "enviado": enviado,
+            "cartas": [cambio.como_dict() for cambio in visibles],
+            "contadores": {estado: n for estado, n in contadores.items()
+                           if n and (sectores is None or _SECTOR_POR_NOMBRE.get(estado) in sectores)},
+        }, id_evento=secuencia)
+
+    def _despachar(self) -> None:
+        """Fin del tick (en el loop): un diff por puerto, serializado una vez por filtro."""
+        with self._lock:
+            pendientes, self._pendientes, self._programado = self._pendientes, [], False
+            grupos = [(grupo, list(suscripciones)) for grupo, suscripciones in self._grupos.items()]
+        if not pendientes:
+            return
+        primero = pendientes[0][0]
+        por_puerto = self._coalescer(cambio for _, cambio in pendientes)
+        secuencia = next(self._secuencia)
+        self.diffs += 1
+        enviado = time.time()
+        lentos: List[Suscripcion] = []
+
+        for (puerto_codigo, sectores), suscripciones in grupos:
+            frame = None
+            for suscripcion in suscripciones:
+                if suscripcion.desde <= primero:
+                    if frame is None:
+                        frame = self._frame(secuencia, enviado, puerto_codigo, sectores, por_puerto.get(puerto_codigo, []))
+                        if frame is None:
+                            break
+                    propio = frame
+                else:
+                    # Se suscribió durante el tick: su estado inicial ya incluye los cambios anteriores
+                    posteriores = self._coalescer(c for n, c in pendientes if n >= suscripcion.desde)
+                    propio = self._frame(secuencia, enviado, puerto_codigo, sectores, posteriores.get(puerto_codigo, []))
+                    if propio is None:
+                        continue
+                if suscripcion.entregar(propio):
+                    self.frames_entregados += 1
+                elif suscripcion.motivo == "consumidor_lento":
+                    lentos.append(suscripcion)
+
+        self._descartar_lentos(lentos)
+
+    def stats(self) -> dict:
+        with self._lock:
+            suscriptores = sum(self._suscriptores_por_puerto.values())
+            grupos = len(self._grupos)
+        return {
+            "suscriptores": suscriptores,
+            "grupos": grupos,
+            "tick_ms": round(self.tick * 1000),
+            "limite_buffer": self.limite_buffer,
+            "cambios_publicados": self.cambios_publicados,
+            "diffs": self.diffs,
+            "frames_serializados": self.frames_serializados,
+            "frames_entregados": self.frames_entregados,
+            "descartados_lentos": self.descartados_lentos,
+        }
+
+
+canal_circuito = CanalCircuito()
+
+
+# === Eventos de SQLAlchemy: acumular en el flush, publicar en el commit === #
+
+def _cambio(target, estado_anterior, estado_nuevo) -> CambioEstado:
+    return CambioEstado(target.id, target.patente, target.puerto_codigo, _nombre(target.tipo_cereal),
+                        _nombre(target.calidad_asignada), _nombre(estado_anterior), _nombre(estado_nuevo),
+                        datetime.utcnow())
+
+
+_pendientes = PendientesDeCommit("canal_circuito_cambios", lambda cambios: canal_circuito.publicar(cambios))
+
+
+def _acumular(target, cambio_de) -> None:
+    # Sin suscriptores no hay nada que armar (el caso normal de los scripts y las pruebas)
+    if not canal_circuito.activo:
+        return
+    cambios = _pendientes.en(target)
+    if cambios is not None:
+        cambios.append(cambio_de(target))
+
+
+@event.listens_for(CartaPorteElectronica, "after_insert")
+def _carta_insertada(mapper, connection, target):
+    _acumular(target, lambda carta: _cambio(carta, None, carta.estado_actual))
+
+
+@event.listens_for(CartaPorteElectronica, "after_update")
+def _carta_actualizada(mapper, connection, target):
+    historial = sa_inspect(target).attrs.estado_actual.history
+    if historial.has_changes():
+        anterior = historial.deleted[0] if historial.deleted else None
+        _acumular(target, lambda carta: _cambio(carta, anterior, carta.estado_actual))
+
+
+@event.listens_for(CartaPorteElectronica, "after_delete")
+def _carta_eliminada(mapper, connection, target):
+    _acumular(target, lambda carta: _cambio(carta, carta.estado_actual, None))
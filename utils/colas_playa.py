@@ -0,0 +1,379 @@
+"""
+Colas en memoria de las playas de espera (Precalado y post-Calada).
+
+Cada (puerto, sector, cereal, calidad) es una cola de prioridad por orden
+de llegada al sector (heap): encolar, ver el primero, sacarlo y quitar un
+camión por patente cuestan O(log n), sin re-ordenar la tabla de cartas de
+porte en cada pantalla de "quién sigue".
+
+- Playa de Precalado (3.4, estado INGRESADO): orden Cereal + FIFO.
+- Playa de Espera post-Calada (3.6, estado POST_CALADA): orden Calidad,
+  Cereal + FIFO.
+
+El orden entre colas de una playa sigue el de los enums (CalidadCereal,
+TipoCereal); dentro de cada cola manda la hora de llegada al sector.
+
+Al iniciar se reconstruyen desde la base (cartas en esos estados y su
+último MovimientoSector de entrada). Los cambios de estado hechos por el
+ORM se aplican con eventos de SQLAlchemy recién en el commit
+(utils/pendientes_commit.py); el motor de transiciones
+(utils/transiciones.py), que escribe sin el ORM, llama a `aplicar_estado`
+después de cada commit.
+
+Con varios workers cada proceso ve solo sus propios commits: una tarea del
+lifespan reconstruye las colas desde la base cada COLAS_PLAYA_RECARGA_SECONDS
+(default 30), así un camión que otro worker movió a una playa aparece en la
+lista y se puede llamar. Un camión que otro worker ya llamó y sigue en la
+cola local se descarta al llamarlo (el UPDATE condicional no lo encuentra).
+"""
+
+import os
+import heapq
+import asyncio
+import itertools
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import DateTime, event, func, inspect as sa_inspect, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from Modelos.carta_porte import (
+    CartaPorteElectronica, MovimientoSector, EstadoCamion, TipoCereal, CalidadCereal, SECTOR_POR_ESTADO
+)
+from utils.logger import setup_logger
+from utils.pendientes_commit import PendientesDeCommit
+
+logger = setup_logger('main')
+
+@dataclass(frozen=True)
+class Playa:
+    """Playa de espera: estado en el que los camiones esperan y estado al que pasan al ser llamados."""
+    nombre: str
+    estado: EstadoCamion
+    llamado: EstadoCamion
+
+    @property
+    def sector(self) -> int:
+        return SECTOR_POR_ESTADO[self.estado]
+
+
+PLAYAS: Dict[str, Playa] = {
+    "precalado": Playa("Playa de Precalado", EstadoCamion.INGRESADO, EstadoCamion.EN_CALADA),
+    "post-calada": Playa("Playa de Espera post-Calada", EstadoCamion.POST_CALADA, EstadoCamion.EN_BALANZA_BRUTO),
+}
+_PLAYA_POR_ESTADO: Dict[str, Playa] = {playa.estado.name: playa for playa in PLAYAS.values()}
+
+# Rango de cada cereal y calidad en el orden de las playas (sin calidad: antes que todas)
+_RANGO_CEREAL = {cereal.name: rango for rango, cereal in enumerate(TipoCereal)}
+_RANGO_CALIDAD = {None: -1, **{calidad.name: rango for rango, calidad in enumerate(CalidadCereal)}}
+
+ClaveCola = Tuple[str, int, str, Optional[str]]  # (puerto_codigo, sector, cereal, calidad)
+
+
+def _nombre(valor) -> Optional[str]:
+    """Nombre del enum (lo que guarda SQLModel); acepta también el nombre ya resuelto."""
+    return valor.name if isinstance(valor, Enum) else valor
+
+
+@dataclass(frozen=True)
+class CamionEnCola:
+    carta_id: int
+    patente: str
+    puerto_codigo: str
+    sector: int
+    tipo_cereal: str
+    calidad: Optional[str]
+    desde: datetime  # Llegada al sector (orden FIFO)
+
+
+class _Cola:
+    """Heap por llegada con borrado perezoso: quitar marca la entrada y se descarta al llegar al tope."""
+
+    def __init__(self):
+        self.heap: List[list] = []  # [desde, secuencia, camion | None]
+        self.vivos = 0
+
+    def agregar(self, entrada: list) -> None:
+        heapq.heappush(self.heap, entrada)
+        self.vivos += 1
+
+    def anular(self, entrada: list) -> None:
+        entrada[2] = None
+        self.vivos -= 1
+        # Compactar si las entradas anuladas superan a las vivas (amortizado O(1) por anulación)
+        if len(self.heap) > 64 and self.vivos < len(self.heap) // 2:
+            self.heap = [e for e in self.heap if e[2] is not None]
+            heapq.heapify(self.heap)
+
+    def primero(self) -> Optional[list]:
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def ordenadas(self) -> List[list]:
+        return sorted(e for e in self.heap if e[2] is not None)
+
+
+class ColasPlaya:
+    """
+    Colas de las playas de espera de todos los puertos.
+
+    Args:
+        intervalo: Segundos entre recargas completas de la tarea periódica
+    """
+
+    def __init__(self, intervalo: float = None):
+        self.intervalo = intervalo or float(os.getenv("COLAS_PLAYA_RECARGA_SECONDS", "30"))
+        self._colas: Dict[ClaveCola, _Cola] = {}
+        self._ubicacion: Dict[int, Tuple[ClaveCola, list]] = {}  # carta_id -> (cola, entrada)
+        self._por_patente: Dict[str, int] = {}  # patente -> carta_id
+        self._secuencia = itertools.count()
+        self._cargado = False
+        self._lock = threading.RLock()
+        # Cambios locales hechos mientras corre la consulta de una recarga (None: sin recarga en curso)
+        self._durante_recarga: Optional[List[Callable[[], None]]] = None
+        self.recargas = 0
+        self.cambios_aplicados = 0
+        self.errores = 0
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado
+
+    # === Carga desde la base === #
+
+    @staticmethod
+    def _consulta():
+        """Cartas en una playa de espera y su llegada (último movimiento de entrada)."""
+        carta, movimiento = CartaPorteElectronica, MovimientoSector
+        llegada = (
+            select(func.max(movimiento.timestamp_movimiento))
+            .where(movimiento.carta_porte_id == carta.id, movimiento.estado_nuevo == carta.estado_actual)
+            .scalar_subquery()
+        )
+        return select(
+            carta.id, carta.patente, carta.puerto_codigo, carta.estado_actual, carta.tipo_cereal, carta.calidad_asignada,
+            func.coalesce(llegada, carta.fecha_ingreso, carta.created_at, type_=DateTime)
+        ).where(carta.estado_actual.in_([playa.estado for playa in PLAYAS.values()]))
+
+    def _reemplazar(self, filas) -> None:
+        with self._lock:
+            self._colas, self._ubicacion, self._por_patente = {}, {}, {}
+            for carta_id, patente, puerto_codigo, estado, cereal, calidad, desde in filas:
+                self._encolar(carta_id, patente, puerto_codigo, _nombre(estado), _nombre(cereal), _nombre(calidad), desde)
+            self._cargado = True
+            self.recargas += 1
+
+    def cargar(self, session: Session) -> None:
+        """Reconstruye todas las colas desde la base."""
+        filas = session.exec(self._consulta()).all()
+        self._reemplazar(filas)
+        logger.info(f"Colas de playa reconstruidas - {len(filas)} camiones en espera")
+
+    async def asegurar_cargado_async(self, session: AsyncSession) -> None:
+        """Carga las colas si todavía no se cargaron (la carga corre con run_sync)."""
+        if not self._cargado:
+            await session.run_sync(self.cargar)
+
+    def invalidar(self) -> None:
+        """Fuerza la reconstrucción completa en el próximo uso."""
+        with self._lock:
+            self._cargado = False
+
+    async def recargar(self, engine: AsyncEngine) -> None:
+        """
+        Reconstruye las colas desde la base (también lo que confirmaron otros workers).
+
+        La consulta pudo leer antes de los commits locales que se aplicaron
+        mientras corría: esos cambios se vuelven a aplicar sobre las colas nuevas.
+        """
+        with self._lock:
+            self._durante_recarga = []
+        try:
+            async with engine.connect() as conexion:
+                filas = (await conexion.execute(self._consulta())).all()
+            with self._lock:
+                pendientes, self._durante_recarga = self._durante_recarga, None
+                self._reemplazar(filas)
+                for cambio in pendientes:
+                    cambio()
+        finally:
+            self._durante_recarga = None
+
+    async def ejecutar(self, engine: AsyncEngine) -> None:
+        """Tarea periódica del lifespan (engine: el de las lecturas)."""
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.recargar(engine)
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"Error al recargar las colas de playa: {str(e)}")
+
+    # === Operaciones === #
+
+    def _encolar(self, carta_id: int, patente: str, puerto_codigo: str, estado: str, cereal: str,
+                 calidad: Optional[str], desde: datetime) -> None:
+        playa = _PLAYA_POR_ESTADO[estado]
+        # En Precalado todavía no hay calidad asignada: una sola cola por cereal
+        calidad = calidad if playa.estado is EstadoCamion.POST_CALADA else None
+        clave = (puerto_codigo, playa.sector, cereal, calidad)
+        camion = CamionEnCola(carta_id, patente, puerto_codigo, playa.sector, cereal, calidad, desde)
+        entrada = [desde, next(self._secuencia), camion]
+        self._colas.setdefault(clave, _Cola()).agregar(entrada)
+        self._ubicacion[carta_id] = (clave, entrada)
+        self._por_patente[patente] = carta_id
+
+    def _registrar(self, cambio: Callable[[], None]) -> None:
+        """Guarda el cambio local para repetirlo si hay una recarga en curso (con el lock tomado)."""
+        if self._durante_recarga is not None:
+            self._durante_recarga.append(cambio)
+
+    def _quitar(self, carta_id: int) -> Optional[CamionEnCola]:
+        ubicacion = self._ubicacion.pop(carta_id, None)
+        if ubicacion is None:
+            return None
+        clave, entrada = ubicacion
+        camion = entrada[2]
+        self._colas[clave].anular(entrada)
+        if self._por_patente.get(camion.patente) == carta_id:
+            del self._por_patente[camion.patente]
+        return camion
+
+    def aplicar_estado(self, carta_id: int, patente: str, puerto_codigo: str, estado, tipo_cereal, calidad,
+                       desde: Optional[datetime] = None) -> None:
+        """
+        Refleja el estado de una carta: la encola si quedó en una playa de espera y la quita si no.
+
+        Args:
+            desde: Llegada al sector; None conserva la posición si ya estaba en esa playa (o usa ahora)
+        """
+        estado = _nombre(estado)
+        with self._lock:
+            anterior = self._ubicacion.get(carta_id)
+            if desde is None:
+                misma_playa = anterior is not None and estado in _PLAYA_POR_ESTADO \
+                    and anterior[0][1] == _PLAYA_POR_ESTADO[estado].sector
+                desde = anterior[1][0] if misma_playa else datetime.utcnow()
+            self._registrar(lambda: self.aplicar_estado(carta_id, patente, puerto_codigo, estado, tipo_cereal,
+                                                        calidad, desde))
+            self._quitar(carta_id)
+            if estado in _PLAYA_POR_ESTADO:
+                self._encolar(carta_id, patente, puerto_codigo, estado, _nombre(tipo_cereal), _nombre(calidad), desde)
+            self.cambios_aplicados += 1
+
+    def quitar(self, carta_id: int) -> Optional[CamionEnCola]:
+        """Saca de su cola a la carta (si está en alguna)."""
+        with self._lock:
+            self._registrar(lambda: self.quitar(carta_id))
+            return self._quitar(carta_id)
+
+    def quitar_patente(self, patente: str) -> Optional[CamionEnCola]:
+        """Saca de su cola al camión con esa patente (O(1) + compactación amortizada)."""
+        with self._lock:
+            carta_id = self._por_patente.get(patente)
+            if carta_id is None:
+                return None
+            self._registrar(lambda: self.quitar(carta_id))
+            return self._quitar(carta_id)
+
+    def _claves(self, puerto_codigo: str, playa: Playa, tipo_cereal=None, calidad=None) -> Iterator[ClaveCola]:
+        """Colas de la playa que cumplen el filtro, en el orden de la playa (calidad, cereal)."""
+        tipo_cereal, calidad = _nombre(tipo_cereal), _nombre(calidad)
+        claves = [
+            clave for clave in self._colas
+            if clave[0] == puerto_codigo and clave[1] == playa.sector
+            and (tipo_cereal is None or clave[2] == tipo_cereal) and (calidad is None or clave[3] == calidad)
+        ]
+        return iter(sorted(claves, key=lambda c: (_RANGO_CALIDAD.get(c[3], len(_RANGO_CALIDAD)),
+                                                 _RANGO_CEREAL.get(c[2], len(_RANGO_CEREAL)))))
+
+    def primero(self, puerto_codigo: str, playa: Playa, tipo_cereal=None, calidad=None) -> Optional[CamionEnCola]:
+        """Próximo camión a llamar de la playa (opcionalmente de un cereal y/o calidad)."""
+        with self._lock:
+            for clave in self._claves(puerto_codigo, playa, tipo_cereal, calidad):
+                entrada = self._colas[clave].primero()
+                if entrada is not None:
+                    return entrada[2]
+        return None
+
+    def sacar(self, puerto_codigo: str, playa: Playa, tipo_cereal=None, calidad=None) -> Optional[CamionEnCola]:
+        """Saca y devuelve el próximo camión a llamar (None si no hay camiones que cumplan el filtro)."""
+        with self._lock:
+            camion = self.primero(puerto_codigo, playa, tipo_cereal, calidad)
+            if camion is not None:
+                self._registrar(lambda: self.quitar(camion.carta_id))
+                self._quitar(camion.carta_id)
+            return camion
+
+    def listar(self, puerto_codigo: str, playa: Playa, tipo_cereal=None, calidad=None,
+               limite: Optional[int] = None) -> Tuple[int, List[CamionEnCola]]:
+        """Camiones de la playa en orden de llamado. Returns: (total que cumple el filtro, primeros `limite`)."""
+        with self._lock:
+            colas = [self._colas[clave] for clave in self._claves(puerto_codigo, playa, tipo_cereal, calidad)]
+            total = sum(cola.vivos for cola in colas)
+            camiones: List[CamionEnCola] = []
+            for cola in colas:
+                if limite is not None and len(camiones) >= limite:
+                    break
+                faltan = None if limite is None else limite - len(camiones)
+                entradas = heapq.nsmallest(faltan, (e for e in cola.heap if e[2] is not None)) \
+                    if faltan is not None else cola.ordenadas()
+                camiones.extend(entrada[2] for entrada in entradas)
+        return total, camiones
+
+    def stats(self) -> dict:
+        return {
+            "camiones": len(self._ubicacion),
+            "colas": sum(1 for cola in self._colas.values() if cola.vivos),
+            "recargas": self.recargas,
+            "cambios_aplicados": self.cambios_aplicados,
+            "intervalo": self.intervalo,
+            "errores": self.errores,
+        }
+
+
+colas_playa = ColasPlaya()
+
+
+# === Eventos de SQLAlchemy: acumular en el flush, aplicar en el commit === #
+
+_CAMPOS_COLA = ("estado_actual", "puerto_codigo", "tipo_cereal", "calidad_asignada", "patente")
+
+
+def _aplicar_cambios(cambios) -> None:
+    # Sin colas cargadas la próxima reconstrucción ya lee el estado confirmado
+    if colas_playa.cargado:
+        for cambio in cambios:
+            cambio()
+
+
+_pendientes = PendientesDeCommit("colas_playa_cambios", _aplicar_cambios)
+
+
+@event.listens_for(CartaPorteElectronica, "after_insert")
+@event.listens_for(CartaPorteElectronica, "after_update")
+def _carta_guardada(mapper, connection, target):
+    estado = sa_inspect(target)
+    if not any(estado.attrs[campo].history.has_changes() for campo in _CAMPOS_COLA):
+        return
+    cambios = _pendientes.en(target)
+    if cambios is None:
+        return
+    # Cambio de estado: llega ahora al sector; otro campo: conserva su lugar en la fila
+    desde = None if not estado.attrs.estado_actual.history.has_changes() else datetime.utcnow()
+    valores = (target.id, target.patente, target.puerto_codigo, target.estado_actual, target.tipo_cereal,
+               target.calidad_asignada, desde)
+    cambios.append(lambda: colas_playa.aplicar_estado(*valores))
+
+
+@event.listens_for(CartaPorteElectronica, "after_delete")
+def _carta_eliminada(mapper, connection, target):
+    cambios = _pendientes.en(target)
+    if cambios is not None:
+        cambios.append(lambda carta_id=target.id: colas_playa.quitar(carta_id))
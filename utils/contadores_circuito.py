@@ -0,0 +1,338 @@
+"""
+Contadores del circuito para el tablero de Operaciones (camiones por estado y puerto).
+
+La tabla contadorcircuito guarda cuántas cartas hay en cada (puerto,
+estado, cereal, calidad). Cada cambio de estado la actualiza en su misma
+transacción con un upsert de deltas (`cantidad = cantidad + delta`), así
+el tablero no hace `COUNT(*) GROUP BY estado_actual` sobre toda la
+temporada: lee a lo sumo estados x cereales x calidades filas por puerto,
+sin importar el tamaño del historial.
+
+- Motor de transiciones (utils/transiciones.py): suma los deltas del lote
+  antes de su commit.
+- Escrituras por el ORM (altas, bajas y cambios de CartaPorteElectronica):
+  eventos de SQLAlchemy acumulan los deltas del flush y los escriben en el
+  mismo flush (after_flush).
+
+El espejo en memoria (`contadores_circuito`) recibe los mismos deltas
+recién después del commit (utils/pendientes_commit.py) y responde el
+tablero sin consultar la base.
+
+Reconciliación: una tarea del lifespan reconstruye cada
+CONTADORES_RECONCILIACION_SECONDS (default 900) los contadores desde
+MovimientoSector (último movimiento de cada carta; las cartas sin
+movimientos cuentan en su estado de alta) sin tomar el lock de
+escritura, suma el desvío encontrado como corrección y recarga el espejo
+(que así también ve las escrituras de otros workers). Las cartas cuyo estado_actual no coincide con su último
+movimiento se informan como "desfasadas": cambiaron de estado sin
+registrar el MovimientoSector.
+"""
+
+import os
+import asyncio
+import threading
+from collections import Counter
+from enum import Enum
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, event, inspect as sa_inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session as SASession
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from Modelos.carta_porte import CartaPorteElectronica, ContadorCircuito, CIRCUITO
+from utils.logger import setup_logger
+from utils.pendientes_commit import PendientesDeCommit
+
+logger = setup_logger('main')
+
+ClaveContador = Tuple[str, str, str, str]  # (puerto_codigo, estado, tipo_cereal, calidad)
+
+# Contadores reconstruidos: estado del último movimiento de cada carta (o el de la carta si no tiene)
+SQL_RECONSTRUCCION = """
+SELECT c.puerto_codigo AS puerto_codigo,
+       COALESCE(m.estado_nuevo, c.estado_actual) AS estado,
+       c.tipo_cereal AS tipo_cereal,
+       COALESCE(c.calidad_asignada, '') AS calidad,
+       COUNT(*) AS cantidad,
+       SUM(m.estado_nuevo IS NOT NULL AND m.estado_nuevo != c.estado_actual) AS desfasadas
+FROM cartaporteelectronica c
+LEFT JOIN movimientosector m
+       ON m.id = (SELECT MAX(u.id) FROM movimientosector u WHERE u.carta_porte_id = c.id)
+GROUP BY 1, 2, 3, 4
+"""
+
+# Reconstrucción y tabla en una sola consulta: ambas de la misma instantánea de la base
+SQL_COMPARACION = f"""
+SELECT 'reconstruido' AS origen, puerto_codigo, estado, tipo_cereal, calidad, cantidad, desfasadas
+FROM ({SQL_RECONSTRUCCION})
+UNION ALL
+SELECT 'guardado', puerto_codigo, estado, tipo_cereal, calidad, cantidad, 0 FROM contadorcircuito
+"""
+
+_ESTADOS = [estado.name for estado in CIRCUITO]
+
+
+def _nombre(valor) -> Optional[str]:
+    return valor.name if isinstance(valor, Enum) else valor
+
+
+def clave_contador(puerto_codigo: str, estado, tipo_cereal, calidad) -> ClaveContador:
+    """Clave de la tabla con los nombres de los enums ("" sin calidad)."""
+    return (puerto_codigo, _nombre(estado), _nombre(tipo_cereal), _nombre(calidad) or "")
+
+
+def sentencia_deltas(deltas: Dict[ClaveContador, int]):
+    """
+    Upsert `cantidad = cantidad + delta` para ejecutar en la transacción del cambio de estado.
+
+    Returns:
+        (sentencia, filas para executemany); filas vacío si todos los deltas se anulan
+    """
+    tabla = ContadorCircuito.__table__
+    filas = [
+        {"puerto_codigo": puerto, "estado": estado, "tipo_cereal": cereal, "calidad": calidad, "cantidad": delta}
+        for (puerto, estado, cereal, calidad), delta in deltas.items() if delta
+    ]
+    sentencia = sqlite_insert(tabla)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.puerto_codigo, tabla.c.estado, tabla.c.tipo_cereal, tabla.c.calidad],
+        set_={"cantidad": tabla.c.cantidad + sentencia.excluded.cantidad}
+    )
+    return sentencia, filas
+
+
+class ContadoresCircuito:
+    """
+    Espejo en memoria de contadorcircuito y reconciliación periódica.
+
+    Args:
+        intervalo: Segundos entre reconciliaciones de la tarea periódica
+    """
+
+    def __init__(self, intervalo: float = None):
+        self.intervalo = intervalo or float(os.getenv("CONTADORES_RECONCILIACION_SECONDS", "900"))
+        self._por_puerto: Dict[str, Dict[Tuple[str, str, str], int]] = {}  # puerto -> {(estado, cereal, calidad): n}
+        self._por_estado: Dict[str, Counter] = {}  # puerto -> {estado: n}
+        self._cargado = False
+        self._lock = threading.RLock()
+        self.recargas = 0
+        self.deltas_aplicados = 0
+        self.reconciliaciones = 0
+        self.filas_corregidas = 0
+        self.desfasadas = 0
+        self.errores = 0
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado
+
+    # === Carga desde la base === #
+
+    def _reemplazar(self, filas) -> None:
+        por_puerto: Dict[str, Dict[Tuple[str, str, str], int]] = {}
+        por_estado: Dict[str, Counter] = {}
+        for puerto, estado, cereal, calidad, cantidad in filas:
+            if cantidad:
+                por_puerto.setdefault(puerto, {})[(estado, cereal, calidad)] = cantidad
+                por_estado.setdefault(puerto, Counter())[estado] += cantidad
+        with self._lock:
+            self._por_puerto, self._por_estado = por_puerto, por_estado
+            self._cargado = True
+            self.recargas += 1
+
+    def cargar(self, session: Session) -> None:
+        """Carga el espejo desde la tabla (una fila por combinación con camiones)."""
+        tabla = ContadorCircuito.__table__
+        filas = session.connection().execute(
+            select(tabla.c.puerto_codigo, tabla.c.estado, tabla.c.tipo_cereal, tabla.c.calidad, tabla.c.cantidad)
+        ).all()
+        self._reemplazar(filas)
+        logger.info(f"Contadores del circuito cargados - {len(filas)} combinaciones")
+
+    async def asegurar_cargado_async(self, session: AsyncSession) -> None:
+        """Carga el espejo si todavía no se cargó (la carga corre con run_sync)."""
+        if not self._cargado:
+            await session.run_sync(self.cargar)
+
+    def invalidar(self) -> None:
+        """Fuerza la recarga completa en el próximo uso."""
+        with self._lock:
+            self._cargado = False
+
+    # === Operaciones === #
+
+    def aplicar(self, deltas: Dict[ClaveContador, int]) -> None:
+        """Suma deltas ya confirmados en la base. Sin espejo cargado no hace nada (la carga lee lo confirmado)."""
+        with self._lock:
+            if not self._cargado:
+                return
+            for (puerto, estado, cereal, calidad), delta in deltas.items():
+                if not delta:
+                    continue
+                detalle = self._por_puerto.setdefault(puerto, {})
+                clave = (estado, cereal, calidad)
+                cantidad = detalle.get(clave, 0) + delta
+                if cantidad:
+                    detalle[clave] = cantidad
+                else:
+                    detalle.pop(clave, None)
+                self._por_estado.setdefault(puerto, Counter())[estado] += delta
+                self.deltas_aplicados += 1
+
+    def tablero(self, puerto_codigo: str, tipo_cereal=None, calidad=None) -> Dict[str, int]:
+        """
+        Camiones por estado del puerto, en el orden del circuito (todos los estados, con ceros).
+
+        Sin filtros cuesta O(estados); con filtro de cereal o calidad recorre las
+        combinaciones del puerto (acotadas por estados x cereales x calidades).
+        """
+        tipo_cereal, calidad = _nombre(tipo_cereal), _nombre(calidad)
+        with self._lock:
+            if tipo_cereal is None and calidad is None:
+                por_estado = self._por_estado.get(puerto_codigo, {})
+                return {estado: por_estado.get(estado, 0) for estado in _ESTADOS}
+            resultado = dict.fromkeys(_ESTADOS, 0)
+            for (estado, cereal, calidad_fila), cantidad in self._por_puerto.get(puerto_codigo, {}).items():
+                if (tipo_cereal is None or cereal == tipo_cereal) and (calidad is None or calidad_fila == calidad):
+                    resultado[estado] = resultado.get(estado, 0) + cantidad
+        return resultado
+
+    # === Reconciliación === #
+
+    async def reconciliar(self, engine: AsyncEngine, lector: Optional[AsyncEngine] = None) -> dict:
+        """
+        Reconstruye los contadores desde MovimientoSector y corrige los desvíos de la tabla.
+
+        La reconstrucción recorre todas las cartas, así que no toma el lock de
+        escritura: lee reconstrucción y tabla en una sola consulta (misma
+        instantánea) y el desvío entre ambas se suma después como delta en una
+        transacción corta. Las transiciones confirmadas entre medio cambiaron
+        las dos cosas por igual y no alteran el desvío.
+
+        Args:
+            engine: El que recibe las escrituras
+            lector: Engine para la reconstrucción (default: engine)
+
+        Returns:
+            {"corregidas": combinaciones corregidas, "desfasadas": cartas sin el movimiento de su estado actual}
+        """
+        tabla = ContadorCircuito.__table__
+        async with (lector or engine).connect() as conexion:
+            filas = (await conexion.execute(text(SQL_COMPARACION))).all()
+        desvios: Counter = Counter()
+        desfasadas = 0
+        for fila in filas:
+            clave = clave_contador(fila.puerto_codigo, fila.estado, fila.tipo_cereal, fila.calidad)
+            if fila.origen == "reconstruido":
+                desvios[clave] += fila.cantidad
+                desfasadas += fila.desfasadas or 0
+            else:
+                desvios[clave] -= fila.cantidad
+
+        sentencia, correcciones = sentencia_deltas(desvios)
+        async with engine.begin() as conexion:
+            if correcciones:
+                await conexion.execute(sentencia, correcciones)
+            await conexion.execute(delete(tabla).where(tabla.c.cantidad == 0))
+            actuales = (await conexion.execute(
+                select(tabla.c.puerto_codigo, tabla.c.estado, tabla.c.tipo_cereal, tabla.c.calidad, tabla.c.cantidad)
+            )).all()
+        # Sin await entre el commit y el reemplazo: el espejo recarga la tabla (también lo escrito por
+        # otros workers) y ningún delta local posterior se pierde
+        self._reemplazar(actuales)
+        self.reconciliaciones += 1
+        self.filas_corregidas += len(correcciones)
+        self.desfasadas = desfasadas
+        if correcciones:
+            logger.warning(f"Contadores del circuito reconciliados: {len(correcciones)} combinaciones corregidas")
+        if desfasadas:
+            logger.warning(f"{desfasadas} cartas con estado_actual distinto de su último MovimientoSector")
+        return {"corregidas": len(correcciones), "desfasadas": desfasadas}
+
+    async def ejecutar(self, engine: AsyncEngine, lector: Optional[AsyncEngine] = None) -> None:
+        """Tarea periódica del lifespan (engine: el que recibe las escrituras; lector: el de las lecturas)."""
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.reconciliar(engine, lector)
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"Error al reconciliar los contadores del circuito: {str(e)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            camiones = sum(sum(por_estado.values()) for por_estado in self._por_estado.values())
+            combinaciones = sum(len(detalle) for detalle in self._por_puerto.values())
+        return {
+            "cargado": self._cargado,
+            "camiones": camiones,
+            "combinaciones": combinaciones,
+            "recargas": self.recargas,
+            "deltas_aplicados": self.deltas_aplicados,
+            "reconciliaciones": self.reconciliaciones,
+            "filas_corregidas": self.filas_corregidas,
+            "desfasadas": self.desfasadas,
+            "intervalo": self.intervalo,
+            "errores": self.errores,
+        }
+
+
+contadores_circuito = ContadoresCircuito()
+
+
+# === Eventos de SQLAlchemy: deltas en el flush, espejo en el commit === #
+
+_CAMPOS_CONTADOR = ("puerto_codigo", "estado_actual", "tipo_cereal", "calidad_asignada")
+
+# Deltas del flush en curso (se escriben en after_flush) y deltas ya escritos pendientes de commit
+_deltas_del_flush = PendientesDeCommit("contadores_circuito_flush", None, Counter)
+_deltas_escritos = PendientesDeCommit("contadores_circuito_pendientes", lambda deltas: contadores_circuito.aplicar(deltas),
+                                      Counter)
+
+
+def _deltas_flush(target) -> Optional[Counter]:
+    return _deltas_del_flush.en(target)
+
+
+@event.listens_for(CartaPorteElectronica, "after_insert")
+def _carta_insertada(mapper, connection, target):
+    deltas = _deltas_flush(target)
+    if deltas is not None:
+        deltas[clave_contador(target.puerto_codigo, target.estado_actual, target.tipo_cereal, target.calidad_asignada)] += 1
+
+
+@event.listens_for(CartaPorteElectronica, "after_update")
+def _carta_actualizada(mapper, connection, target):
+    estado = sa_inspect(target)
+    historiales = [estado.attrs[campo].history for campo in _CAMPOS_CONTADOR]
+    if not any(historial.has_changes() for historial in historiales):
+        return
+    deltas = _deltas_flush(target)
+    if deltas is None:
+        return
+    anteriores = [historial.deleted[0] if historial.deleted else getattr(target, campo)
+                  for historial, campo in zip(historiales, _CAMPOS_CONTADOR)]
+    deltas[clave_contador(*anteriores)] -= 1
+    deltas[clave_contador(*(getattr(target, campo) for campo in _CAMPOS_CONTADOR))] += 1
+
+
+@event.listens_for(CartaPorteElectronica, "after_delete")
+def _carta_eliminada(mapper, connection, target):
+    deltas = _deltas_flush(target)
+    if deltas is not None:
+        deltas[clave_contador(target.puerto_codigo, target.estado_actual, target.tipo_cereal, target.calidad_asignada)] -= 1
+
+
+@event.listens_for(SASession, "after_flush")
+def _escribir_deltas(session, flush_context):
+    deltas = _deltas_del_flush.tomar(session)
+    if not deltas:
+        return
+    sentencia, filas = sentencia_deltas(deltas)
+    if filas:
+        # Misma conexión y transacción que el flush de las cartas
+        session.connection().execute(sentencia, filas)
+        _deltas_escritos.en(session).update(deltas)
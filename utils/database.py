@@ -0,0 +1,149 @@
+"""
+Construcción de engines de base de datos.
+
+Los endpoints usan un engine asíncrono (SQLite vía aiosqlite): cada
+consulta corre en el hilo de la conexión y el event loop sigue atendiendo
+otros requests mientras tanto. El engine sincrónico queda para el arranque
+(creación de tablas, carga del índice de acceso) y los scripts.
+
+Tamaño del pool (engine asíncrono), por variables de entorno:
+    DB_POOL_SIZE      Conexiones abiertas en régimen (default 5)
+    DB_MAX_OVERFLOW   Conexiones extra en picos (default 10)
+    DB_POOL_TIMEOUT   Segundos de espera por una conexión libre (default 30);
+                      la espera es asíncrona, no bloquea el loop
+
+Perfil de almacenamiento (DB_PROFILE):
+    DEV   (default) Journal por defecto de SQLite, un solo pool para todo
+    PROD  WAL + pragmas de producción en cada conexión; las lecturas usan
+          el pool de lectores (query_only) y toda escritura pasa por una
+          única conexión escritora, así los writers de la app se encolan
+          en el pool (espera asíncrona) en lugar de chocar con
+          "database is locked"
+
+Pragmas del perfil PROD:
+    DB_BUSY_TIMEOUT_MS  Espera ante un lock de otro proceso (default 5000)
+    DB_MMAP_SIZE        Bytes mapeados en memoria (default 256 MB)
+    DB_CACHE_SIZE_KB    Cache de páginas por conexión (default 65536)
+
+Nota: las conexiones de aiosqlite usan hilos no-daemon; llamar a
+`await async_engine.dispose()` al apagar (lo hace el lifespan de main.py).
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.sql.dml import UpdateBase
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def perfil_produccion() -> bool:
+    return os.getenv("DB_PROFILE", "DEV").upper() == "PROD"
+
+
+def pragmas_produccion() -> Dict[str, object]:
+    """Pragmas aplicados a cada conexión nueva en el perfil PROD."""
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # Con WAL no se pierde integridad; solo el último commit ante un corte de energía
+        "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": -int(os.getenv("DB_CACHE_SIZE_KB", "65536")),  # Negativo: KiB en lugar de páginas
+        "temp_store": "MEMORY",
+    }
+
+
+def aplicar_pragmas(engine: Engine, pragmas: Dict[str, object]) -> None:
+    """Ejecuta los pragmas en cada conexión que abra el engine (sincrónico o `async_engine.sync_engine`)."""
+    @event.listens_for(engine, "connect")
+    def _aplicar(conexion_dbapi, _registro):
+        cursor = conexion_dbapi.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+        cursor.close()
+
+
+def url_async(url: str) -> str:
+    """URL sincrónica de SQLite -> equivalente con driver aiosqlite."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+def crear_engine(url: str) -> Engine:
+    """Engine sincrónico (arranque y scripts)."""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    if perfil_produccion():
+        aplicar_pragmas(engine, pragmas_produccion())
+    return engine
+
+
+def crear_engine_async(url: str, pool_size: Optional[int] = None, max_overflow: Optional[int] = None,
+                       pragmas_extra: Optional[Dict[str, object]] = None) -> AsyncEngine:
+    """Engine asíncrono con el pool configurado por entorno (o por argumento)."""
+    async_engine = create_async_engine(
+        url_async(url),
+        pool_size=pool_size if pool_size is not None else int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=max_overflow if max_overflow is not None else int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    )
+    pragmas = pragmas_produccion() if perfil_produccion() else {}
+    pragmas.update(pragmas_extra or {})
+    if pragmas:
+        aplicar_pragmas(async_engine.sync_engine, pragmas)
+    return async_engine
+
+
+def crear_engines_async(url: str) -> Tuple[AsyncEngine, Optional[AsyncEngine]]:
+    """
+    Engines de los endpoints según DB_PROFILE.
+
+    Returns:
+        (lectores, escritor). En DEV el escritor es None y todo usa el
+        mismo pool; en PROD el pool de lectores es query_only y el
+        escritor tiene una sola conexión.
+    """
+    if not perfil_produccion():
+        return crear_engine_async(url), None
+    lectores = crear_engine_async(url, pragmas_extra={"query_only": "ON"})
+    escritor = crear_engine_async(url, pool_size=1, max_overflow=0)
+    return lectores, escritor
+
+
+class SesionEnrutada(Session):
+    """
+    Sesión que envía el flush y el DML explícito (INSERT/UPDATE/DELETE) al
+    engine escritor guardado en `info["escritor"]`; las lecturas van al
+    engine de la sesión (pool de lectores).
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        escritor = self.info.get("escritor")
+        if escritor is not None and (self._flushing or isinstance(clause, UpdateBase)):
+            return escritor.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def nueva_sesion_async(async_engine: AsyncEngine, escritor: Optional[AsyncEngine] = None) -> AsyncSession:
+    """
+    Sesión asíncrona sobre los engines de los endpoints.
+
+    expire_on_commit=False: leer atributos después del commit no dispara I/O implícito.
+    """
+    if escritor is None:
+        return AsyncSession(async_engine, expire_on_commit=False)
+    return AsyncSession(async_engine, expire_on_commit=False,
+                        sync_session_class=SesionEnrutada, info={"escritor": escritor})
+
+
+def sesion_paralela(session: AsyncSession) -> AsyncSession:
+    """Otra sesión sobre los mismos engines (una AsyncSession no admite operaciones concurrentes)."""
+    return nueva_sesion_async(session.bind, session.info.get("escritor"))
+
+
+def engine_escritura(session: AsyncSession) -> AsyncEngine:
+    """Engine por el que deben pasar las escrituras diferidas hechas con los datos de esta sesión."""
+    return session.info.get("escritor") or session.bind
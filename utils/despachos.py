@@ -0,0 +1,296 @@
+"""
+Órdenes de despacho: Operaciones pide camiones a la Playa de Camiones.
+
+Operaciones pide por ejemplo "10 camiones de Maíz" (opcionalmente de un
+exportador, el cuit_destino de la carta) y el operador de la Playa los
+marca En Viaje. Una orden (OrdenDespacho) reserva los N camiones libres
+más antiguos que coinciden, con una sola sentencia:
+
+    UPDATE cartaporteelectronica SET orden_despacho_id = :orden
+    WHERE id IN (SELECT id FROM cartaporteelectronica
+                 WHERE puerto_codigo = :p AND estado_actual = 'EN_PLAYA' AND tipo_cereal = :c
+                   AND orden_despacho_id IS NULL [AND cuit_destino = :e]
+                 ORDER BY created_at, id LIMIT :n)
+    RETURNING ...
+
+La reserva (orden_despacho_id) es la marca: un camión reservado ya no es
+libre para otra orden. La sentencia toma el lock de escritura antes de
+elegir, así dos órdenes simultáneas (de este u otro worker) no pueden
+reservar el mismo camión: la segunda elige después del commit de la
+primera. Si la playa no tiene suficientes, la orden queda PENDIENTE y se
+completa más tarde con `asignar`.
+
+El despacho (reservados -> En Viaje, en bloque) lo aplica el motor de
+transiciones (MotorTransiciones.despachar_orden). Cada transición de una
+carta reservada, en bloque o por escaneo individual, suma el avance de su
+orden en la misma transacción (sentencia_avance: En Viaje -> despachados,
+Ingresado -> ingresados) y el mismo UPDATE recalcula el estado de la orden.
+
+Cancelar libera los reservados que siguen en la playa; los que ya salieron
+siguen contando para la orden.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+from sqlalchemy import DateTime, and_, bindparam, case, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from Modelos.carta_porte import (
+    CartaPorteElectronica, OrdenDespacho, EstadoOrdenDespacho, EstadoCamion, TipoCereal
+)
+from utils.logger import setup_logger
+
+logger = setup_logger('main')
+
+# Campo de la orden que avanza cuando una carta reservada llega a cada estado
+AVANCE_POR_ESTADO: Dict[EstadoCamion, str] = {
+    EstadoCamion.EN_VIAJE: "despachados",
+    EstadoCamion.INGRESADO: "ingresados",
+}
+
+# Estados en los que la orden todavía puede reservar (y cancelarse)
+ESTADOS_ABIERTOS = (EstadoOrdenDespacho.PENDIENTE, EstadoOrdenDespacho.ASIGNADA)
+
+
+def _avance():
+    orden = OrdenDespacho.__table__
+    asignados, despachados, ingresados = bindparam("asignados_delta"), bindparam("despachados_delta"), bindparam("ingresados_delta")
+    ahora = bindparam("ahora", type_=DateTime())
+    cumplida = orden.c.ingresados + ingresados >= orden.c.cantidad
+    # En el SET las columnas valen lo anterior al UPDATE: el estado se calcula con los totales nuevos
+    estado = case(
+        (orden.c.estado == EstadoOrdenDespacho.CANCELADA.name, orden.c.estado),
+        (cumplida, EstadoOrdenDespacho.CUMPLIDA.name),
+        (orden.c.despachados + despachados >= orden.c.cantidad, EstadoOrdenDespacho.DESPACHADA.name),
+        (orden.c.asignados + asignados >= orden.c.cantidad, EstadoOrdenDespacho.ASIGNADA.name),
+        else_=EstadoOrdenDespacho.PENDIENTE.name,
+    )
+    return update(orden).where(orden.c.id == bindparam("orden_id")).values(
+        asignados=orden.c.asignados + asignados,
+        despachados=orden.c.despachados + despachados,
+        ingresados=orden.c.ingresados + ingresados,
+        estado=estado,
+        fecha_cumplida=case(
+            (and_(orden.c.fecha_cumplida.is_(None), orden.c.estado != EstadoOrdenDespacho.CANCELADA.name, cumplida), ahora),
+            else_=orden.c.fecha_cumplida,
+        ),
+        updated_at=ahora,
+    )
+
+
+_SENTENCIA_AVANCE = _avance()
+
+
+def sentencia_avance(avances: Dict[int, Counter], ahora: datetime):
+    """
+    UPDATE de avance de las órdenes para ejecutar en la transacción de las transiciones.
+
+    Args:
+        avances: orden_id -> Counter de "asignados" / "despachados" / "ingresados"
+
+    Returns:
+        (sentencia, filas para executemany); filas vacío si no hay avances
+    """
+    filas = [
+        {"orden_id": orden_id, "asignados_delta": campos["asignados"], "despachados_delta": campos["despachados"],
+         "ingresados_delta": campos["ingresados"], "ahora": ahora}
+        for orden_id, campos in avances.items() if any(campos.values())
+    ]
+    return _SENTENCIA_AVANCE, filas
+
+
+def _valores(fila) -> dict:
+    """Fila (RETURNING, SELECT u objeto del ORM) -> dict con los enums por nombre, como los guarda la base."""
+    valores = fila.model_dump() if isinstance(fila, OrdenDespacho) else dict(fila._mapping)
+    return {nombre: valor.name if isinstance(valor, Enum) else valor for nombre, valor in valores.items()}
+
+
+def _camion(fila) -> dict:
+    valores = _valores(fila)
+    valores["carta_id"] = valores.pop("id")
+    return valores
+
+
+@dataclass
+class ResultadoOrden:
+    """Orden con sus camiones. duplicada: el pedido repetía una clave_idempotencia ya usada."""
+    orden: dict
+    camiones: List[dict] = field(default_factory=list)
+    duplicada: bool = False
+    reservados: int = 0  # Camiones reservados por esta llamada
+
+
+class OrdenesDespacho:
+    """Alta, reserva, cancelación y consulta de órdenes de despacho."""
+
+    def __init__(self):
+        self.ordenes = 0
+        self.duplicadas = 0
+        self.reservados = 0
+        self.faltantes = 0
+        self.liberados = 0
+
+    @staticmethod
+    def _columnas_camion():
+        carta = CartaPorteElectronica.__table__
+        return (carta.c.id, carta.c.numero_carta, carta.c.patente, carta.c.cuit_destino,
+                carta.c.estado_actual, carta.c.created_at)
+
+    async def _reservar(self, conexion: AsyncConnection, orden, faltan: int, ahora: datetime) -> List[dict]:
+        """La sentencia de asignación (ver el docstring del módulo) y el avance de la orden."""
+        if faltan <= 0:
+            return []
+        carta = CartaPorteElectronica.__table__
+        condicion = [
+            carta.c.puerto_codigo == orden.puerto_codigo,
+            carta.c.estado_actual == EstadoCamion.EN_PLAYA,
+            carta.c.tipo_cereal == orden.tipo_cereal,
+            carta.c.orden_despacho_id.is_(None),
+        ]
+        if orden.cuit_destino is not None:
+            condicion.append(carta.c.cuit_destino == orden.cuit_destino)
+        libres = select(carta.c.id).where(*condicion).order_by(carta.c.created_at, carta.c.id).limit(faltan)
+        filas = (await conexion.execute(
+            update(carta).where(carta.c.id.in_(libres))
+            .values(orden_despacho_id=orden.id, updated_at=ahora)
+            .returning(*self._columnas_camion())
+        )).all()
+        if filas:
+            sentencia, avance = sentencia_avance({orden.id: Counter(asignados=len(filas))}, ahora)
+            await conexion.execute(sentencia, avance)
+        self.reservados += len(filas)
+        self.faltantes += faltan - len(filas)
+        # RETURNING no respeta el ORDER BY de la subconsulta
+        return sorted((_camion(fila) for fila in filas), key=lambda c: (c["created_at"], c["carta_id"]))
+
+    async def _orden(self, conexion: AsyncConnection, orden_id: int) -> Optional[dict]:
+        orden = OrdenDespacho.__table__
+        fila = (await conexion.execute(select(orden).where(orden.c.id == orden_id))).first()
+        return _valores(fila) if fila is not None else None
+
+    async def crear(self, engine: AsyncEngine, puerto_codigo: str, tipo_cereal: TipoCereal, cantidad: int,
+                    solicitado_por: str, cuit_destino: Optional[str] = None,
+                    clave_idempotencia: Optional[str] = None) -> ResultadoOrden:
+        """
+        Alta de la orden y reserva de hasta `cantidad` camiones, en una transacción.
+
+        Un pedido repetido (misma clave_idempotencia) devuelve la orden original sin reservar.
+        """
+        orden = OrdenDespacho.__table__
+        ahora = datetime.utcnow()
+        async with engine.begin() as conexion:
+            # El INSERT es la primera escritura: toma el lock antes de elegir camiones
+            fila = (await conexion.execute(
+                sqlite_insert(orden).values(
+                    puerto_codigo=puerto_codigo, tipo_cereal=tipo_cereal, cuit_destino=cuit_destino, cantidad=cantidad,
+                    estado=EstadoOrdenDespacho.PENDIENTE, asignados=0, despachados=0, ingresados=0,
+                    solicitado_por=solicitado_por, clave_idempotencia=clave_idempotencia, created_at=ahora, updated_at=ahora,
+                ).on_conflict_do_nothing().returning(*orden.c)
+            )).first()
+            if fila is None:
+                orden_id = (await conexion.execute(
+                    select(orden.c.id).where(orden.c.clave_idempotencia == clave_idempotencia)
+                )).scalar_one()
+                self.duplicadas += 1
+                return await self._consultar(conexion, orden_id, duplicada=True)
+            camiones = await self._reservar(conexion, fila, cantidad, ahora)
+            resultado = await self._consultar(conexion, fila.id)
+
+        self.ordenes += 1
+        resultado.reservados = len(camiones)
+        logger.info(f"Orden de despacho {fila.id} ({puerto_codigo}, {cantidad} x {tipo_cereal.name}): "
+                    f"{len(camiones)} camiones reservados")
+        return resultado
+
+    async def asignar(self, engine: AsyncEngine, orden_id: int) -> Optional[ResultadoOrden]:
+        """
+        Completa una orden PENDIENTE con los camiones que llegaron a la playa.
+
+        Returns:
+            None si la orden no existe o ya no está pendiente
+        """
+        orden = OrdenDespacho.__table__
+        ahora = datetime.utcnow()
+        async with engine.begin() as conexion:
+            fila = (await conexion.execute(
+                update(orden).where(orden.c.id == orden_id, orden.c.estado == EstadoOrdenDespacho.PENDIENTE)
+                .values(updated_at=ahora).returning(*orden.c)
+            )).first()
+            if fila is None:
+                return None
+            camiones = await self._reservar(conexion, fila, fila.cantidad - fila.asignados, ahora)
+            resultado = await self._consultar(conexion, orden_id)
+        resultado.reservados = len(camiones)
+        return resultado
+
+    async def cancelar(self, engine: AsyncEngine, orden_id: int) -> Optional[ResultadoOrden]:
+        """
+        Cancela una orden abierta y libera sus camiones que siguen en la playa.
+
+        Returns:
+            None si la orden no existe o ya no está abierta (despachada, cumplida o cancelada)
+        """
+        orden, carta = OrdenDespacho.__table__, CartaPorteElectronica.__table__
+        ahora = datetime.utcnow()
+        async with engine.begin() as conexion:
+            fila = (await conexion.execute(
+                update(orden).where(orden.c.id == orden_id, orden.c.estado.in_(ESTADOS_ABIERTOS))
+                .values(estado=EstadoOrdenDespacho.CANCELADA, updated_at=ahora).returning(orden.c.id)
+            )).first()
+            if fila is None:
+                return None
+            liberados = (await conexion.execute(
+                update(carta).where(carta.c.orden_despacho_id == orden_id, carta.c.estado_actual == EstadoCamion.EN_PLAYA)
+                .values(orden_despacho_id=None, updated_at=ahora).returning(carta.c.id)
+            )).all()
+            if liberados:
+                sentencia, avance = sentencia_avance({orden_id: Counter(asignados=-len(liberados))}, ahora)
+                await conexion.execute(sentencia, avance)
+            resultado = await self._consultar(conexion, orden_id)
+        self.liberados += len(liberados)
+        logger.info(f"Orden de despacho {orden_id} cancelada: {len(liberados)} camiones liberados")
+        return resultado
+
+    async def _consultar(self, conexion, orden_id: int, duplicada: bool = False) -> Optional[ResultadoOrden]:
+        valores = await self._orden(conexion, orden_id)
+        if valores is None:
+            return None
+        carta = CartaPorteElectronica.__table__
+        filas = (await conexion.execute(
+            select(*self._columnas_camion()).where(carta.c.orden_despacho_id == orden_id)
+            .order_by(carta.c.created_at, carta.c.id)
+        )).all()
+        return ResultadoOrden(valores, [_camion(fila) for fila in filas], duplicada)
+
+    async def consultar(self, session: AsyncSession, orden_id: int) -> Optional[ResultadoOrden]:
+        """Orden con sus camiones (reservados, en viaje o ya ingresados)."""
+        return await self._consultar(await session.connection(), orden_id)
+
+    async def listar(self, session: AsyncSession, puerto_codigo: str,
+                     estados=ESTADOS_ABIERTOS) -> List[dict]:
+        """Órdenes del puerto en los estados pedidos, las más antiguas primero (pantalla de la Playa)."""
+        orden = OrdenDespacho.__table__
+        conexion = await session.connection()
+        filas = await conexion.execute(
+            select(orden).where(orden.c.puerto_codigo == puerto_codigo, orden.c.estado.in_(estados))
+            .order_by(orden.c.created_at)
+        )
+        return [_valores(fila) for fila in filas]
+
+    def stats(self) -> dict:
+        return {
+            "ordenes": self.ordenes,
+            "duplicadas": self.duplicadas,
+            "camiones_reservados": self.reservados,
+            "camiones_faltantes": self.faltantes,
+            "camiones_liberados": self.liberados,
+        }
+
+
+ordenes_despacho = OrdenesDespacho()
@@ -0,0 +1,134 @@
+"""
+Lecturas compartidas: coalescencia de consultas idénticas de los endpoints de lectura.
+
+Cuando veinte pantallas de Operaciones piden "post-Calada de TRP1" en el
+mismo segundo, la respuesta es la misma para todas. Cada lectura se
+identifica por (recurso, puerto, parámetros normalizados) y:
+
+- Single-flight: si ya hay un cálculo en vuelo para la clave, se espera
+  ese resultado en lugar de lanzar otro (como el broker de tickets,
+  Arca/ticket_broker.py). Cubre por ejemplo la carga inicial de las colas
+  cuando todas las pantallas se conectan a la vez.
+- Ventana alineada al tick: el resultado se guarda hasta el fin del tick
+  en curso (LECTURAS_TICK_MS, default 1000, alineado al reloj: todas las
+  pantallas y workers cortan en el mismo instante). Una lectura puede
+  atrasar hasta un tick respecto de lo confirmado; los cambios en vivo
+  llegan por el canal de eventos (utils/canal_circuito.py).
+
+El control de acceso se hace antes, por request: solo se comparte lo que
+no depende del usuario. Los endpoints guardan el cuerpo JSON ya
+serializado, así una lectura compartida tampoco repite la serialización.
+"""
+
+import os
+import time
+import asyncio
+from collections import defaultdict
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.ttl_cache import TTLCache
+
+ClaveLectura = Tuple[Hashable, ...]
+
+
+def _normalizar(valor) -> Hashable:
+    if isinstance(valor, Enum):
+        return valor.name
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return tuple(sorted(_normalizar(v) for v in valor))
+    return valor
+
+
+def clave_lectura(recurso: str, puerto_codigo: str, parametros: Optional[Dict[str, Any]] = None) -> ClaveLectura:
+    """Clave de una lectura: los parámetros en None se omiten y el orden no importa."""
+    normalizados = tuple(sorted((nombre, _normalizar(valor)) for nombre, valor in (parametros or {}).items()
+                                if valor is not None))
+    return (recurso, puerto_codigo, normalizados)
+
+
+class LecturasCompartidas:
+    """
+    Single-flight + cache por tick de las lecturas de los endpoints.
+
+    Args:
+        tick: Segundos de la ventana (alineada al reloj) durante la que se reusa un resultado
+        max_entradas: Claves guardadas antes de desalojar por LRU
+    """
+
+    def __init__(self, tick: float = None, max_entradas: int = None):
+        self.tick = tick if tick is not None else float(os.getenv("LECTURAS_TICK_MS", "1000")) / 1000
+        self._cache = TTLCache(max_size=max_entradas or int(os.getenv("LECTURAS_MAX_ENTRADAS", "1024")),
+                               nombre="lecturas_compartidas")
+        self._en_vuelo: Dict[ClaveLectura, asyncio.Task] = {}
+        self._contadores: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"solicitudes": 0, "calculos": 0, "en_vuelo": 0, "cache": 0}
+        )
+
+    def _ventana(self, ahora: float) -> int:
+        return int(ahora // self.tick) if self.tick > 0 else 0
+
+    async def obtener(self, recurso: str, puerto_codigo: str, parametros: Optional[Dict[str, Any]],
+                      calcular: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Resultado de la lectura: del tick en curso, del cálculo en vuelo o de un cálculo nuevo.
+
+        Si el cálculo falla, todos los que lo esperaban reciben la excepción y no se guarda nada.
+        """
+        clave = clave_lectura(recurso, puerto_codigo, parametros)
+        contadores = self._contadores[recurso]
+        contadores["solicitudes"] += 1
+
+        resultado = self._cache.get(clave)
+        if resultado is not None:
+            contadores["cache"] += 1
+            return resultado
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            contadores["calculos"] += 1
+            tarea = asyncio.create_task(self._calcular(clave, calcular))
+            self._en_vuelo[clave] = tarea
+        else:
+            contadores["en_vuelo"] += 1
+        # shield: si un cliente cancela, el cálculo sigue para el resto
+        return await asyncio.shield(tarea)
+
+    async def _calcular(self, clave: ClaveLectura, calcular: Callable[[], Awaitable[Any]]) -> Any:
+        inicio = time.time()
+        try:
+            resultado = await calcular()
+            if self.tick > 0:
+                # Vale hasta el fin del tick en que empezó el cálculo (si ya pasó, no se guarda)
+                fin_tick = (self._ventana(inicio) + 1) * self.tick
+                self._cache.set(clave, resultado, fin_tick - time.time())
+            return resultado
+        finally:
+            self._en_vuelo.pop(clave, None)
+
+    def invalidar(self) -> None:
+        """Descarta los resultados guardados (los cálculos en vuelo siguen)."""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        recursos = {}
+        for recurso, contadores in self._contadores.items():
+            compartidas = contadores["en_vuelo"] + contadores["cache"]
+            recursos[recurso] = {
+                **contadores,
+                "ratio_coalescencia": round(compartidas / contadores["solicitudes"], 4) if contadores["solicitudes"] else 0.0,
+            }
+        solicitudes = sum(c["solicitudes"] for c in self._contadores.values())
+        calculos = sum(c["calculos"] for c in self._contadores.values())
+        return {
+            "tick_ms": round(self.tick * 1000),
+            "entradas": len(self._cache),
+            "en_vuelo": len(self._en_vuelo),
+            "solicitudes": solicitudes,
+            "calculos": calculos,
+            "ratio_coalescencia": round(1 - calculos / solicitudes, 4) if solicitudes else 0.0,
+            "recursos": recursos,
+        }
+
+
+lecturas_compartidas = LecturasCompartidas()
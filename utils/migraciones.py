@@ -0,0 +1,280 @@
+"""
+Migraciones versionadas del esquema SQLite.
+
+`SQLModel.metadata.create_all` crea las tablas y los índices de una
+columna declarados en los modelos, pero no agrega columnas a tablas
+existentes ni los índices compuestos que necesitan las consultas
+calientes. Las migraciones de MIGRACIONES se aplican al arrancar (después
+de create_all) en orden de versión; la tabla `schema_version` registra
+las aplicadas, así que cada una corre una sola vez por base.
+
+Cada migración corre en su propia transacción `BEGIN IMMEDIATE` (el DDL
+de SQLite es transaccional): si varios workers arrancan a la vez, el
+segundo espera y encuentra la versión ya registrada.
+
+HOT_QUERIES lista las consultas calientes con parámetros de ejemplo;
+`escaneos_completos` devuelve las que el planificador resolvería
+recorriendo una tabla o un índice completo (lo verifica
+test/test_migraciones.py).
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from utils.logger import setup_logger
+
+logger = setup_logger('main')
+
+
+@dataclass(frozen=True)
+class Migracion:
+    version: int
+    descripcion: str
+    aplicar: Callable[[Connection], None]
+
+
+def _ejecutar(*sentencias: str) -> Callable[[Connection], None]:
+    def aplicar(conexion: Connection) -> None:
+        for sentencia in sentencias:
+            conexion.exec_driver_sql(sentencia)
+    return aplicar
+
+
+def _columnas(conexion: Connection, tabla: str) -> List[str]:
+    return [fila[1] for fila in conexion.exec_driver_sql(f"PRAGMA table_info({tabla})")]
+
+
+def _clave_idempotencia_en_movimientos(conexion: Connection) -> None:
+    if "clave_idempotencia" not in _columnas(conexion, "movimientosector"):
+        conexion.exec_driver_sql("ALTER TABLE movimientosector ADD COLUMN clave_idempotencia VARCHAR(100)")
+    # Único: un escaneo repetido no genera otro movimiento. Parcial: los movimientos sin
+    # clave (históricos, altas masivas) no entran, y con ANALYZE el planificador no descarta
+    # el índice por tener casi todo NULL
+    conexion.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_movimiento_idempotencia ON movimientosector (clave_idempotencia) "
+        "WHERE clave_idempotencia IS NOT NULL"
+    )
+
+
+def _puerto_en_cartas_de_porte(conexion: Connection) -> None:
+    # Las bases creadas antes de la columna la reciben acá; las nuevas ya la traen de create_all
+    if "puerto_codigo" not in _columnas(conexion, "cartaporteelectronica"):
+        conexion.exec_driver_sql(
+            "ALTER TABLE cartaporteelectronica ADD COLUMN puerto_codigo VARCHAR(10) NOT NULL DEFAULT ''"
+        )
+    _ejecutar(
+        # Playa de Precalado: cereal y FIFO
+        "CREATE INDEX IF NOT EXISTS idx_cpe_cola_precalado ON cartaporteelectronica "
+        "(puerto_codigo, estado_actual, tipo_cereal, fecha_ingreso)",
+        # Playa post-Calada: calidad, cereal y FIFO
+        "CREATE INDEX IF NOT EXISTS idx_cpe_cola_postcalada ON cartaporteelectronica "
+        "(puerto_codigo, estado_actual, calidad_asignada, tipo_cereal, fecha_ingreso)",
+        # Tablero: ingresos por período, cereal y calidad (cubre el peso para no leer la tabla)
+        "CREATE INDEX IF NOT EXISTS idx_cpe_ingresos ON cartaporteelectronica "
+        "(puerto_codigo, fecha_ingreso, tipo_cereal, calidad_asignada, peso_declarado)",
+    )(conexion)
+
+
+def _ordenes_de_despacho(conexion: Connection) -> None:
+    # La tabla ordendespacho la crea create_all; la reserva en las cartas existentes se agrega acá
+    if "orden_despacho_id" not in _columnas(conexion, "cartaporteelectronica"):
+        conexion.exec_driver_sql(
+            "ALTER TABLE cartaporteelectronica ADD COLUMN orden_despacho_id INTEGER REFERENCES ordendespacho (id)"
+        )
+    _ejecutar(
+        # Playa de Camiones: libres por cereal (y exportador), los más antiguos primero
+        "CREATE INDEX IF NOT EXISTS idx_cpe_playa_despacho ON cartaporteelectronica "
+        "(puerto_codigo, estado_actual, tipo_cereal, orden_despacho_id, cuit_destino, created_at)",
+        # Camiones de una orden. Parcial: las cartas sin orden (casi todas) no entran
+        "CREATE INDEX IF NOT EXISTS idx_cpe_orden_despacho ON cartaporteelectronica (orden_despacho_id, estado_actual) "
+        "WHERE orden_despacho_id IS NOT NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orden_despacho_idempotencia ON ordendespacho (clave_idempotencia) "
+        "WHERE clave_idempotencia IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_orden_despacho_puerto ON ordendespacho (puerto_codigo, estado, created_at)",
+    )(conexion)
+
+
+MIGRACIONES: List[Migracion] = [
+    Migracion(1, "Índices compuestos de arca_tokens (búsqueda de ticket y vencimientos)", _ejecutar(
+        "CREATE INDEX IF NOT EXISTS idx_arca_tokens_lookup ON arca_tokens "
+        "(usuario_id, puerto_codigo, servicio_tipo, fecha_vencimiento)",
+        "CREATE INDEX IF NOT EXISTS idx_arca_tokens_expiry ON arca_tokens (fecha_vencimiento)",
+    )),
+    Migracion(2, "puerto_codigo en cartaporteelectronica e índices de colas y tablero", _puerto_en_cartas_de_porte),
+    Migracion(3, "Índices de historial por carta de porte (movimientos y pesajes)", _ejecutar(
+        "CREATE INDEX IF NOT EXISTS idx_movimiento_carta ON movimientosector (carta_porte_id, timestamp_movimiento)",
+        "CREATE INDEX IF NOT EXISTS idx_pesaje_carta ON pesaje (carta_porte_id, tipo_pesaje)",
+    )),
+    Migracion(4, "Clave única (usuario_id, puerto_codigo, servicio_tipo) en arca_tokens para el upsert", _ejecutar(
+        # Conservar solo el ticket más reciente de cada clave antes de crear el índice único
+        "DELETE FROM arca_tokens WHERE id NOT IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY usuario_id, puerto_codigo, servicio_tipo ORDER BY fecha_solicitud DESC, id DESC) AS orden "
+        "FROM arca_tokens) WHERE orden = 1)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_arca_tokens_clave ON arca_tokens (usuario_id, puerto_codigo, servicio_tipo)",
+        # La clave única resuelve la búsqueda de ticket: el índice de la migración 1 queda redundante
+        "DROP INDEX IF EXISTS idx_arca_tokens_lookup",
+    )),
+    Migracion(5, "Índice por estado de cartaporteelectronica (reconstrucción de las colas de playa)", _ejecutar(
+        "CREATE INDEX IF NOT EXISTS idx_cpe_estado ON cartaporteelectronica (estado_actual, puerto_codigo)",
+    )),
+    Migracion(6, "clave_idempotencia en movimientosector (escaneos de transiciones)", _clave_idempotencia_en_movimientos),
+    Migracion(7, "Carga inicial de contadorcircuito (tablero de Operaciones) desde MovimientoSector", _ejecutar(
+        # La tabla la crea create_all; desde acá la mantienen las transiciones (utils/contadores_circuito.py)
+        "DELETE FROM contadorcircuito",
+        "INSERT INTO contadorcircuito (puerto_codigo, estado, tipo_cereal, calidad, cantidad) "
+        "SELECT c.puerto_codigo, COALESCE(m.estado_nuevo, c.estado_actual), c.tipo_cereal, "
+        "COALESCE(c.calidad_asignada, ''), COUNT(*) FROM cartaporteelectronica c "
+        "LEFT JOIN movimientosector m ON m.id = "
+        "(SELECT MAX(u.id) FROM movimientosector u WHERE u.carta_porte_id = c.id) "
+        "GROUP BY 1, 2, 3, 4",
+    )),
+    Migracion(8, "Órdenes de despacho: reserva en cartaporteelectronica e índices de asignación", _ordenes_de_despacho),
+]
+
+
+def version_actual(conexion: Connection) -> int:
+    conexion.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, descripcion VARCHAR(200) NOT NULL, aplicada_en DATETIME NOT NULL)"
+    )
+    return conexion.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_version").scalar()
+
+
+def aplicar_migraciones(engine: Engine) -> List[int]:
+    """
+    Aplica las migraciones pendientes, cada una en su transacción.
+
+    Returns:
+        Versiones aplicadas en esta llamada (vacío si la base estaba al día)
+    """
+    aplicadas = []
+    # AUTOCOMMIT: el driver no abre transacciones implícitas; BEGIN IMMEDIATE toma el lock de escritura
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        for migracion in sorted(MIGRACIONES, key=lambda m: m.version):
+            conexion.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                if version_actual(conexion) >= migracion.version:
+                    conexion.exec_driver_sql("COMMIT")
+                    continue
+                migracion.aplicar(conexion)
+                conexion.execute(
+                    text("INSERT INTO schema_version (version, descripcion, aplicada_en) VALUES (:v, :d, :f)"),
+                    {"v": migracion.version, "d": migracion.descripcion, "f": datetime.utcnow()}
+                )
+                conexion.exec_driver_sql("COMMIT")
+            except Exception:
+                conexion.exec_driver_sql("ROLLBACK")
+                logger.error(f"Migración {migracion.version} fallida: {migracion.descripcion}")
+                raise
+            aplicadas.append(migracion.version)
+            logger.info(f"Migración {migracion.version} aplicada: {migracion.descripcion}")
+    return aplicadas
+
+
+# Consultas calientes: nombre -> (SQL, parámetros de ejemplo para EXPLAIN QUERY PLAN)
+HOT_QUERIES: Dict[str, Tuple[str, dict]] = {
+    "login_usuario": (
+        "SELECT * FROM usuario WHERE username = :username",
+        {"username": "operador"},
+    ),
+    "ticket_arca_cacheado": (
+        "SELECT * FROM arca_tokens WHERE usuario_id = :u AND puerto_codigo = :p AND servicio_tipo = :s "
+        "AND fecha_vencimiento > :ahora",
+        {"u": 1, "p": "TRP1", "s": "CPE", "ahora": "2025-01-01"},
+    ),
+    "tickets_arca_lote": (
+        "SELECT * FROM arca_tokens WHERE usuario_id = :u AND puerto_codigo IN ('TRP1', 'TRP2') "
+        "AND servicio_tipo IN ('CPE', 'EMBARQUES') AND fecha_vencimiento > :ahora",
+        {"u": 1, "ahora": "2025-01-01"},
+    ),
+    "tickets_arca_vencidos": (
+        "SELECT id FROM arca_tokens WHERE fecha_vencimiento <= :ahora",
+        {"ahora": "2025-01-01"},
+    ),
+    "cola_precalado": (
+        "SELECT id, patente FROM cartaporteelectronica WHERE puerto_codigo = :p AND estado_actual = 'INGRESADO' "
+        "ORDER BY tipo_cereal, fecha_ingreso",
+        {"p": "TRP1"},
+    ),
+    "cola_precalado_cereal": (
+        "SELECT id, patente FROM cartaporteelectronica WHERE puerto_codigo = :p AND estado_actual = 'INGRESADO' "
+        "AND tipo_cereal = :c ORDER BY fecha_ingreso LIMIT 1",
+        {"p": "TRP1", "c": "MAIZ"},
+    ),
+    "cola_postcalada": (
+        "SELECT id, patente FROM cartaporteelectronica WHERE puerto_codigo = :p AND estado_actual = 'POST_CALADA' "
+        "ORDER BY calidad_asignada, tipo_cereal, fecha_ingreso",
+        {"p": "TRP1"},
+    ),
+    "tablero_estados": (
+        "SELECT estado_actual, COUNT(*) FROM cartaporteelectronica WHERE puerto_codigo = :p GROUP BY estado_actual",
+        {"p": "TRP1"},
+    ),
+    "tablero_contadores": (
+        "SELECT estado, SUM(cantidad) FROM contadorcircuito WHERE puerto_codigo = :p GROUP BY estado",
+        {"p": "TRP1"},
+    ),
+    "tablero_ingresos": (
+        "SELECT tipo_cereal, calidad_asignada, COUNT(*), SUM(peso_declarado) FROM cartaporteelectronica "
+        "WHERE puerto_codigo = :p AND fecha_ingreso >= :desde GROUP BY tipo_cereal, calidad_asignada",
+        {"p": "TRP1", "desde": "2025-01-01"},
+    ),
+    "camion_por_patente": (
+        "SELECT * FROM cartaporteelectronica WHERE patente = :patente AND estado_actual != 'SALIDO'",
+        {"patente": "AB123CD"},
+    ),
+    "historial_movimientos": (
+        "SELECT * FROM movimientosector WHERE carta_porte_id = :id ORDER BY timestamp_movimiento",
+        {"id": 1},
+    ),
+    "reconstruccion_colas": (
+        "SELECT c.id, c.patente, c.puerto_codigo, c.estado_actual, c.tipo_cereal, c.calidad_asignada, "
+        "COALESCE((SELECT MAX(m.timestamp_movimiento) FROM movimientosector m WHERE m.carta_porte_id = c.id "
+        "AND m.estado_nuevo = c.estado_actual), c.fecha_ingreso, c.created_at) FROM cartaporteelectronica c "
+        "WHERE c.estado_actual IN ('INGRESADO', 'POST_CALADA')",
+        {},
+    ),
+    "escaneos_repetidos": (
+        "SELECT id, carta_porte_id, estado_anterior, estado_nuevo FROM movimientosector "
+        "WHERE clave_idempotencia IN ('TRP1:CPE-1:INGRESADO', 'TRP1:CPE-2:INGRESADO')",
+        {},
+    ),
+    "despacho_libres_exportador": (
+        "SELECT id FROM cartaporteelectronica WHERE puerto_codigo = :p AND estado_actual = 'EN_PLAYA' "
+        "AND tipo_cereal = :c AND orden_despacho_id IS NULL AND cuit_destino = :e ORDER BY created_at, id LIMIT 200",
+        {"p": "TRP1", "c": "MAIZ", "e": "30222222223"},
+    ),
+    "despacho_libres": (
+        "SELECT id FROM cartaporteelectronica WHERE puerto_codigo = :p AND estado_actual = 'EN_PLAYA' "
+        "AND tipo_cereal = :c AND orden_despacho_id IS NULL ORDER BY created_at, id LIMIT 200",
+        {"p": "TRP1", "c": "MAIZ"},
+    ),
+    "camiones_orden_despacho": (
+        "SELECT id, numero_carta, patente, estado_actual FROM cartaporteelectronica WHERE orden_despacho_id = :o",
+        {"o": 1},
+    ),
+    "ordenes_despacho_puerto": (
+        "SELECT * FROM ordendespacho WHERE puerto_codigo = :p AND estado IN ('PENDIENTE', 'ASIGNADA') "
+        "ORDER BY created_at",
+        {"p": "TRP1"},
+    ),
+    "pesajes_carta": (
+        "SELECT * FROM pesaje WHERE carta_porte_id = :id AND tipo_pesaje = 'bruto'",
+        {"id": 1},
+    ),
+}
+
+
+def escaneos_completos(conexion: Connection) -> Dict[str, List[str]]:
+    """Consultas de HOT_QUERIES cuyo plan recorre una tabla o índice completo: nombre -> pasos SCAN."""
+    resultado = {}
+    for nombre, (sql, parametros) in HOT_QUERIES.items():
+        plan = [fila[3] for fila in conexion.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parametros)]
+        escaneos = [paso for paso in plan if paso.startswith("SCAN ")]
+        if escaneos:
+            resultado[nombre] = escaneos
+    return resultado
@@ -0,0 +1,62 @@
+"""
+Cambios pendientes de commit por sesión (eventos de SQLAlchemy).
+
+Los índices y espejos en memoria (acl_index, colas_playa,
+contadores_circuito, canal_circuito y los principales de main.py) reflejan
+lo que escribe el ORM recién cuando la transacción se confirma: los
+eventos de mapper de cada flush acumulan en `session.info`, el commit
+aplica lo acumulado y un rollback lo descarta. Cada consumidor declara un
+`PendientesDeCommit`; un solo par de listeners (after_commit y
+after_rollback) atiende a todos.
+"""
+
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SASession, object_session
+
+
+class PendientesDeCommit:
+    """
+    Lo que un consumidor acumula en la sesión hasta el commit.
+
+    Args:
+        clave: Clave en session.info (única por consumidor)
+        aplicar: Recibe lo acumulado después del commit; None si solo se
+            descarta (acumulados que se consumen antes, ej: en after_flush)
+        inicial: Fábrica del acumulado vacío (list, set, Counter, ...)
+    """
+
+    def __init__(self, clave: str, aplicar: Optional[Callable[[Any], None]], inicial: Callable[[], Any] = list):
+        self.clave = clave
+        self.aplicar = aplicar
+        self.inicial = inicial
+        _registrados.append(self)
+
+    def en(self, origen) -> Optional[Any]:
+        """Acumulado de la sesión (o de la sesión del objeto); None si el objeto no está en una sesión."""
+        session = origen if isinstance(origen, SASession) else object_session(origen)
+        if session is None:
+            return None
+        return session.info.setdefault(self.clave, self.inicial())
+
+    def tomar(self, session) -> Optional[Any]:
+        """Saca lo acumulado en la sesión (None si no hay nada)."""
+        return session.info.pop(self.clave, None)
+
+
+_registrados: List[PendientesDeCommit] = []
+
+
+@event.listens_for(SASession, "after_commit")
+def _aplicar_pendientes(session):
+    for pendientes in _registrados:
+        acumulado = pendientes.tomar(session)
+        if acumulado and pendientes.aplicar is not None:
+            pendientes.aplicar(acumulado)
+
+
+@event.listens_for(SASession, "after_rollback")
+def _descartar_pendientes(session):
+    for pendientes in _registrados:
+        pendientes.tomar(session)
@@ -0,0 +1,64 @@
+"""
+Purga periódica de tickets ARCA vencidos (fuera del camino de los requests).
+
+Las búsquedas de tickets ya filtran por `fecha_vencimiento > ahora`, así
+que un ticket vencido nunca se devuelve: borrarlo no es urgente y no debe
+costarle un commit a un request. Una tarea del lifespan los elimina cada
+ARCA_TOKEN_PURGE_SECONDS (default 300) con un único DELETE por conjunto
+que usa el índice idx_arca_tokens_expiry.
+"""
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from Modelos.arca_tokens import ArcaToken
+from utils.logger import setup_logger
+
+logger = setup_logger('main')
+
+
+class PurgaTokensArca:
+    """
+    Tarea de limpieza de la tabla arca_tokens.
+
+    Args:
+        intervalo: Segundos entre purgas de la tarea periódica
+    """
+
+    def __init__(self, intervalo: float = 300.0):
+        self.intervalo = intervalo
+        self.purgas = 0
+        self.filas_eliminadas = 0
+        self.errores = 0
+
+    async def purgar(self, engine: AsyncEngine) -> int:
+        """Elimina los tickets vencidos. Retorna la cantidad de filas borradas."""
+        tabla = ArcaToken.__table__
+        async with engine.begin() as conexion:
+            resultado = await conexion.execute(delete(tabla).where(tabla.c.fecha_vencimiento <= datetime.utcnow()))
+        self.purgas += 1
+        self.filas_eliminadas += resultado.rowcount
+        if resultado.rowcount:
+            logger.info(f"Purga de tickets ARCA: {resultado.rowcount} vencidos eliminados")
+        return resultado.rowcount
+
+    async def ejecutar(self, engine: AsyncEngine) -> None:
+        """Tarea periódica del lifespan (engine: el que recibe las escrituras)."""
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.purgar(engine)
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"Error al purgar tickets ARCA vencidos: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "intervalo": self.intervalo,
+            "purgas": self.purgas,
+            "filas_eliminadas": self.filas_eliminadas,
+            "errores": self.errores,
+        }
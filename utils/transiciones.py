@@ -0,0 +1,469 @@
+"""
+Motor de transiciones de estado de los camiones (escaneos de QR por sector).
+
+Cada sector del circuito (Playa, Portería, Precalado, Calada, Báscula
+Bruto, Plataforma, Báscula Tara) mueve una CartaPorteElectronica al
+estado siguiente y agrega su MovimientoSector. TRANSICIONES es la tabla
+declarativa de transiciones permitidas: cualquier otra se rechaza.
+
+Cada transición es un UPDATE condicional (`WHERE estado_actual = <origen>`,
+sin leer la carta antes) más el INSERT del movimiento en la misma
+transacción. Dos escaneos simultáneos del mismo camión no pueden aplicar
+la misma transición dos veces: el segundo UPDATE no encuentra la fila.
+
+Idempotencia: cada escaneo lleva una clave (la del cliente, o
+"<puerto>:<carta>:<estado destino>" por defecto) que se guarda en
+MovimientoSector.clave_idempotencia (índice único). Un escaneo repetido
+devuelve el resultado original como "duplicada" sin escribir; las claves
+recientes se resuelven en memoria (TRANSICIONES_IDEMPOTENCIA_SECONDS,
+default 600) y las demás con una consulta por lote.
+
+Group commit: los escaneos concurrentes se encolan por engine y una tarea
+los aplica en lotes (hasta TRANSICIONES_MAX_LOTE, default 256) con un solo
+commit por lote. No agrega espera: el lote es lo que se acumuló mientras
+se escribía el anterior. Si un lote falla, sus escaneos se reintentan de
+a uno para que el error quede solo en el que lo causó.
+
+Cada lote suma sus deltas a los contadores del tablero
+(utils/contadores_circuito.py) y el avance de las órdenes de despacho de
+sus cartas (utils/despachos.py) antes del commit, en la misma transacción.
+
+Despacho de una orden (`despachar_orden`): todos los camiones reservados
+que siguen en la Playa pasan a En Viaje con un solo UPDATE, sus
+movimientos se insertan en lote y todo se confirma con un commit. Cada
+movimiento lleva la clave por defecto del escaneo EN_VIAJE, así un QR
+leído después en la Playa resuelve como "duplicada".
+
+Las escrituras no pasan por el ORM: después del commit se actualizan las
+colas de playa (utils/colas_playa.py) y el espejo de los contadores, y se
+publican los cambios en el canal de eventos (utils/canal_circuito.py),
+con los datos del RETURNING.
+"""
+
+import os
+import asyncio
+from collections import Counter, defaultdict
+from dataclasses import dataclass, replace
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from Modelos.carta_porte import CartaPorteElectronica, MovimientoSector, EstadoCamion, CalidadCereal, SECTOR_POR_ESTADO
+from utils.canal_circuito import canal_circuito, CambioEstado
+from utils.colas_playa import colas_playa
+from utils.contadores_circuito import contadores_circuito, clave_contador, sentencia_deltas
+from utils.despachos import AVANCE_POR_ESTADO, sentencia_avance
+from utils.ttl_cache import TTLCache
+from utils.logger import setup_logger
+
+logger = setup_logger('main')
+
+
+@dataclass(frozen=True)
+class Transicion:
+    """
+    Transición permitida del circuito.
+
+    Args:
+        desde: Estado en el que tiene que estar la carta
+        hacia: Estado al que pasa
+        sector: Sector que escanea el QR
+        requiere_calidad: El escaneo debe informar la calidad asignada (resultado de Calada)
+        marca: Columna de fecha que se completa con el momento de la transición
+    """
+    desde: EstadoCamion
+    hacia: EstadoCamion
+    sector: str
+    requiere_calidad: bool = False
+    marca: Optional[str] = None
+
+
+TRANSICIONES: List[Transicion] = [
+    Transicion(EstadoCamion.EN_PLAYA, EstadoCamion.EN_VIAJE, "Playa de Camiones"),
+    Transicion(EstadoCamion.EN_VIAJE, EstadoCamion.INGRESADO, "Portería de Ingreso", marca="fecha_ingreso"),
+    Transicion(EstadoCamion.INGRESADO, EstadoCamion.EN_CALADA, "Playa de Precalado"),
+    Transicion(EstadoCamion.EN_CALADA, EstadoCamion.POST_CALADA, "Calada", requiere_calidad=True),
+    Transicion(EstadoCamion.POST_CALADA, EstadoCamion.EN_BALANZA_BRUTO, "Playa de Espera post-Calada"),
+    Transicion(EstadoCamion.EN_BALANZA_BRUTO, EstadoCamion.DESCARGANDO, "Báscula Peso Bruto"),
+    Transicion(EstadoCamion.DESCARGANDO, EstadoCamion.EN_BALANZA_TARA, "Plataforma de Descarga"),
+    Transicion(EstadoCamion.EN_BALANZA_TARA, EstadoCamion.SALIDO, "Portería de Salida", marca="fecha_salida"),
+]
+
+# Cada estado destino tiene un único origen: el UPDATE condicional no necesita leer la carta
+TRANSICION_HACIA: Dict[EstadoCamion, Transicion] = {t.hacia: t for t in TRANSICIONES}
+assert len(TRANSICION_HACIA) == len(TRANSICIONES), "Cada estado destino debe tener un único origen"
+
+
+class TransicionInvalida(ValueError):
+    """La solicitud no corresponde a ninguna transición de TRANSICIONES (o le falta un dato requerido)."""
+
+
+@dataclass(frozen=True)
+class SolicitudTransicion:
+    """
+    Escaneo de un sector. La carta se identifica por número (QR) o por id.
+
+    Args:
+        puerto_codigo: Puerto del sector que escanea (una carta de otro puerto no se encuentra)
+        clave_idempotencia: Clave del escaneo; None usa "<puerto>:<carta>:<estado destino>"
+    """
+    hacia: EstadoCamion
+    autorizado_por: str
+    puerto_codigo: Optional[str] = None
+    numero_carta: Optional[str] = None
+    carta_id: Optional[int] = None
+    clave_idempotencia: Optional[str] = None
+    calidad_asignada: Optional[CalidadCereal] = None
+    puesto_asignado: Optional[str] = None
+    inspector_asignado: Optional[str] = None
+    observaciones: Optional[str] = None
+
+    @property
+    def transicion(self) -> Transicion:
+        transicion = TRANSICION_HACIA.get(self.hacia)
+        if transicion is None:
+            raise TransicionInvalida(f"No hay transición permitida hacia {self.hacia.name}")
+        return transicion
+
+    @property
+    def clave(self) -> str:
+        if self.clave_idempotencia:
+            return self.clave_idempotencia
+        carta = self.numero_carta if self.numero_carta is not None else f"id:{self.carta_id}"
+        return f"{self.puerto_codigo or '*'}:{carta}:{self.hacia.name}"
+
+    def validar(self) -> None:
+        if (self.numero_carta is None) == (self.carta_id is None):
+            raise TransicionInvalida("Indicar numero_carta o carta_id (uno de los dos)")
+        if self.transicion.requiere_calidad and self.calidad_asignada is None:
+            raise TransicionInvalida(f"La transición a {self.hacia.name} requiere calidad_asignada")
+
+
+@dataclass(frozen=True)
+class ResultadoTransicion:
+    """
+    resultado: "aplicada", "duplicada" (escaneo repetido), "rechazada" (la carta
+    está en otro estado) o "no_encontrada"
+    """
+    resultado: str
+    clave_idempotencia: str
+    carta_id: Optional[int] = None
+    numero_carta: Optional[str] = None
+    estado_anterior: Optional[str] = None
+    estado_nuevo: Optional[str] = None
+    estado_actual: Optional[str] = None
+    movimiento_id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+
+
+def _nombre(valor) -> Optional[str]:
+    return valor.name if isinstance(valor, Enum) else valor
+
+
+class MotorTransiciones:
+    """
+    Aplica transiciones con group commit por engine.
+
+    Args:
+        max_lote: Máximo de escaneos por transacción
+        idempotencia_ttl: Segundos que se recuerdan en memoria las claves aplicadas
+    """
+
+    def __init__(self, max_lote: int = None, idempotencia_ttl: float = None):
+        self.max_lote = max_lote or int(os.getenv("TRANSICIONES_MAX_LOTE", "256"))
+        self.idempotencia_ttl = idempotencia_ttl if idempotencia_ttl is not None \
+            else float(os.getenv("TRANSICIONES_IDEMPOTENCIA_SECONDS", "600"))
+        self.recientes = TTLCache(max_size=int(os.getenv("TRANSICIONES_IDEMPOTENCIA_SIZE", "50000")),
+                                  nombre="transiciones_idempotencia")
+        self._pendientes: Dict[AsyncEngine, List[Tuple[SolicitudTransicion, asyncio.Future]]] = defaultdict(list)
+        self._tareas: Dict[AsyncEngine, asyncio.Task] = {}
+        self.lotes = 0
+        self.aplicadas = 0
+        self.duplicadas = 0
+        self.rechazadas = 0
+        self.reintentos_individuales = 0
+
+    async def aplicar(self, engine: AsyncEngine, solicitud: SolicitudTransicion) -> ResultadoTransicion:
+        """
+        Encola el escaneo y espera el commit de su lote.
+
+        Raises:
+            TransicionInvalida: Transición fuera de la tabla o sin los datos que requiere
+        """
+        solicitud.validar()
+        previo = self.recientes.get((engine, solicitud.clave))
+        if previo is not None:
+            self.duplicadas += 1
+            return replace(previo, resultado="duplicada")
+
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendientes[engine].append((solicitud, futuro))
+        tarea = self._tareas.get(engine)
+        if tarea is None or tarea.done() or tarea.get_loop() is not loop:
+            self._tareas[engine] = loop.create_task(self._drenar(engine))
+        return await futuro
+
+    async def _drenar(self, engine: AsyncEngine) -> None:
+        """Aplica lotes mientras haya escaneos pendientes para el engine."""
+        pendientes = self._pendientes[engine]
+        while pendientes:
+            lote = pendientes[:self.max_lote]
+            del pendientes[:self.max_lote]
+            try:
+                resultados = await self._aplicar_lote(engine, [solicitud for solicitud, _ in lote])
+            except Exception as e:
+                if len(lote) > 1:
+                    logger.warning(f"Lote de {len(lote)} transiciones fallido, reintentando de a uno: {str(e)}")
+                    self.reintentos_individuales += len(lote)
+                    for item in lote:
+                        await self._aplicar_individual(engine, *item)
+                else:
+                    self._fallar(*lote[0], e)
+                continue
+            for (solicitud, futuro), resultado in zip(lote, resultados):
+                self._resolver(engine, solicitud, futuro, resultado)
+
+    async def _aplicar_individual(self, engine: AsyncEngine, solicitud: SolicitudTransicion, futuro: asyncio.Future) -> None:
+        try:
+            resultado = (await self._aplicar_lote(engine, [solicitud]))[0]
+        except Exception as e:
+            self._fallar(solicitud, futuro, e)
+            return
+        self._resolver(engine, solicitud, futuro, resultado)
+
+    @staticmethod
+    def _fallar(solicitud: SolicitudTransicion, futuro: asyncio.Future, error: Exception) -> None:
+        logger.error(f"Error al aplicar transición {solicitud.clave}: {str(error)}")
+        if not futuro.done():
+            futuro.set_exception(error)
+
+    def _resolver(self, engine: AsyncEngine, solicitud: SolicitudTransicion, futuro: asyncio.Future,
+                  resultado: ResultadoTransicion) -> None:
+        if resultado.resultado in ("aplicada", "duplicada"):
+            self.recientes.set((engine, solicitud.clave), resultado, self.idempotencia_ttl)
+        if resultado.resultado == "aplicada":
+            self.aplicadas += 1
+        elif resultado.resultado == "duplicada":
+            self.duplicadas += 1
+        else:
+            self.rechazadas += 1
+        if not futuro.done():
+            futuro.set_result(resultado)
+
+    async def _aplicar_lote(self, engine: AsyncEngine, lote: List[SolicitudTransicion]) -> List[ResultadoTransicion]:
+        """Una transacción: UPDATE condicional por escaneo, INSERT de los movimientos en lote, un commit."""
+        carta = CartaPorteElectronica.__table__
+        resultados: List[Optional[ResultadoTransicion]] = [None] * len(lote)
+        movimientos, colas = [], []
+        deltas = Counter()
+        avances: Dict[int, Counter] = defaultdict(Counter)
+        ahora = datetime.utcnow()
+
+        async with engine.begin() as conexion:
+            previos = await self._movimientos_por_clave(conexion, {s.clave for s in lote})
+            en_lote: Dict[str, int] = {}  # clave -> índice del escaneo que la aplica en este lote
+            for i, solicitud in enumerate(lote):
+                clave = solicitud.clave
+                if clave in previos:
+                    resultados[i] = previos[clave]
+                    continue
+                if clave in en_lote:
+                    continue  # Se resuelve como duplicada del primero, más abajo
+                en_lote[clave] = i
+
+                transicion = solicitud.transicion
+                valores = {"estado_actual": transicion.hacia, "updated_at": ahora}
+                if transicion.marca:
+                    valores[transicion.marca] = ahora
+                if transicion.requiere_calidad:
+                    valores["calidad_asignada"] = solicitud.calidad_asignada
+                condicion = [carta.c.estado_actual == transicion.desde]
+                condicion.append(carta.c.numero_carta == solicitud.numero_carta if solicitud.numero_carta is not None
+                                 else carta.c.id == solicitud.carta_id)
+                if solicitud.puerto_codigo is not None:
+                    condicion.append(carta.c.puerto_codigo == solicitud.puerto_codigo)
+                calidad_anterior = None
+                if transicion.requiere_calidad:
+                    # RETURNING devuelve la calidad nueva: la anterior (para el contador) se lee antes
+                    calidad_anterior = (await conexion.execute(select(carta.c.calidad_asignada).where(*condicion))).scalar()
+                fila = (await conexion.execute(
+                    update(carta).where(*condicion).values(**valores).returning(
+                        carta.c.id, carta.c.numero_carta, carta.c.patente, carta.c.puerto_codigo,
+                        carta.c.tipo_cereal, carta.c.calidad_asignada, carta.c.orden_despacho_id)
+                )).first()
+
+                if fila is None:
+                    resultados[i] = await self._no_aplicada(conexion, solicitud, condicion[1:])
+                    continue
+                movimientos.append({
+                    "carta_porte_id": fila.id, "sector_origen": SECTOR_POR_ESTADO[transicion.desde],
+                    "sector_destino": SECTOR_POR_ESTADO[transicion.hacia], "timestamp_movimiento": ahora,
+                    "estado_anterior": transicion.desde, "estado_nuevo": transicion.hacia,
+                    "observaciones": solicitud.observaciones, "puesto_asignado": solicitud.puesto_asignado,
+                    "inspector_asignado": solicitud.inspector_asignado, "autorizado_por": solicitud.autorizado_por,
+                    "motivo_movimiento": f"Escaneo en {transicion.sector}", "clave_idempotencia": clave,
+                })
+                colas.append((fila, transicion, solicitud.puesto_asignado))
+                calidad = fila.calidad_asignada
+                deltas[clave_contador(fila.puerto_codigo, transicion.desde, fila.tipo_cereal,
+                                      calidad_anterior if transicion.requiere_calidad else calidad)] -= 1
+                deltas[clave_contador(fila.puerto_codigo, transicion.hacia, fila.tipo_cereal, calidad)] += 1
+                if fila.orden_despacho_id is not None and transicion.hacia in AVANCE_POR_ESTADO:
+                    avances[fila.orden_despacho_id][AVANCE_POR_ESTADO[transicion.hacia]] += 1
+                resultados[i] = ResultadoTransicion(
+                    "aplicada", clave, fila.id, fila.numero_carta, transicion.desde.name, transicion.hacia.name,
+                    transicion.hacia.name, timestamp=ahora
+                )
+
+            if movimientos:
+                aplicadas = iter(await self._insertar_movimientos(conexion, movimientos))
+                for i, resultado in enumerate(resultados):
+                    if resultado is not None and resultado.resultado == "aplicada":
+                        resultados[i] = replace(resultado, movimiento_id=next(aplicadas))
+                await self._sumar_deltas(conexion, deltas, avances, ahora)
+
+        self.lotes += 1
+        for i, solicitud in enumerate(lote):
+            if resultados[i] is None:
+                primero = resultados[en_lote[solicitud.clave]]
+                # Solo es duplicada de un escaneo aplicado; un rechazo o una carta inexistente se repite tal cual
+                resultados[i] = replace(primero, resultado="duplicada") if primero.resultado in ("aplicada", "duplicada") \
+                    else primero
+        self._publicar(colas, deltas, ahora)
+        return resultados
+
+    async def despachar_orden(self, engine: AsyncEngine, orden_id: int, autorizado_por: str,
+                              observaciones: Optional[str] = None) -> List[ResultadoTransicion]:
+        """
+        Pasa a En Viaje, en bloque, los camiones de la orden que siguen reservados en la Playa.
+
+        Returns:
+            Una transición aplicada por camión despachado (vacío si no quedaba ninguno en la playa)
+        """
+        carta = CartaPorteElectronica.__table__
+        transicion = TRANSICION_HACIA[EstadoCamion.EN_VIAJE]
+        ahora = datetime.utcnow()
+        deltas = Counter()
+        async with engine.begin() as conexion:
+            filas = (await conexion.execute(
+                update(carta).where(carta.c.orden_despacho_id == orden_id, carta.c.estado_actual == transicion.desde)
+                .values(estado_actual=transicion.hacia, updated_at=ahora).returning(
+                    carta.c.id, carta.c.numero_carta, carta.c.patente, carta.c.puerto_codigo,
+                    carta.c.tipo_cereal, carta.c.calidad_asignada)
+            )).all()
+            if not filas:
+                return []
+            claves = [f"{fila.puerto_codigo}:{fila.numero_carta}:{transicion.hacia.name}" for fila in filas]
+            movimientos = [{
+                "carta_porte_id": fila.id, "sector_origen": SECTOR_POR_ESTADO[transicion.desde],
+                "sector_destino": SECTOR_POR_ESTADO[transicion.hacia], "timestamp_movimiento": ahora,
+                "estado_anterior": transicion.desde, "estado_nuevo": transicion.hacia,
+                "observaciones": observaciones, "autorizado_por": autorizado_por,
+                "motivo_movimiento": f"Despacho de la orden {orden_id}", "clave_idempotencia": clave,
+            } for fila, clave in zip(filas, claves)]
+            for fila in filas:
+                deltas[clave_contador(fila.puerto_codigo, transicion.desde, fila.tipo_cereal, fila.calidad_asignada)] -= 1
+                deltas[clave_contador(fila.puerto_codigo, transicion.hacia, fila.tipo_cereal, fila.calidad_asignada)] += 1
+            ids = await self._insertar_movimientos(conexion, movimientos)
+            avances = {orden_id: Counter({AVANCE_POR_ESTADO[transicion.hacia]: len(filas)})}
+            await self._sumar_deltas(conexion, deltas, avances, ahora)
+
+        self.lotes += 1
+        self.aplicadas += len(filas)
+        resultados = []
+        for fila, clave, movimiento_id in zip(filas, claves, ids):
+            resultado = ResultadoTransicion("aplicada", clave, fila.id, fila.numero_carta, transicion.desde.name,
+                                            transicion.hacia.name, transicion.hacia.name, movimiento_id, ahora)
+            self.recientes.set((engine, clave), resultado, self.idempotencia_ttl)
+            resultados.append(resultado)
+        self._publicar([(fila, transicion, None) for fila in filas], deltas, ahora)
+        return resultados
+
+    @staticmethod
+    async def _insertar_movimientos(conexion: AsyncConnection, movimientos: List[dict]) -> range:
+        """INSERT en lote de los movimientos; devuelve sus ids (en orden)."""
+        movimiento = MovimientoSector.__table__
+        # Con el lock de escritura tomado por los UPDATE los ids siguientes son de este lote
+        primer_id = (await conexion.execute(select(movimiento.c.id).order_by(movimiento.c.id.desc()).limit(1))).scalar()
+        primer_id = (primer_id or 0) + 1
+        for desplazamiento, fila in enumerate(movimientos):
+            fila["id"] = primer_id + desplazamiento
+        await conexion.execute(insert(movimiento), movimientos)
+        return range(primer_id, primer_id + len(movimientos))
+
+    @staticmethod
+    async def _sumar_deltas(conexion: AsyncConnection, deltas: Counter, avances: Dict[int, Counter], ahora: datetime) -> None:
+        """Contadores del tablero y avance de las órdenes de despacho, en la transacción de las transiciones."""
+        for sentencia, filas in (sentencia_deltas(deltas), sentencia_avance(avances, ahora)):
+            if filas:
+                await conexion.execute(sentencia, filas)
+
+    @staticmethod
+    def _publicar(aplicadas: List[tuple], deltas: Counter, ahora: datetime) -> None:
+        """Después del commit: colas de playa, espejo de los contadores y canal de eventos."""
+        # No ven estas escrituras por eventos del ORM
+        for fila, transicion, _ in aplicadas:
+            colas_playa.aplicar_estado(fila.id, fila.patente, fila.puerto_codigo, transicion.hacia,
+                                       fila.tipo_cereal, fila.calidad_asignada, desde=ahora)
+        contadores_circuito.aplicar(deltas)
+        if canal_circuito.activo:
+            canal_circuito.publicar([
+                CambioEstado(fila.id, fila.patente, fila.puerto_codigo, _nombre(fila.tipo_cereal),
+                             _nombre(fila.calidad_asignada), transicion.desde.name, transicion.hacia.name, ahora, puesto)
+                for fila, transicion, puesto in aplicadas
+            ])
+
+    @staticmethod
+    async def _movimientos_por_clave(conexion: AsyncConnection, claves) -> Dict[str, ResultadoTransicion]:
+        """Escaneos ya aplicados (en commits anteriores) para las claves del lote: una consulta."""
+        movimiento, carta = MovimientoSector.__table__, CartaPorteElectronica.__table__
+        filas = await conexion.execute(
+            select(movimiento.c.clave_idempotencia, movimiento.c.id, movimiento.c.carta_porte_id,
+                   movimiento.c.estado_anterior, movimiento.c.estado_nuevo, movimiento.c.timestamp_movimiento,
+                   carta.c.numero_carta, carta.c.estado_actual)
+            .join(carta, carta.c.id == movimiento.c.carta_porte_id)
+            .where(movimiento.c.clave_idempotencia.in_(bindparam("claves", expanding=True))),
+            {"claves": list(claves)}
+        )
+        return {
+            fila.clave_idempotencia: ResultadoTransicion(
+                "duplicada", fila.clave_idempotencia, fila.carta_porte_id, fila.numero_carta,
+                _nombre(fila.estado_anterior), _nombre(fila.estado_nuevo), _nombre(fila.estado_actual),
+                fila.id, fila.timestamp_movimiento
+            )
+            for fila in filas
+        }
+
+    @staticmethod
+    async def _no_aplicada(conexion: AsyncConnection, solicitud: SolicitudTransicion, condicion) -> ResultadoTransicion:
+        """El UPDATE no encontró la carta en el estado de origen: distinguir rechazo, repetición y carta inexistente."""
+        carta = CartaPorteElectronica.__table__
+        fila = (await conexion.execute(
+            select(carta.c.id, carta.c.numero_carta, carta.c.estado_actual).where(*condicion)
+        )).first()
+        if fila is None:
+            return ResultadoTransicion("no_encontrada", solicitud.clave, solicitud.carta_id, solicitud.numero_carta)
+        estado_actual = _nombre(fila.estado_actual)
+        # Ya está en el destino (escaneo repetido con otra clave): no es un error del sector
+        resultado = "duplicada" if estado_actual == solicitud.hacia.name else "rechazada"
+        return ResultadoTransicion(resultado, solicitud.clave, fila.id, fila.numero_carta,
+                                   solicitud.transicion.desde.name, solicitud.hacia.name, estado_actual)
+
+    def stats(self) -> dict:
+        return {
+            "lotes": self.lotes,
+            "aplicadas": self.aplicadas,
+            "duplicadas": self.duplicadas,
+            "rechazadas": self.rechazadas,
+            "transiciones_por_lote": round(self.aplicadas / self.lotes, 2) if self.lotes else 0,
+            "reintentos_individuales": self.reintentos_individuales,
+            "pendientes": sum(len(p) for p in self._pendientes.values()),
+            "idempotencia": self.recientes.stats(),
+        }
+
+
+motor_transiciones = MotorTransiciones()
@@ -0,0 +1,94 @@
+"""
+Cache en memoria con vencimiento por entrada y desalojo LRU.
+
+Pensado como L1 delante de tablas de cache en la base de datos: cada
+entrada vence a su propio TTL (por ejemplo el vencimiento real de un
+ticket ARCA) y, al llenarse, se desaloja la entrada usada hace más tiempo.
+Lleva contadores de aciertos, fallos, desalojos y vencimientos.
+
+Es thread-safe: los endpoints sincrónicos de FastAPI corren en un pool de threads.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Cache LRU acotado con TTL por entrada.
+
+    Args:
+        max_size: Cantidad máxima de entradas antes de desalojar por LRU
+        nombre: Nombre del cache (para estadísticas)
+    """
+
+    def __init__(self, max_size: int = 1024, nombre: str = "cache"):
+        if max_size <= 0:
+            raise ValueError("max_size debe ser mayor a 0")
+        self.max_size = max_size
+        self.nombre = nombre
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()  # clave -> (valor, vence_monotonic)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, clave: Hashable) -> Optional[Any]:
+        """Devuelve el valor vigente de la clave o None (cuenta acierto/fallo)."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            valor, vence = entrada
+            if time.monotonic() >= vence:
+                del self._datos[clave]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def set(self, clave: Hashable, valor: Any, ttl: float) -> None:
+        """Guarda el valor por ttl segundos; si ttl <= 0 no se guarda."""
+        if ttl <= 0:
+            self.invalidate(clave)
+            return
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_size:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, clave: Hashable) -> bool:
+        """Elimina la clave. Devuelve True si existía."""
+        with self._lock:
+            return self._datos.pop(clave, None) is not None
+
+    def clear(self) -> None:
+        """Vacía el cache (conserva los contadores)."""
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del cache para monitoreo."""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "nombre": self.nombre,
+                "entradas": len(self._datos),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0,
+            }
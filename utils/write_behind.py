@@ -0,0 +1,133 @@
+"""
+Escritura diferida (write-behind) de datos de login en la tabla de usuarios.
+
+`/login` ya no hace commit por request: registra `ultimo_acceso` (y la
+migración del hash de contraseña, si corresponde) en un buffer en memoria
+y una tarea del lifespan lo vuelca cada LOGIN_WRITE_BEHIND_SECONDS
+(default 5) con un UPDATE ejecutado en lote dentro de una transacción.
+
+Varios logins del mismo usuario dentro de un intervalo se reducen a una
+sola fila (gana el último). El rehash se aplica con la condición
+`password_hash = <hash anterior>`, así que nunca pisa un cambio de
+contraseña hecho mientras tanto. Cada escritura se vuelca al engine del
+que se leyó el usuario. Si el volcado falla, los pendientes se reencolan
+para el próximo intento; al apagar se vuelca lo que quede.
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from Modelos.usuario import Usuario
+from utils.logger import setup_logger
+
+logger = setup_logger('main')
+
+
+class UsuarioWriteBehind:
+    """
+    Buffer de escrituras diferidas sobre `usuario`.
+
+    Args:
+        intervalo: Segundos entre volcados de la tarea periódica
+    """
+
+    def __init__(self, intervalo: float = 5.0):
+        self.intervalo = intervalo
+        self._accesos: Dict[Tuple[AsyncEngine, int], datetime] = {}  # (engine, usuario_id) -> ultimo_acceso
+        self._rehash: Dict[Tuple[AsyncEngine, int], Tuple[str, str]] = {}  # (engine, usuario_id) -> (hash anterior, hash nuevo)
+        self._lock = threading.Lock()
+        self.volcados = 0
+        self.filas_escritas = 0
+        self.errores = 0
+
+    def registrar_acceso(self, engine: AsyncEngine, usuario_id: int, cuando: datetime) -> None:
+        with self._lock:
+            self._accesos[(engine, usuario_id)] = cuando
+
+    def registrar_rehash(self, engine: AsyncEngine, usuario_id: int, hash_anterior: str, hash_nuevo: str) -> None:
+        with self._lock:
+            self._rehash[(engine, usuario_id)] = (hash_anterior, hash_nuevo)
+
+    def rehash_pendiente(self, engine: AsyncEngine, usuario_id: int) -> bool:
+        with self._lock:
+            return (engine, usuario_id) in self._rehash
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._accesos) + len(self._rehash)
+
+    async def flush(self) -> int:
+        """Vuelca los pendientes (una transacción por engine). Retorna la cantidad de filas enviadas."""
+        with self._lock:
+            accesos, self._accesos = self._accesos, {}
+            rehash, self._rehash = self._rehash, {}
+        if not accesos and not rehash:
+            return 0
+
+        por_engine = defaultdict(lambda: ({}, {}))
+        for (engine, uid), cuando in accesos.items():
+            por_engine[engine][0][uid] = cuando
+        for (engine, uid), par in rehash.items():
+            por_engine[engine][1][uid] = par
+
+        escritas = 0
+        for engine, (accesos_engine, rehash_engine) in por_engine.items():
+            try:
+                await self._volcar(engine, accesos_engine, rehash_engine)
+            except Exception as e:
+                # Reencolar sin pisar lo registrado durante el intento fallido
+                with self._lock:
+                    for uid, cuando in accesos_engine.items():
+                        self._accesos.setdefault((engine, uid), cuando)
+                    for uid, par in rehash_engine.items():
+                        self._rehash.setdefault((engine, uid), par)
+                    self.errores += 1
+                logger.error(f"Error al volcar escrituras diferidas de login: {str(e)}")
+                continue
+            escritas += len(accesos_engine) + len(rehash_engine)
+            logger.debug(f"Write-behind de login: {len(accesos_engine)} accesos, {len(rehash_engine)} rehash")
+
+        with self._lock:
+            self.volcados += 1
+            self.filas_escritas += escritas
+        return escritas
+
+    @staticmethod
+    async def _volcar(engine: AsyncEngine, accesos: Dict[int, datetime], rehash: Dict[int, Tuple[str, str]]) -> None:
+        tabla = Usuario.__table__
+        async with engine.begin() as conexion:
+            if accesos:
+                await conexion.execute(
+                    update(tabla).where(tabla.c.id == bindparam("b_id"))
+                    .values(ultimo_acceso=bindparam("b_acceso")),
+                    [{"b_id": uid, "b_acceso": cuando} for uid, cuando in accesos.items()]
+                )
+            if rehash:
+                await conexion.execute(
+                    update(tabla).where(tabla.c.id == bindparam("b_id"),
+                                        tabla.c.password_hash == bindparam("b_anterior"))
+                    .values(password_hash=bindparam("b_nuevo")),
+                    [{"b_id": uid, "b_anterior": anterior, "b_nuevo": nuevo}
+                     for uid, (anterior, nuevo) in rehash.items()]
+                )
+
+    async def ejecutar(self) -> None:
+        """Tarea periódica del lifespan."""
+        while True:
+            await asyncio.sleep(self.intervalo)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pendientes": self.pendientes(),
+            "intervalo": self.intervalo,
+            "volcados": self.volcados,
+            "filas_escritas": self.filas_escritas,
+            "errores": self.errores,
+        }